@@ -0,0 +1,160 @@
+"""
+Dashboard statistics computation for the Admin Portal.
+
+Statistics for any number of months are computed with a single conditional
+aggregate per source table, so the monthly task and historical backfills
+cost the same handful of queries. Collections are summed from the daily
+collections rollup rather than the payments table.
+"""
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+
+def month_start(day):
+    """Return the first day of the month containing ``day``."""
+    return day.replace(day=1)
+
+
+def next_month(day):
+    """Return the first day of the month following ``day``."""
+    if day.month == 12:
+        return date(day.year + 1, 1, 1)
+    return date(day.year, day.month + 1, 1)
+
+
+def month_range(start, end):
+    """List month start dates from ``start`` to ``end`` (both inclusive)."""
+    months = []
+    current = month_start(start)
+    while current <= end:
+        months.append(current)
+        current = next_month(current)
+    return months
+
+
+def _local_midnight(day):
+    """Aware datetime for midnight of ``day`` in the current timezone."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _month_windows(months, now):
+    """
+    Build (index, start, end) windows for each month.
+
+    ``end`` is capped at ``now`` so the current month reports month-to-date
+    figures and snapshot counts reflect the present state.
+    """
+    windows = []
+    for index, month in enumerate(months):
+        start = _local_midnight(month)
+        end = min(_local_midnight(next_month(month)), now)
+        windows.append((index, start, end))
+    return windows
+
+
+def compute_dashboard_stats(months, now=None):
+    """
+    Compute ``AdminDashboardStats`` field values for the given months.
+
+    Runs exactly one aggregate query per table (users, filings, payments,
+    invoices) regardless of how many months are requested.
+
+    Returns:
+        dict: ``{month_start: {field: value}}``
+    """
+    from apps.users.models import User
+    from apps.gst_filing.models import GSTFiling
+    from apps.invoices.models import Invoice
+    from apps.payments.models import DailyCollection
+
+    now = now or timezone.now()
+    windows = _month_windows(months, now)
+    if not windows:
+        return {}
+
+    user_aggregates = {}
+    filing_aggregates = {}
+    payment_aggregates = {}
+    invoice_aggregates = {}
+
+    for i, start, end in windows:
+        in_month = Q(date_joined__gte=start, date_joined__lt=end)
+        user_aggregates[f'new_users_{i}'] = Count('id', filter=in_month)
+        user_aggregates[f'total_users_{i}'] = Count(
+            'id', filter=Q(is_active=True, date_joined__lt=end)
+        )
+
+        filed = Q(status='filed', filed_at__gte=start, filed_at__lt=end)
+        filing_aggregates[f'gstr1_filed_{i}'] = Count('id', filter=filed & Q(filing_type='GSTR1'))
+        filing_aggregates[f'gstr3b_filed_{i}'] = Count('id', filter=filed & Q(filing_type='GSTR3B'))
+        filing_aggregates[f'gstr9b_filed_{i}'] = Count('id', filter=filed & Q(filing_type='GSTR9B'))
+        filing_aggregates[f'nil_filings_{i}'] = Count('id', filter=Q(
+            nil_filing=True,
+            declaration_signed_at__gte=start,
+            declaration_signed_at__lt=end,
+        ))
+
+        # Rollup days of the window; ``end`` itself is excluded
+        first_day = timezone.localdate(start)
+        last_day = timezone.localdate(end - timedelta(microseconds=1))
+        payment_aggregates[f'payments_collected_{i}'] = Sum('amount', filter=Q(
+            kind='payment', status='success', day__gte=first_day, day__lte=last_day
+        ))
+
+        # Outstanding as of the end of the window: issued before it and
+        # not yet paid at that point. Cancelled invoices are left out.
+        outstanding = (
+            Q(created_at__lt=end)
+            & ~Q(status='cancelled')
+            & (Q(paid_at__isnull=True) | Q(paid_at__gte=end))
+        )
+        overdue = outstanding & Q(due_date__lt=end.date())
+        invoice_aggregates[f'pending_invoices_{i}'] = Count(
+            'id', filter=outstanding & Q(due_date__gte=end.date())
+        )
+        invoice_aggregates[f'overdue_invoices_{i}'] = Count('id', filter=overdue)
+        invoice_aggregates[f'overdue_amount_{i}'] = Sum('total_amount', filter=overdue)
+
+    totals = {}
+    totals.update(User.objects.aggregate(**user_aggregates))
+    totals.update(GSTFiling.objects.aggregate(**filing_aggregates))
+    totals.update(DailyCollection.objects.aggregate(**payment_aggregates))
+    totals.update(Invoice.objects.aggregate(**invoice_aggregates))
+
+    fields = [
+        'new_users', 'total_users',
+        'gstr1_filed', 'gstr3b_filed', 'gstr9b_filed', 'nil_filings',
+        'payments_collected', 'pending_invoices', 'overdue_invoices', 'overdue_amount',
+    ]
+    decimal_fields = {'payments_collected', 'overdue_amount'}
+
+    results = {}
+    for i, month in enumerate(months):
+        values = {}
+        for field in fields:
+            value = totals[f'{field}_{i}']
+            if value is None:
+                value = Decimal('0') if field in decimal_fields else 0
+            values[field] = value
+        results[month] = values
+    return results
+
+
+def store_dashboard_stats(months, now=None):
+    """
+    Compute and upsert dashboard statistics for the given months.
+
+    Safe to run repeatedly: existing rows for a month are updated in place.
+
+    Returns:
+        dict: ``{month_start: field values}`` as stored.
+    """
+    from .models import AdminDashboardStats
+
+    results = compute_dashboard_stats(months, now=now)
+    for month, values in results.items():
+        AdminDashboardStats.objects.update_or_create(date=month, defaults=values)
+    return results
@@ -0,0 +1,132 @@
+"""
+Unit tests for Admin Portal app.
+"""
+import os
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.admin_portal.models import AdminDashboardStats
+from apps.admin_portal.services import compute_dashboard_stats, month_range
+from apps.gst_filing.models import GSTFiling
+from apps.invoices.models import Invoice
+from apps.payments.models import DailyCollection
+from apps.users.models import User
+
+JANUARY = date(2026, 1, 1)
+FEBRUARY = date(2026, 2, 1)
+MARCH = date(2026, 3, 1)
+
+
+def local(*args):
+    """Aware datetime in the project timezone (Asia/Kolkata)."""
+    return timezone.make_aware(datetime(*args))
+
+
+class DashboardStatsTests(TestCase):
+    """Test cases for monthly dashboard statistics and their backfill."""
+
+    def setUp(self):
+        # Late on 31 January, and early on 1 February local time (still 31 January in UTC)
+        self.january_user = self.user('jan@example.com', local(2026, 1, 31, 23, 59))
+        self.february_user = self.user('feb@example.com', local(2026, 2, 1, 3, 0))
+        self.user('inactive@example.com', local(2026, 1, 15), is_active=False)
+
+        self.filing('GSTR1', 1, status='filed', filed_at=local(2026, 1, 31, 23, 0))
+        self.filing('GSTR3B', 1, status='filed', filed_at=local(2026, 2, 1, 1, 0))
+        self.filing('GSTR9B', 2)
+        self.filing('GSTR3B', 2, nil_filing=True, declaration_signed_at=local(2026, 2, 10))
+
+        for day, status, amount in [
+            (date(2026, 1, 31), 'success', '100.00'),
+            (date(2026, 2, 1), 'success', '250.00'),
+            (date(2026, 2, 1), 'failed', '999.00'),
+        ]:
+            DailyCollection.objects.create(
+                day=day, kind='payment', gateway='razorpay', status=status, count=1, amount=Decimal(amount)
+            )
+
+        # Overdue at the end of January, paid in February
+        self.invoice('118.00', local(2026, 1, 10), date(2026, 1, 20), status='paid', paid_at=local(2026, 2, 5))
+        # Pending at the end of January, overdue at the end of February
+        self.invoice('236.00', local(2026, 1, 25), date(2026, 2, 15))
+        # Issued just after the January boundary
+        self.invoice('59.00', local(2026, 2, 1, 0, 30), date(2026, 3, 20))
+        self.invoice('500.00', local(2026, 1, 5), date(2026, 1, 10), status='cancelled')
+
+    def user(self, email, joined, **extra):
+        user = User.objects.create_user(email=email, password='testpass123', **extra)
+        User.objects.filter(pk=user.pk).update(date_joined=joined)
+        return user
+
+    def filing(self, filing_type, month, **fields):
+        return GSTFiling.objects.create(
+            user=self.january_user, filing_type=filing_type, financial_year='2025-26',
+            month=month, year=2026, **fields
+        )
+
+    def invoice(self, total, created_at, due_date, **fields):
+        invoice = Invoice.objects.create(
+            user=self.january_user, amount=Decimal(total), total_amount=Decimal(total),
+            due_date=due_date, **fields
+        )
+        Invoice.objects.filter(pk=invoice.pk).update(created_at=created_at)
+        return invoice
+
+    def test_monthly_stats(self):
+        """Test each month's figures, including rows on either side of a month boundary."""
+        with self.assertNumQueries(4):
+            stats = compute_dashboard_stats([JANUARY, FEBRUARY, MARCH], now=local(2026, 3, 10, 12, 0))
+
+        self.assertEqual(stats[JANUARY], {
+            'new_users': 2, 'total_users': 1,
+            'gstr1_filed': 1, 'gstr3b_filed': 0, 'gstr9b_filed': 0, 'nil_filings': 0,
+            'payments_collected': Decimal('100.00'),
+            'pending_invoices': 1, 'overdue_invoices': 1, 'overdue_amount': Decimal('118.00'),
+        })
+        self.assertEqual(stats[FEBRUARY], {
+            'new_users': 1, 'total_users': 2,
+            'gstr1_filed': 0, 'gstr3b_filed': 1, 'gstr9b_filed': 0, 'nil_filings': 1,
+            'payments_collected': Decimal('250.00'),
+            'pending_invoices': 1, 'overdue_invoices': 1, 'overdue_amount': Decimal('236.00'),
+        })
+        # The current month is month-to-date
+        self.assertEqual(stats[MARCH]['new_users'], 0)
+        self.assertEqual(stats[MARCH]['total_users'], 2)
+        self.assertEqual(stats[MARCH]['payments_collected'], Decimal('0'))
+        self.assertEqual((stats[MARCH]['pending_invoices'], stats[MARCH]['overdue_invoices']), (1, 1))
+
+    def test_query_count_does_not_grow_with_months(self):
+        """Test a year of months still costs one query per table."""
+        months = month_range(date(2025, 4, 1), MARCH)
+        self.assertEqual(len(months), 12)
+
+        with self.assertNumQueries(4):
+            stats = compute_dashboard_stats(months, now=local(2026, 3, 10, 12, 0))
+        self.assertEqual(stats[date(2025, 4, 1)]['total_users'], 0)
+        self.assertEqual(compute_dashboard_stats([]), {})
+
+    def test_backfill_command(self):
+        """Test the backfill stores one row per month and updates it on rerun."""
+        call_command('backfill_dashboard_stats', '--from', '2026-01', '--to', '2026-02', stdout=open(os.devnull, 'w'))
+
+        self.assertEqual(AdminDashboardStats.objects.count(), 2)
+        january = AdminDashboardStats.objects.get(date=JANUARY)
+        self.assertEqual((january.new_users, january.gstr1_filed), (2, 1))
+        self.assertEqual(january.payments_collected, Decimal('100.00'))
+
+        DailyCollection.objects.filter(day=date(2026, 2, 1), status='success').update(amount=Decimal('300.00'))
+        call_command('backfill_dashboard_stats', '--from', '2026-02', '--to', '2026-02', stdout=open(os.devnull, 'w'))
+        self.assertEqual(AdminDashboardStats.objects.count(), 2)
+        self.assertEqual(AdminDashboardStats.objects.get(date=FEBRUARY).payments_collected, Decimal('300.00'))
+
+    def test_backfill_rejects_bad_months(self):
+        """Test invalid or reversed month arguments are rejected."""
+        with self.assertRaises(CommandError):
+            call_command('backfill_dashboard_stats', '--from', '2026-13')
+        with self.assertRaises(CommandError):
+            call_command('backfill_dashboard_stats', '--from', '2026-02', '--to', '2026-01')
+        self.assertFalse(AdminDashboardStats.objects.exists())
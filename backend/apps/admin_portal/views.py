@@ -4,7 +4,7 @@ Views for Admin Portal.
 import uuid
 from django.db.models import Sum, Count, Q
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, timedelta
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -71,18 +71,13 @@ class DashboardViewSet(viewsets.ViewSet):
         filed_today = GSTFiling.objects.filter(status='filed', filed_at__date=today).count()
         nil_filings_count = GSTFiling.objects.filter(nil_filing=True).count()
         
-        # Payment stats
-        from apps.invoices.models import Invoice, PaymentRecord
-        total_collected = PaymentRecord.objects.filter(
-            status='success'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        pending_invoices = Invoice.objects.filter(status='issued')
-        pending_amount = pending_invoices.aggregate(total=Sum('total_amount'))['total'] or 0
-        
-        overdue_invoices = Invoice.objects.filter(status='overdue')
-        overdue_count = overdue_invoices.count()
-        overdue_amount = overdue_invoices.aggregate(total=Sum('total_amount'))['total'] or 0
+        # Payment stats, from the daily collections rollup
+        from apps.payments.rollup import collection_totals
+        collections = collection_totals()
+        total_collected = collections['collected_amount']
+        pending_amount = collections['pending_amount']
+        overdue_count = collections['overdue_count']
+        overdue_amount = collections['overdue_amount']
         
         return Response({
             'total_users': total_users,
@@ -127,28 +122,43 @@ class DashboardViewSet(viewsets.ViewSet):
     
     @action(detail=False, methods=['get'])
     def payment_report(self, request):
-        """Get payment collection report."""
+        """
+        Get payment collection report.
+        
+        Optional ``year`` and ``month`` query parameters limit the report to
+        payments made and invoices issued in that year or month.
+        """
         if not hasattr(request.user, 'admin_profile'):
             return Response(
                 {'error': 'Admin access required.'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        from apps.invoices.models import Invoice, PaymentRecord
-        
-        total_invoiced = Invoice.objects.aggregate(
-            total=Sum('total_amount')
-        )['total'] or 0
-        
-        total_collected = PaymentRecord.objects.filter(
-            status='success'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        pending_invoices = Invoice.objects.filter(status='issued')
-        pending_amount = pending_invoices.aggregate(total=Sum('total_amount'))['total'] or 0
-        
-        overdue_invoices = Invoice.objects.filter(status='overdue')
-        overdue_amount = overdue_invoices.aggregate(total=Sum('total_amount'))['total'] or 0
+        from apps.admin_portal.services import next_month
+        from apps.payments.rollup import collection_totals
+        
+        start = end = None
+        year = request.query_params.get('year')
+        month = request.query_params.get('month')
+        if year or month:
+            try:
+                if month:
+                    start = date(int(year), int(month), 1)
+                    end = next_month(start) - timedelta(days=1)
+                else:
+                    start = date(int(year), 1, 1)
+                    end = date(int(year), 12, 31)
+            except (TypeError, ValueError):
+                return Response(
+                    {'error': 'year must be a year and month a month number.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        
+        collections = collection_totals(start=start, end=end)
+        total_invoiced = collections['invoiced_amount']
+        total_collected = collections['collected_amount']
+        pending_amount = collections['pending_amount']
+        overdue_amount = collections['overdue_amount']
         
         collection_rate = (total_collected / total_invoiced * 100) if total_invoiced > 0 else 0
         
@@ -0,0 +1,48 @@
+"""
+Outbox consumers for the Analytics app.
+"""
+from collections import defaultdict
+from functools import partial
+
+from django.db import transaction
+
+
+def deliver_webhooks(events):
+    """
+    Queue a delivery to every active webhook subscribed to each event, once
+    the events are committed as dispatched.
+    """
+    from .models import Webhook
+    from .tasks import deliver_webhook
+
+    user_ids = {event.user_id for event in events if event.user_id}
+    if not user_ids:
+        return
+
+    webhooks_by_user = defaultdict(list)
+    for webhook in Webhook.objects.filter(user_id__in=user_ids, is_active=True).only('id', 'user_id', 'events'):
+        webhooks_by_user[webhook.user_id].append(webhook)
+
+    for event in events:
+        for webhook in webhooks_by_user.get(event.user_id, []):
+            if event.event_type in (webhook.events or []):
+                transaction.on_commit(partial(deliver_webhook.delay, str(webhook.id), event.id))
+
+
+def record_audit_events(events):
+    """Record domain events in the audit log in one insert."""
+    from .models import AuditLog
+
+    actions = {
+        'filing.created': 'create',
+    }
+    AuditLog.objects.bulk_create([
+        AuditLog(
+            user_id=event.user_id,
+            action=actions.get(event.event_type, 'update'),
+            resource_type=event.aggregate_type,
+            resource_id=event.aggregate_id,
+            details={'event': event.event_type, 'event_id': event.id, **event.payload},
+        )
+        for event in events
+    ])
@@ -0,0 +1,75 @@
+"""
+Celery tasks for Analytics app.
+"""
+import hashlib
+import hmac
+import json
+import logging
+
+import requests
+from celery import shared_task
+from django.db.models import F
+from django.utils import timezone
+
+from apps.core import queues
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_TIMEOUT = 10
+
+
+def sign_payload(secret, body):
+    """HMAC-SHA256 signature receivers use to verify a delivery."""
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+@shared_task(bind=True, queue=queues.NOTIFICATIONS_BULK, max_retries=5)
+def deliver_webhook(self, webhook_id, event_id):
+    """
+    POST an outbox event to a customer webhook.
+    Receivers should de-duplicate on the X-GSTONGO-Event-Id header.
+    """
+    from apps.core.models import OutboxEvent
+    from .models import Webhook
+
+    webhook = Webhook.objects.filter(id=webhook_id, is_active=True).first()
+    event = OutboxEvent.objects.filter(id=event_id).first()
+    if webhook is None or event is None:
+        return 'Skipped: webhook inactive or event missing'
+
+    body = json.dumps({
+        'id': event.id,
+        'event': event.event_type,
+        'created_at': event.created_at.isoformat(),
+        'data': event.payload,
+    }).encode()
+    headers = {
+        'Content-Type': 'application/json',
+        'X-GSTONGO-Event': event.event_type,
+        'X-GSTONGO-Event-Id': str(event.id),
+        'X-GSTONGO-Signature': sign_payload(webhook.secret, body),
+    }
+
+    response_code = None
+    try:
+        response = requests.post(webhook.url, data=body, headers=headers, timeout=WEBHOOK_TIMEOUT)
+        response_code = response.status_code
+        delivered = 200 <= response_code < 300
+        error = None if delivered else f'HTTP {response_code}'
+    except requests.RequestException as e:
+        delivered = False
+        error = str(e)
+
+    Webhook.objects.filter(id=webhook.id).update(
+        total_deliveries=F('total_deliveries') + 1,
+        successful_deliveries=F('successful_deliveries') + (1 if delivered else 0),
+        failed_deliveries=F('failed_deliveries') + (0 if delivered else 1),
+        last_delivery=timezone.now(),
+        last_response_code=response_code,
+    )
+
+    if not delivered:
+        logger.warning(f'Webhook {webhook.id} delivery of event {event.id} failed: {error}')
+        raise self.retry(countdown=60 * (2 ** self.request.retries))
+
+    return f'Delivered event {event.id} to webhook {webhook.id}'
@@ -0,0 +1,18 @@
+from django.contrib import admin
+from unfold.admin import ModelAdmin
+from .models import OutboxEvent, TaskRun
+
+@admin.register(TaskRun)
+class TaskRunAdmin(ModelAdmin):
+    list_display = ('task_name', 'period_key', 'status', 'attempts', 'rows_processed', 'started_at', 'finished_at')
+    list_filter = ('status', 'task_name')
+    search_fields = ('task_name', 'period_key', 'celery_task_id')
+    date_hierarchy = 'started_at'
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(ModelAdmin):
+    list_display = ('id', 'event_type', 'aggregate_type', 'aggregate_id', 'status', 'attempts', 'available_at', 'dispatched_at')
+    list_filter = ('status', 'event_type', 'aggregate_type')
+    search_fields = ('aggregate_id', 'user__email')
+    readonly_fields = ('created_at', 'dispatched_at')
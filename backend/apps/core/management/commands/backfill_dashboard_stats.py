@@ -0,0 +1,54 @@
+"""
+Management command to backfill monthly dashboard statistics.
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = 'Compute AdminDashboardStats for a range of months (YYYY-MM)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--from',
+            dest='from_month',
+            required=True,
+            help='First month to compute, e.g. 2024-04'
+        )
+        parser.add_argument(
+            '--to',
+            dest='to_month',
+            help='Last month to compute (default: current month)'
+        )
+
+    def handle(self, *args, **options):
+        from apps.admin_portal.services import month_range, store_dashboard_stats
+
+        start = self.parse_month(options['from_month'])
+        if options['to_month']:
+            end = self.parse_month(options['to_month'])
+        else:
+            end = timezone.now().date().replace(day=1)
+
+        if start > end:
+            raise CommandError('--from must not be after --to.')
+
+        months = month_range(start, end)
+        results = store_dashboard_stats(months)
+
+        for month, stats in results.items():
+            self.stdout.write(
+                f'  {month:%Y-%m}: {stats["new_users"]} new users, '
+                f'₹{stats["payments_collected"]} collected'
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {len(months)} month(s).'))
+
+    def parse_month(self, value):
+        """Parse a YYYY-MM string into the first day of that month."""
+        try:
+            return datetime.strptime(value, '%Y-%m').date()
+        except ValueError:
+            raise CommandError(f'Invalid month "{value}", expected YYYY-MM.')
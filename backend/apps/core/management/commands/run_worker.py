@@ -0,0 +1,41 @@
+"""
+Management command to start a Celery worker for one queue profile.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.queues import WORKER_PROFILES, worker_argv
+
+
+class Command(BaseCommand):
+    help = 'Start a Celery worker using a per-queue profile (see apps/core/queues.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'profile',
+            choices=sorted(WORKER_PROFILES),
+            help='Queue profile to consume'
+        )
+        parser.add_argument(
+            '--loglevel',
+            default='INFO',
+            help='Worker log level (default: INFO)'
+        )
+        parser.add_argument(
+            '--print-only',
+            action='store_true',
+            help='Print the equivalent celery command instead of starting the worker'
+        )
+
+    def handle(self, *args, **options):
+        from gstongo.celery import app
+
+        try:
+            argv = worker_argv(options['profile'], loglevel=options['loglevel'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['print_only']:
+            self.stdout.write('celery -A gstongo.celery ' + ' '.join(argv))
+            return
+
+        app.worker_main(argv)
@@ -0,0 +1,336 @@
+"""
+Celery task instrumentation for GSTONGO.
+
+Signal handlers record, for every task execution: wall time, DB query count
+and time, rows touched (reported by the task via ``report_rows``), retries,
+failures and enqueue-to-start lag. Samples go to a rolling store in the
+default cache (Redis in production) and are summarised for the admin
+metrics endpoint and the Prometheus exporter.
+"""
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+from celery.signals import (
+    before_task_publish, task_failure, task_postrun, task_prerun, task_retry
+)
+from django.core.cache import cache
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+# Samples kept per task for percentile summaries
+SAMPLE_LIMIT = 500
+# Seconds metrics survive without new samples
+METRICS_TTL = 7 * 24 * 60 * 60
+
+ENQUEUED_AT_HEADER = 'enqueued_at'
+
+
+class TaskStats:
+    """Counters for a single task execution."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.started = time.monotonic()
+        self.rows = 0
+        self.queries = 0
+        self.query_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper counting queries and their time."""
+        start = time.monotonic()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_time += time.monotonic() - start
+
+
+_current_stats = ContextVar('task_stats', default=None)
+_active = {}
+
+
+def current_task_stats():
+    """Return stats for the task executing in this context, if any."""
+    return _current_stats.get()
+
+
+def report_rows(count):
+    """
+    Report rows touched by the running task.
+
+    Counts accumulate per execution and appear in task metrics and on the
+    ``TaskRun`` ledger of guarded tasks. A no-op outside a task.
+    """
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.rows += count
+
+
+def begin_task_stats(task_id):
+    """Start collecting stats for ``task_id`` in the current context."""
+    stats = TaskStats()
+    token = _current_stats.set(stats)
+    connection.execute_wrappers.append(stats)
+    _active[task_id] = (stats, token)
+    return stats
+
+
+def end_task_stats(task_id):
+    """Stop collecting stats for ``task_id`` and return them."""
+    stats, token = _active.pop(task_id, (None, None))
+    if stats is None:
+        return None
+    if stats in connection.execute_wrappers:
+        connection.execute_wrappers.remove(stats)
+    try:
+        _current_stats.reset(token)
+    except ValueError:
+        _current_stats.set(None)
+    return stats
+
+
+class TaskMetricsStore:
+    """
+    Rolling per-task metrics in the default cache.
+
+    Uses native Redis lists and counters when the cache is django-redis so
+    concurrent workers never lose samples; other backends fall back to
+    read-modify-write through the cache API.
+    """
+
+    def __init__(self, prefix='task-metrics'):
+        self.prefix = prefix
+
+    def _key(self, *parts):
+        return cache.make_key(':'.join((self.prefix,) + parts))
+
+    def _redis(self):
+        try:
+            from django_redis import get_redis_connection
+            return get_redis_connection('default')
+        except Exception:
+            return None
+
+    def record(self, task_name, sample):
+        """Store a sample and bump the run counters for ``task_name``."""
+        payload = json.dumps(sample)
+        redis = self._redis()
+        if redis is not None:
+            samples_key = self._key('samples', task_name)
+            pipe = redis.pipeline()
+            pipe.lpush(samples_key, payload)
+            pipe.ltrim(samples_key, 0, SAMPLE_LIMIT - 1)
+            pipe.expire(samples_key, METRICS_TTL)
+            pipe.sadd(self._key('tasks'), task_name)
+            pipe.execute()
+        else:
+            key = f'{self.prefix}:samples:{task_name}'
+            samples = cache.get(key) or []
+            samples.insert(0, payload)
+            cache.set(key, samples[:SAMPLE_LIMIT], METRICS_TTL)
+            tasks_key = f'{self.prefix}:tasks'
+            tasks = cache.get(tasks_key) or []
+            if task_name not in tasks:
+                cache.set(tasks_key, tasks + [task_name], None)
+
+        self.incr(task_name, 'runs')
+        if sample.get('rows'):
+            self.incr(task_name, 'rows', sample['rows'])
+
+    def incr(self, task_name, counter, amount=1):
+        """Increment a monotonic counter (runs, rows, retries, failures)."""
+        redis = self._redis()
+        if redis is not None:
+            redis.hincrby(self._key('counters', task_name), counter, amount)
+            return
+        key = f'{self.prefix}:counters:{task_name}:{counter}'
+        if not cache.add(key, amount, None):
+            cache.incr(key, amount)
+
+    def task_names(self):
+        redis = self._redis()
+        if redis is not None:
+            return sorted(name.decode() for name in redis.smembers(self._key('tasks')))
+        return sorted(cache.get(f'{self.prefix}:tasks') or [])
+
+    def samples(self, task_name):
+        redis = self._redis()
+        if redis is not None:
+            raw = redis.lrange(self._key('samples', task_name), 0, -1)
+        else:
+            raw = cache.get(f'{self.prefix}:samples:{task_name}') or []
+        return [json.loads(item) for item in raw]
+
+    def counters(self, task_name):
+        names = ['runs', 'rows', 'retries', 'failures']
+        redis = self._redis()
+        if redis is not None:
+            raw = redis.hgetall(self._key('counters', task_name))
+            values = {key.decode(): int(value) for key, value in raw.items()}
+            return {name: values.get(name, 0) for name in names}
+        return {
+            name: cache.get(f'{self.prefix}:counters:{task_name}:{name}') or 0
+            for name in names
+        }
+
+    def summary(self, task_name):
+        """Summarise the rolling window for ``task_name``."""
+        samples = self.samples(task_name)
+        durations = sorted(s['duration'] for s in samples)
+        lags = sorted(s['lag'] for s in samples if s.get('lag') is not None)
+        count = len(samples)
+
+        return {
+            'task': task_name,
+            'counters': self.counters(task_name),
+            'window': count,
+            'duration': _distribution(durations),
+            'queue_lag': _distribution(lags),
+            'avg_queries': round(sum(s['queries'] for s in samples) / count, 2) if count else 0,
+            'avg_query_time': round(sum(s['query_time'] for s in samples) / count, 4) if count else 0,
+            'avg_rows': round(sum(s['rows'] for s in samples) / count, 2) if count else 0,
+            'last_run_at': samples[0]['finished_at'] if samples else None,
+            'last_state': samples[0]['state'] if samples else None,
+        }
+
+    def summaries(self):
+        return [self.summary(name) for name in self.task_names()]
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def _distribution(values):
+    """p50/p95/max/avg of a sorted list of seconds."""
+    if not values:
+        return {'avg': None, 'p50': None, 'p95': None, 'max': None}
+    return {
+        'avg': round(sum(values) / len(values), 4),
+        'p50': round(_percentile(values, 0.5), 4),
+        'p95': round(_percentile(values, 0.95), 4),
+        'max': round(values[-1], 4),
+    }
+
+
+metrics_store = TaskMetricsStore()
+
+
+# =========================
+# SIGNAL HANDLERS
+# =========================
+
+@before_task_publish.connect
+def stamp_enqueue_time(sender=None, headers=None, **kwargs):
+    """Stamp outgoing task messages so workers can measure queue lag."""
+    if headers is not None:
+        headers.setdefault(ENQUEUED_AT_HEADER, time.time())
+
+
+@task_prerun.connect
+def start_task_metrics(sender=None, task_id=None, task=None, **kwargs):
+    begin_task_stats(task_id)
+
+
+@task_postrun.connect
+def finish_task_metrics(sender=None, task_id=None, task=None, state=None, **kwargs):
+    stats = end_task_stats(task_id)
+    if stats is None or task is None:
+        return
+
+    lag = None
+    enqueued_at = getattr(task.request, ENQUEUED_AT_HEADER, None)
+    if enqueued_at is None:
+        enqueued_at = (getattr(task.request, 'headers', None) or {}).get(ENQUEUED_AT_HEADER)
+    if enqueued_at is not None:
+        lag = max(0.0, stats.started_at - float(enqueued_at))
+
+    sample = {
+        'task_id': task_id,
+        'state': state,
+        'duration': round(time.monotonic() - stats.started, 6),
+        'queries': stats.queries,
+        'query_time': round(stats.query_time, 6),
+        'rows': stats.rows,
+        'lag': None if lag is None else round(lag, 6),
+        'retries': task.request.retries or 0,
+        'finished_at': time.time(),
+    }
+    try:
+        metrics_store.record(task.name, sample)
+    except Exception as e:
+        # Metrics must never fail the task itself.
+        logger.warning(f'Failed to record metrics for {task.name}: {e}')
+
+
+@task_retry.connect
+def count_task_retry(sender=None, **kwargs):
+    try:
+        metrics_store.incr(sender.name, 'retries')
+    except Exception as e:
+        logger.warning(f'Failed to record retry for {sender.name}: {e}')
+
+
+@task_failure.connect
+def count_task_failure(sender=None, **kwargs):
+    try:
+        metrics_store.incr(sender.name, 'failures')
+    except Exception as e:
+        logger.warning(f'Failed to record failure for {sender.name}: {e}')
+
+
+# =========================
+# EXPORTER
+# =========================
+
+def render_prometheus(summaries):
+    """Render task summaries in the Prometheus text exposition format."""
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            if value is None:
+                continue
+            label_str = ','.join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f'{name}{{{label_str}}} {value}')
+
+    for counter, help_text in [
+        ('runs', 'Task executions recorded.'),
+        ('rows', 'Rows reported as touched by tasks.'),
+        ('retries', 'Task retries.'),
+        ('failures', 'Task failures.'),
+    ]:
+        metric(
+            f'gstongo_task_{counter}_total', 'counter', help_text,
+            [({'task': s['task']}, s['counters'][counter]) for s in summaries]
+        )
+
+    for field, name, help_text in [
+        ('duration', 'gstongo_task_duration_seconds', 'Task wall time over the rolling window.'),
+        ('queue_lag', 'gstongo_task_queue_lag_seconds', 'Enqueue-to-start lag over the rolling window.'),
+    ]:
+        samples = []
+        for s in summaries:
+            for quantile, key in [('0.5', 'p50'), ('0.95', 'p95'), ('1', 'max')]:
+                samples.append(({'task': s['task'], 'quantile': quantile}, s[field][key]))
+        metric(name, 'summary', help_text, samples)
+
+    metric(
+        'gstongo_task_db_queries_avg', 'gauge', 'Average DB queries per execution.',
+        [({'task': s['task']}, s['avg_queries']) for s in summaries]
+    )
+    metric(
+        'gstongo_task_db_query_seconds_avg', 'gauge', 'Average DB time per execution.',
+        [({'task': s['task']}, s['avg_query_time']) for s in summaries]
+    )
+
+    return '\n'.join(lines) + '\n'
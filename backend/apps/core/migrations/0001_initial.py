@@ -0,0 +1,43 @@
+# Generated by Django 4.2.27 on 2026-10-19 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task_name', models.CharField(max_length=200)),
+                ('period_key', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('celery_task_id', models.CharField(blank=True, max_length=255, null=True)),
+                ('hostname', models.CharField(blank=True, max_length=255, null=True)),
+                ('rows_processed', models.PositiveIntegerField(default=0)),
+                ('result', models.TextField(blank=True, null=True)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Task Run',
+                'verbose_name_plural': 'Task Runs',
+                'db_table': 'task_runs',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='taskrun',
+            constraint=models.UniqueConstraint(fields=('task_name', 'period_key'), name='unique_task_run_per_period'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.27 on 2026-10-19 02:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('filing.created', 'Filing Created'), ('filing.completed', 'Filing Completed'), ('payment.received', 'Payment Received'), ('ticket.resolved', 'Ticket Resolved')], max_length=50)),
+                ('aggregate_type', models.CharField(max_length=50)),
+                ('aggregate_id', models.CharField(max_length=64)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('dispatched', 'Dispatched'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('dispatched_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='outbox_events', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Outbox Event',
+                'verbose_name_plural': 'Outbox Events',
+                'db_table': 'outbox_events',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'available_at', 'id'], name='outbox_even_status_7a3ca6_idx'), models.Index(fields=['aggregate_type', 'aggregate_id', 'id'], name='outbox_even_aggrega_d068de_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,116 @@
+"""
+Core models shared across GSTONGO apps.
+"""
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class TaskRun(models.Model):
+    """Ledger of guarded periodic task executions, one row per task per period."""
+
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+
+    task_name = models.CharField(max_length=200)
+    period_key = models.CharField(max_length=100)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    attempts = models.PositiveIntegerField(default=0)
+
+    # Execution details of the latest attempt
+    celery_task_id = models.CharField(max_length=255, null=True, blank=True)
+    hostname = models.CharField(max_length=255, null=True, blank=True)
+    rows_processed = models.PositiveIntegerField(default=0)
+    result = models.TextField(null=True, blank=True)
+    error_message = models.TextField(null=True, blank=True)
+
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'task_runs'
+        verbose_name = 'Task Run'
+        verbose_name_plural = 'Task Runs'
+        ordering = ['-started_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['task_name', 'period_key'],
+                name='unique_task_run_per_period'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.task_name} [{self.period_key}] - {self.status}"
+
+    @property
+    def duration(self):
+        """Wall time of the latest attempt, if finished."""
+        if self.started_at and self.finished_at:
+            return self.finished_at - self.started_at
+        return None
+
+
+class OutboxEvent(models.Model):
+    """
+    Domain event written in the same transaction as the state change.
+
+    A relay drains pending events in id order and hands them to the
+    consumers in ``OUTBOX_CONSUMERS`` (delivery is at-least-once).
+    """
+
+    EVENT_TYPES = [
+        ('filing.created', 'Filing Created'),
+        ('filing.completed', 'Filing Completed'),
+        ('payment.received', 'Payment Received'),
+        ('ticket.resolved', 'Ticket Resolved'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('dispatched', 'Dispatched'),
+        ('failed', 'Failed'),
+    ]
+
+    event_type = models.CharField(max_length=50, choices=EVENT_TYPES)
+
+    # Aggregate the event belongs to; events are delivered in order per aggregate
+    aggregate_type = models.CharField(max_length=50)
+    aggregate_id = models.CharField(max_length=64)
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='outbox_events'
+    )
+    payload = models.JSONField(default=dict)
+
+    # Delivery tracking
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'outbox_events'
+        verbose_name = 'Outbox Event'
+        verbose_name_plural = 'Outbox Events'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'available_at', 'id']),
+            models.Index(fields=['aggregate_type', 'aggregate_id', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.event_type} {self.aggregate_type}:{self.aggregate_id} - {self.status}"
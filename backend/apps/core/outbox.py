@@ -0,0 +1,219 @@
+"""
+Transactional outbox for GSTONGO domain events.
+
+State changes record an ``OutboxEvent`` inside the same database transaction
+via ``emit_event``. After commit a relay task drains pending events in id
+order, in batches, to the consumers listed in ``settings.OUTBOX_CONSUMERS``
+(notifications, webhooks, analytics). Delivery is at-least-once: a failed
+batch is retried, so consumers must tolerate seeing an event twice. Events
+of one aggregate are never delivered ahead of an earlier, undelivered event
+of the same aggregate.
+
+Consumers run in one transaction with the update marking their events
+dispatched. Work outside the database (Celery tasks, HTTP calls) must be
+registered with ``transaction.on_commit`` so it happens only once the
+events are committed as dispatched, and never for a batch that is rolled
+back and retried.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def emit_event(event_type, aggregate, payload=None, user=None):
+    """
+    Record a domain event for ``aggregate``.
+
+    Call inside the ``transaction.atomic()`` block that performs the state
+    change so the event is committed (or rolled back) with it.
+    """
+    from .models import OutboxEvent
+
+    event = OutboxEvent.objects.create(
+        event_type=event_type,
+        aggregate_type=aggregate._meta.model_name,
+        aggregate_id=str(aggregate.pk),
+        user=user,
+        payload=payload or {},
+    )
+    transaction.on_commit(schedule_relay)
+    return event
+
+
+def schedule_relay():
+    """Ask a worker to drain the outbox now rather than on the next beat."""
+    from .tasks import relay_outbox_events
+    try:
+        relay_outbox_events.delay()
+    except Exception as e:
+        # The periodic relay picks the event up regardless.
+        logger.warning(f'Could not schedule outbox relay: {e}')
+
+
+def get_consumers():
+    """Load consumer callables from ``OUTBOX_CONSUMERS``."""
+    return [import_string(path) for path in getattr(settings, 'OUTBOX_CONSUMERS', [])]
+
+
+def _retry_delay(attempts):
+    base = getattr(settings, 'OUTBOX_RETRY_BASE_SECONDS', 30)
+    return timedelta(seconds=min(base * (2 ** max(attempts - 1, 0)), 60 * 60))
+
+
+def _aggregate_key(event):
+    return (event.aggregate_type, event.aggregate_id)
+
+
+def _blocked_aggregates(events):
+    """
+    Earliest pending event id per aggregate that precedes this batch but is
+    not part of it (i.e. waiting on a retry backoff).
+    """
+    from .models import OutboxEvent
+
+    batch_ids = [event.id for event in events]
+    keys = {_aggregate_key(event) for event in events}
+    earlier = OutboxEvent.objects.filter(
+        status='pending',
+        aggregate_id__in={aggregate_id for _, aggregate_id in keys},
+        id__lt=max(batch_ids),
+    ).exclude(
+        id__in=batch_ids
+    ).order_by('id').values_list('aggregate_type', 'aggregate_id', 'id', 'available_at')
+
+    blocked = {}
+    for aggregate_type, aggregate_id, event_id, available_at in earlier:
+        key = (aggregate_type, aggregate_id)
+        if key in keys and key not in blocked:
+            blocked[key] = (event_id, available_at)
+    return blocked
+
+
+def _mark_dispatched(events):
+    from .models import OutboxEvent
+
+    if not events:
+        return
+    OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(
+        status='dispatched',
+        dispatched_at=timezone.now(),
+        attempts=F('attempts') + 1,
+        last_error=None,
+    )
+
+
+def _mark_failed(event, error):
+    """Schedule a retry for ``event`` or dead-letter it after max attempts."""
+    max_attempts = getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 10)
+    event.attempts += 1
+    event.last_error = str(error)
+    if event.attempts >= max_attempts:
+        event.status = 'failed'
+        logger.error(f'Outbox event {event.id} dead-lettered after {event.attempts} attempts: {error}')
+    else:
+        event.available_at = timezone.now() + _retry_delay(event.attempts)
+    event.save(update_fields=['attempts', 'last_error', 'status', 'available_at'])
+
+
+def _defer(events, until):
+    from .models import OutboxEvent
+
+    if events:
+        OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(available_at=until)
+
+
+def dispatch_batch(events, consumers):
+    """
+    Deliver an ordered batch of events to every consumer.
+
+    The whole batch is offered to each consumer at once. If any consumer
+    fails, events are redelivered one at a time to isolate the failure;
+    later events of a failing aggregate are deferred behind it.
+
+    Returns:
+        int: number of events dispatched
+    """
+    blocked = _blocked_aggregates(events)
+    deferred = {}
+    ready = []
+    for event in events:
+        blocker = blocked.get(_aggregate_key(event))
+        if blocker and blocker[0] < event.id:
+            deferred.setdefault(blocker[1], []).append(event)
+        else:
+            ready.append(event)
+    for until, waiting in deferred.items():
+        _defer(waiting, until)
+
+    if not ready:
+        return 0
+
+    try:
+        with transaction.atomic():
+            for consumer in consumers:
+                consumer(ready)
+            _mark_dispatched(ready)
+    except Exception as e:
+        logger.warning(f'Outbox batch delivery failed, retrying events individually: {e}')
+    else:
+        return len(ready)
+
+    dispatched = 0
+    failed_aggregates = {}
+    for event in ready:
+        key = _aggregate_key(event)
+        if key in failed_aggregates:
+            _defer([event], failed_aggregates[key])
+            continue
+        try:
+            with transaction.atomic():
+                for consumer in consumers:
+                    consumer([event])
+                _mark_dispatched([event])
+        except Exception as e:
+            _mark_failed(event, e)
+            if event.status == 'pending':
+                failed_aggregates[key] = event.available_at
+        else:
+            dispatched += 1
+
+    return dispatched
+
+
+def relay_pending_events(batch_size=None, max_batches=None):
+    """
+    Drain available outbox events in id order.
+
+    Must run in a single relay at a time (see ``relay_outbox_events``) to
+    keep per-aggregate ordering.
+
+    Returns:
+        int: number of events dispatched
+    """
+    from .models import OutboxEvent
+
+    batch_size = batch_size or getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+    max_batches = max_batches or getattr(settings, 'OUTBOX_MAX_BATCHES_PER_RUN', 50)
+    consumers = get_consumers()
+
+    total = 0
+    for _ in range(max_batches):
+        events = list(
+            OutboxEvent.objects.filter(
+                status='pending',
+                available_at__lte=timezone.now()
+            ).order_by('id')[:batch_size]
+        )
+        if not events:
+            break
+        total += dispatch_batch(events, consumers)
+        if len(events) < batch_size:
+            break
+    return total
@@ -0,0 +1,83 @@
+"""
+Celery queue topology for GSTONGO.
+
+Tasks declare their queue next to their definition
+(``@shared_task(queue=queues.REPORTS)``). Each queue is consumed by its own
+worker profile so long-running bulk jobs never hold the slots or prefetch
+buffers that latency-sensitive work (OTP delivery, payment confirmations)
+depends on.
+"""
+from kombu import Queue
+
+REALTIME = 'realtime'
+NOTIFICATIONS_BULK = 'notifications-bulk'
+REPORTS = 'reports'
+MAINTENANCE = 'maintenance'
+
+# Tasks without an explicit queue land here rather than on realtime.
+DEFAULT_QUEUE = MAINTENANCE
+
+TASK_QUEUES = (
+    Queue(REALTIME, routing_key=REALTIME),
+    Queue(NOTIFICATIONS_BULK, routing_key=NOTIFICATIONS_BULK),
+    Queue(REPORTS, routing_key=REPORTS),
+    Queue(MAINTENANCE, routing_key=MAINTENANCE),
+)
+
+# Worker profiles, one per queue.
+# prefetch_multiplier: messages reserved per process; 1 for long tasks so a
+#   busy process never sits on queued work another process could take.
+# soft_time_limit / time_limit: seconds before SoftTimeLimitExceeded is
+#   raised in the task / the process is killed.
+WORKER_PROFILES = {
+    REALTIME: {
+        'queues': [REALTIME],
+        'concurrency': 8,
+        'prefetch_multiplier': 4,
+        'soft_time_limit': 20,
+        'time_limit': 30,
+    },
+    NOTIFICATIONS_BULK: {
+        'queues': [NOTIFICATIONS_BULK],
+        'concurrency': 4,
+        'prefetch_multiplier': 1,
+        'soft_time_limit': 30 * 60,
+        'time_limit': 35 * 60,
+    },
+    REPORTS: {
+        'queues': [REPORTS],
+        'concurrency': 2,
+        'prefetch_multiplier': 1,
+        'soft_time_limit': 55 * 60,
+        'time_limit': 60 * 60,
+    },
+    MAINTENANCE: {
+        'queues': [MAINTENANCE],
+        'concurrency': 2,
+        'prefetch_multiplier': 1,
+        'soft_time_limit': 15 * 60,
+        'time_limit': 20 * 60,
+    },
+}
+
+
+def worker_argv(profile, loglevel='INFO'):
+    """Build ``celery worker`` arguments for a worker profile."""
+    if profile not in WORKER_PROFILES:
+        raise ValueError(f'Unknown worker profile: {profile}')
+    config = WORKER_PROFILES[profile]
+    argv = [
+        'worker',
+        f'--queues={",".join(config["queues"])}',
+        f'--concurrency={config["concurrency"]}',
+        f'--prefetch-multiplier={config["prefetch_multiplier"]}',
+        f'--soft-time-limit={config["soft_time_limit"]}',
+        f'--time-limit={config["time_limit"]}',
+        f'--hostname={profile}@%h',
+        f'--loglevel={loglevel}',
+    ]
+    if config['prefetch_multiplier'] == 1:
+        # Hand tasks only to processes that are free.
+        argv.append('-O')
+        argv.append('fair')
+    return argv
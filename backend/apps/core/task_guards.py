@@ -0,0 +1,169 @@
+"""
+Exactly-once guards for periodic Celery tasks.
+
+``exclusive_task`` gives each task per-period mutual exclusion through a Redis
+lock (django-redis), records every execution in the ``TaskRun`` ledger and
+skips periods that have already completed, so beat and workers can be scaled
+horizontally without double-sending reminders or double-creating invoices.
+
+Usage::
+
+    @shared_task(bind=True)
+    @exclusive_task(period='daily')
+    def payment_reminder(self):
+        ...
+        report_rows(len(invoices))  # from apps.core.metrics
+"""
+import functools
+import logging
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .metrics import begin_task_stats, current_task_stats, end_task_stats
+
+logger = logging.getLogger(__name__)
+
+
+PERIOD_FORMATS = {
+    'hourly': '%Y-%m-%dT%H',
+    'daily': '%Y-%m-%d',
+    'weekly': '%G-W%V',
+    'monthly': '%Y-%m',
+}
+
+def get_period_key(period, args=(), kwargs=None, now=None):
+    """Build the ledger key for the current period, qualified by task args and kwargs."""
+    if period not in PERIOD_FORMATS:
+        raise ValueError(f'Unknown task period: {period}')
+    now = timezone.localtime(now or timezone.now())
+    key = now.strftime(PERIOD_FORMATS[period])
+    parts = [str(arg) for arg in args]
+    parts += [f'{name}={value}' for name, value in sorted((kwargs or {}).items())]
+    if parts:
+        key = f"{key}:{':'.join(parts)}"
+    return key
+
+
+class TaskLock:
+    """
+    Non-blocking distributed lock.
+
+    Uses a Redis lock when the default cache is django-redis, so release is
+    atomic and only by the owner; otherwise falls back to ``cache.add`` which
+    is atomic for any shared cache backend.
+    """
+
+    def __init__(self, name, timeout):
+        self.key = f'task-lock:{name}'
+        self.timeout = timeout
+        self.token = uuid.uuid4().hex
+        self._redis_lock = None
+
+    def acquire(self):
+        if hasattr(cache, 'lock'):
+            self._redis_lock = cache.lock(self.key, timeout=self.timeout)
+            return self._redis_lock.acquire(blocking=False)
+        return cache.add(self.key, self.token, self.timeout)
+
+    def release(self):
+        if self._redis_lock is not None:
+            try:
+                self._redis_lock.release()
+            except Exception as e:
+                # Lock expired and may now belong to another worker.
+                logger.warning(f'Could not release {self.key}: {e}')
+        elif cache.get(self.key) == self.token:
+            cache.delete(self.key)
+
+
+def exclusive_task(period='daily', lock_timeout=None, key_args=True):
+    """
+    Decorator for bound periodic tasks that must run once per period.
+
+    Args:
+        period: 'hourly', 'daily', 'weekly' or 'monthly'
+        lock_timeout: Seconds before the lock expires (default TASK_LOCK_TIMEOUT)
+        key_args: Include the task args and kwargs in the period key, so e.g.
+            ``filing_status_check('GSTR1')`` and ``('GSTR3B')`` are independent
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(task, *args, **kwargs):
+            from .models import TaskRun
+
+            task_name = task.name
+            period_key = get_period_key(period, args, kwargs) if key_args else get_period_key(period)
+            timeout = lock_timeout or getattr(settings, 'TASK_LOCK_TIMEOUT', 3600)
+
+            if TaskRun.objects.filter(
+                task_name=task_name, period_key=period_key, status='succeeded'
+            ).exists():
+                logger.info(f'{task_name} already completed for {period_key}, skipping')
+                return f'Skipped: already completed for {period_key}'
+
+            lock = TaskLock(f'{task_name}:{period_key}', timeout)
+            if not lock.acquire():
+                logger.info(f'{task_name} is already running for {period_key}, skipping')
+                return f'Skipped: already running for {period_key}'
+
+            try:
+                with transaction.atomic():
+                    run, _ = TaskRun.objects.select_for_update().get_or_create(
+                        task_name=task_name,
+                        period_key=period_key
+                    )
+                    if run.status == 'succeeded':
+                        return f'Skipped: already completed for {period_key}'
+
+                    # A 'running' row here is left over from a worker that
+                    # died; holding the lock means it is safe to take over.
+                    run.status = 'running'
+                    run.attempts += 1
+                    run.celery_task_id = task.request.id
+                    run.hostname = task.request.hostname
+                    run.rows_processed = 0
+                    run.error_message = None
+                    run.started_at = timezone.now()
+                    run.finished_at = None
+                    run.save()
+
+                # Rows come from the instrumentation stats of this execution;
+                # collect our own when the task is called outside a worker.
+                own_stats_id = None
+                stats = current_task_stats()
+                if stats is None:
+                    own_stats_id = f'guard-{uuid.uuid4().hex}'
+                    stats = begin_task_stats(own_stats_id)
+                rows_before = stats.rows
+                try:
+                    result = func(task, *args, **kwargs)
+                except Exception as e:
+                    run.status = 'failed'
+                    run.error_message = str(e)
+                    run.rows_processed = stats.rows - rows_before
+                    run.finished_at = timezone.now()
+                    run.save(update_fields=[
+                        'status', 'error_message', 'rows_processed', 'finished_at', 'updated_at'
+                    ])
+                    raise
+                finally:
+                    if own_stats_id:
+                        end_task_stats(own_stats_id)
+
+                run.status = 'succeeded'
+                run.rows_processed = stats.rows - rows_before
+                run.result = None if result is None else str(result)
+                run.finished_at = timezone.now()
+                run.save(update_fields=[
+                    'status', 'rows_processed', 'result', 'finished_at', 'updated_at'
+                ])
+                return result
+            finally:
+                lock.release()
+
+        return wrapper
+    return decorator
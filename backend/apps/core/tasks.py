@@ -6,13 +6,17 @@ from celery import shared_task
 from django.utils import timezone
 from django.db.models import Count, Sum
 from datetime import timedelta
-from django.core.mail import send_mail
 from django.conf import settings
 
+from . import queues
+from .metrics import report_rows
+from .task_guards import exclusive_task
+
 logger = logging.getLogger(__name__)
 
 
-@shared_task(bind=True)
+@shared_task(bind=True, queue=queues.NOTIFICATIONS_BULK)
+@exclusive_task(period='daily')
 def filing_reminder(self, reminder_type=1):
     """
     Send filing reminders to customers.
@@ -20,6 +24,7 @@ def filing_reminder(self, reminder_type=1):
     """
     from apps.users.models import User
     from apps.gst_filing.models import GSTFiling
+    from apps.notifications.digest import coalesce
     from apps.notifications.models import Notification, NotificationTemplate
     
     today = timezone.now().date()
@@ -34,40 +39,48 @@ def filing_reminder(self, reminder_type=1):
     ).select_related('user')
     
     users_with_pending = set(filing.user for filing in pending_filings)
+    notifications = []
+    summaries = []
     
     for user in users_with_pending:
         # Get user's pending filings
         user_filings = pending_filings.filter(user=user)
         filing_types = ', '.join(f.filing_type for f in user_filings)
+        summary = f'Please submit your {filing_types} filings for {today.strftime("%B %Y")}. Due date approaching.'
         
-        # Create notification
-        Notification.objects.create(
+        # In-app/push notification
+        notifications.append(Notification(
             user=user,
             channel='push',
             category='filing_reminder',
             title='GST Filing Reminder',
-            message=f'Please submit your {filing_types} filings for {today.strftime("%B %Y")}. Due date approaching.',
+            message=summary,
             reference_type='filing',
             reference_id=user_filings.first().id
-        )
+        ))
         
-        # Send email notification
-        try:
-            send_mail(
-                'GST Filing Reminder - GSTONGO',
-                f'Dear {user.first_name},\n\nPlease submit your {filing_types} filings for {today.strftime("%B %Y")}.\n\nBest regards,\nGSTONGO Team',
-                settings.DEFAULT_FROM_EMAIL,
-                [user.email],
-                fail_silently=True,
-            )
-        except Exception as e:
-            logger.error(f'Failed to send email to {user.email}: {e}')
+        # Email notification
+        notifications.append(Notification(
+            user=user,
+            channel='email',
+            category='filing_reminder',
+            title='GST Filing Reminder - GSTONGO',
+            message=f'Dear {user.first_name},\n\nPlease submit your {filing_types} filings for {today.strftime("%B %Y")}.\n\nBest regards,\nGSTONGO Team',
+            reference_type='filing',
+            reference_id=user_filings.first().id
+        ))
+        summaries += [summary, summary]
     
+    # Buffered and sent as one digest per user and channel
+    coalesce(notifications, summaries)
+    
+    report_rows(len(users_with_pending))
     logger.info(f'Filing reminders sent to {len(users_with_pending)} users')
     return f'Reminders sent to {len(users_with_pending)} users'
 
 
-@shared_task(bind=True)
+@shared_task(bind=True, queue=queues.NOTIFICATIONS_BULK)
+@exclusive_task(period='monthly')
 def filing_status_check(self, filing_type):
     """
     Check filing status and notify users about status changes.
@@ -97,18 +110,20 @@ def filing_status_check(self, filing_type):
             reference_id=filing.id
         )
     
+    report_rows(filings.count())
     logger.info(f'Filing status check completed for {filings.count()} {filing_type} filings')
     return f'Status check completed for {filings.count()} filings'
 
 
-@shared_task(bind=True)
+@shared_task(bind=True, queue=queues.NOTIFICATIONS_BULK)
+@exclusive_task(period='daily')
 def payment_reminder(self):
     """
     Send payment reminders for pending invoices.
     """
     from apps.invoices.models import Invoice
+    from apps.notifications.digest import coalesce
     from apps.notifications.models import Notification
-    from django.core.mail import send_mail
     
     today = timezone.now().date()
     
@@ -116,6 +131,8 @@ def payment_reminder(self):
     pending_invoices = Invoice.objects.filter(
         status='issued'
     ).select_related('user')
+    notifications = []
+    summaries = []
     
     for invoice in pending_invoices:
         days_until_due = (invoice.due_date - today).days
@@ -128,8 +145,8 @@ def payment_reminder(self):
         else:
             message = f'Payment reminder: Invoice #{invoice.invoice_number} - ₹{invoice.total_amount} due on {invoice.due_date}'
         
-        # Create notification
-        Notification.objects.create(
+        # In-app/push notification
+        notifications.append(Notification(
             user=invoice.user,
             channel='push',
             category='payment_reminder',
@@ -137,25 +154,30 @@ def payment_reminder(self):
             message=message,
             reference_type='invoice',
             reference_id=invoice.id
-        )
+        ))
         
-        # Send email
-        try:
-            send_mail(
-                f'Payment Reminder - Invoice #{invoice.invoice_number}',
-                f'Dear {invoice.user.first_name},\n\n{message}\n\nBest regards,\nGSTONGO Team',
-                settings.DEFAULT_FROM_EMAIL,
-                [invoice.user.email],
-                fail_silently=True,
-            )
-        except Exception as e:
-            logger.error(f'Failed to send payment reminder to {invoice.user.email}: {e}')
+        # Email notification
+        notifications.append(Notification(
+            user=invoice.user,
+            channel='email',
+            category='payment_reminder',
+            title=f'Payment Reminder - Invoice #{invoice.invoice_number}',
+            message=f'Dear {invoice.user.first_name},\n\n{message}\n\nBest regards,\nGSTONGO Team',
+            reference_type='invoice',
+            reference_id=invoice.id
+        ))
+        summaries += [message, message]
+    
+    # Users with several invoices get one digest per channel
+    coalesce(notifications, summaries)
     
+    report_rows(pending_invoices.count())
     logger.info(f'Payment reminders sent for {pending_invoices.count()} invoices')
     return f'Payment reminders sent for {pending_invoices.count()} invoices'
 
 
-@shared_task(bind=True)
+@shared_task(bind=True, queue=queues.MAINTENANCE)
+@exclusive_task(period='daily')
 def generate_proforma_invoices(self):
     """
     Generate proforma invoices for completed filings.
@@ -213,6 +235,8 @@ def generate_proforma_invoices(self):
                 related_filing_id=filing.id
             )
             
+            report_rows(1)
+            
             # Notify user
             Notification.objects.create(
                 user=filing.user,
@@ -228,21 +252,25 @@ def generate_proforma_invoices(self):
     return f'Generated proforma invoices for {declared_filings.count()} filings'
 
 
-@shared_task(bind=True)
+@shared_task(bind=True, queue=queues.MAINTENANCE)
+@exclusive_task(period='daily')
 def update_overdue_invoices(self):
     """
     Mark invoices as overdue if due date has passed.
     """
+    from apps.invoices.ledger import mark_overdue
     from apps.invoices.models import Invoice
+    from apps.invoices.suspension import refresh_suspensions
+    from apps.notifications.digest import coalesce
     from apps.notifications.models import Notification
     
     today = timezone.now().date()
     
-    # Update invoices that are past due date
-    updated_count = Invoice.objects.filter(
-        status='issued',
-        due_date__lt=today
-    ).update(status='overdue')
+    # Update invoices that are past due date, with their users' ledgers
+    updated_count = mark_overdue(today)
+    
+    # Suspend accounts past the grace period, lift settled ones
+    suspended, lifted = refresh_suspensions(today)
     
     # Get overdue invoices for notification
     overdue_invoices = Invoice.objects.filter(
@@ -250,8 +278,10 @@ def update_overdue_invoices(self):
         due_date=today - timedelta(days=1)  # Newly overdue today
     ).select_related('user')
     
+    notifications = []
+    summaries = []
     for invoice in overdue_invoices:
-        Notification.objects.create(
+        notifications.append(Notification(
             user=invoice.user,
             channel='push',
             category='payment_reminder',
@@ -259,84 +289,42 @@ def update_overdue_invoices(self):
             message=f'Your invoice #{invoice.invoice_number} is now overdue. Amount: ₹{invoice.total_amount}. Please pay immediately to avoid service disruption.',
             reference_type='invoice',
             reference_id=invoice.id
-        )
+        ))
+        summaries.append(f'Invoice #{invoice.invoice_number} is now overdue. Amount: ₹{invoice.total_amount}')
+    
+    # Users with several newly overdue invoices get one digest
+    coalesce(notifications, summaries)
     
-    logger.info(f'Marked {updated_count} invoices as overdue')
+    report_rows(updated_count)
+    logger.info(f'Marked {updated_count} invoices as overdue; {suspended} accounts suspended, {lifted} lifted')
     return f'{updated_count} invoices marked as overdue'
 
 
-@shared_task(bind=True)
+@shared_task(bind=True, queue=queues.REPORTS)
+@exclusive_task(period='monthly')
 def generate_monthly_report(self):
     """
     Generate and store monthly statistics.
+    
+    Refreshes the previous (now complete) month as well as the current one,
+    so retries and re-runs update the existing rows instead of failing.
     """
-    from apps.admin_portal.models import AdminDashboardStats
-    from apps.users.models import User
-    from apps.gst_filing.models import GSTFiling
-    from apps.invoices.models import Invoice, PaymentRecord
-    from django.db.models import Sum
+    from apps.admin_portal.services import month_start, store_dashboard_stats
     
     today = timezone.now().date()
-    month_start = today.replace(day=1)
-    
-    # Calculate statistics
-    new_users = User.objects.filter(date_joined__date__gte=month_start).count()
-    total_users = User.objects.filter(is_active=True).count()
-    
-    gstr1_filed = GSTFiling.objects.filter(
-        filing_type='GSTR1',
-        status='filed',
-        filed_at__date__gte=month_start
-    ).count()
-    
-    gstr3b_filed = GSTFiling.objects.filter(
-        filing_type='GSTR3B',
-        status='filed',
-        filed_at__date__gte=month_start
-    ).count()
-    
-    gstr9b_filed = GSTFiling.objects.filter(
-        filing_type='GSTR9B',
-        status='filed',
-        filed_at__date__gte=month_start
-    ).count()
-    
-    nil_filings = GSTFiling.objects.filter(
-        nil_filing=True,
-        declaration_signed_at__date__gte=month_start
-    ).count()
-    
-    payments_collected = PaymentRecord.objects.filter(
-        status='success',
-        created_at__date__gte=month_start
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    pending_invoices = Invoice.objects.filter(status='issued').count()
-    overdue_invoices = Invoice.objects.filter(status='overdue').count()
-    overdue_amount = Invoice.objects.filter(
-        status='overdue'
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
-    
-    # Store statistics
-    stats = AdminDashboardStats.objects.create(
-        date=month_start,
-        new_users=new_users,
-        total_users=total_users,
-        gstr1_filed=gstr1_filed,
-        gstr3b_filed=gstr3b_filed,
-        gstr9b_filed=gstr9b_filed,
-        nil_filings=nil_filings,
-        payments_collected=payments_collected,
-        pending_invoices=pending_invoices,
-        overdue_invoices=overdue_invoices,
-        overdue_amount=overdue_amount
-    )
+    current_month = month_start(today)
+    previous_month = month_start(current_month - timedelta(days=1))
+    
+    results = store_dashboard_stats([previous_month, current_month])
+    stats = results[current_month]
     
-    logger.info(f'Monthly report generated for {month_start}')
-    return f'Monthly report generated: {new_users} new users, ₹{payments_collected} collected'
+    report_rows(len(results))
+    logger.info(f'Monthly report generated for {previous_month} and {current_month}')
+    return f'Monthly report generated: {stats["new_users"]} new users, ₹{stats["payments_collected"]} collected'
 
 
-@shared_task(bind=True)
+@shared_task(bind=True, queue=queues.MAINTENANCE)
+@exclusive_task(period='daily')
 def cleanup_expired_proforma_invoices(self):
     """
     Cancel proforma invoices that have expired.
@@ -351,11 +339,28 @@ def cleanup_expired_proforma_invoices(self):
         valid_until__lt=today
     ).update(status='cancelled')
     
+    report_rows(updated_count)
     logger.info(f'Cancelled {updated_count} expired proforma invoices')
     return f'{updated_count} expired proforma invoices cancelled'
 
 
-@shared_task(bind=True)
+@shared_task(bind=True, queue=queues.MAINTENANCE)
+@exclusive_task(period='daily')
+def reconcile_receivables_ledgers(self):
+    """
+    Verify receivables ledgers against invoices and fix any drift.
+    """
+    from apps.invoices.ledger import reconcile_ledgers
+    
+    checked, corrected = reconcile_ledgers()
+    
+    report_rows(checked)
+    logger.info(f'Receivables ledgers reconciled: {checked} checked, {corrected} corrected')
+    return f'{corrected} of {checked} ledgers corrected'
+
+
+@shared_task(bind=True, queue=queues.NOTIFICATIONS_BULK)
+@exclusive_task(period='daily')
 def send_service_disablement_notifications(self):
     """
     Notify users about service disablement due to pending payments.
@@ -385,6 +390,7 @@ def send_service_disablement_notifications(self):
             ).order_by('-due_date').first()
             
             if invoice:
+                report_rows(1)
                 Notification.objects.create(
                     user_id=user_id,
                     channel='push',
@@ -397,3 +403,26 @@ def send_service_disablement_notifications(self):
     
     logger.info('Service disablement notifications sent')
     return 'Notifications sent for accounts with overdue payments'
+
+
+@shared_task(bind=True, queue=queues.REALTIME)
+def relay_outbox_events(self):
+    """
+    Drain the transactional outbox to notifications, webhooks and analytics.
+    Only one relay runs at a time so events stay ordered per aggregate.
+    """
+    from .outbox import relay_pending_events
+    from .task_guards import TaskLock
+    
+    lock = TaskLock('outbox-relay', timeout=settings.OUTBOX_RELAY_LOCK_TIMEOUT)
+    if not lock.acquire():
+        return 'Skipped: outbox relay already running'
+    
+    try:
+        dispatched = relay_pending_events()
+    finally:
+        lock.release()
+    
+    report_rows(dispatched)
+    logger.info(f'Relayed {dispatched} outbox events')
+    return f'Relayed {dispatched} outbox events'
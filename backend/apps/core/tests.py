@@ -0,0 +1,358 @@
+"""
+Unit tests for Core app.
+"""
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from celery import shared_task
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from apps.core.metrics import (
+    TaskMetricsStore, _distribution, _percentile, metrics_store, render_prometheus, report_rows,
+)
+from apps.core.models import OutboxEvent, TaskRun
+from apps.core.outbox import emit_event, relay_pending_events
+from apps.core.task_guards import TaskLock, exclusive_task, get_period_key
+from apps.users.models import User
+
+# Batches seen by ``recording_consumer`` and aggregates ``failing_consumer`` rejects
+DELIVERED = []
+FAILING = set()
+
+
+def recording_consumer(events):
+    DELIVERED.append([event.id for event in events])
+
+
+def failing_consumer(events):
+    for event in events:
+        if event.aggregate_id in FAILING:
+            raise RuntimeError(f'Consumer rejected {event.aggregate_id}')
+
+
+# Calls that reached the body of ``guarded_task``
+GUARDED_CALLS = []
+
+
+@shared_task(bind=True, name='apps.core.tests.guarded_task')
+@exclusive_task(period='daily')
+def guarded_task(self, form_type=None, fail=False, rows=0):
+    GUARDED_CALLS.append(form_type)
+    report_rows(rows)
+    if fail:
+        raise RuntimeError('Task failed')
+    return f'Processed {form_type}'
+
+
+@override_settings(
+    OUTBOX_CONSUMERS=['apps.core.tests.recording_consumer', 'apps.core.tests.failing_consumer'],
+    OUTBOX_RETRY_BASE_SECONDS=30,
+    OUTBOX_MAX_ATTEMPTS=3,
+)
+class OutboxTests(TestCase):
+    """Test cases for the transactional outbox relay."""
+
+    def setUp(self):
+        DELIVERED.clear()
+        FAILING.clear()
+        self.first = User.objects.create_user(email='first@example.com', password='testpass123')
+        self.second = User.objects.create_user(email='second@example.com', password='testpass123')
+
+    def emit(self, aggregate, event_type='filing.created'):
+        with patch('apps.core.outbox.schedule_relay'):
+            return emit_event(event_type, aggregate, {'n': OutboxEvent.objects.count()}, user=aggregate)
+
+    def make_available(self):
+        OutboxEvent.objects.filter(status='pending').update(available_at=timezone.now())
+
+    def test_events_are_delivered_once_in_order(self):
+        """Test a batch goes to every consumer in id order and is marked dispatched."""
+        events = [self.emit(self.first), self.emit(self.second), self.emit(self.first)]
+
+        self.assertEqual(relay_pending_events(), 3)
+        self.assertEqual(DELIVERED, [[event.id for event in events]])
+        self.assertFalse(OutboxEvent.objects.exclude(status='dispatched').exists())
+
+        self.assertEqual(relay_pending_events(), 0)
+        self.assertEqual(len(DELIVERED), 1)
+
+    def test_failed_aggregate_is_retried_and_holds_back_later_events(self):
+        """Test a failing event is retried and later events of its aggregate wait for it."""
+        first_a = self.emit(self.first)
+        other = self.emit(self.second)
+        second_a = self.emit(self.first)
+        FAILING.add(str(self.first.pk))
+
+        self.assertEqual(relay_pending_events(), 1)
+        first_a.refresh_from_db()
+        second_a.refresh_from_db()
+        self.assertEqual((first_a.status, first_a.attempts), ('pending', 1))
+        self.assertGreater(first_a.available_at, timezone.now())
+        self.assertEqual(second_a.available_at, first_a.available_at)
+        self.assertEqual(OutboxEvent.objects.get(id=other.id).status, 'dispatched')
+
+        # A new event of the blocked aggregate waits behind the pending retry
+        later_a = self.emit(self.first)
+        FAILING.clear()
+        self.assertEqual(relay_pending_events(), 0)
+        later_a.refresh_from_db()
+        self.assertEqual(later_a.available_at, first_a.available_at)
+
+        # Once the retry is due everything is delivered, still in order
+        DELIVERED.clear()
+        self.make_available()
+        self.assertEqual(relay_pending_events(), 3)
+        self.assertEqual(DELIVERED, [[first_a.id, second_a.id, later_a.id]])
+
+    def test_events_are_dead_lettered_after_max_attempts(self):
+        """Test an event failing on every attempt ends up failed."""
+        event = self.emit(self.first)
+        FAILING.add(str(self.first.pk))
+
+        for _ in range(3):
+            self.make_available()
+            relay_pending_events()
+
+        event.refresh_from_db()
+        self.assertEqual((event.status, event.attempts), ('failed', 3))
+        self.assertIn('Consumer rejected', event.last_error)
+
+    @override_settings(OUTBOX_CONSUMERS=[
+        'apps.notifications.consumers.notify_on_events',
+        'apps.analytics.consumers.deliver_webhooks',
+        'apps.core.tests.failing_consumer',
+    ])
+    def test_consumer_tasks_are_queued_only_for_committed_deliveries(self):
+        """Test payment emails and webhooks are not queued for a rolled-back batch."""
+        from apps.analytics.models import Webhook
+
+        webhook = Webhook.objects.create(
+            user=self.first, name='Payments', url='https://example.com/hook',
+            events=['payment.received'], secret='s'
+        )
+        event = self.emit(self.first, 'payment.received')
+        OutboxEvent.objects.filter(id=event.id).update(payload={'transaction_id': 'txn-1'})
+        FAILING.add(str(self.first.pk))
+
+        with patch('apps.payments.tasks.notify_payment_success.delay') as notify, \
+                patch('apps.analytics.tasks.deliver_webhook.delay') as deliver:
+            with self.captureOnCommitCallbacks(execute=True):
+                relay_pending_events()
+            notify.assert_not_called()
+            deliver.assert_not_called()
+
+            FAILING.clear()
+            self.make_available()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(relay_pending_events(), 1)
+            notify.assert_called_once_with('txn-1')
+            deliver.assert_called_once_with(str(webhook.id), event.id)
+
+            # Redelivery of a dispatched event does not happen
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(relay_pending_events(), 0)
+            self.assertEqual(notify.call_count, 1)
+
+    def test_events_roll_back_with_the_state_change(self):
+        """Test an event emitted in a rolled-back transaction is never relayed."""
+        from django.db import transaction
+
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.emit(self.first)
+                raise RuntimeError('Rolled back')
+
+        self.assertEqual(relay_pending_events(), 0)
+        self.assertFalse(OutboxEvent.objects.exists())
+
+
+class TaskGuardTests(TestCase):
+    """Test cases for the exactly-once periodic task guard."""
+
+    def setUp(self):
+        cache.clear()
+        GUARDED_CALLS.clear()
+
+    def run_task(self, *args, **kwargs):
+        return guarded_task.apply(args=args, kwargs=kwargs).get()
+
+    def test_period_key(self):
+        """Test period keys by period, qualified by args and sorted kwargs."""
+        now = timezone.make_aware(datetime(2026, 1, 5, 9, 30))
+        self.assertEqual(get_period_key('hourly', now=now), '2026-01-05T09')
+        self.assertEqual(get_period_key('daily', now=now), '2026-01-05')
+        self.assertEqual(get_period_key('weekly', now=now), '2026-W02')
+        self.assertEqual(get_period_key('monthly', now=now), '2026-01')
+        self.assertEqual(
+            get_period_key('daily', ('GSTR1',), {'year': 2026, 'month': 1}, now=now),
+            '2026-01-05:GSTR1:month=1:year=2026'
+        )
+        with self.assertRaises(ValueError):
+            get_period_key('yearly')
+
+    def test_completed_period_is_skipped(self):
+        """Test a task runs once per period and records the run in the ledger."""
+        self.assertEqual(self.run_task('GSTR1', rows=3), 'Processed GSTR1')
+        self.assertIn('already completed', self.run_task('GSTR1', rows=3))
+        self.assertEqual(GUARDED_CALLS, ['GSTR1'])
+
+        run = TaskRun.objects.get(task_name='apps.core.tests.guarded_task')
+        self.assertEqual(run.period_key, get_period_key('daily', ('GSTR1',), {'rows': 3}))
+        self.assertEqual((run.status, run.attempts, run.rows_processed), ('succeeded', 1, 3))
+        self.assertEqual(run.result, 'Processed GSTR1')
+        self.assertIsNotNone(run.celery_task_id)
+
+        # The next period runs again
+        tomorrow = timezone.now() + timedelta(days=1)
+        with patch('django.utils.timezone.now', return_value=tomorrow):
+            self.assertEqual(self.run_task('GSTR1'), 'Processed GSTR1')
+        self.assertEqual(TaskRun.objects.count(), 2)
+
+    def test_args_and_kwargs_are_separate_periods(self):
+        """Test calls differing only in args or kwargs do not skip each other."""
+        self.run_task('GSTR1')
+        self.run_task('GSTR3B')
+        self.run_task(form_type='GSTR1')
+        self.run_task(form_type='GSTR3B')
+        self.run_task(form_type='GSTR3B')
+
+        self.assertEqual(GUARDED_CALLS, ['GSTR1', 'GSTR3B', 'GSTR1', 'GSTR3B'])
+        self.assertEqual(TaskRun.objects.filter(status='succeeded').count(), 4)
+
+    def test_failed_run_is_retried(self):
+        """Test a failure is recorded and the same period can run again."""
+        with self.assertRaises(RuntimeError):
+            self.run_task('GSTR1', fail=True, rows=2)
+
+        run = TaskRun.objects.get()
+        self.assertEqual((run.status, run.error_message, run.rows_processed), ('failed', 'Task failed', 2))
+
+        # Kwargs qualify the key, so the retry uses the same arguments
+        with self.assertRaises(RuntimeError):
+            self.run_task('GSTR1', fail=True, rows=2)
+        run.refresh_from_db()
+        self.assertEqual((run.status, run.attempts), ('failed', 2))
+
+    def test_running_period_is_skipped(self):
+        """Test a call is skipped while another worker holds the period lock."""
+        key = get_period_key('daily', ('GSTR1',))
+        lock = TaskLock(f'apps.core.tests.guarded_task:{key}', 60)
+        self.assertTrue(lock.acquire())
+
+        self.assertIn('already running', self.run_task('GSTR1'))
+        self.assertEqual(GUARDED_CALLS, [])
+        self.assertFalse(TaskRun.objects.exists())
+
+        lock.release()
+        self.assertEqual(self.run_task('GSTR1'), 'Processed GSTR1')
+
+
+class TaskLockTests(SimpleTestCase):
+    """Test cases for the non-blocking task lock."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_lock_is_exclusive_and_released_by_owner(self):
+        """Test only one holder at a time and only the owner releases."""
+        first = TaskLock('report', 60)
+        second = TaskLock('report', 60)
+
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        second.release()
+        self.assertFalse(TaskLock('report', 60).acquire())
+
+        first.release()
+        self.assertTrue(second.acquire())
+
+
+class TaskMetricsTests(TestCase):
+    """Test cases for task instrumentation, summaries and the Prometheus exporter."""
+
+    def setUp(self):
+        cache.clear()
+        GUARDED_CALLS.clear()
+        self.store = TaskMetricsStore(prefix='test-metrics')
+
+    def sample(self, duration, lag=None, rows=0, queries=2, finished_at=0):
+        return {
+            'task_id': f'task-{finished_at}', 'state': 'SUCCESS', 'duration': duration,
+            'queries': queries, 'query_time': duration / 10, 'rows': rows,
+            'lag': lag, 'retries': 0, 'finished_at': finished_at,
+        }
+
+    def test_percentiles(self):
+        """Test nearest-rank percentiles and distributions of sorted values."""
+        values = [float(n) for n in range(1, 101)]
+        self.assertIsNone(_percentile([], 0.5))
+        self.assertEqual(_percentile([3.0], 0.95), 3.0)
+        self.assertEqual(_percentile(values, 0.5), 51.0)
+        self.assertEqual(_percentile(values, 0.95), 95.0)
+        self.assertEqual(_percentile(values, 1), 100.0)
+
+        self.assertEqual(_distribution(values), {'avg': 50.5, 'p50': 51.0, 'p95': 95.0, 'max': 100.0})
+        self.assertEqual(_distribution([]), {'avg': None, 'p50': None, 'p95': None, 'max': None})
+
+    def test_record_and_summary(self):
+        """Test samples and counters are summarised per task, newest first."""
+        self.store.record('reports', self.sample(1.0, lag=0.5, rows=10, finished_at=1))
+        self.store.record('reports', self.sample(3.0, rows=20, queries=4, finished_at=2))
+        self.store.record('cleanup', self.sample(0.2, finished_at=3))
+        self.store.incr('reports', 'retries')
+        self.store.incr('reports', 'failures', 2)
+
+        summary = self.store.summary('reports')
+        self.assertEqual(summary['counters'], {'runs': 2, 'rows': 30, 'retries': 1, 'failures': 2})
+        self.assertEqual(summary['window'], 2)
+        self.assertEqual(summary['duration'], {'avg': 2.0, 'p50': 1.0, 'p95': 3.0, 'max': 3.0})
+        self.assertEqual(summary['queue_lag']['max'], 0.5)
+        self.assertEqual((summary['avg_queries'], summary['avg_rows']), (3.0, 15.0))
+        self.assertEqual(summary['last_run_at'], 2)
+        self.assertEqual(self.store.task_names(), ['cleanup', 'reports'])
+
+        empty = self.store.summary('unknown')
+        self.assertEqual((empty['window'], empty['avg_queries'], empty['last_state']), (0, 0, None))
+
+    def test_rolling_window_is_capped(self):
+        """Test only the newest SAMPLE_LIMIT samples are kept, while counters keep counting."""
+        with patch('apps.core.metrics.SAMPLE_LIMIT', 2):
+            for n in range(1, 4):
+                self.store.record('reports', self.sample(float(n), finished_at=n))
+
+        self.assertEqual([s['finished_at'] for s in self.store.samples('reports')], [3, 2])
+        self.assertEqual(self.store.counters('reports')['runs'], 3)
+
+    def test_task_execution_is_recorded(self):
+        """Test signal handlers record a sample with queries and reported rows."""
+        guarded_task.apply(kwargs={'form_type': 'GSTR1', 'rows': 4})
+
+        summary = metrics_store.summary('apps.core.tests.guarded_task')
+        self.assertEqual(summary['counters']['runs'], 1)
+        self.assertEqual(summary['counters']['rows'], 4)
+        self.assertEqual(summary['last_state'], 'SUCCESS')
+        self.assertGreater(summary['avg_queries'], 0)
+        self.assertIsNone(summary['queue_lag']['max'])
+
+    def test_render_prometheus(self):
+        """Test summaries render as Prometheus counters, summaries and gauges."""
+        self.store.record('reports', self.sample(1.5, lag=0.25, rows=7))
+        text = render_prometheus(self.store.summaries())
+        lines = text.splitlines()
+
+        self.assertTrue(text.endswith('\n'))
+        self.assertIn('# TYPE gstongo_task_runs_total counter', lines)
+        self.assertIn('gstongo_task_runs_total{task="reports"} 1', lines)
+        self.assertIn('gstongo_task_rows_total{task="reports"} 7', lines)
+        self.assertIn('# TYPE gstongo_task_duration_seconds summary', lines)
+        self.assertIn('gstongo_task_duration_seconds{task="reports",quantile="0.95"} 1.5', lines)
+        self.assertIn('gstongo_task_queue_lag_seconds{task="reports",quantile="1"} 0.25', lines)
+        self.assertIn('gstongo_task_db_queries_avg{task="reports"} 2.0', lines)
+
+        # Distributions without samples are left out rather than rendered empty
+        self.store.record('cleanup', self.sample(0.5))
+        text = render_prometheus(self.store.summaries())
+        self.assertNotIn('gstongo_task_queue_lag_seconds{task="cleanup"', text)
+        self.assertEqual(render_prometheus([]).count('# TYPE'), 8)
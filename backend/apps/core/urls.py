@@ -2,5 +2,9 @@
 URL patterns for Core app.
 """
 from django.urls import path
+from .views import TaskMetricsView, MetricsExporterView
 
-urlpatterns = []
+urlpatterns = [
+    path('task-metrics/', TaskMetricsView.as_view(), name='task-metrics'),
+    path('metrics/', MetricsExporterView.as_view(), name='metrics-exporter'),
+]
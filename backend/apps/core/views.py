@@ -0,0 +1,68 @@
+"""
+Views for Core app.
+"""
+import hmac
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import status, permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .metrics import metrics_store, render_prometheus
+from .models import TaskRun
+
+
+class TaskMetricsView(APIView):
+    """
+    Rolling Celery task metrics for admins.
+    
+    GET /api/v1/core/task-metrics/
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        """Get per-task duration, DB, rows and queue lag summaries."""
+        if not hasattr(request.user, 'admin_profile'):
+            return Response(
+                {'error': 'Admin access required.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        recent_runs = TaskRun.objects.order_by('-started_at')[:20].values(
+            'task_name', 'period_key', 'status', 'attempts', 'rows_processed',
+            'started_at', 'finished_at', 'error_message'
+        )
+        
+        return Response({
+            'tasks': metrics_store.summaries(),
+            'recent_runs': list(recent_runs),
+        })
+
+
+class MetricsExporterView(APIView):
+    """
+    Prometheus exporter for Celery task metrics.
+    
+    GET /api/v1/core/metrics/
+    
+    Scrapers authenticate with the ``X-Metrics-Token`` header matching
+    ``METRICS_EXPORTER_TOKEN``; admins can also read it with their JWT.
+    """
+    permission_classes = [permissions.AllowAny]
+    
+    def get(self, request):
+        """Render task metrics in Prometheus text format."""
+        expected = getattr(settings, 'METRICS_EXPORTER_TOKEN', None)
+        provided = request.META.get('HTTP_X_METRICS_TOKEN', '')
+        token_ok = bool(expected) and hmac.compare_digest(provided, expected)
+        
+        if not token_ok and not hasattr(request.user, 'admin_profile'):
+            return Response(
+                {'error': 'Permission denied.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        return HttpResponse(
+            render_prometheus(metrics_store.summaries()),
+            content_type='text/plain; version=0.0.4'
+        )
@@ -80,10 +80,26 @@ class GSTFiling(models.Model):
     
     def mark_as_filed(self, reference_number):
         """Mark filing as filed."""
+        from django.db import transaction
+        from apps.core.outbox import emit_event
+        
         self.status = 'filed'
         self.filing_reference_number = reference_number
         self.filed_at = timezone.now()
-        self.save()
+        with transaction.atomic():
+            self.save()
+            emit_event('filing.completed', self, self.event_payload(), user=self.user)
+    
+    def event_payload(self):
+        """Payload for outbox events about this filing."""
+        return {
+            'filing_id': str(self.id),
+            'filing_type': self.filing_type,
+            'month': self.month,
+            'year': self.year,
+            'status': self.status,
+            'filing_reference_number': self.filing_reference_number,
+        }
     
     def calculate_totals(self):
         """Calculate and update filing totals from invoices."""
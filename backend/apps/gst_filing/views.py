@@ -13,6 +13,9 @@ from rest_framework.parsers import MultiPartParser, FormParser
 from django.db import transaction
 from django.utils import timezone
 
+from apps.core.outbox import emit_event
+from apps.invoices.permissions import ServiceNotSuspended
+
 from .models import GSTFiling, GSTR1Details, GSTR3BDetails, GSTR9BDetails, Invoice, FilingDocument
 from .serializers import (
     GSTFilingSerializer, GSTFilingCreateSerializer, GSTFilingUpdateSerializer,
@@ -26,7 +29,7 @@ class GSTFilingViewSet(viewsets.ModelViewSet):
     """ViewSet for GST Filing operations."""
     
     serializer_class = GSTFilingSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.IsAuthenticated, ServiceNotSuspended]
     
     def get_queryset(self):
         """Filter filings by user."""
@@ -62,15 +65,19 @@ class GSTFilingViewSet(viewsets.ModelViewSet):
         """Create a new GST filing."""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        filing = serializer.save()
         
-        # Create corresponding details based on filing type
-        if filing.filing_type == 'GSTR1':
-            GSTR1Details.objects.create(filing=filing)
-        elif filing.filing_type == 'GSTR3B':
-            GSTR3BDetails.objects.create(filing=filing)
-        elif filing.filing_type == 'GSTR9B':
-            GSTR9BDetails.objects.create(filing=filing)
+        with transaction.atomic():
+            filing = serializer.save()
+            
+            # Create corresponding details based on filing type
+            if filing.filing_type == 'GSTR1':
+                GSTR1Details.objects.create(filing=filing)
+            elif filing.filing_type == 'GSTR3B':
+                GSTR3BDetails.objects.create(filing=filing)
+            elif filing.filing_type == 'GSTR9B':
+                GSTR9BDetails.objects.create(filing=filing)
+            
+            emit_event('filing.created', filing, filing.event_payload(), user=filing.user)
         
         return Response(
             GSTFilingSerializer(filing).data,
@@ -425,7 +432,7 @@ class InvoiceViewSet(viewsets.ModelViewSet):
     """ViewSet for Invoice operations."""
     
     serializer_class = InvoiceSerializer
-    permission_classes = [permissions.IsAuthenticated]
+    permission_classes = [permissions.IsAuthenticated, ServiceNotSuspended]
     
     def get_queryset(self):
         """Filter invoices by filing and user."""
@@ -524,6 +531,7 @@ class FilingAdminViewSet(viewsets.ModelViewSet):
         serializer = FilingStatusSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
+        previous_status = filing.status
         filing.status = serializer.validated_data['status']
         if serializer.validated_data.get('filing_reference_number'):
             filing.filing_reference_number = serializer.validated_data['filing_reference_number']
@@ -531,7 +539,10 @@ class FilingAdminViewSet(viewsets.ModelViewSet):
         if filing.status == 'filed':
             filing.filed_at = timezone.now()
         
-        filing.save()
+        with transaction.atomic():
+            filing.save()
+            if filing.status == 'filed' and previous_status != 'filed':
+                emit_event('filing.completed', filing, filing.event_payload(), user=filing.user)
         
         return Response(GSTFilingSerializer(filing).data)
     
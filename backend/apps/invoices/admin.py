@@ -1,6 +1,6 @@
 from django.contrib import admin
 from unfold.admin import ModelAdmin
-from .models import RateSlab, ProformaInvoice, Invoice, PaymentRecord
+from .models import RateSlab, ProformaInvoice, Invoice, PaymentRecord, ReceivablesLedger, InvoiceSequence, BillingRun, ServiceSuspension
 
 @admin.register(RateSlab)
 class RateSlabAdmin(ModelAdmin):
@@ -24,3 +24,33 @@ class PaymentRecordAdmin(ModelAdmin):
     list_display = ('id', 'user', 'amount', 'gateway', 'status', 'created_at')
     list_filter = ('gateway', 'status')
     search_fields = ('user__email', 'gateway_payment_id')
+
+@admin.register(ReceivablesLedger)
+class ReceivablesLedgerAdmin(ModelAdmin):
+    list_display = ('user', 'invoiced_amount', 'paid_amount', 'outstanding_amount', 'overdue_amount', 'updated_at')
+    search_fields = ('user__email',)
+    readonly_fields = ('invoiced_amount', 'paid_amount', 'outstanding_amount', 'overdue_amount', 'outstanding_count', 'overdue_count', 'updated_at')
+
+@admin.register(InvoiceSequence)
+class InvoiceSequenceAdmin(ModelAdmin):
+    list_display = ('series', 'next_value', 'updated_at')
+    readonly_fields = ('series', 'next_value', 'updated_at')
+
+@admin.register(BillingRun)
+class BillingRunAdmin(ModelAdmin):
+    list_display = ('started_at', 'started_by', 'status', 'converted_count', 'expired_count', 'total_amount')
+    list_filter = ('status',)
+    readonly_fields = ('first_invoice_number', 'last_invoice_number', 'error_message')
+
+@admin.register(ServiceSuspension)
+class ServiceSuspensionAdmin(ModelAdmin):
+    list_display = ('user', 'overdue_since', 'suspended_at')
+    search_fields = ('user__email',)
+    readonly_fields = ('user', 'overdue_since', 'suspended_at')
+
+    # Derived from invoices and mirrored in the cache; see apps.invoices.suspension
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
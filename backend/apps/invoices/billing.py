@@ -0,0 +1,155 @@
+"""
+Billing runs for GSTONGO.
+
+``run_billing`` converts every pending, unexpired proforma without a final
+invoice into an invoice, one batch per transaction. For each batch:
+
+- the proformas are locked (skipping any being converted elsewhere);
+- their invoice numbers are reserved with one allocation (see ``numbering``);
+- the invoices are inserted with ``bulk_create``;
+- the proformas are marked with a single ``UPDATE``;
+- the receivables ledgers get one change per user, and the daily
+  collections rollup one per issue day.
+
+The run is recorded as a ``BillingRun`` and announced with a single
+``billing.completed`` outbox event carrying its summary, rather than one
+event per invoice.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from apps.core.outbox import emit_event
+
+from .ledger import apply_delta, contribution
+from .numbering import assign_numbers
+
+logger = logging.getLogger(__name__)
+
+# Days from issue to the invoice due date
+INVOICE_DUE_DAYS = 30
+
+
+def invoice_due_date(today=None):
+    return (today or timezone.localdate()) + timedelta(days=INVOICE_DUE_DAYS)
+
+
+def build_invoice(proforma, due_date):
+    """Unsaved final invoice for ``proforma``."""
+    from .models import Invoice
+
+    return Invoice(
+        proforma=proforma,
+        user_id=proforma.user_id,
+        amount=proforma.amount,
+        tax_amount=proforma.total_amount - proforma.amount,
+        total_amount=proforma.total_amount,
+        service_type=proforma.service_type,
+        description=proforma.description,
+        due_date=due_date
+    )
+
+
+def eligible_proformas(now=None):
+    """Pending proformas that have not expired or been invoiced."""
+    from .models import ProformaInvoice
+
+    return ProformaInvoice.objects.filter(
+        status='pending',
+        valid_until__gt=now or timezone.now(),
+        final_invoice__isnull=True
+    )
+
+
+def convert_batch(proformas, due_date, now=None):
+    """
+    Invoice a batch of locked proformas; call inside a transaction.
+
+    Returns:
+        list: the created invoices, numbered in proforma order
+    """
+    from apps.payments.rollup import record_invoices
+    from .models import Invoice, ProformaInvoice
+
+    invoices = assign_numbers([build_invoice(proforma, due_date) for proforma in proformas], 'invoice')
+    Invoice.objects.bulk_create(invoices)
+    ProformaInvoice.objects.filter(pk__in=[proforma.pk for proforma in proformas]).update(
+        status='paid',
+        updated_at=now or timezone.now()
+    )
+
+    # bulk_create skips Invoice.save, so the ledger and rollup changes are
+    # applied here
+    per_user = defaultdict(dict)
+    for invoice in invoices:
+        totals = per_user[invoice.user_id]
+        for field, value in contribution(invoice.status, invoice.total_amount).items():
+            if value:
+                totals[field] = totals.get(field, 0) + value
+    for user_id, delta in per_user.items():
+        apply_delta(user_id, delta)
+    record_invoices(invoices)
+    return invoices
+
+
+def run_billing(started_by=None, batch_size=None):
+    """
+    Convert every eligible proforma into an invoice.
+
+    Args:
+        started_by: user who started the run, if any
+        batch_size: proformas converted per transaction
+
+    Returns:
+        BillingRun: the finished run
+    """
+    from .models import BillingRun, ProformaInvoice
+
+    batch_size = batch_size or getattr(settings, 'BILLING_RUN_BATCH_SIZE', 1000)
+    run = BillingRun.objects.create(started_by=started_by)
+    now = timezone.now()
+    due_date = invoice_due_date()
+
+    try:
+        while True:
+            with transaction.atomic():
+                proformas = list(
+                    eligible_proformas(now).select_for_update(
+                        skip_locked=True, of=('self',)
+                    ).order_by('pk')[:batch_size]
+                )
+                if not proformas:
+                    break
+                invoices = convert_batch(proformas, due_date, now)
+
+            run.converted_count += len(invoices)
+            run.total_amount += sum(invoice.total_amount for invoice in invoices)
+            run.first_invoice_number = run.first_invoice_number or invoices[0].invoice_number
+            run.last_invoice_number = invoices[-1].invoice_number
+            run.save(update_fields=[
+                'converted_count', 'total_amount', 'first_invoice_number', 'last_invoice_number'
+            ])
+    except Exception as e:
+        run.status = 'failed'
+        run.error_message = str(e)
+        run.completed_at = timezone.now()
+        run.save()
+        logger.error(f'Billing run {run.id} failed after {run.converted_count} invoices: {e}')
+        raise
+
+    with transaction.atomic():
+        run.expired_count = ProformaInvoice.objects.filter(status='pending', valid_until__lte=now).count()
+        run.status = 'completed'
+        run.completed_at = timezone.now()
+        run.save()
+        emit_event('billing.completed', run, run.summary(), user=started_by)
+
+    logger.info(
+        f'Billing run {run.id}: {run.converted_count} invoices for ₹{run.total_amount} '
+        f'({run.first_invoice_number} - {run.last_invoice_number}), {run.expired_count} expired proformas skipped'
+    )
+    return run
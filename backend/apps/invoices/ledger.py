@@ -0,0 +1,243 @@
+"""
+Per-user receivables ledger for GSTONGO.
+
+``ReceivablesLedger`` keeps one row per user with the running totals of their
+invoices: invoiced, paid, outstanding (issued or overdue) and overdue, plus
+the number of open and overdue invoices. Every invoice status or amount
+change - issue, payment capture, ``mark_as_paid`` - applies its difference
+in the saving transaction, and ``mark_overdue`` does the same for the
+nightly overdue sweep, so balances are single-row reads. A user without a
+row is totalled from their invoices on first use, and
+``reconcile_ledgers`` verifies every row against the invoices table.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+OPEN_STATUSES = ('issued', 'overdue')
+BILLED_STATUSES = ('issued', 'overdue', 'paid')
+
+LEDGER_FIELDS = (
+    'invoiced_amount', 'paid_amount', 'outstanding_amount', 'overdue_amount',
+    'outstanding_count', 'overdue_count',
+)
+
+# Aggregates over the invoices table matching each ledger field
+SOURCE_AGGREGATES = {
+    'invoiced_amount': Sum('total_amount', filter=Q(status__in=BILLED_STATUSES)),
+    'paid_amount': Sum('total_amount', filter=Q(status='paid')),
+    'outstanding_amount': Sum('total_amount', filter=Q(status__in=OPEN_STATUSES)),
+    'overdue_amount': Sum('total_amount', filter=Q(status='overdue')),
+    'outstanding_count': Count('id', filter=Q(status__in=OPEN_STATUSES)),
+    'overdue_count': Count('id', filter=Q(status='overdue')),
+}
+
+
+def empty_totals():
+    return dict.fromkeys(LEDGER_FIELDS, 0)
+
+
+def contribution(status, amount):
+    """Ledger totals a single invoice in ``status`` adds up to."""
+    totals = empty_totals()
+    if status in BILLED_STATUSES:
+        totals['invoiced_amount'] = amount
+    if status == 'paid':
+        totals['paid_amount'] = amount
+    if status in OPEN_STATUSES:
+        totals['outstanding_amount'] = amount
+        totals['outstanding_count'] = 1
+    if status == 'overdue':
+        totals['overdue_amount'] = amount
+        totals['overdue_count'] = 1
+    return totals
+
+
+def transition_delta(previous, current):
+    """
+    Ledger change for an invoice moving between two states.
+
+    Args:
+        previous: (status, total_amount) before, or None for a new invoice
+        current: (status, total_amount) after, or None for a deleted invoice
+    """
+    before = contribution(*previous) if previous else empty_totals()
+    after = contribution(*current) if current else empty_totals()
+    return {field: after[field] - before[field] for field in LEDGER_FIELDS if after[field] != before[field]}
+
+
+def source_totals(user_ids):
+    """Ledger totals computed from the invoices table, keyed by user id."""
+    from .models import Invoice
+
+    rows = Invoice.objects.filter(user_id__in=user_ids).values('user_id').annotate(**SOURCE_AGGREGATES)
+    return {
+        row['user_id']: {field: row[field] or 0 for field in LEDGER_FIELDS}
+        for row in rows
+    }
+
+
+def apply_delta(user_id, delta):
+    """Add ``delta`` to a user's ledger; a missing row is created from source."""
+    from .models import ReceivablesLedger
+
+    if not delta:
+        return
+    changes = {field: F(field) + value for field, value in delta.items()}
+    if ReceivablesLedger.objects.filter(user_id=user_id).update(updated_at=timezone.now(), **changes):
+        return
+
+    # The invoice rows already include this change
+    _, created = ReceivablesLedger.objects.get_or_create(
+        user_id=user_id,
+        defaults=source_totals([user_id]).get(user_id, empty_totals())
+    )
+    if not created:
+        ReceivablesLedger.objects.filter(user_id=user_id).update(updated_at=timezone.now(), **changes)
+
+
+def record_transition(user_id, previous, current):
+    """Apply one invoice's state change to its user's ledger."""
+    apply_delta(user_id, transition_delta(previous, current))
+
+
+def get_ledger(user_id):
+    """A user's ledger, totalled from their invoices on first use."""
+    from .models import ReceivablesLedger
+
+    ledger = ReceivablesLedger.objects.filter(user_id=user_id).first()
+    if ledger is None:
+        ledger, _ = ReceivablesLedger.objects.get_or_create(
+            user_id=user_id,
+            defaults=source_totals([user_id]).get(user_id, empty_totals())
+        )
+    return ledger
+
+
+def ledger_totals():
+    """Totals across every user's ledger, for admin dashboards."""
+    from .models import ReceivablesLedger
+
+    totals = ReceivablesLedger.objects.aggregate(**{field: Sum(field) for field in LEDGER_FIELDS})
+    return {field: totals[field] or 0 for field in LEDGER_FIELDS}
+
+
+def mark_overdue(today=None, batch_size=1000):
+    """
+    Move issued invoices past their due date to overdue.
+
+    Invoices are locked and updated a batch at a time; each batch applies
+    one ledger change per affected user, and one daily collections change
+    per issue day, in the same transaction.
+
+    Returns:
+        int: invoices marked overdue
+    """
+    from apps.payments.rollup import INVOICE, add_change, apply_changes
+    from .models import Invoice
+
+    today = today or timezone.now().date()
+    marked = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                Invoice.objects.select_for_update().filter(
+                    status='issued',
+                    due_date__lt=today
+                ).order_by('pk').values_list('pk', 'user_id', 'total_amount', 'created_at')[:batch_size]
+            )
+            if not rows:
+                break
+
+            Invoice.objects.filter(pk__in=[pk for pk, _, _, _ in rows]).update(
+                status='overdue',
+                updated_at=timezone.now()
+            )
+
+            per_user = defaultdict(lambda: [Decimal('0'), 0])
+            per_day = {}
+            for _, user_id, amount, created_at in rows:
+                per_user[user_id][0] += amount
+                per_user[user_id][1] += 1
+                day = timezone.localdate(created_at)
+                add_change(per_day, (day, INVOICE, '', 'issued'), -1, -amount)
+                add_change(per_day, (day, INVOICE, '', 'overdue'), 1, amount)
+            for user_id, (amount, count) in per_user.items():
+                apply_delta(user_id, {'overdue_amount': amount, 'overdue_count': count})
+            apply_changes(per_day)
+
+        marked += len(rows)
+    return marked
+
+
+def reconcile_ledgers(batch_size=1000):
+    """
+    Verify ledgers against the invoices table and repair any drift.
+
+    Covers every user with invoices or a ledger, in user-id order with one
+    grouped aggregate per batch. Missing ledgers are created, and count as
+    corrected when the user has open or billed invoices.
+
+    Each batch runs in one transaction that creates the missing rows and
+    locks the batch's ledgers before totalling their invoices. An invoice
+    save in flight holds its user's ledger row until it commits, so the
+    totals include it; one that starts later waits for the batch and
+    applies its change on top of the repaired row.
+
+    Returns:
+        tuple: (checked, corrected) counts
+    """
+    from .models import Invoice, ReceivablesLedger
+
+    user_ids = sorted(
+        set(Invoice.objects.values_list('user_id', flat=True).distinct())
+        | set(ReceivablesLedger.objects.values_list('user_id', flat=True))
+    )
+
+    checked = corrected = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        with transaction.atomic():
+            existing = set(ReceivablesLedger.objects.filter(user_id__in=batch).values_list('user_id', flat=True))
+            missing = set(batch) - existing
+            if missing:
+                ReceivablesLedger.objects.bulk_create(
+                    [ReceivablesLedger(user_id=user_id) for user_id in sorted(missing)],
+                    ignore_conflicts=True
+                )
+            ledgers = {
+                ledger.user_id: ledger
+                for ledger in ReceivablesLedger.objects.select_for_update().filter(
+                    user_id__in=batch
+                ).order_by('user_id')
+            }
+            actual = source_totals(batch)
+
+            now = timezone.now()
+            stale = []
+            drifted = 0
+            for user_id in batch:
+                totals = actual.get(user_id, empty_totals())
+                ledger = ledgers[user_id]
+                if any(getattr(ledger, field) != totals[field] for field in LEDGER_FIELDS):
+                    for field in LEDGER_FIELDS:
+                        setattr(ledger, field, totals[field])
+                    ledger.updated_at = now
+                    stale.append(ledger)
+                    drifted += 1
+
+            if stale:
+                ReceivablesLedger.objects.bulk_update(stale, [*LEDGER_FIELDS, 'updated_at'])
+
+        checked += len(batch)
+        corrected += drifted
+
+    if corrected:
+        logger.warning(f'Corrected {corrected} of {checked} receivables ledgers')
+    return checked, corrected
@@ -0,0 +1,52 @@
+"""
+Management command to render a month's invoice PDFs.
+"""
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Render PDFs of the invoices (or proformas) created in a month (YYYY-MM) across all cores'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--month',
+            required=True,
+            help='Month to render, e.g. 2024-04'
+        )
+        parser.add_argument(
+            '--proformas',
+            action='store_true',
+            help='Render proforma invoices instead of tax invoices'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Render processes (default: INVOICE_PDF_WORKERS, else one per core)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Render documents whose PDF is current too'
+        )
+
+    def handle(self, *args, **options):
+        from apps.invoices.pdf import render_month
+
+        try:
+            month = datetime.strptime(options['month'], '%Y-%m').date()
+        except ValueError:
+            raise CommandError(f'Invalid month "{options["month"]}", expected YYYY-MM.')
+
+        checked, rendered = render_month(
+            month.year,
+            month.month,
+            kind='proforma' if options['proformas'] else 'invoice',
+            workers=options['workers'],
+            force=options['force']
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {rendered} PDF(s); {checked - rendered} of {checked} were current.'
+        ))
@@ -0,0 +1,27 @@
+"""
+Management command to run month-end billing.
+"""
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Convert all pending, unexpired proforma invoices into invoices'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Proformas converted per transaction (default: BILLING_RUN_BATCH_SIZE)'
+        )
+
+    def handle(self, *args, **options):
+        from apps.invoices.billing import run_billing
+
+        run = run_billing(batch_size=options['batch_size'])
+
+        if run.converted_count:
+            self.stdout.write(f'  Invoices {run.first_invoice_number} to {run.last_invoice_number}')
+        self.stdout.write(f'  Skipped {run.expired_count} expired proforma(s)')
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {run.converted_count} invoice(s) totalling ₹{run.total_amount}.'
+        ))
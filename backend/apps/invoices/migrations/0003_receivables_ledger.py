@@ -0,0 +1,58 @@
+# Generated by Django 4.2.27 on 2026-10-19 03:03
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Q, Sum
+
+
+def backfill_ledgers(apps, schema_editor):
+    Invoice = apps.get_model('invoices', 'Invoice')
+    ReceivablesLedger = apps.get_model('invoices', 'ReceivablesLedger')
+
+    open_statuses = ('issued', 'overdue')
+    rows = Invoice.objects.values('user_id').annotate(
+        invoiced_amount=Sum('total_amount', filter=Q(status__in=('issued', 'overdue', 'paid'))),
+        paid_amount=Sum('total_amount', filter=Q(status='paid')),
+        outstanding_amount=Sum('total_amount', filter=Q(status__in=open_statuses)),
+        overdue_amount=Sum('total_amount', filter=Q(status='overdue')),
+        outstanding_count=Count('id', filter=Q(status__in=open_statuses)),
+        overdue_count=Count('id', filter=Q(status='overdue')),
+    )
+    ReceivablesLedger.objects.bulk_create(
+        [
+            ReceivablesLedger(**{field: value or 0 for field, value in row.items()})
+            for row in rows.iterator()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_userprofile_reset_token_and_more'),
+        ('invoices', '0002_add_user_and_proforma'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceivablesLedger',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='receivables_ledger', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('invoiced_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('paid_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('outstanding_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('overdue_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('outstanding_count', models.PositiveIntegerField(default=0)),
+                ('overdue_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Receivables Ledger',
+                'verbose_name_plural': 'Receivables Ledgers',
+                'db_table': 'receivables_ledgers',
+            },
+        ),
+        migrations.RunPython(backfill_ledgers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.27 on 2026-10-19 03:05
+
+from django.db import migrations
+
+# Read-only view with the old payment_records columns over the unified ledger
+CREATE_VIEW = """
+CREATE VIEW payment_records AS
+SELECT id, user_id, invoice_id, proforma_id, amount, currency, gateway,
+       COALESCE(gateway_order_id, gateway_payment_id) AS gateway_payment_id,
+       status, payment_method, error_message, webhook_data, created_at, updated_at
+FROM payment_transactions
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_payment_ledger'),
+        ('invoices', '0003_receivables_ledger'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='PaymentRecord',
+        ),
+        migrations.CreateModel(
+            name='PaymentRecord',
+            fields=[
+            ],
+            options={
+                'verbose_name': 'Payment Record',
+                'verbose_name_plural': 'Payment Records',
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('payments.paymenttransaction',),
+        ),
+        migrations.RunSQL(CREATE_VIEW, 'DROP VIEW payment_records'),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.27 on 2026-10-19 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0004_payment_record_proxy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InvoiceSequence',
+            fields=[
+                ('series', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('next_value', models.PositiveBigIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Invoice Sequence',
+                'verbose_name_plural': 'Invoice Sequences',
+                'db_table': 'invoice_sequences',
+            },
+        ),
+    ]
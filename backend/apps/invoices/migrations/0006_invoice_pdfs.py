@@ -0,0 +1,28 @@
+# Generated by Django 4.2.27 on 2026-10-19 03:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0005_invoice_sequences'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='pdf_source_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='proformainvoice',
+            name='pdf_file',
+            field=models.FileField(blank=True, null=True, upload_to='invoices/'),
+        ),
+        migrations.AddField(
+            model_name='proformainvoice',
+            name='pdf_source_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
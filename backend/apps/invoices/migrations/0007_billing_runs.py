@@ -0,0 +1,39 @@
+# Generated by Django 4.2.27 on 2026-10-19 03:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('invoices', '0006_invoice_pdfs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingRun',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('converted_count', models.PositiveIntegerField(default=0)),
+                ('expired_count', models.PositiveIntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('first_invoice_number', models.CharField(blank=True, max_length=50, null=True)),
+                ('last_invoice_number', models.CharField(blank=True, max_length=50, null=True)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('started_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='billing_runs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Billing Run',
+                'verbose_name_plural': 'Billing Runs',
+                'db_table': 'billing_runs',
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.27 on 2026-10-19 03:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_userprofile_reset_token_and_more'),
+        ('invoices', '0007_billing_runs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceSuspension',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='service_suspension', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('overdue_since', models.DateField()),
+                ('suspended_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Service Suspension',
+                'verbose_name_plural': 'Service Suspensions',
+                'db_table': 'service_suspensions',
+            },
+        ),
+    ]
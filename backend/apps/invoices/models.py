@@ -2,11 +2,13 @@
 Invoice models for payment processing.
 """
 import uuid
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 
+from apps.payments.models import PaymentTransaction
+
 
 class RateSlab(models.Model):
     """Rate slab configuration for pricing."""
@@ -35,7 +37,34 @@ class RateSlab(models.Model):
         return f"{self.name} - ₹{self.price} ({self.min_invoices}-{self.max_invoices} invoices)"
 
 
-class ProformaInvoice(models.Model):
+class FriendlyFilenameMixin:
+    """Mixin to generate friendly filenames for files."""
+    
+    def get_friendly_filename(self, prefix=''):
+        """Generate a friendly filename for the model instance."""
+        if hasattr(self, 'invoice_number'):
+            invoice_num = self.invoice_number
+        elif hasattr(self, 'number'):
+            invoice_num = self.number
+        else:
+            invoice_num = str(self.pk)
+        
+        if hasattr(self, 'user') and hasattr(self.user, 'email'):
+            email_parts = self.user.email.split('@')
+            email_prefix = email_parts[0] if email_parts else 'user'
+        else:
+            email_prefix = 'file'
+        
+        # Sanitize email prefix for filename
+        email_prefix = ''.join(c for c in email_prefix if c.isalnum() or c in '-_')
+        
+        # Series numbers contain slashes
+        invoice_num = str(invoice_num).replace('/', '-')
+        
+        return f"{prefix}{invoice_num}_{email_prefix}"
+
+
+class ProformaInvoice(FriendlyFilenameMixin, models.Model):
     """Proforma invoice model."""
     
     INVOICE_STATUS = [
@@ -71,6 +100,10 @@ class ProformaInvoice(models.Model):
     # Generated from filing
     related_filing_id = models.UUIDField(null=True, blank=True)
     
+    # PDF file, content-addressed (see ``pdf``)
+    pdf_file = models.FileField(upload_to='invoices/', null=True, blank=True)
+    pdf_source_hash = models.CharField(max_length=64, null=True, blank=True)
+    
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -84,16 +117,19 @@ class ProformaInvoice(models.Model):
         return f"Proforma {self.invoice_number} - {self.user.email} - ₹{self.total_amount}"
     
     def save(self, *args, **kwargs):
-        if not self.invoice_number:
-            self.invoice_number = self.generate_invoice_number()
         self.tax_amount = self.total_amount - self.amount
-        super().save(*args, **kwargs)
+        
+        # The number is reserved in the saving transaction, so a failed
+        # save hands it back and the series stays gap-free
+        with transaction.atomic():
+            if not self.invoice_number:
+                self.invoice_number = self.generate_invoice_number()
+            super().save(*args, **kwargs)
     
     def generate_invoice_number(self):
-        """Generate unique invoice number."""
-        from django.utils import timezone
-        date_str = timezone.now().strftime('%Y%m%d')
-        return f"PI-{date_str}-{uuid.uuid4().hex[:6].upper()}"
+        """Next number in the proforma series (see ``numbering``)."""
+        from .numbering import allocate
+        return allocate('proforma')[0]
     
     def is_expired(self):
         """Check if proforma is expired."""
@@ -101,30 +137,6 @@ class ProformaInvoice(models.Model):
         return timezone.now() > self.valid_until
 
 
-class FriendlyFilenameMixin:
-    """Mixin to generate friendly filenames for files."""
-    
-    def get_friendly_filename(self, prefix=''):
-        """Generate a friendly filename for the model instance."""
-        if hasattr(self, 'invoice_number'):
-            invoice_num = self.invoice_number
-        elif hasattr(self, 'number'):
-            invoice_num = self.number
-        else:
-            invoice_num = str(self.pk)
-        
-        if hasattr(self, 'user') and hasattr(self.user, 'email'):
-            email_parts = self.user.email.split('@')
-            email_prefix = email_parts[0] if email_parts else 'user'
-        else:
-            email_prefix = 'file'
-        
-        # Sanitize email prefix for filename
-        email_prefix = ''.join(c for c in email_prefix if c.isalnum() or c in '-_')
-        
-        return f"{prefix}{invoice_num}_{email_prefix}"
-
-
 class Invoice(FriendlyFilenameMixin, models.Model):
     """Final invoice model (generated from proforma)."""
     
@@ -173,8 +185,9 @@ class Invoice(FriendlyFilenameMixin, models.Model):
     payment_reference = models.CharField(max_length=100, null=True, blank=True)
     paid_at = models.DateTimeField(null=True, blank=True)
     
-    # PDF file
+    # PDF file, content-addressed (see ``pdf``)
     pdf_file = models.FileField(upload_to='invoices/', null=True, blank=True)
+    pdf_source_hash = models.CharField(max_length=64, null=True, blank=True)
     
     # Due date
     due_date = models.DateField()
@@ -192,16 +205,45 @@ class Invoice(FriendlyFilenameMixin, models.Model):
         return f"Invoice {self.invoice_number} - {self.user.email} - ₹{self.total_amount}"
     
     def save(self, *args, **kwargs):
-        if not self.invoice_number:
-            self.invoice_number = self.generate_invoice_number()
+        from apps.payments.rollup import record_invoice
+        from .ledger import OPEN_STATUSES, record_transition
+        from .suspension import lift_if_settled
+        
         self.tax_amount = self.total_amount - self.amount
-        super().save(*args, **kwargs)
+        
+        # The ledger moves with the invoice; the stored state is read under a
+        # row lock so concurrent payment captures cannot both count as paid.
+        # The number is reserved in the same transaction (see ``numbering``).
+        with transaction.atomic():
+            if not self.invoice_number:
+                self.invoice_number = self.generate_invoice_number()
+            previous = None
+            if not self._state.adding:
+                previous = Invoice.objects.select_for_update().filter(
+                    pk=self.pk
+                ).values_list('status', 'total_amount').first()
+            super().save(*args, **kwargs)
+            record_transition(self.user_id, previous, (self.status, self.total_amount))
+            record_invoice(self.created_at, previous, (self.status, self.total_amount))
+            
+            # Paid or cancelled: the user's suspension may no longer apply
+            if previous and previous[0] in OPEN_STATUSES and self.status not in OPEN_STATUSES:
+                lift_if_settled(self.user_id)
+    
+    def delete(self, *args, **kwargs):
+        from apps.payments.rollup import record_invoice
+        from .ledger import record_transition
+        
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            record_transition(self.user_id, (self.status, self.total_amount), None)
+            record_invoice(self.created_at, (self.status, self.total_amount), None)
+        return result
     
     def generate_invoice_number(self):
-        """Generate unique invoice number."""
-        from django.utils import timezone
-        date_str = timezone.now().strftime('%Y%m%d')
-        return f"INV-{date_str}-{uuid.uuid4().hex[:6].upper()}"
+        """Next number in the tax invoice series (see ``numbering``)."""
+        from .numbering import allocate
+        return allocate('invoice')[0]
     
     def mark_as_paid(self, method, reference):
         """Mark invoice as paid."""
@@ -218,64 +260,139 @@ class Invoice(FriendlyFilenameMixin, models.Model):
             self.proforma.save()
 
 
-class PaymentRecord(models.Model):
-    """Record of all payments."""
+class ReceivablesLedger(models.Model):
+    """Running receivables totals for one user (see ``ledger``)."""
     
-    PAYMENT_STATUS = [
-        ('pending', 'Pending'),
-        ('success', 'Success'),
-        ('failed', 'Failed'),
-        ('refunded', 'Refunded'),
-    ]
-    
-    PAYMENT_GATEWAYS = [
-        ('razorpay', 'Razorpay'),
-        ('cashfree', 'Cashfree'),
-        ('stripe', 'Stripe'),
-        ('manual', 'Manual'),
-    ]
-    
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(
+    user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='payment_records'
+        primary_key=True,
+        related_name='receivables_ledger'
     )
-    invoice = models.ForeignKey(
-        Invoice,
+    
+    # Amounts
+    invoiced_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    outstanding_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    overdue_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    # Open invoices (issued or overdue)
+    outstanding_count = models.PositiveIntegerField(default=0)
+    overdue_count = models.PositiveIntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'receivables_ledgers'
+        verbose_name = 'Receivables Ledger'
+        verbose_name_plural = 'Receivables Ledgers'
+    
+    def __str__(self):
+        return f"Ledger {self.user_id} - outstanding ₹{self.outstanding_amount}"
+
+
+class ServiceSuspension(models.Model):
+    """A user suspended for invoices long past due (see ``suspension``)."""
+    
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='payments',
-        null=True,
-        blank=True
+        primary_key=True,
+        related_name='service_suspension'
     )
-    proforma = models.ForeignKey(
-        ProformaInvoice,
-        on_delete=models.CASCADE,
-        related_name='payments',
+    # Due date of the user's oldest open invoice when suspended
+    overdue_since = models.DateField()
+    suspended_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'service_suspensions'
+        verbose_name = 'Service Suspension'
+        verbose_name_plural = 'Service Suspensions'
+    
+    def __str__(self):
+        return f"Suspension {self.user_id} - overdue since {self.overdue_since}"
+
+
+class InvoiceSequence(models.Model):
+    """Next serial of one invoice number series (see ``numbering``)."""
+    
+    # Prefix and financial year, e.g. INV/25-26
+    series = models.CharField(max_length=20, primary_key=True)
+    next_value = models.PositiveBigIntegerField(default=1)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'invoice_sequences'
+        verbose_name = 'Invoice Sequence'
+        verbose_name_plural = 'Invoice Sequences'
+    
+    def __str__(self):
+        return f"{self.series} - next {self.next_value}"
+
+
+class BillingRun(models.Model):
+    """A bulk proforma-to-invoice conversion (see ``billing``)."""
+    
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    started_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
         null=True,
-        blank=True
+        blank=True,
+        related_name='billing_runs'
     )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    
+    # Summary
+    converted_count = models.PositiveIntegerField(default=0)
+    expired_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    first_invoice_number = models.CharField(max_length=50, null=True, blank=True)
+    last_invoice_number = models.CharField(max_length=50, null=True, blank=True)
+    error_message = models.TextField(null=True, blank=True)
     
-    # Payment details
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
-    currency = models.CharField(max_length=3, default='INR')
-    gateway = models.CharField(max_length=20, choices=PAYMENT_GATEWAYS)
-    gateway_payment_id = models.CharField(max_length=100, null=True, blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
     
-    # Status
-    status = models.CharField(max_length=20, choices=PAYMENT_STATUS, default='pending')
+    class Meta:
+        db_table = 'billing_runs'
+        verbose_name = 'Billing Run'
+        verbose_name_plural = 'Billing Runs'
+        ordering = ['-started_at']
     
-    # Metadata
-    payment_method = models.CharField(max_length=50, null=True, blank=True)
-    error_message = models.TextField(null=True, blank=True)
-    webhook_data = models.JSONField(null=True, blank=True)
+    def __str__(self):
+        return f"Billing run {self.started_at:%Y-%m-%d} - {self.converted_count} invoices ({self.status})"
+    
+    def summary(self):
+        """Aggregated result of the run, for the API and its outbox event."""
+        return {
+            'billing_run_id': str(self.id),
+            'status': self.status,
+            'converted_count': self.converted_count,
+            'expired_count': self.expired_count,
+            'total_amount': str(self.total_amount),
+            'first_invoice_number': self.first_invoice_number,
+            'last_invoice_number': self.last_invoice_number,
+        }
+
+
+class PaymentRecord(PaymentTransaction):
+    """
+    Record of all payments.
     
-    # Timestamps
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    Proxy of the unified ``payments.PaymentTransaction`` ledger, kept so the
+    invoices APIs and admin continue to work.
+    """
     
     class Meta:
-        db_table = 'payment_records'
+        proxy = True
         verbose_name = 'Payment Record'
         verbose_name_plural = 'Payment Records'
     
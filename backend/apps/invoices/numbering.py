@@ -0,0 +1,89 @@
+"""
+Invoice numbering for GSTONGO.
+
+Proforma and tax invoice numbers are consecutive serials per series, one
+series per document type and financial year (``INV/25-26/000042``, at most
+16 characters as GST invoice serials require). ``InvoiceSequence`` holds
+each series' next serial; ``allocate`` reserves a block of serials with a
+single ``UPDATE ... RETURNING``, so bulk generation gets thousands of numbers
+in one round trip and numbers never collide.
+
+The reservation takes part in the caller's transaction: the sequence row
+stays locked until commit and a rollback returns the block, so series are
+gap-free. Callers should therefore allocate as late in the transaction as
+possible, right before inserting the documents.
+"""
+from django.db import connection, transaction
+from django.utils import timezone
+
+# Digits of the serial; keeps numbers within GST's 16 characters
+NUMBER_WIDTH = 6
+
+SERIES_PREFIXES = {
+    'proforma': 'PI',
+    'invoice': 'INV',
+}
+
+
+def financial_year(day):
+    """Indian financial year (April-March) of ``day``, e.g. ``25-26``."""
+    start = day.year if day.month >= 4 else day.year - 1
+    return f'{start % 100:02d}-{(start + 1) % 100:02d}'
+
+
+def series_for(kind, day=None):
+    """Series key for document ``kind`` issued on ``day`` (default today)."""
+    return f'{SERIES_PREFIXES[kind]}/{financial_year(day or timezone.localdate())}'
+
+
+def format_number(series, value):
+    return f'{series}/{value:0{NUMBER_WIDTH}d}'
+
+
+def _reserve(series, count):
+    """Advance ``series`` by ``count``; returns the first reserved serial or None."""
+    from .models import InvoiceSequence
+
+    table = connection.ops.quote_name(InvoiceSequence._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET next_value = next_value + %s, updated_at = %s '
+            f'WHERE series = %s RETURNING next_value',
+            [count, timezone.now(), series]
+        )
+        row = cursor.fetchone()
+    return row[0] - count if row else None
+
+
+def allocate(kind, count=1, day=None):
+    """
+    Reserve ``count`` consecutive numbers of a document series.
+
+    Args:
+        kind: 'proforma' or 'invoice'
+        count: numbers to reserve
+        day: issue date selecting the financial year (default today)
+
+    Returns:
+        list: the formatted numbers, in order
+    """
+    from .models import InvoiceSequence
+
+    series = series_for(kind, day)
+    with transaction.atomic():
+        first = _reserve(series, count)
+        if first is None:
+            # First number of the series; a concurrent creator wins the
+            # insert and this reservation then waits behind its lock
+            InvoiceSequence.objects.get_or_create(series=series)
+            first = _reserve(series, count)
+    return [format_number(series, value) for value in range(first, first + count)]
+
+
+def assign_numbers(documents, kind, day=None):
+    """Number every unnumbered document of ``documents`` with one allocation."""
+    pending = [document for document in documents if not document.invoice_number]
+    if pending:
+        for document, number in zip(pending, allocate(kind, len(pending), day)):
+            document.invoice_number = number
+    return documents
@@ -0,0 +1,342 @@
+"""
+Invoice PDF rendering for GSTONGO.
+
+PDFs are rendered from a ``snapshot`` of the document: plain data, so
+rendering needs no database and can run in worker processes. The writer is
+deterministic, so the same snapshot always yields the same bytes. Files are
+stored content-addressed under ``invoices/pdf/`` by the SHA-256 of the
+rendered data, and identical output is stored once. Each document keeps the
+hash of the snapshot it was last rendered from (``pdf_source_hash``), so an
+unchanged document is never rendered again.
+
+Single documents render on the reports queue when first downloaded
+(``render_invoice_pdf``); ``render_month`` renders a month of documents
+across a process pool (see the ``render_invoice_pdfs`` command).
+"""
+import hashlib
+import json
+import logging
+import os
+import textwrap
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout changes so every document renders again
+RENDERER_VERSION = 1
+
+PDF_DIRECTORY = 'invoices/pdf'
+
+# Seconds a queued render suppresses further renders of the same document
+RENDER_DEDUPE_SECONDS = 5 * 60
+
+TITLES = {
+    'invoice': ('TAX INVOICE', 'Invoice'),
+    'proforma': ('PROFORMA INVOICE', 'Proforma'),
+}
+
+# A4 page in points
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+LINE_HEIGHT = 14
+PAGE_LINES = (PAGE_HEIGHT - 2 * MARGIN) // LINE_HEIGHT
+WRAP_WIDTH = 90
+
+# Line style: (font resource, size)
+FONTS = {
+    'regular': (b'F1', 10),
+    'bold': (b'F2', 10),
+    'title': (b'F2', 16),
+}
+
+
+def document_model(kind):
+    from .models import Invoice, ProformaInvoice
+    return {'invoice': Invoice, 'proforma': ProformaInvoice}[kind]
+
+
+def _date(value):
+    if value is None:
+        return None
+    if hasattr(value, 'hour'):
+        value = timezone.localtime(value).date()
+    return value.isoformat()
+
+
+def snapshot(document, kind):
+    """Everything printed on the PDF of ``document``, as JSON-serialisable data."""
+    user = document.user
+    try:
+        profile = user.profile
+    except ObjectDoesNotExist:
+        profile = None
+
+    customer_name = user.get_full_name() or user.email
+    customer_address = ''
+    customer_gstin = None
+    if profile:
+        customer_name = profile.legal_name or profile.trade_name or customer_name
+        customer_gstin = profile.gst_number
+        customer_address = ', '.join(filter(None, [
+            profile.address_line_1, profile.address_line_2, profile.city, profile.state, profile.pincode
+        ]))
+
+    data = {
+        'version': RENDERER_VERSION,
+        'kind': kind,
+        'number': document.invoice_number,
+        'date': _date(document.created_at),
+        'seller': {
+            'name': getattr(settings, 'INVOICE_SELLER_NAME', 'GSTONGO'),
+            'gstin': getattr(settings, 'INVOICE_SELLER_GSTIN', ''),
+            'address': getattr(settings, 'INVOICE_SELLER_ADDRESS', ''),
+        },
+        'customer': {
+            'name': customer_name,
+            'email': user.email,
+            'gstin': customer_gstin,
+            'address': customer_address,
+        },
+        'service_type': document.service_type,
+        'description': document.description or '',
+        'amount': str(document.amount),
+        'tax_amount': str(document.tax_amount),
+        'total_amount': str(document.total_amount),
+        'status': document.status,
+    }
+    if kind == 'invoice':
+        data['due_date'] = _date(document.due_date)
+        data['paid_at'] = _date(document.paid_at)
+        data['payment_reference'] = document.payment_reference
+    else:
+        data['gst_rate'] = str(document.gst_rate)
+        data['valid_until'] = _date(document.valid_until)
+    return data
+
+
+def source_hash(data):
+    """Hash of a snapshot; a document re-renders only when it changes."""
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def _wrap(text):
+    return textwrap.wrap(text, WRAP_WIDTH) if text else []
+
+
+def document_lines(data):
+    """Lines of a snapshot's PDF as (style, text) pairs."""
+    title, label = TITLES[data['kind']]
+    seller = data['seller']
+    customer = data['customer']
+
+    lines = [('title', title), ('regular', ''), ('bold', seller['name'])]
+    lines += [('regular', line) for line in _wrap(seller['address'])]
+    if seller['gstin']:
+        lines.append(('regular', f"GSTIN: {seller['gstin']}"))
+
+    lines += [
+        ('regular', ''),
+        ('regular', f"{label} No: {data['number']}"),
+        ('regular', f"Date: {data['date']}"),
+    ]
+    if data.get('due_date'):
+        lines.append(('regular', f"Due date: {data['due_date']}"))
+    if data.get('valid_until'):
+        lines.append(('regular', f"Valid until: {data['valid_until']}"))
+
+    lines += [('regular', ''), ('bold', 'Bill to'), ('regular', customer['name']), ('regular', customer['email'])]
+    lines += [('regular', line) for line in _wrap(customer['address'])]
+    if customer['gstin']:
+        lines.append(('regular', f"GSTIN: {customer['gstin']}"))
+
+    lines += [('regular', ''), ('bold', data['service_type'])]
+    lines += [('regular', line) for line in _wrap(data['description'])]
+
+    gst_label = f"GST ({data['gst_rate']}%)" if data.get('gst_rate') else 'GST'
+    lines += [
+        ('regular', ''),
+        ('regular', f"Taxable value: ₹{data['amount']}"),
+        ('regular', f"{gst_label}: ₹{data['tax_amount']}"),
+        ('bold', f"Total: ₹{data['total_amount']}"),
+        ('regular', ''),
+    ]
+
+    status = f"Status: {data['status'].upper()}"
+    if data.get('paid_at'):
+        status += f" on {data['paid_at']}"
+    if data.get('payment_reference'):
+        status += f" (ref {data['payment_reference']})"
+    lines.append(('regular', status))
+    return lines
+
+
+def _pdf_string(text):
+    # Standard fonts use WinAnsi (cp1252), which has no rupee sign
+    data = text.replace('₹', 'Rs. ').encode('cp1252', 'replace')
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def render_pdf(lines):
+    """Text-only A4 PDF of (style, text) lines, paginated."""
+    pages = [lines[i:i + PAGE_LINES] for i in range(0, len(lines), PAGE_LINES)] or [[]]
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # page tree, filled in once the pages are numbered
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+    ]
+    kids = []
+    for page in pages:
+        ops = [b'BT', b'%d TL' % LINE_HEIGHT, b'%d %d Td' % (MARGIN, PAGE_HEIGHT - MARGIN)]
+        for style, text in page:
+            font, size = FONTS[style]
+            ops.append(b'/%s %d Tf (%s) Tj T*' % (font, size, _pdf_string(text)))
+        ops.append(b'ET')
+        stream = b'\n'.join(ops)
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>'
+            % (PAGE_WIDTH, PAGE_HEIGHT, len(objects))
+        )
+        kids.append(len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % kid for kid in kids), len(kids)
+    )
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def render_snapshot(data):
+    """PDF bytes of a snapshot; runs in worker processes."""
+    return render_pdf(document_lines(data))
+
+
+def store_pdf(data):
+    """Store rendered PDF bytes under their content hash; returns the file name."""
+    digest = hashlib.sha256(data).hexdigest()
+    name = f'{PDF_DIRECTORY}/{digest[:2]}/{digest}.pdf'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    return name
+
+
+def is_pdf_current(document, kind):
+    """Whether the stored PDF of ``document`` matches its current content."""
+    return bool(document.pdf_file) and document.pdf_source_hash == source_hash(snapshot(document, kind))
+
+
+def render_document(document, kind, force=False):
+    """
+    Render and store the PDF of one document unless it is current.
+
+    Returns:
+        bool: True if the PDF was rendered
+    """
+    data = snapshot(document, kind)
+    digest = source_hash(data)
+    if not force and document.pdf_file and document.pdf_source_hash == digest:
+        return False
+
+    name = store_pdf(render_snapshot(data))
+    # No save(): the PDF is derived data and must not touch the ledger or updated_at
+    document_model(kind).objects.filter(pk=document.pk).update(pdf_file=name, pdf_source_hash=digest)
+    document.pdf_file = name
+    document.pdf_source_hash = digest
+    return True
+
+
+def render_queued_key(kind, document_id):
+    return f'invoice-pdf:{kind}:{document_id}'
+
+
+def schedule_render(kind, document_id):
+    """Queue a background render of one document, once while one is pending."""
+    from .tasks import render_invoice_pdf
+
+    key = render_queued_key(kind, document_id)
+    if not cache.add(key, 1, timeout=RENDER_DEDUPE_SECONDS):
+        return
+    try:
+        render_invoice_pdf.delay(kind, str(document_id))
+    except Exception as e:
+        cache.delete(key)
+        logger.warning(f'Could not queue PDF render of {kind} {document_id}: {e}')
+
+
+def render_month(year, month, kind='invoice', workers=None, batch_size=None, force=False):
+    """
+    Render the PDFs of a month's documents whose content changed.
+
+    Snapshots are taken in keyset-paginated batches and rendered across a
+    process pool of ``workers`` processes (default ``INVOICE_PDF_WORKERS``,
+    else one per core); must not run inside a Celery worker process, which
+    cannot start child processes.
+
+    Returns:
+        tuple: (documents checked, documents rendered)
+    """
+    model = document_model(kind)
+    workers = workers or getattr(settings, 'INVOICE_PDF_WORKERS', None) or os.cpu_count() or 1
+    batch_size = batch_size or getattr(settings, 'INVOICE_PDF_BATCH_SIZE', 500)
+
+    queryset = model.objects.filter(
+        created_at__year=year,
+        created_at__month=month
+    ).select_related('user__profile').order_by('pk')
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    checked = rendered = 0
+    last_pk = None
+    try:
+        while True:
+            page = queryset.filter(pk__gt=last_pk) if last_pk else queryset
+            batch = list(page[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            checked += len(batch)
+
+            stale = []
+            for document in batch:
+                data = snapshot(document, kind)
+                digest = source_hash(data)
+                if force or not document.pdf_file or document.pdf_source_hash != digest:
+                    stale.append((document, data, digest))
+            if not stale:
+                continue
+
+            snapshots = [data for _, data, _ in stale]
+            if executor:
+                outputs = executor.map(render_snapshot, snapshots, chunksize=max(1, len(snapshots) // (workers * 4)))
+            else:
+                outputs = map(render_snapshot, snapshots)
+
+            for (document, _, digest), output in zip(stale, outputs):
+                document.pdf_file = store_pdf(output)
+                document.pdf_source_hash = digest
+            model.objects.bulk_update([document for document, _, _ in stale], ['pdf_file', 'pdf_source_hash'])
+            rendered += len(stale)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    logger.info(f'Rendered {rendered} of {checked} {kind} PDFs for {year}-{month:02d}')
+    return checked, rendered
@@ -0,0 +1,25 @@
+"""
+Permissions for billing-dependent services.
+"""
+from rest_framework import permissions
+
+from .suspension import is_suspended
+
+
+class ServiceNotSuspended(permissions.BasePermission):
+    """
+    Deny changes by accounts suspended for overdue invoices.
+    
+    Reads stay allowed so suspended users can still see their filings. The
+    check is a cache read (see ``suspension``), never a database query.
+    """
+    
+    message = 'Your account is suspended due to overdue payments. Please clear your dues to continue filing.'
+    
+    def has_permission(self, request, view):
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        user = request.user
+        if not user or not user.is_authenticated:
+            return True
+        return not is_suspended(user.id)
@@ -30,9 +30,9 @@ class ProformaInvoiceSerializer(serializers.ModelSerializer):
             'id', 'invoice_number', 'user', 'user_email', 'amount',
             'tax_amount', 'total_amount', 'gst_rate', 'service_type',
             'description', 'status', 'valid_until', 'is_expired',
-            'related_filing_id', 'created_at', 'updated_at'
+            'related_filing_id', 'pdf_file', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'invoice_number', 'user', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'invoice_number', 'user', 'pdf_file', 'created_at', 'updated_at']
     
     def get_is_expired(self, obj):
         return obj.is_expired()
@@ -72,7 +72,7 @@ class InvoiceSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
         read_only_fields = [
-            'id', 'invoice_number', 'user', 'created_at', 'updated_at', 'paid_at'
+            'id', 'invoice_number', 'user', 'created_at', 'updated_at', 'paid_at', 'pdf_file'
         ]
     
     def get_days_until_due(self, obj):
@@ -105,10 +105,10 @@ class PaymentRecordSerializer(serializers.ModelSerializer):
         model = PaymentRecord
         fields = [
             'id', 'user', 'user_email', 'invoice', 'proforma', 'amount',
-            'currency', 'gateway', 'gateway_payment_id', 'status',
-            'payment_method', 'error_message', 'created_at', 'updated_at'
+            'currency', 'gateway', 'gateway_order_id', 'gateway_payment_id', 'status',
+            'payment_method', 'error_message', 'created_at', 'updated_at', 'completed_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'completed_at']
 
 
 class PaymentInitSerializer(serializers.Serializer):
@@ -116,7 +116,8 @@ class PaymentInitSerializer(serializers.Serializer):
     
     invoice_id = serializers.UUIDField(required=False)
     proforma_id = serializers.UUIDField(required=False)
-    gateway = serializers.ChoiceField(choices=['razorpay', 'cashfree', 'stripe'])
+    # Optional; without it the payment is routed to the fastest gateway
+    gateway = serializers.ChoiceField(choices=['razorpay', 'cashfree', 'stripe'], required=False)
     
     def validate(self, attrs):
         if not attrs.get('invoice_id') and not attrs.get('proforma_id'):
@@ -0,0 +1,117 @@
+"""
+Service suspension for accounts with long-overdue invoices.
+
+A user is suspended while any of their open invoices is more than
+``SERVICE_SUSPENSION_GRACE_DAYS`` past its due date. The record is the
+``ServiceSuspension`` table. It is mirrored in the cache as one key per
+suspended user plus a marker saying the mirror is loaded, so
+``is_suspended`` reads two small keys in one round trip, whatever the
+number of suspended users, and needs no database query. A missing
+marker, after a flush or an eviction, means the mirror is reloaded from
+the table. The overdue job recomputes the suspensions daily
+(``refresh_suspensions``). An invoice leaving the open states, through
+payment capture or cancellation, lifts its user's suspension immediately
+once nothing else is past the grace period (``lift_if_settled``); only
+that user's key is dropped.
+"""
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .ledger import OPEN_STATUSES
+
+logger = logging.getLogger(__name__)
+
+LOADED_KEY = 'service-suspended:loaded'
+
+
+def user_key(user_id):
+    return f'service-suspended:user:{user_id}'
+
+
+def grace_cutoff(today=None):
+    """Latest due date of an open invoice that suspends its user."""
+    days = getattr(settings, 'SERVICE_SUSPENSION_GRACE_DAYS', 7)
+    return (today or timezone.localdate()) - timedelta(days=days)
+
+
+def load_cache():
+    """Mirror the suspended users into the cache, e.g. after a cache flush."""
+    from .models import ServiceSuspension
+
+    user_ids = set(ServiceSuspension.objects.values_list('user_id', flat=True))
+    # User keys first: the marker must never announce a partial mirror
+    cache.set_many({user_key(user_id): True for user_id in user_ids}, timeout=None)
+    cache.set(LOADED_KEY, True, timeout=None)
+    return user_ids
+
+
+def is_suspended(user_id):
+    """Whether ``user_id`` is suspended; one cache round trip."""
+    key = user_key(user_id)
+    cached = cache.get_many([LOADED_KEY, key])
+    if LOADED_KEY not in cached:
+        return user_id in load_cache()
+    return key in cached
+
+
+def update_cache(suspended, lifted):
+    """Apply suspension changes to a loaded mirror."""
+    if cache.get(LOADED_KEY) is None:
+        # Not loaded: the next read loads everything from the table
+        return
+    cache.set_many({user_key(user_id): True for user_id in suspended}, timeout=None)
+    cache.delete_many([user_key(user_id) for user_id in lifted])
+
+
+def refresh_suspensions(today=None):
+    """
+    Recompute the suspended set from open invoices past the grace period.
+
+    Returns:
+        tuple: (newly suspended, lifted) user counts
+    """
+    from .models import Invoice, ServiceSuspension
+
+    overdue = dict(
+        Invoice.objects.filter(
+            status__in=OPEN_STATUSES,
+            due_date__lte=grace_cutoff(today)
+        ).values('user_id').annotate(oldest=Min('due_date')).values_list('user_id', 'oldest')
+    )
+
+    with transaction.atomic():
+        current = set(ServiceSuspension.objects.values_list('user_id', flat=True))
+        suspended = overdue.keys() - current
+        lifted = current - overdue.keys()
+
+        ServiceSuspension.objects.bulk_create(
+            [ServiceSuspension(user_id=user_id, overdue_since=overdue[user_id]) for user_id in suspended],
+            ignore_conflicts=True
+        )
+        ServiceSuspension.objects.filter(user_id__in=lifted).delete()
+
+        transaction.on_commit(lambda: update_cache(suspended, lifted))
+
+    if suspended or lifted:
+        logger.info(f'Service suspensions: {len(suspended)} suspended, {len(lifted)} lifted')
+    return len(suspended), len(lifted)
+
+
+def lift_if_settled(user_id):
+    """Lift a user's suspension once no open invoice is past the grace period."""
+    from .models import Invoice, ServiceSuspension
+
+    if not is_suspended(user_id):
+        return False
+    if Invoice.objects.filter(user_id=user_id, status__in=OPEN_STATUSES, due_date__lte=grace_cutoff()).exists():
+        return False
+
+    ServiceSuspension.objects.filter(user_id=user_id).delete()
+    transaction.on_commit(lambda: cache.delete(user_key(user_id)))
+    logger.info(f'Service suspension lifted for user {user_id}')
+    return True
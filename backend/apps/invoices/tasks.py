@@ -0,0 +1,30 @@
+"""
+Celery tasks for Invoices app.
+"""
+import logging
+from celery import shared_task
+from django.core.cache import cache
+
+from apps.core import queues
+from apps.core.metrics import report_rows
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, queue=queues.REPORTS)
+def render_invoice_pdf(self, kind, document_id):
+    """
+    Render the PDF of one invoice or proforma unless it is current.
+    """
+    from .pdf import document_model, render_document, render_queued_key
+    
+    try:
+        document = document_model(kind).objects.select_related('user__profile').filter(pk=document_id).first()
+        if document is None:
+            return f'{kind} {document_id} not found'
+        rendered = render_document(document, kind)
+    finally:
+        cache.delete(render_queued_key(kind, document_id))
+    
+    report_rows(int(rendered))
+    return f'{"Rendered" if rendered else "Unchanged"} {kind} {document.invoice_number} PDF'
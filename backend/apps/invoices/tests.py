@@ -0,0 +1,405 @@
+"""
+Unit tests for Invoices app.
+"""
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from apps.invoices.ledger import get_ledger, mark_overdue, reconcile_ledgers
+from apps.core.models import OutboxEvent
+from apps.invoices.models import BillingRun, Invoice, InvoiceSequence, PaymentRecord, ProformaInvoice, ReceivablesLedger
+from apps.invoices.numbering import allocate, series_for
+from apps.invoices.pdf import render_document, render_month
+from apps.invoices.suspension import LOADED_KEY, is_suspended, refresh_suspensions
+from apps.invoices.tasks import render_invoice_pdf
+from apps.payments.models import PaymentTransaction
+from apps.users.models import AdminProfile, User
+
+
+class ReceivablesLedgerTests(APITestCase):
+    """Test cases for the per-user receivables ledger."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='billing@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def issue(self, total, due_in_days=30):
+        return Invoice.objects.create(
+            user=self.user,
+            amount=total,
+            total_amount=total,
+            due_date=timezone.now().date() + timedelta(days=due_in_days)
+        )
+
+    def assertLedger(self, **expected):
+        ledger = ReceivablesLedger.objects.get(user=self.user)
+        for field, value in expected.items():
+            self.assertEqual(getattr(ledger, field), value, field)
+
+    def test_transitions_update_ledger(self):
+        """Test issue, payment, overdue sweep and cancellation move the balances."""
+        first = self.issue(Decimal('100.00'))
+        self.issue(Decimal('250.00'), due_in_days=-2)
+        self.assertLedger(invoiced_amount=Decimal('350.00'), outstanding_amount=Decimal('350.00'), outstanding_count=2)
+
+        self.assertEqual(mark_overdue(), 1)
+        self.assertLedger(overdue_amount=Decimal('250.00'), overdue_count=1, outstanding_count=2)
+
+        first.mark_as_paid('cash', 'R-1')
+        first.mark_as_paid('cash', 'R-1')
+        self.assertLedger(
+            invoiced_amount=Decimal('350.00'),
+            paid_amount=Decimal('100.00'),
+            outstanding_amount=Decimal('250.00'),
+            outstanding_count=1
+        )
+
+        overdue = Invoice.objects.get(status='overdue')
+        overdue.status = 'cancelled'
+        overdue.save()
+        self.assertLedger(
+            invoiced_amount=Decimal('100.00'),
+            outstanding_amount=Decimal('0.00'),
+            overdue_amount=Decimal('0.00'),
+            outstanding_count=0,
+            overdue_count=0
+        )
+
+    def test_list_reads_ledger(self):
+        """Test the invoice list reports pending payments from the ledger."""
+        self.issue(Decimal('118.00'))
+        response = self.client.get(reverse('invoices-list'))
+
+        self.assertTrue(response.data['has_pending_payments'])
+        self.assertEqual(response.data['pending_amount'], Decimal('118.00'))
+
+    def test_reconcile_fixes_drift(self):
+        """Test reconciliation recomputes drifted and missing ledgers."""
+        self.issue(Decimal('50.00'))
+        ReceivablesLedger.objects.filter(user=self.user).update(outstanding_amount=Decimal('999.00'))
+        self.assertEqual(reconcile_ledgers(), (1, 1))
+        self.assertEqual(get_ledger(self.user.id).outstanding_amount, Decimal('50.00'))
+
+        ReceivablesLedger.objects.all().delete()
+        self.assertEqual(reconcile_ledgers(), (1, 1))
+        self.assertLedger(invoiced_amount=Decimal('50.00'), outstanding_count=1)
+
+    def test_reconcile_locks_ledgers_before_totalling(self):
+        """Test a batch creates and locks its ledgers before reading the invoices."""
+        self.issue(Decimal('50.00'))
+        idle = User.objects.create_user(email='idle@example.com', password='testpass123')
+        ReceivablesLedger.objects.all().delete()
+        ReceivablesLedger.objects.create(user=idle)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(reconcile_ledgers(), (2, 1))
+
+        statements = [query['sql'] for query in queries.captured_queries]
+        insert = next(i for i, sql in enumerate(statements) if sql.startswith('INSERT'))
+        locked = next(
+            i for i, sql in enumerate(statements)
+            if sql.startswith('SELECT') and 'FROM "receivables_ledgers"' in sql and i > insert
+        )
+        totalled = next(i for i, sql in enumerate(statements) if 'SUM(' in sql)
+        self.assertLess(insert, locked)
+        self.assertLess(locked, totalled)
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', statements[locked])
+        self.assertLedger(outstanding_amount=Decimal('50.00'), outstanding_count=1)
+
+
+class PaymentLedgerTests(APITestCase):
+    """Test cases for the unified payment ledger behind PaymentRecord."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='payer@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.invoice = Invoice.objects.create(
+            user=self.user,
+            amount=Decimal('100.00'),
+            total_amount=Decimal('118.00'),
+            due_date=timezone.now().date() + timedelta(days=30)
+        )
+
+    def test_webhook_updates_shared_ledger(self):
+        """Test the invoices webhook settles the transaction by gateway order id."""
+        record = PaymentRecord.objects.create(
+            user=self.user,
+            invoice=self.invoice,
+            amount=Decimal('118.00'),
+            gateway='razorpay',
+            gateway_order_id='order_ABC'
+        )
+        self.client.post(reverse('payments-webhook'), {
+            'gateway': 'razorpay',
+            'event': 'payment.captured',
+            'data': {'order_id': 'order_ABC', 'payment_id': 'pay_XYZ'},
+        }, format='json')
+
+        transaction = PaymentTransaction.objects.get(pk=record.pk)
+        self.assertEqual(transaction.status, 'success')
+        self.assertEqual(transaction.gateway_payment_id, 'pay_XYZ')
+        self.assertIsNotNone(transaction.completed_at)
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.status, 'paid')
+
+
+class InvoiceNumberingTests(APITestCase):
+    """Test cases for sequence-backed invoice numbering."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='numbers@example.com', password='testpass123')
+
+    def issue(self, **kwargs):
+        return Invoice.objects.create(
+            user=self.user,
+            amount=Decimal('100.00'),
+            total_amount=Decimal('118.00'),
+            due_date=timezone.now().date() + timedelta(days=30),
+            **kwargs
+        )
+
+    def test_series_are_consecutive_per_financial_year(self):
+        """Test invoices and proformas number consecutively in their own series."""
+        series = series_for('invoice')
+        self.assertEqual(self.issue().invoice_number, f'{series}/000001')
+        self.assertEqual(self.issue().invoice_number, f'{series}/000002')
+
+        proforma = ProformaInvoice.objects.create(
+            user=self.user,
+            amount=Decimal('100.00'),
+            total_amount=Decimal('118.00'),
+            valid_until=timezone.now() + timedelta(days=7)
+        )
+        self.assertEqual(proforma.invoice_number, f'{series_for("proforma")}/000001')
+
+        self.assertEqual(series_for('invoice', date(2026, 3, 31)), 'INV/25-26')
+        self.assertEqual(series_for('invoice', date(2026, 4, 1)), 'INV/26-27')
+        self.assertLessEqual(len(self.issue().invoice_number), 16)
+
+    def test_block_allocation_and_rollback_leave_no_gaps(self):
+        """Test a bulk block is consecutive and a rolled-back save returns its number."""
+        self.assertEqual(allocate('invoice', 3, date(2025, 6, 1)), [
+            'INV/25-26/000001', 'INV/25-26/000002', 'INV/25-26/000003',
+        ])
+
+        self.issue()
+        # Fails after the insert, inside the saving transaction
+        with patch('apps.invoices.ledger.apply_delta', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.issue()
+        self.assertEqual(self.issue().invoice_number, f'{series_for("invoice")}/000002')
+        self.assertEqual(InvoiceSequence.objects.get(series=series_for('invoice')).next_value, 3)
+
+
+class InvoicePdfTests(APITestCase):
+    """Test cases for content-addressed invoice PDF rendering."""
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_override = override_settings(MEDIA_ROOT=media.name)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+
+        self.user = User.objects.create_user(email='pdf.owner@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.invoice = Invoice.objects.create(
+            user=self.user,
+            amount=Decimal('100.00'),
+            total_amount=Decimal('118.00'),
+            description='GST Filing (GSTR-1) for April',
+            due_date=timezone.now().date() + timedelta(days=30)
+        )
+
+    def test_render_is_content_addressed_and_skips_unchanged(self):
+        """Test PDFs are stored by content hash and re-rendered only on change."""
+        self.assertTrue(render_document(self.invoice, 'invoice'))
+        name = self.invoice.pdf_file.name
+        self.assertRegex(name, r'^invoices/pdf/[0-9a-f]{2}/[0-9a-f]{64}\.pdf$')
+        with self.invoice.pdf_file.open('rb') as fh:
+            data = fh.read()
+        self.assertTrue(data.startswith(b'%PDF-1.4'))
+        self.assertIn(b'Rs. 118.00', data)
+
+        self.invoice.refresh_from_db()
+        self.assertFalse(render_document(self.invoice, 'invoice'))
+
+        self.invoice.mark_as_paid('cash', 'R-9')
+        self.assertTrue(render_document(self.invoice, 'invoice'))
+        self.assertNotEqual(self.invoice.pdf_file.name, name)
+
+    def test_download_renders_in_background(self):
+        """Test the first download queues a render and later ones serve the file."""
+        url = reverse('invoices-pdf', args=[self.invoice.pk])
+        with patch.object(render_invoice_pdf, 'delay') as delay:
+            self.assertEqual(self.client.get(url).status_code, 202)
+            self.assertEqual(self.client.get(url).status_code, 202)
+        delay.assert_called_once_with('invoice', str(self.invoice.pk))
+
+        render_invoice_pdf.apply(args=delay.call_args.args)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        filename = f"{self.invoice.invoice_number.replace('/', '-')}_pdfowner.pdf"
+        self.assertIn(filename, response['Content-Disposition'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_render_month_uses_process_pool(self):
+        """Test a month renders across worker processes and a rerun renders nothing."""
+        for _ in range(3):
+            Invoice.objects.create(
+                user=self.user,
+                amount=Decimal('50.00'),
+                total_amount=Decimal('59.00'),
+                due_date=timezone.now().date()
+            )
+        today = timezone.localdate()
+        self.assertEqual(render_month(today.year, today.month, workers=2, batch_size=3), (4, 4))
+        self.assertEqual(render_month(today.year, today.month, workers=2), (4, 0))
+        self.assertFalse(Invoice.objects.filter(pdf_file='').exists())
+
+
+class BillingRunTests(APITestCase):
+    """Test cases for bulk proforma-to-invoice billing runs."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(email='finance.admin@example.com', password='testpass123')
+        AdminProfile.objects.create(user=self.admin, employee_id='EMP-1', can_manage_payments=True)
+        self.customers = [
+            User.objects.create_user(email=f'customer{i}@example.com', password='testpass123') for i in range(2)
+        ]
+
+    def proforma(self, user, total='118.00', valid_days=7):
+        return ProformaInvoice.objects.create(
+            user=user,
+            amount=Decimal(total) / Decimal('1.18'),
+            total_amount=Decimal(total),
+            valid_until=timezone.now() + timedelta(days=valid_days)
+        )
+
+    def test_billing_run_converts_eligible_proformas(self):
+        """Test one run invoices every eligible proforma and reports one summary."""
+        first, second = self.customers
+        converted = [self.proforma(first), self.proforma(first, '236.00'), self.proforma(second)]
+        expired = self.proforma(second, valid_days=-1)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(reverse('admin-payments-billing-run'))
+
+        self.assertEqual(response.data['converted_count'], 3)
+        self.assertEqual(response.data['expired_count'], 1)
+        self.assertEqual(response.data['total_amount'], '472.00')
+        series = series_for('invoice')
+        self.assertEqual(response.data['first_invoice_number'], f'{series}/000001')
+        self.assertEqual(response.data['last_invoice_number'], f'{series}/000003')
+
+        for proforma in converted:
+            proforma.refresh_from_db()
+            self.assertEqual(proforma.status, 'paid')
+            self.assertEqual(proforma.final_invoice.total_amount, proforma.total_amount)
+        expired.refresh_from_db()
+        self.assertEqual(expired.status, 'pending')
+
+        self.assertEqual(get_ledger(first.id).outstanding_amount, Decimal('354.00'))
+        self.assertEqual(get_ledger(second.id).outstanding_count, 1)
+        self.assertEqual(OutboxEvent.objects.filter(event_type='billing.completed').count(), 1)
+
+        # Nothing left to convert
+        self.assertEqual(self.client.post(reverse('admin-payments-billing-run')).data['converted_count'], 0)
+        self.assertEqual(BillingRun.objects.filter(status='completed').count(), 2)
+
+    def test_convert_single_proforma(self):
+        """Test converting one proforma creates a numbered invoice."""
+        proforma = self.proforma(self.customers[0])
+        self.client.force_authenticate(self.customers[0])
+
+        response = self.client.post(reverse('proforma-convert-to-invoice', args=[proforma.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['invoice_number'], f'{series_for("invoice")}/000001')
+        self.assertEqual(Decimal(response.data['tax_amount']), proforma.total_amount - proforma.amount)
+
+        response = self.client.post(reverse('proforma-convert-to-invoice', args=[proforma.pk]))
+        self.assertEqual(response.status_code, 400)
+
+    def test_billing_run_requires_admin(self):
+        """Test customers cannot start a billing run."""
+        self.client.force_authenticate(self.customers[0])
+        self.assertEqual(self.client.post(reverse('admin-payments-billing-run')).status_code, 403)
+
+
+class ServiceSuspensionTests(APITestCase):
+    """Test cases for suspending filing for long-overdue accounts."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='late.payer@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.invoice = Invoice.objects.create(
+            user=self.user,
+            amount=Decimal('100.00'),
+            total_amount=Decimal('118.00'),
+            due_date=timezone.localdate() - timedelta(days=10)
+        )
+
+    def create_filing(self):
+        return self.client.post(reverse('gst-filings-list'), {}, format='json')
+
+    def test_overdue_account_is_blocked_until_paid(self):
+        """Test suspension blocks filing changes but not reads, and payment lifts it."""
+        self.assertNotEqual(self.create_filing().status_code, 403)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(refresh_suspensions(), (1, 0))
+        with self.assertNumQueries(0):
+            self.assertTrue(is_suspended(self.user.id))
+
+        response = self.create_filing()
+        self.assertEqual(response.status_code, 403)
+        self.assertIn('suspended', response.data['detail'])
+        self.assertEqual(self.client.get(reverse('gst-filings-list')).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.invoice.mark_as_paid('cash', 'R-1')
+        # Lifting drops only this user's key; the mirror stays loaded
+        with self.assertNumQueries(0):
+            self.assertFalse(is_suspended(self.user.id))
+        self.assertNotEqual(self.create_filing().status_code, 403)
+        self.assertEqual(refresh_suspensions(), (0, 0))
+
+    def test_cache_is_reloaded_after_flush(self):
+        """Test the suspended users are restored from the table when the cache is lost."""
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh_suspensions()
+        cache.clear()
+
+        self.assertTrue(is_suspended(self.user.id))
+        with self.assertNumQueries(0):
+            self.assertFalse(is_suspended(self.user.id + 1))
+
+        # Evicting the marker is a miss that reloads the mirror, never a false negative
+        cache.delete(LOADED_KEY)
+        with self.assertNumQueries(1):
+            self.assertTrue(is_suspended(self.user.id))
+
+    def test_refresh_updates_the_loaded_mirror(self):
+        """Test the daily refresh adds and drops users without reloading the mirror."""
+        self.assertFalse(is_suspended(self.user.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(refresh_suspensions(), (1, 0))
+        with self.assertNumQueries(0):
+            self.assertTrue(is_suspended(self.user.id))
+
+        Invoice.objects.filter(pk=self.invoice.pk).update(due_date=timezone.localdate())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(refresh_suspensions(), (0, 1))
+        with self.assertNumQueries(0):
+            self.assertFalse(is_suspended(self.user.id))
@@ -1,15 +1,24 @@
 """
 Views for Invoices and Payments.
 """
-import razorpay
 from django.conf import settings
 from django.db import transaction
+from django.http import FileResponse
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils import timezone
 from datetime import timedelta
+from decimal import Decimal
 
+from apps.payments.gateways import GATEWAY_CLASSES, get_gateway_registry
+from apps.payments.rollup import collection_totals, collections_by_gateway
+from apps.payments.services import PaymentError
+
+from .billing import build_invoice, invoice_due_date, run_billing
+from .ledger import get_ledger
+from .pdf import is_pdf_current, schedule_render
+from .suspension import is_suspended
 from .models import RateSlab, ProformaInvoice, Invoice, PaymentRecord
 from .serializers import (
     RateSlabSerializer, ProformaInvoiceSerializer, InvoiceSerializer,
@@ -55,6 +64,23 @@ class RateSlabViewSet(viewsets.ModelViewSet):
         return super().update(request, *args, **kwargs)
 
 
+def pdf_response(document, kind):
+    """Download a current PDF, or queue its render and ask the client to retry."""
+    if is_pdf_current(document, kind):
+        return FileResponse(
+            document.pdf_file.open('rb'),
+            as_attachment=True,
+            filename=f'{document.get_friendly_filename()}.pdf',
+            content_type='application/pdf'
+        )
+    
+    schedule_render(kind, document.pk)
+    return Response(
+        {'status': 'rendering', 'message': 'The PDF is being generated. Please retry shortly.'},
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
 class ProformaInvoiceViewSet(viewsets.ModelViewSet):
     """ViewSet for Proforma Invoice operations."""
     
@@ -139,34 +165,35 @@ class ProformaInvoiceViewSet(viewsets.ModelViewSet):
         """Convert proforma to final invoice."""
         proforma = self.get_object()
         
-        if proforma.status != 'pending':
-            return Response(
-                {'error': 'Proforma is not pending.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        if proforma.is_expired():
-            return Response(
-                {'error': 'Proforma has expired.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Create final invoice
-        invoice = Invoice.objects.create(
-            proforma=proforma,
-            user=proforma.user,
-            amount=proforma.amount,
-            total_amount=proforma.total_amount,
-            gst_rate=proforma.gst_rate,
-            service_type=proforma.service_type,
-            description=proforma.description,
-            due_date=timezone.now().date() + timedelta(days=30)
-        )
-        
-        proforma.status = 'paid'
-        proforma.save()
+        with transaction.atomic():
+            # Locked so a concurrent billing run cannot invoice it as well
+            proforma = ProformaInvoice.objects.select_for_update().get(pk=proforma.pk)
+            
+            if proforma.status != 'pending':
+                return Response(
+                    {'error': 'Proforma is not pending.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            if proforma.is_expired():
+                return Response(
+                    {'error': 'Proforma has expired.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            # Create final invoice
+            invoice = build_invoice(proforma, invoice_due_date())
+            invoice.save()
+            
+            proforma.status = 'paid'
+            proforma.save()
         
         return Response(InvoiceSerializer(invoice).data)
+    
+    @action(detail=True, methods=['get'])
+    def pdf(self, request, pk=None):
+        """Download the proforma invoice PDF."""
+        return pdf_response(self.get_object(), 'proforma')
 
 
 class InvoiceViewSet(viewsets.ModelViewSet):
@@ -195,20 +222,20 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         queryset = self.get_queryset()
         serializer = self.get_serializer(queryset, many=True)
         
-        # Check for pending payments
-        user_has_pending = Invoice.objects.filter(
-            user=request.user,
-            status__in=['issued', 'overdue']
-        ).exists()
+        # Pending payments come from the user's receivables ledger
+        ledger = get_ledger(request.user.id)
         
         return Response({
             'invoices': serializer.data,
-            'has_pending_payments': user_has_pending,
-            'pending_amount': sum(
-                inv.total_amount for inv in
-                Invoice.objects.filter(user=request.user, status__in=['issued', 'overdue'])
-            )
+            'has_pending_payments': ledger.outstanding_count > 0,
+            'pending_amount': ledger.outstanding_amount,
+            'service_suspended': is_suspended(request.user.id)
         })
+    
+    @action(detail=True, methods=['get'])
+    def pdf(self, request, pk=None):
+        """Download the invoice PDF."""
+        return pdf_response(self.get_object(), 'invoice')
 
 
 class PaymentViewSet(viewsets.ViewSet):
@@ -252,47 +279,49 @@ class PaymentViewSet(viewsets.ViewSet):
                 )
             amount = proforma.total_amount
         
-        # Initialize payment based on gateway
-        if gateway == 'razorpay':
-            client = razorpay.Client(
-                auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
+        if gateway and gateway not in GATEWAY_CLASSES:
+            return Response(
+                {'error': 'Payment gateway not implemented.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            payment_data = {
-                'amount': int(amount * 100),  # Convert to paise
-                'currency': 'INR',
-                'receipt': f'receipt_{uuid.uuid4().hex[:8]}',
-                'notes': {
-                    'user_id': str(user.id),
-                    'invoice_id': str(invoice.id if invoice else proforma.id),
-                }
-            }
-            
-            razorpay_order = client.order.create(payment_data)
-            
-            # Create payment record
-            payment = PaymentRecord.objects.create(
-                user=user,
-                invoice=invoice,
-                proforma=proforma,
+        
+        # Create the order on the requested gateway, or the fastest available one
+        document = invoice or proforma
+        try:
+            order = get_gateway_registry().create_order(
                 amount=amount,
-                gateway='razorpay',
-                gateway_payment_id=razorpay_order['id'],
-                status='pending'
+                currency='INR',
+                preferred=gateway,
+                invoice_id=str(document.id),
+                user_id=str(user.id),
+                service_type=document.service_type
+            )
+        except PaymentError as e:
+            return Response(
+                {'error': e.message},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            return Response({
-                'order_id': razorpay_order['id'],
-                'amount': razorpay_order['amount'],
-                'currency': razorpay_order['currency'],
-                'key_id': settings.RAZORPAY_KEY_ID,
-                'payment_id': payment.id
-            })
         
-        return Response(
-            {'error': 'Payment gateway not implemented.'},
-            status=status.HTTP_400_BAD_REQUEST
+        # Create payment record
+        payment = PaymentRecord.objects.create(
+            user=user,
+            invoice=invoice,
+            proforma=proforma,
+            amount=amount,
+            gateway=order['gateway'],
+            gateway_order_id=order['order_id'],
+            status='pending'
         )
+        
+        return Response({
+            'gateway': order['gateway'],
+            'order_id': order['order_id'],
+            'amount': order['amount_paise'],
+            'currency': order['currency'],
+            'key_id': order.get('key_id'),
+            'payment_session_id': order.get('payment_session_id'),
+            'payment_id': payment.id
+        })
     
     @action(detail=False, methods=['post'])
     def webhook(self, request):
@@ -308,9 +337,9 @@ class PaymentViewSet(viewsets.ViewSet):
         if gateway == 'razorpay':
             if event == 'payment.captured':
                 order_id = data.get('order_id')
-                payment = PaymentRecord.objects.get(gateway_payment_id=order_id)
-                payment.status = 'success'
-                payment.save()
+                payment = PaymentRecord.objects.get(gateway_order_id=order_id)
+                payment.webhook_data = data
+                payment.mark_as_success(data.get('payment_id'))
                 
                 # Update invoice/proforma status
                 if payment.invoice:
@@ -352,33 +381,37 @@ class AdminPaymentViewSet(viewsets.ViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        from django.db.models import Sum
-        
-        today = timezone.now().date()
+        today = timezone.localdate()
         start_of_month = today.replace(day=1)
+        start_of_year = today.replace(month=1, day=1)
         
-        # This month's collection
-        month_collection = PaymentRecord.objects.filter(
-            status='success',
-            created_at__date__gte=start_of_month
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        # Overdue invoices
-        overdue_invoices = Invoice.objects.filter(
-            status='overdue'
-        ).count()
-        
-        overdue_amount = Invoice.objects.filter(
-            status='overdue'
-        ).aggregate(total=Sum('total_amount'))['total'] or 0
+        # Collections and invoice counts from the daily collections rollup
+        month = collection_totals(start=start_of_month)
+        year = collection_totals(start=start_of_year)
+        receivables = collection_totals()
         
         return Response({
-            'this_month_collection': month_collection,
-            'overdue_invoices_count': overdue_invoices,
-            'overdue_amount': overdue_amount,
-            'pending_invoices_count': Invoice.objects.filter(status='issued').count(),
+            'this_month_collection': month['collected_amount'],
+            'this_year_collection': year['collected_amount'],
+            'this_month_by_gateway': collections_by_gateway(start=start_of_month),
+            'overdue_invoices_count': receivables['overdue_count'],
+            'overdue_amount': receivables['overdue_amount'],
+            'pending_invoices_count': receivables['pending_count'],
         })
     
+    @action(detail=False, methods=['post'])
+    def billing_run(self, request):
+        """Convert all pending, unexpired proformas into invoices."""
+        if not hasattr(request.user, 'admin_profile'):
+            return Response(
+                {'error': 'Admin access required.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        run = run_billing(started_by=request.user)
+        
+        return Response(run.summary())
+    
     @action(detail=True, methods=['post'])
     def record_manual_payment(self, request, pk=None):
         """Record manual payment."""
@@ -414,7 +447,8 @@ class AdminPaymentViewSet(viewsets.ViewSet):
             gateway='manual',
             gateway_payment_id=reference,
             status='success',
-            payment_method=method
+            payment_method=method,
+            completed_at=timezone.now()
         )
         
         # Update invoice
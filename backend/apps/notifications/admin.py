@@ -1,6 +1,8 @@
 from django.contrib import admin
 from unfold.admin import ModelAdmin
-from .models import NotificationTemplate, Notification, NotificationSchedule, FCMToken
+from .models import (
+    NotificationTemplate, Notification, NotificationSchedule, NotificationDigestItem, FCMToken
+)
 
 @admin.register(NotificationTemplate)
 class NotificationTemplateAdmin(ModelAdmin):
@@ -20,6 +22,12 @@ class NotificationScheduleAdmin(ModelAdmin):
     list_display = ('name', 'schedule_type', 'trigger_type', 'is_active', 'next_run_at')
     list_filter = ('schedule_type', 'trigger_type', 'is_active')
 
+@admin.register(NotificationDigestItem)
+class NotificationDigestItemAdmin(ModelAdmin):
+    list_display = ('user', 'channel', 'category', 'digest_id', 'created_at')
+    list_filter = ('channel', 'category')
+    search_fields = ('user__email', 'title')
+
 @admin.register(FCMToken)
 class FCMTokenAdmin(ModelAdmin):
     list_display = ('user', 'device_type', 'is_active', 'created_at')
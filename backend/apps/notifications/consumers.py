@@ -0,0 +1,66 @@
+"""
+Outbox consumers for the Notifications app.
+"""
+import logging
+from functools import partial
+
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def _filing_completed(event):
+    payload = event.payload
+    reference = payload.get('filing_reference_number') or 'N/A'
+    return {
+        'category': 'filing_status',
+        'title': 'GST Filing Completed',
+        'message': f"Your {payload.get('filing_type')} filing for {payload.get('month')}/{payload.get('year')} has been filed. Reference: {reference}",
+        'reference_type': 'filing',
+    }
+
+
+def _ticket_resolved(event):
+    payload = event.payload
+    return {
+        'category': 'general',
+        'title': 'Support Ticket Resolved',
+        'message': f"Your support ticket {payload.get('ticket_number')} has been resolved.",
+        'reference_type': 'ticket',
+    }
+
+
+# In-app notifications built directly from the event
+IN_APP_BUILDERS = {
+    'filing.completed': _filing_completed,
+    'ticket.resolved': _ticket_resolved,
+}
+
+
+def notify_on_events(events):
+    """Create customer notifications for a batch of outbox events."""
+    from .models import Notification
+    from apps.payments.tasks import notify_payment_success
+
+    notifications = []
+    for event in events:
+        if event.user_id is None:
+            continue
+        if event.event_type == 'payment.received':
+            # In-app plus email confirmation, sent on the realtime queue once
+            # the event is committed as dispatched
+            transaction.on_commit(partial(notify_payment_success.delay, event.payload['transaction_id']))
+            continue
+
+        builder = IN_APP_BUILDERS.get(event.event_type)
+        if builder:
+            notifications.append(Notification(
+                user_id=event.user_id,
+                channel='push',
+                reference_id=event.aggregate_id,
+                **builder(event)
+            ))
+
+    if notifications:
+        Notification.objects.bulk_create(notifications)
+    logger.debug(f'Created {len(notifications)} notifications from {len(events)} outbox events')
@@ -0,0 +1,135 @@
+"""
+Denormalized per-user unread notification counts.
+
+``UnreadNotificationCounter`` holds one row per user, so badge polling is a
+primary-key read instead of counting the user's notification history.
+Counters move in the same transaction as the notifications they describe:
+creation (including ``bulk_create``) increments, ``mark_as_read`` decrements
+and ``mark_all_as_read`` resets. A user without a row is counted once on
+first read, and ``reconcile_unread_counters`` repairs any drift. Every change
+is also announced to open notification streams (see ``realtime``).
+"""
+import logging
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .realtime import publish_created, publish_unread_changed
+
+logger = logging.getLogger(__name__)
+
+
+def count_unread(user_id):
+    """Unread notifications for a user, counted from the notifications table."""
+    from .models import Notification
+
+    return Notification.objects.filter(user_id=user_id).exclude(status='read').count()
+
+
+def get_unread_count(user_id):
+    """Current unread count, creating the user's counter on first use."""
+    from .models import UnreadNotificationCounter
+
+    count = UnreadNotificationCounter.objects.filter(user_id=user_id).values_list('count', flat=True).first()
+    if count is None:
+        counter, _ = UnreadNotificationCounter.objects.get_or_create(
+            user_id=user_id,
+            defaults={'count': count_unread(user_id)}
+        )
+        count = counter.count
+    return count
+
+
+def increment_unread(notifications):
+    """
+    Add newly created unread notifications to their users' counters.
+
+    Users are grouped by increment so a bulk send costs one UPDATE per
+    distinct count. Users without a counter are skipped; their first read
+    counts them.
+    """
+    from .models import UnreadNotificationCounter
+
+    unread = [n for n in notifications if n.status != 'read']
+    per_user = Counter(n.user_id for n in unread)
+    by_increment = defaultdict(list)
+    for user_id, count in per_user.items():
+        by_increment[count].append(user_id)
+
+    now = timezone.now()
+    for count, user_ids in by_increment.items():
+        UnreadNotificationCounter.objects.filter(user_id__in=user_ids).update(
+            count=F('count') + count,
+            updated_at=now
+        )
+    publish_created(unread)
+
+
+def decrement_unread(user_id, count=1):
+    """Remove ``count`` read notifications from a user's counter."""
+    from .models import UnreadNotificationCounter
+
+    UnreadNotificationCounter.objects.filter(user_id=user_id).update(
+        count=Greatest(F('count') - count, Value(0)),
+        updated_at=timezone.now()
+    )
+    publish_unread_changed(user_id)
+
+
+def reset_unread(user_id):
+    """Zero a user's counter after all their notifications were read."""
+    from .models import UnreadNotificationCounter
+
+    UnreadNotificationCounter.objects.filter(user_id=user_id).update(count=0, updated_at=timezone.now())
+    publish_unread_changed(user_id)
+
+
+def reconcile_unread_counters(batch_size=1000):
+    """
+    Recount existing counters from the notifications table.
+
+    Counters are processed in user-id order, one grouped COUNT per batch.
+
+    Returns:
+        tuple: (checked, corrected) counts
+    """
+    from .models import Notification, UnreadNotificationCounter
+
+    checked = corrected = 0
+    last_user_id = None
+    while True:
+        counters = UnreadNotificationCounter.objects.order_by('user_id')
+        if last_user_id is not None:
+            counters = counters.filter(user_id__gt=last_user_id)
+        counters = list(counters[:batch_size])
+        if not counters:
+            break
+
+        actual = dict(
+            Notification.objects.filter(
+                user_id__in=[c.user_id for c in counters]
+            ).exclude(status='read').values('user_id').annotate(
+                unread=Count('id')
+            ).values_list('user_id', 'unread')
+        )
+
+        now = timezone.now()
+        stale = []
+        for counter in counters:
+            unread = actual.get(counter.user_id, 0)
+            if counter.count != unread:
+                counter.count = unread
+                counter.updated_at = now
+                stale.append(counter)
+        if stale:
+            UnreadNotificationCounter.objects.bulk_update(stale, ['count', 'updated_at'])
+
+        checked += len(counters)
+        corrected += len(stale)
+        last_user_id = counters[-1].user_id
+
+    if corrected:
+        logger.warning(f'Corrected {corrected} of {checked} unread notification counters')
+    return checked, corrected
@@ -0,0 +1,172 @@
+"""
+Notification digest and coalescing for GSTONGO.
+
+Reminder jobs create one notification per invoice or filing. Routed through
+``coalesce`` they are buffered as ``NotificationDigestItem`` rows instead;
+``flush_digests`` later sends each user one notification per channel and
+category: the original one when only a single item is waiting, otherwise a
+digest listing every item. Items record the notification they went out in
+(``digest_id``).
+"""
+import logging
+import uuid
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .dispatcher import enqueue
+from .models import Notification, NotificationDigestItem
+
+logger = logging.getLogger(__name__)
+
+DIGEST_LABELS = {
+    'payment_reminder': 'Payment Reminders',
+    'filing_reminder': 'GST Filing Reminders',
+    'filing_status': 'Filing Updates',
+    'invoice_generated': 'New Invoices',
+}
+
+# Items listed in a digest before "and N more"
+MAX_DIGEST_LINES = 10
+
+
+def digest_window():
+    return timedelta(minutes=getattr(settings, 'NOTIFICATION_DIGEST_WINDOW_MINUTES', 60))
+
+
+def coalesce(notifications, summaries=None):
+    """
+    Buffer notifications for digesting instead of sending them directly.
+
+    Args:
+        notifications: unsaved ``Notification`` instances
+        summaries: optional one-line text per notification for digests;
+            defaults to the notification message
+
+    Returns:
+        int: items buffered (or notifications enqueued when digests are off)
+    """
+    if not digest_window():
+        return len(enqueue(notifications))
+
+    summaries = summaries or [None] * len(notifications)
+    items = NotificationDigestItem.objects.bulk_create([
+        NotificationDigestItem(
+            user_id=notification.user_id,
+            channel=notification.channel,
+            category=notification.category,
+            title=notification.title,
+            message=notification.message,
+            summary=summary or notification.message,
+            reference_type=notification.reference_type,
+            reference_id=notification.reference_id,
+        )
+        for notification, summary in zip(notifications, summaries)
+    ])
+    return len(items)
+
+
+def build_digest(items):
+    """Notification for one (user, channel, category) group of items."""
+    first = items[0]
+    if len(items) == 1:
+        return Notification(
+            id=uuid.uuid4(),
+            user_id=first.user_id,
+            channel=first.channel,
+            category=first.category,
+            title=first.title,
+            message=first.message,
+            reference_type=first.reference_type,
+            reference_id=first.reference_id,
+        )
+
+    label = DIGEST_LABELS.get(first.category, 'Notifications')
+    lines = [f'- {item.summary}' for item in items[:MAX_DIGEST_LINES]]
+    if len(items) > MAX_DIGEST_LINES:
+        lines.append(f'...and {len(items) - MAX_DIGEST_LINES} more')
+    body = '\n'.join(lines)
+
+    if first.channel == 'email':
+        title = f'{label} ({len(items)}) - GSTONGO'
+        message = f'Dear {first.user.first_name},\n\nYou have {len(items)} updates:\n\n{body}\n\nBest regards,\nGSTONGO Team'
+    else:
+        title = f'{label} ({len(items)})'
+        message = body
+
+    digest_id = uuid.uuid4()
+    return Notification(
+        id=digest_id,
+        user_id=first.user_id,
+        channel=first.channel,
+        category=first.category,
+        title=title,
+        message=message,
+        reference_type='digest',
+        reference_id=digest_id,
+    )
+
+
+def flush_digests(now=None, batch_size=None):
+    """
+    Send every group whose oldest buffered item has waited a full window.
+
+    Groups are processed a batch of users at a time; item rows are locked
+    with SKIP LOCKED so concurrent flushes never send an item twice.
+
+    Returns:
+        tuple: (notifications sent, items coalesced)
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_BATCH_SIZE', 200)
+    cutoff = now - digest_window()
+
+    due = NotificationDigestItem.objects.filter(digest_id__isnull=True).values(
+        'user_id', 'channel', 'category'
+    ).annotate(oldest=Min('created_at')).filter(oldest__lte=cutoff)
+    due_groups = {(g['user_id'], g['channel'], g['category']) for g in due}
+    user_ids = sorted({user_id for user_id, _, _ in due_groups})
+
+    sent = coalesced = 0
+    for start in range(0, len(user_ids), batch_size):
+        with transaction.atomic():
+            items = list(
+                NotificationDigestItem.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+                    digest_id__isnull=True,
+                    user_id__in=user_ids[start:start + batch_size],
+                    created_at__lte=now
+                ).select_related('user').order_by('user_id', 'channel', 'category', 'created_at')
+            )
+
+            notifications = []
+            flushed = []
+            for key, group in groupby(items, key=lambda i: (i.user_id, i.channel, i.category)):
+                if key not in due_groups:
+                    continue
+                group = list(group)
+                notification = build_digest(group)
+                for item in group:
+                    item.digest_id = notification.id
+                notifications.append(notification)
+                flushed.extend(group)
+
+            enqueue(notifications)
+            NotificationDigestItem.objects.bulk_update(flushed, ['digest_id'], batch_size=1000)
+
+        sent += len(notifications)
+        coalesced += len(flushed)
+    return sent, coalesced
+
+
+def purge_flushed_items(days=None):
+    """Delete items whose digest went out more than ``days`` ago."""
+    days = days or getattr(settings, 'NOTIFICATION_DIGEST_RETENTION_DAYS', 30)
+    deleted, _ = NotificationDigestItem.objects.filter(
+        digest_id__isnull=False,
+        created_at__lt=timezone.now() - timedelta(days=days)
+    ).delete()
+    return deleted
@@ -0,0 +1,181 @@
+"""
+Bulk notification dispatcher for GSTONGO.
+
+Send paths only persist ``pending`` notifications (see ``enqueue``). The
+dispatcher claims due rows in batches with ``SELECT ... FOR UPDATE SKIP
+LOCKED``, so any number of workers can drain the table concurrently, sends
+each channel group through its batched provider and records the outcome
+in bulk. Failed sends are retried with exponential backoff until
+``NOTIFICATION_MAX_RETRIES``.
+"""
+import logging
+from datetime import timedelta
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Notification
+from .providers import DeliveryFailure, get_provider
+
+logger = logging.getLogger(__name__)
+
+# A claimed row becomes claimable again if its worker dies mid-send
+CLAIM_LEASE = timedelta(minutes=5)
+
+
+def enqueue(notifications, realtime=False):
+    """
+    Persist notifications for delivery and schedule a dispatch after commit.
+
+    Args:
+        notifications: unsaved ``Notification`` instances
+        realtime: dispatch these rows on the realtime queue (OTPs, direct sends)
+
+    Returns:
+        list: the created notifications
+    """
+    notifications = Notification.objects.bulk_create(notifications)
+    if notifications:
+        ids = [str(n.id) for n in notifications] if realtime else None
+        transaction.on_commit(lambda: schedule_dispatch(ids))
+    return notifications
+
+
+def schedule_dispatch(notification_ids=None):
+    """Ask a worker to dispatch now rather than on the next beat."""
+    from apps.core import queues
+    from .tasks import dispatch_notifications
+
+    queue = queues.REALTIME if notification_ids else queues.NOTIFICATIONS_BULK
+    try:
+        dispatch_notifications.apply_async(kwargs={'notification_ids': notification_ids}, queue=queue)
+    except Exception as e:
+        # The periodic dispatcher picks the rows up regardless.
+        logger.warning(f'Could not schedule notification dispatch: {e}')
+
+
+def retry_delay(retry_count):
+    base = getattr(settings, 'NOTIFICATION_RETRY_BASE_SECONDS', 60)
+    return timedelta(seconds=min(base * (2 ** max(retry_count - 1, 0)), 6 * 60 * 60))
+
+
+def claim_batch(limit, channels=None, notification_ids=None):
+    """
+    Claim up to ``limit`` due notifications.
+
+    Rows locked by another dispatcher are skipped; claimed rows are leased
+    by pushing ``next_attempt_at`` forward until their outcome is recorded.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = Notification.objects.select_for_update(skip_locked=True).filter(
+            Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now),
+            status='pending',
+        )
+        if channels:
+            queryset = queryset.filter(channel__in=channels)
+        if notification_ids is not None:
+            queryset = queryset.filter(id__in=notification_ids)
+
+        ids = list(queryset.order_by('created_at').values_list('id', flat=True)[:limit])
+        if ids:
+            Notification.objects.filter(id__in=ids).update(next_attempt_at=now + CLAIM_LEASE)
+
+    if not ids:
+        return []
+    return list(Notification.objects.filter(id__in=ids).select_related('user').order_by('channel', 'created_at'))
+
+
+def record_results(notifications, results):
+    """
+    Store delivery outcomes in bulk.
+
+    Status changes skip rows the user read while they were being sent, so a
+    read notification never goes back to unread.
+
+    Returns:
+        tuple: (sent, failed) counts
+    """
+    now = timezone.now()
+    max_retries = getattr(settings, 'NOTIFICATION_MAX_RETRIES', 5)
+
+    sent_ids = []
+    failed_ids = []
+    failed = []
+    deferred = []
+    for notification in notifications:
+        failure = results.get(notification.id, DeliveryFailure('No result from provider'))
+        if failure is None:
+            sent_ids.append(notification.id)
+            continue
+
+        notification.error_message = failure.error
+        notification.updated_at = now
+        if failure.retry_at is not None:
+            notification.next_attempt_at = failure.retry_at
+            deferred.append(notification)
+            continue
+
+        notification.retry_count += 1
+        if not failure.retryable or notification.retry_count >= max_retries:
+            failed_ids.append(notification.id)
+            notification.next_attempt_at = None
+        else:
+            notification.next_attempt_at = now + retry_delay(notification.retry_count)
+        failed.append(notification)
+
+    if sent_ids:
+        Notification.objects.filter(id__in=sent_ids).exclude(status='read').update(
+            status='sent',
+            sent_at=now,
+            error_message=None,
+            next_attempt_at=None,
+            updated_at=now,
+        )
+    if failed or deferred:
+        Notification.objects.bulk_update(
+            failed + deferred,
+            ['retry_count', 'error_message', 'next_attempt_at', 'updated_at']
+        )
+    if failed_ids:
+        Notification.objects.filter(id__in=failed_ids).exclude(status='read').update(status='failed')
+    return len(sent_ids), len(failed)
+
+
+def dispatch_batch(notifications):
+    """Send claimed notifications grouped by channel and record outcomes."""
+    results = {}
+    for channel, group in groupby(notifications, key=lambda n: n.channel):
+        group = list(group)
+        try:
+            results.update(get_provider(channel).send_batch(group))
+        except Exception as e:
+            logger.error(f'{channel} provider failed for a batch of {len(group)}: {e}')
+            results.update({n.id: DeliveryFailure(e) for n in group})
+    return record_results(notifications, results)
+
+
+def dispatch_pending(channels=None, notification_ids=None, batch_size=None, max_batches=None):
+    """
+    Claim and send due notifications until none remain or the run limit.
+
+    Returns:
+        tuple: (sent, failed) counts
+    """
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_BATCH_SIZE', 200)
+    max_batches = max_batches or getattr(settings, 'NOTIFICATION_MAX_BATCHES_PER_RUN', 50)
+
+    sent = failed = 0
+    for _ in range(max_batches):
+        notifications = claim_batch(batch_size, channels=channels, notification_ids=notification_ids)
+        if not notifications:
+            break
+        batch_sent, batch_failed = dispatch_batch(notifications)
+        sent += batch_sent
+        failed += batch_failed
+        if len(notifications) < batch_size:
+            break
+    return sent, failed
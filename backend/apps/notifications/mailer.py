@@ -0,0 +1,320 @@
+"""
+High-volume email delivery for GSTONGO notifications.
+
+Two transports sit behind ``EmailProvider``:
+
+- ``smtp``: a per-process pool of authenticated connections to the
+  configured email backend, reused across batches instead of one TLS
+  handshake per message.
+- ``sendgrid``: the SendGrid v3 API through django-sendgrid-v5, sending
+  every group of identical messages as one request with one
+  personalization per recipient.
+
+Both report per-recipient outcomes so failures land on
+``Notification.error_message``. ``EmailRateLimiter`` shapes sends to
+``EMAIL_RATE_LIMIT_PER_MINUTE`` across all workers.
+"""
+import json
+import logging
+import os
+import smtplib
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+
+from .providers import DeliveryFailure
+
+logger = logging.getLogger(__name__)
+
+# SendGrid accepts at most 1000 personalizations per request
+SENDGRID_MAX_RECIPIENTS = 1000
+
+
+class EmailRateLimiter:
+    """
+    Fixed-window per-minute send budget shared through the default cache.
+    """
+
+    def __init__(self, per_minute, prefix='email-rate'):
+        self.per_minute = per_minute
+        self.prefix = prefix
+
+    def reserve(self, count):
+        """
+        Reserve up to ``count`` sends in the current minute.
+
+        Returns:
+            tuple: (granted, retry_at) where ``retry_at`` is the start of the
+            next window for anything not granted
+        """
+        now = time.time()
+        window = int(now // 60)
+        retry_at = datetime.fromtimestamp((window + 1) * 60, tz=dt_timezone.utc)
+        if not self.per_minute or count <= 0:
+            return count, retry_at
+
+        key = f'{self.prefix}:{window}'
+        cache.add(key, 0, 120)
+        try:
+            used = cache.incr(key, count)
+        except ValueError:
+            # Window key expired between add and incr
+            cache.set(key, count, 120)
+            used = count
+        already_used = used - count
+        granted = max(0, min(count, self.per_minute - already_used))
+        return granted, retry_at
+
+
+class SMTPConnectionPool:
+    """
+    Pool of open email backend connections for one worker process.
+
+    Connections are recycled after ``max_messages`` sends or ``max_age``
+    seconds, and dropped when the server disconnects.
+    """
+
+    def __init__(self, size=4, max_messages=500, max_age=300):
+        self.size = size
+        self.max_messages = max_messages
+        self.max_age = max_age
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _new(self):
+        connection = get_connection(fail_silently=False)
+        connection.open()
+        connection.pool_opened_at = time.monotonic()
+        connection.pool_sent = 0
+        return connection
+
+    def _usable(self, connection):
+        if connection.pool_sent >= self.max_messages:
+            return False
+        if time.monotonic() - connection.pool_opened_at > self.max_age:
+            return False
+        smtp = getattr(connection, 'connection', None)
+        if smtp is not None:
+            try:
+                return smtp.noop()[0] == 250
+            except (smtplib.SMTPException, OSError):
+                return False
+        return True
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        with self._lock:
+            while self._idle:
+                connection = self._idle.pop()
+                if self._usable(connection):
+                    return connection
+                self._close(connection)
+        return self._new()
+
+    def release(self, connection, broken=False):
+        with self._lock:
+            if not broken and len(self._idle) < self.size and self._usable(connection):
+                self._idle.append(connection)
+                return
+        self._close(connection)
+
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        state = {'broken': False}
+        try:
+            yield connection, state
+        except Exception:
+            state['broken'] = True
+            raise
+        finally:
+            self.release(connection, broken=state['broken'])
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self._close(connection)
+
+
+_pools = {}
+
+
+def get_smtp_pool():
+    """Return this process's connection pool (pools never cross a fork)."""
+    pid = os.getpid()
+    if pid not in _pools:
+        _pools.clear()
+        _pools[pid] = SMTPConnectionPool(
+            size=getattr(settings, 'EMAIL_POOL_SIZE', 4),
+            max_messages=getattr(settings, 'EMAIL_POOL_MAX_MESSAGES', 500),
+            max_age=getattr(settings, 'EMAIL_POOL_MAX_AGE', 300),
+        )
+    return _pools[pid]
+
+
+def _refused_failure(error):
+    details = '; '.join(
+        f'{recipient}: {code} {message.decode(errors="replace") if isinstance(message, bytes) else message}'
+        for recipient, (code, message) in error.recipients.items()
+    )
+    return DeliveryFailure(f'Recipient refused - {details}', retryable=False)
+
+
+class SMTPTransport:
+    """Sends messages one by one over pooled connections."""
+
+    def send(self, messages):
+        """
+        Args:
+            messages: list of (key, EmailMessage)
+
+        Returns:
+            dict: key -> None or DeliveryFailure
+        """
+        results = {}
+        pending = list(messages)
+        pool = get_smtp_pool()
+
+        # One reconnect per batch on a dropped connection
+        for attempt in range(2):
+            if not pending:
+                break
+            retry = []
+            with pool.connection() as (connection, state):
+                for index, (key, message) in enumerate(pending):
+                    message.connection = connection
+                    try:
+                        connection.send_messages([message])
+                        connection.pool_sent += 1
+                        results[key] = None
+                    except smtplib.SMTPRecipientsRefused as e:
+                        results[key] = _refused_failure(e)
+                    except (smtplib.SMTPServerDisconnected, OSError) as e:
+                        state['broken'] = True
+                        if attempt == 0:
+                            retry = pending[index:]
+                        else:
+                            for rest_key, _ in pending[index:]:
+                                results[rest_key] = DeliveryFailure(e)
+                        break
+                    except smtplib.SMTPException as e:
+                        results[key] = DeliveryFailure(e)
+            pending = retry
+        return results
+
+
+def _sendgrid_errors(error):
+    """Split a SendGrid error body into ({personalization index: message}, summary)."""
+    try:
+        body = json.loads(getattr(error, 'body', b'') or b'{}')
+    except ValueError:
+        return {}, str(getattr(error, 'reason', error))
+    by_index = {}
+    general = []
+    for item in body.get('errors', []) if isinstance(body, dict) else []:
+        field = item.get('field') or ''
+        parts = field.split('.')
+        if len(parts) > 1 and parts[0] == 'personalizations' and parts[1].isdigit():
+            by_index[int(parts[1])] = item.get('message', 'Rejected')
+        else:
+            general.append(item.get('message', str(error)))
+    return by_index, '; '.join(general) or str(getattr(error, 'reason', error))
+
+
+class SendGridTransport:
+    """Sends identical messages as one SendGrid request per 1000 recipients."""
+
+    def __init__(self):
+        from sendgrid_backend.mail import SendgridBackend
+        self.backend = SendgridBackend(fail_silently=False)
+
+    def send(self, messages):
+        from python_http_client.exceptions import HTTPError
+        from sendgrid.helpers.mail import CustomArg, Email, Personalization
+
+        groups = defaultdict(list)
+        for key, message in messages:
+            groups[(message.subject, message.body, message.from_email)].append((key, message))
+
+        results = {}
+        for (subject, body, from_email), group in groups.items():
+            for start in range(0, len(group), SENDGRID_MAX_RECIPIENTS):
+                chunk = group[start:start + SENDGRID_MAX_RECIPIENTS]
+                personalizations = []
+                for key, message in chunk:
+                    personalization = Personalization()
+                    for address in message.to:
+                        personalization.add_to(Email(address))
+                    personalization.add_custom_arg(CustomArg('notification_id', str(key)))
+                    personalizations.append(personalization)
+
+                batch = EmailMessage(subject, body, from_email, to=[])
+                # The backend inserts each personalization at the front; reversing
+                # keeps the request order, and SendGrid's error indexes, on ``chunk``
+                batch.personalizations = personalizations[::-1]
+                try:
+                    self.backend.send_messages([batch])
+                except HTTPError as e:
+                    rejected, general = _sendgrid_errors(e)
+                    # A rejected recipient fails the whole request; the others
+                    # were not sent and can go out in a later batch.
+                    retryable = bool(rejected) or e.status_code == 429 or e.status_code >= 500
+                    for index, (key, _) in enumerate(chunk):
+                        if index in rejected:
+                            results[key] = DeliveryFailure(f'SendGrid rejected recipient: {rejected[index]}', retryable=False)
+                        elif rejected:
+                            results[key] = DeliveryFailure('Not sent: SendGrid rejected another recipient in the batch')
+                        else:
+                            results[key] = DeliveryFailure(f'SendGrid error {e.status_code}: {general}', retryable=retryable)
+                except Exception as e:
+                    for key, _ in chunk:
+                        results[key] = DeliveryFailure(e)
+                else:
+                    for key, _ in chunk:
+                        results[key] = None
+        return results
+
+
+TRANSPORTS = {
+    'smtp': SMTPTransport,
+    'sendgrid': SendGridTransport,
+}
+
+
+def get_transport():
+    return TRANSPORTS[getattr(settings, 'EMAIL_DELIVERY_TRANSPORT', 'smtp')]()
+
+
+def get_rate_limiter():
+    return EmailRateLimiter(getattr(settings, 'EMAIL_RATE_LIMIT_PER_MINUTE', 0))
+
+
+def deliver(messages):
+    """
+    Send (key, EmailMessage) pairs within the per-minute budget.
+
+    Returns:
+        dict: key -> None or DeliveryFailure; messages over budget are
+        deferred to the next window without counting as an attempt
+    """
+    granted, retry_at = get_rate_limiter().reserve(len(messages))
+    results = {
+        key: DeliveryFailure('Deferred by email rate limit', retry_at=retry_at)
+        for key, _ in messages[granted:]
+    }
+    if granted:
+        results.update(get_transport().send(messages[:granted]))
+    return results
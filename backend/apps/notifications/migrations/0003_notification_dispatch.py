@@ -0,0 +1,35 @@
+# Generated by Django 4.2.27 on 2026-10-19 02:40
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def mark_existing_sent(apps, schema_editor):
+    # Rows from before the dispatcher were handled by the old send paths,
+    # and in-app notifications stayed pending until read: none of them may
+    # be picked up and sent again.
+    Notification = apps.get_model('notifications', 'Notification')
+    Notification.objects.filter(status='pending').update(
+        status='sent',
+        sent_at=Coalesce('sent_at', 'created_at')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0002_add_user_field'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['status', 'next_attempt_at'], name='notificatio_status_55722f_idx'),
+        ),
+        migrations.RunPython(mark_existing_sent, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.27 on 2026-10-19 02:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_userprofile_reset_token_and_more'),
+        ('notifications', '0003_notification_dispatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadNotificationCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_notification_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Unread Notification Counter',
+                'verbose_name_plural': 'Unread Notification Counters',
+                'db_table': 'notification_unread_counters',
+            },
+        ),
+    ]
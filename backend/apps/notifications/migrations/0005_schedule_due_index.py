@@ -0,0 +1,17 @@
+# Generated by Django 4.2.27 on 2026-10-19 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_unread_counter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notificationschedule',
+            index=models.Index(fields=['is_active', 'next_run_at'], name='notificatio_is_acti_20aa8c_idx'),
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 4.2.27 on 2026-10-19 02:58
+
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from django.db import migrations, models
+from django.utils import timezone
+
+
+# Months created beyond the current one; later months come from the
+# maintain_notification_partitions task.
+PARTITIONS_AHEAD = 3
+
+
+def partition_notifications(apps, schema_editor):
+    """
+    Rebuild ``notifications`` as a table range-partitioned by month on created_at.
+
+    PostgreSQL only. Existing rows are copied into monthly partitions and the
+    primary key becomes (id, created_at), as partitioning requires; indexes
+    and foreign keys are recreated on the new table.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'notifications'::regclass")
+        if cursor.fetchone():
+            return
+
+        cursor.execute(
+            """
+            SELECT indexname, indexdef FROM pg_indexes
+            WHERE schemaname = current_schema() AND tablename = 'notifications'
+            AND indexname NOT IN (
+                SELECT conname FROM pg_constraint
+                WHERE conrelid = 'notifications'::regclass AND contype IN ('p', 'u')
+            )
+            """
+        )
+        indexes = cursor.fetchall()
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = 'notifications'::regclass AND contype IN ('p', 'f')
+            """
+        )
+        constraints = cursor.fetchall()
+        cursor.execute("SELECT min(created_at) FROM notifications")
+        oldest = cursor.fetchone()[0]
+
+        # Free index and constraint names for the new table
+        cursor.execute('ALTER TABLE notifications RENAME TO notifications_unpartitioned')
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {name}')
+        for name, _ in constraints:
+            cursor.execute(f'ALTER TABLE notifications_unpartitioned DROP CONSTRAINT {name}')
+
+        cursor.execute(
+            'CREATE TABLE notifications (LIKE notifications_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            'PARTITION BY RANGE (created_at)'
+        )
+        cursor.execute('ALTER TABLE notifications ADD CONSTRAINT notifications_pkey PRIMARY KEY (id, created_at)')
+
+        now = timezone.now()
+        month = date((oldest or now).year, (oldest or now).month, 1)
+        last = date(now.year, now.month, 1) + relativedelta(months=PARTITIONS_AHEAD)
+        while month <= last:
+            upper = month + relativedelta(months=1)
+            cursor.execute(
+                f'CREATE TABLE notifications_p{month.year:04d}_{month.month:02d} PARTITION OF notifications '
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{upper.isoformat()} 00:00:00+00')"
+            )
+            month = upper
+        cursor.execute('CREATE TABLE notifications_default PARTITION OF notifications DEFAULT')
+
+        cursor.execute('INSERT INTO notifications SELECT * FROM notifications_unpartitioned')
+        cursor.execute('DROP TABLE notifications_unpartitioned')
+
+        for _, definition in indexes:
+            cursor.execute(definition)
+        for name, definition in constraints:
+            if definition.startswith('FOREIGN KEY'):
+                cursor.execute(f'ALTER TABLE notifications ADD CONSTRAINT {name} {definition}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0005_schedule_due_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_notifications, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at'], name='notifications_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(condition=models.Q(('status', 'read'), _negated=True), fields=['user'], name='notifications_user_unread'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.27 on 2026-10-19 02:59
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0006_partition_notifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationDigestItem',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('channel', models.CharField(choices=[('email', 'Email'), ('sms', 'SMS'), ('push', 'Push'), ('whatsapp', 'WhatsApp')], max_length=20)),
+                ('category', models.CharField(choices=[('registration', 'Registration'), ('otp', 'OTP'), ('filing_reminder', 'Filing Reminder'), ('filing_status', 'Filing Status'), ('payment_reminder', 'Payment Reminder'), ('payment_received', 'Payment Received'), ('invoice_generated', 'Invoice Generated'), ('general', 'General')], max_length=30)),
+                ('title', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('summary', models.TextField()),
+                ('reference_type', models.CharField(blank=True, max_length=50, null=True)),
+                ('reference_id', models.UUIDField(blank=True, null=True)),
+                ('digest_id', models.UUIDField(blank=True, db_index=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_digest_items', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Notification Digest Item',
+                'verbose_name_plural': 'Notification Digest Items',
+                'db_table': 'notification_digest_items',
+                'indexes': [models.Index(condition=models.Q(('digest_id__isnull', True)), fields=['created_at'], name='digest_items_pending')],
+            },
+        ),
+    ]
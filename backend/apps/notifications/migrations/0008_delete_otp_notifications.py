@@ -0,0 +1,22 @@
+# Generated by Django 4.2.27 on 2026-10-19 04:10
+
+from django.db import migrations
+
+
+def delete_otp_notifications(apps, schema_editor):
+    # OTPs are sent without a notification row now; rows queued earlier
+    # still hold login codes and must not be listed, streamed or archived.
+    # Unread counters are repaired by the hourly reconciliation.
+    Notification = apps.get_model('notifications', 'Notification')
+    Notification.objects.filter(category='otp').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0007_digest_items'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_otp_notifications, migrations.RunPython.noop),
+    ]
@@ -2,7 +2,7 @@
 Notification models for GSTONGO.
 """
 import uuid
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.utils import timezone
 
@@ -52,6 +52,28 @@ class NotificationTemplate(models.Model):
     
     def __str__(self):
         return f"{self.name} ({self.template_type})"
+    
+    def clean(self):
+        """Reject templates that do not parse or use undeclared variables."""
+        from django.core.exceptions import ValidationError
+        from .templating import CompiledTemplate, TemplateVariableError
+        
+        try:
+            CompiledTemplate(self)
+        except TemplateVariableError as e:
+            raise ValidationError({'body': str(e)})
+
+
+class NotificationQuerySet(models.QuerySet):
+    """Keeps unread counters in step with bulk inserts."""
+    
+    def bulk_create(self, objs, *args, **kwargs):
+        from .counters import increment_unread
+        
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            increment_unread(objs)
+        return objs
 
 
 class Notification(models.Model):
@@ -100,6 +122,7 @@ class Notification(models.Model):
     # Error tracking
     error_message = models.TextField(null=True, blank=True)
     retry_count = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
     
     # Template used (if any)
     template = models.ForeignKey(
@@ -118,9 +141,30 @@ class Notification(models.Model):
         verbose_name = 'Notification'
         verbose_name_plural = 'Notifications'
         ordering = ['-created_at']
+        # On PostgreSQL the table is range-partitioned by created_at (see partitions)
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['user', '-created_at'], name='notifications_user_created'),
+            models.Index(
+                fields=['user'],
+                name='notifications_user_unread',
+                condition=~models.Q(status='read')
+            ),
+        ]
+    
+    objects = NotificationQuerySet.as_manager()
     
     def __str__(self):
         return f"{self.category} - {self.user.email} - {self.status}"
+    
+    def save(self, *args, **kwargs):
+        from .counters import increment_unread
+        
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                increment_unread([self])
 
 
 class NotificationSchedule(models.Model):
@@ -182,11 +226,76 @@ class NotificationSchedule(models.Model):
         db_table = 'notification_schedules'
         verbose_name = 'Notification Schedule'
         verbose_name_plural = 'Notification Schedules'
+        indexes = [
+            models.Index(fields=['is_active', 'next_run_at']),
+        ]
     
     def __str__(self):
         return f"{self.name} ({self.trigger_type})"
 
 
+class UnreadNotificationCounter(models.Model):
+    """Denormalized unread notification count per user (see ``counters``)."""
+    
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='unread_notification_counter'
+    )
+    count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'notification_unread_counters'
+        verbose_name = 'Unread Notification Counter'
+        verbose_name_plural = 'Unread Notification Counters'
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.count}"
+
+
+class NotificationDigestItem(models.Model):
+    """Notification buffered for coalescing into a digest (see ``digest``)."""
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='notification_digest_items'
+    )
+    channel = models.CharField(max_length=20, choices=Notification.NOTIFICATION_CHANNELS)
+    category = models.CharField(max_length=30, choices=NotificationTemplate.NOTIFICATION_CATEGORIES)
+    
+    # Content if sent on its own, and its line in a digest
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    summary = models.TextField()
+    
+    reference_type = models.CharField(max_length=50, null=True, blank=True)
+    reference_id = models.UUIDField(null=True, blank=True)
+    
+    # Notification the item was sent in, once flushed
+    digest_id = models.UUIDField(null=True, blank=True, db_index=True)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'notification_digest_items'
+        verbose_name = 'Notification Digest Item'
+        verbose_name_plural = 'Notification Digest Items'
+        indexes = [
+            models.Index(
+                fields=['created_at'],
+                name='digest_items_pending',
+                condition=models.Q(digest_id__isnull=True)
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.category} - {self.user_id} - {self.channel}"
+
+
 class FCMToken(models.Model):
     """Firebase Cloud Messaging tokens for push notifications."""
     
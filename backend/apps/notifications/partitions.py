@@ -0,0 +1,166 @@
+"""
+Monthly partition maintenance for the notifications table.
+
+On PostgreSQL the ``notifications`` table is range-partitioned by
+``created_at`` into one partition per calendar month (UTC), named
+``notifications_pYYYY_MM``, plus a default partition. ``ensure_partitions``
+creates upcoming months ahead of time; ``archive_old_partitions`` detaches
+partitions past the retention window, writes each to a gzip-compressed CSV
+file and drops it. On other databases (e.g. SQLite in tests) these are no-ops.
+"""
+import gzip
+import logging
+import os
+import re
+from datetime import date
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = 'notifications'
+PARTITION_PATTERN = re.compile(r'^notifications_p(\d{4})_(\d{2})$')
+
+
+def partition_name(month):
+    return f'{PARENT_TABLE}_p{month.year:04d}_{month.month:02d}'
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def is_partitioned():
+    """True when the notifications table is a partitioned PostgreSQL table."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)',
+            [PARENT_TABLE]
+        )
+        return cursor.fetchone() is not None
+
+
+def list_partitions():
+    """
+    Monthly partitions attached to the notifications table.
+
+    Returns:
+        list: (month start date, partition name) tuples, oldest first
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            """,
+            [PARENT_TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = []
+    for name in names:
+        match = PARTITION_PATTERN.match(name)
+        if match:
+            partitions.append((date(int(match.group(1)), int(match.group(2)), 1), name))
+    return sorted(partitions)
+
+
+def partition_bounds(month):
+    """``FOR VALUES`` clause of the partition for ``month``."""
+    upper = month + relativedelta(months=1)
+    return f"FOR VALUES FROM ('{month.isoformat()} 00:00:00+00') TO ('{upper.isoformat()} 00:00:00+00')"
+
+
+def create_partition(cursor, month):
+    """Create the partition for ``month`` if it does not exist yet."""
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT_TABLE} {partition_bounds(month)}'
+    )
+
+
+def ensure_partitions(months_ahead=None):
+    """
+    Create partitions for the current month and the next ``months_ahead``.
+
+    Returns:
+        int: partitions checked
+    """
+    if not is_partitioned():
+        return 0
+    months_ahead = months_ahead if months_ahead is not None else getattr(
+        settings, 'NOTIFICATION_PARTITIONS_AHEAD', 3
+    )
+    current = month_start(timezone.now())
+    with connection.cursor() as cursor:
+        for offset in range(months_ahead + 1):
+            create_partition(cursor, current + relativedelta(months=offset))
+    return months_ahead + 1
+
+
+def archive_partition(name, archive_dir):
+    """
+    Detach a partition, export it to ``<archive_dir>/<name>.csv.gz`` and drop it.
+
+    The detach commits on its own, so the exclusive lock it takes on the
+    notifications table is held only briefly and reads and inserts carry on
+    during the export. A failed export attaches the partition again.
+
+    Returns:
+        str: path of the archive file
+    """
+    match = PARTITION_PATTERN.match(name)
+    month = date(int(match.group(1)), int(match.group(2)), 1)
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f'{name}.csv.gz')
+    partial_path = f'{path}.partial'
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}')
+
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            with gzip.open(partial_path, 'wb') as archive:
+                cursor.cursor.copy_expert(f'COPY {name} TO STDOUT WITH (FORMAT csv, HEADER)', archive)
+        os.replace(partial_path, path)
+    except Exception:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} {partition_bounds(month)}')
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE {name}')
+    return path
+
+
+def archive_old_partitions(retention_months=None, archive_dir=None):
+    """
+    Archive every monthly partition older than the retention window.
+
+    Returns:
+        list: paths of the archive files written
+    """
+    if not is_partitioned():
+        return []
+    retention_months = retention_months or getattr(settings, 'NOTIFICATION_RETENTION_MONTHS', 12)
+    archive_dir = archive_dir or getattr(
+        settings, 'NOTIFICATION_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archives', 'notifications')
+    )
+    cutoff = month_start(timezone.now()) - relativedelta(months=retention_months)
+
+    archived = []
+    for month, name in list_partitions():
+        if month >= cutoff:
+            break
+        path = archive_partition(name, archive_dir)
+        logger.info(f'Archived notification partition {name} to {path}')
+        archived.append(path)
+    return archived
@@ -0,0 +1,155 @@
+"""
+Batched delivery adapters for notification channels.
+
+Each provider takes a list of claimed ``Notification`` rows (with ``user``
+loaded) for one channel and returns a mapping of notification id to
+``None`` on success or a ``DeliveryFailure``.
+"""
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryFailure:
+    """
+    Failed delivery of one notification.
+
+    ``retry_at`` defers the notification (e.g. rate limiting) without
+    counting an attempt against its retries.
+    """
+
+    def __init__(self, error, retryable=True, retry_at=None):
+        self.error = str(error)
+        self.retryable = retryable
+        self.retry_at = retry_at
+
+    def __repr__(self):
+        return f'DeliveryFailure({self.error!r}, retryable={self.retryable}, retry_at={self.retry_at})'
+
+
+class NotificationProvider:
+    """Base class for channel adapters."""
+
+    channel = None
+
+    def send_batch(self, notifications):
+        raise NotImplementedError
+
+
+class EmailProvider(NotificationProvider):
+    """
+    Sends a batch through the configured email transport (pooled SMTP or
+    SendGrid, see ``mailer``) within the per-minute rate limit.
+    """
+
+    channel = 'email'
+
+    def send_batch(self, notifications):
+        from django.core.mail import EmailMessage
+        from .mailer import deliver
+
+        results = {}
+        messages = []
+        for notification in notifications:
+            if not notification.user.email:
+                results[notification.id] = DeliveryFailure('User has no email address.', retryable=False)
+                continue
+            messages.append((notification.id, EmailMessage(
+                notification.title,
+                notification.message,
+                settings.DEFAULT_FROM_EMAIL,
+                [notification.user.email],
+            )))
+
+        if messages:
+            results.update(deliver(messages))
+        return results
+
+
+class SMSProvider(NotificationProvider):
+    """Sends a batch through one Twilio client."""
+
+    channel = 'sms'
+
+    def send_batch(self, notifications):
+        account_sid = getattr(settings, 'TWILIO_ACCOUNT_SID', None)
+        auth_token = getattr(settings, 'TWILIO_AUTH_TOKEN', None)
+        if not (account_sid and auth_token):
+            return {n.id: DeliveryFailure('Twilio not configured') for n in notifications}
+
+        from twilio.rest import Client
+        client = Client(account_sid, auth_token)
+
+        results = {}
+        for notification in notifications:
+            if not notification.user.phone_number:
+                results[notification.id] = DeliveryFailure('User has no phone number.', retryable=False)
+                continue
+            try:
+                client.messages.create(
+                    body=notification.message,
+                    from_=settings.TWILIO_PHONE_NUMBER,
+                    to=str(notification.user.phone_number)
+                )
+                results[notification.id] = None
+            except Exception as e:
+                results[notification.id] = DeliveryFailure(e)
+        return results
+
+
+class PushProvider(NotificationProvider):
+    """Fans a batch out over FCM multicasts (see ``push``)."""
+
+    channel = 'push'
+
+    def send_batch(self, notifications):
+        from .push import send_push_notifications
+        return send_push_notifications(notifications)
+
+
+class WhatsAppProvider(NotificationProvider):
+    """Sends a batch concurrently through ``WhatsAppService.send_bulk``."""
+
+    channel = 'whatsapp'
+
+    def send_batch(self, notifications):
+        from .whatsapp import WhatsAppService
+
+        service = WhatsAppService()
+        if not service.is_configured():
+            return {n.id: DeliveryFailure('WhatsApp is not configured') for n in notifications}
+
+        results = {}
+        recipients = []
+        for notification in notifications:
+            if not notification.user.phone_number:
+                results[notification.id] = DeliveryFailure('User has no phone number.', retryable=False)
+                continue
+            recipients.append(notification)
+
+        responses = service.send_bulk([
+            service.build_text_payload(str(n.user.phone_number), n.message)
+            for n in recipients
+        ])
+        for notification, response in zip(recipients, responses):
+            if response.get('success'):
+                results[notification.id] = None
+            else:
+                # 4xx other than throttling means the request itself is bad
+                status_code = response.get('status_code')
+                retryable = status_code is None or status_code == 429 or status_code >= 500
+                results[notification.id] = DeliveryFailure(response.get('error'), retryable=retryable)
+        return results
+
+
+PROVIDERS = {
+    provider.channel: provider
+    for provider in [EmailProvider, SMSProvider, PushProvider, WhatsAppProvider]
+}
+
+
+def get_provider(channel):
+    """Return a provider instance for ``channel``."""
+    return PROVIDERS[channel]()
@@ -0,0 +1,132 @@
+"""
+FCM push fan-out for GSTONGO notifications.
+
+Notifications with the same title and body are sent together: their
+recipients' device tokens are packed into multicast calls of up to
+``FCM_MULTICAST_LIMIT`` tokens, whatever user they belong to. Per-token
+responses are mapped back to the notifications they came from, and
+tokens FCM reports as unregistered or invalid are deactivated in bulk.
+"""
+import logging
+from collections import defaultdict
+
+from .providers import DeliveryFailure
+
+logger = logging.getLogger(__name__)
+
+# FCM accepts at most 500 tokens per multicast message
+FCM_MULTICAST_LIMIT = 500
+
+# Error codes meaning the token will never work again
+DEAD_TOKEN_CODES = {'UNREGISTERED', 'INVALID_ARGUMENT'}
+
+
+def is_dead_token_error(exception):
+    """True when FCM says the token is unregistered or malformed."""
+    from firebase_admin import messaging
+
+    if isinstance(exception, messaging.UnregisteredError):
+        return True
+    return getattr(exception, 'code', None) in DEAD_TOKEN_CODES
+
+
+def deactivate_tokens(tokens):
+    """Bulk-deactivate dead FCM tokens; returns the number updated."""
+    from .models import FCMToken
+
+    if not tokens:
+        return 0
+    return FCMToken.objects.filter(token__in=tokens, is_active=True).update(is_active=False)
+
+
+def send_multicast(title, body, tokens):
+    """
+    Send one message to many tokens in chunks of ``FCM_MULTICAST_LIMIT``.
+
+    Returns:
+        dict: token -> None on success or the exception FCM returned
+    """
+    from firebase_admin import messaging
+
+    outcomes = {}
+    for start in range(0, len(tokens), FCM_MULTICAST_LIMIT):
+        chunk = tokens[start:start + FCM_MULTICAST_LIMIT]
+        try:
+            response = messaging.send_each_for_multicast(messaging.MulticastMessage(
+                notification=messaging.Notification(title=title, body=body),
+                tokens=chunk,
+            ))
+        except Exception as e:
+            logger.error(f'FCM multicast of {len(chunk)} tokens failed: {e}')
+            outcomes.update({token: e for token in chunk})
+            continue
+        for token, send_response in zip(chunk, response.responses):
+            outcomes[token] = None if send_response.success else send_response.exception
+    return outcomes
+
+
+def send_push_notifications(notifications):
+    """
+    Deliver push notifications to every active device of each recipient.
+
+    Notifications for users without working devices are in-app only and
+    count as delivered. Otherwise a notification succeeds when at least one
+    of its devices accepted it.
+
+    Returns:
+        dict: notification id -> None or DeliveryFailure
+    """
+    from .models import FCMToken
+
+    tokens_by_user = defaultdict(list)
+    for user_id, token in FCMToken.objects.filter(
+        user_id__in={n.user_id for n in notifications},
+        is_active=True
+    ).values_list('user_id', 'token'):
+        tokens_by_user[user_id].append(token)
+
+    results = {}
+    groups = defaultdict(list)
+    for notification in notifications:
+        if not tokens_by_user.get(notification.user_id):
+            results[notification.id] = None
+        else:
+            groups[(notification.title, notification.message)].append(notification)
+
+    dead_tokens = set()
+    for (title, body), group in groups.items():
+        # Identical notifications to the same user share one send per device
+        token_owners = defaultdict(list)
+        for notification in group:
+            for token in tokens_by_user[notification.user_id]:
+                token_owners[token].append(notification)
+
+        outcomes = send_multicast(title, body, list(token_owners))
+
+        errors = defaultdict(list)
+        delivered = set()
+        for token, exception in outcomes.items():
+            if exception is not None and is_dead_token_error(exception):
+                dead_tokens.add(token)
+            for notification in token_owners[token]:
+                if exception is None:
+                    delivered.add(notification.id)
+                else:
+                    errors[notification.id].append(exception)
+
+        for notification in group:
+            if notification.id in delivered:
+                results[notification.id] = None
+                continue
+            notification_errors = errors.get(notification.id, [])
+            if notification_errors and all(is_dead_token_error(e) for e in notification_errors):
+                # Every device is gone; like a user without devices it stays in-app only
+                results[notification.id] = None
+                continue
+            message = '; '.join(sorted({str(e) for e in notification_errors})) or 'Push delivery failed for all devices.'
+            results[notification.id] = DeliveryFailure(message)
+
+    deactivated = deactivate_tokens(dead_tokens)
+    if deactivated:
+        logger.info(f'Deactivated {deactivated} dead FCM tokens')
+    return results
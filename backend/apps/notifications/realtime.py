@@ -0,0 +1,180 @@
+"""
+Realtime notification fan-out for GSTONGO.
+
+Creation paths and unread-counter changes publish small JSON messages to one
+Redis pub/sub channel after their transaction commits. Each ASGI worker
+holds a single subscription (``broker``) and routes messages to the
+in-process queues of the users' open event streams, so an idle connection
+costs one asyncio queue rather than a Redis connection or a polling request.
+"""
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+import redis
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHANNEL = 'notifications:stream'
+
+# Messages per Redis pipeline when a bulk send publishes
+PUBLISH_CHUNK_SIZE = 1000
+
+# Larger batches (campaigns) only announce a count refresh per user
+FULL_PAYLOAD_LIMIT = 1000
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = redis.Redis.from_url(settings.REDIS_URL, socket_timeout=5)
+        return _client
+
+
+def stream_enabled():
+    """Whether messages go through Redis; off, streams only see local dispatches."""
+    return getattr(settings, 'NOTIFICATION_STREAM_ENABLED', True)
+
+
+def publish(messages):
+    """Publish messages to the stream channel; failures only cost realtime delivery."""
+    if not messages or not stream_enabled():
+        return
+    try:
+        client = _get_client()
+        for start in range(0, len(messages), PUBLISH_CHUNK_SIZE):
+            pipe = client.pipeline(transaction=False)
+            for message in messages[start:start + PUBLISH_CHUNK_SIZE]:
+                pipe.publish(STREAM_CHANNEL, json.dumps(message, cls=DjangoJSONEncoder))
+            pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f'Could not publish {len(messages)} notification stream messages: {e}')
+
+
+def notification_message(notification):
+    return {
+        'type': 'notification',
+        'user_id': str(notification.user_id),
+        'notification': {
+            'id': notification.id,
+            'channel': notification.channel,
+            'category': notification.category,
+            'title': notification.title,
+            'message': notification.message,
+            'reference_type': notification.reference_type,
+            'reference_id': notification.reference_id,
+            'created_at': notification.created_at,
+        },
+    }
+
+
+def publish_created(notifications):
+    """Announce new notifications once the creating transaction commits."""
+    if not notifications or not stream_enabled():
+        return
+    if len(notifications) > FULL_PAYLOAD_LIMIT:
+        messages = [
+            {'type': 'unread_count', 'user_id': str(user_id)}
+            for user_id in {n.user_id for n in notifications}
+        ]
+    else:
+        messages = [notification_message(n) for n in notifications]
+    transaction.on_commit(lambda: publish(messages))
+
+
+def publish_unread_changed(user_id):
+    """Tell a user's open streams to refresh their badge count."""
+    if not stream_enabled():
+        return
+    message = {'type': 'unread_count', 'user_id': str(user_id)}
+    transaction.on_commit(lambda: publish([message]))
+
+
+class NotificationBroker:
+    """
+    Per-process router from the Redis channel to open streams.
+
+    The subscription starts with the first stream and reconnects with
+    backoff. When a stream's queue overflows, or the subscription was
+    interrupted, its pending messages are replaced by a ``resync`` marker so
+    the client just refreshes its count.
+    """
+
+    def __init__(self):
+        self.listeners = defaultdict(set)
+        self._task = None
+        self._loop = None
+
+    def subscribe(self, user_id):
+        """Register a stream for ``user_id`` and return its message queue."""
+        loop = asyncio.get_running_loop()
+        listening = self._task is not None and not self._task.done() and self._loop is loop
+        if stream_enabled() and not listening:
+            self._loop = loop
+            self._task = loop.create_task(self._listen())
+        queue = asyncio.Queue(maxsize=getattr(settings, 'NOTIFICATION_STREAM_QUEUE_SIZE', 100))
+        self.listeners[str(user_id)].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self.listeners.get(str(user_id))
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self.listeners[str(user_id)]
+
+    @staticmethod
+    def _resync(queue):
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait({'type': 'resync'})
+
+    def dispatch(self, raw):
+        """Route one published message to the recipient's local streams."""
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            logger.warning('Dropped malformed notification stream message')
+            return
+        for queue in self.listeners.get(message.get('user_id'), ()):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._resync(queue)
+
+    async def _listen(self):
+        from redis import asyncio as aioredis
+
+        backoff = 1
+        while True:
+            client = aioredis.Redis.from_url(settings.REDIS_URL)
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(STREAM_CHANNEL)
+                    backoff = 1
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self.dispatch(message['data'])
+            except (redis.RedisError, OSError) as e:
+                logger.warning(f'Notification stream subscription lost: {e}')
+            finally:
+                await client.aclose()
+
+            # Messages may have been missed while disconnected
+            for queues in self.listeners.values():
+                for queue in queues:
+                    self._resync(queue)
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+
+broker = NotificationBroker()
@@ -0,0 +1,175 @@
+"""
+Executor for ``NotificationSchedule`` rules.
+
+Due schedules are claimed with ``SELECT ... FOR UPDATE SKIP LOCKED`` through
+the ``(is_active, next_run_at)`` index. Each run resolves its audience with a
+single set-based query, streams recipients in chunks, renders the linked
+template for a whole chunk at once and inserts the pending notifications
+with ``bulk_create`` for the dispatcher. The notifications and the advanced
+``next_run_at`` commit in one transaction, so a run either happens
+completely or not at all.
+"""
+import logging
+
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .dispatcher import schedule_dispatch
+from .models import Notification, NotificationSchedule
+from .templating import TemplateVariableError, build_notifications
+
+logger = logging.getLogger(__name__)
+
+RECURRENCE_STEPS = {
+    'daily': relativedelta(days=1),
+    'weekly': relativedelta(weeks=1),
+    'monthly': relativedelta(months=1),
+    'yearly': relativedelta(years=1),
+}
+
+# Fields read per recipient; also the template variables schedules provide
+AUDIENCE_FIELDS = ('id', 'email', 'first_name', 'last_name')
+
+
+def next_occurrence(schedule, now):
+    """
+    Next run after ``now``, or None when the schedule is finished.
+
+    Missed occurrences are skipped rather than replayed.
+    """
+    step = RECURRENCE_STEPS.get(schedule.recurrence)
+    if schedule.schedule_type != 'recurring' or step is None:
+        return None
+    run_at = schedule.next_run_at
+    while run_at <= now:
+        run_at += step
+    return run_at
+
+
+def audience_queryset(schedule, today=None):
+    """
+    Users a schedule targets, as one query.
+
+    ``target_all_users`` selects every active user; otherwise the union of
+    users with a pending filing this month and users with overdue invoices.
+    For ``payment_based`` rules, ``trigger_days`` is how many days past the
+    due date an invoice must be.
+    """
+    from apps.gst_filing.models import GSTFiling
+    from apps.invoices.models import Invoice
+    from apps.users.models import User
+
+    today = today or timezone.localdate()
+    users = User.objects.filter(is_active=True)
+    if schedule.target_all_users:
+        return users
+
+    conditions = Q(pk__in=[])
+    if schedule.target_gst_filing_due:
+        conditions |= Q(Exists(GSTFiling.objects.filter(
+            user=OuterRef('pk'),
+            status='pending',
+            month=today.month,
+            year=today.year
+        )))
+    if schedule.target_payment_overdue:
+        overdue = Invoice.objects.filter(user=OuterRef('pk'), status='overdue')
+        if schedule.trigger_type == 'payment_based' and schedule.trigger_days:
+            overdue = overdue.filter(due_date__lte=today - relativedelta(days=schedule.trigger_days))
+        conditions |= Q(Exists(overdue))
+    return users.filter(conditions)
+
+
+def recipient_context(row, today):
+    """Template variables available to scheduled notifications."""
+    user_id, email, first_name, last_name = row
+    return {
+        'email': email,
+        'first_name': first_name,
+        'last_name': last_name,
+        'full_name': f'{first_name} {last_name}'.strip(),
+        'date': today.strftime('%d %B %Y'),
+        'month': today.strftime('%B %Y'),
+    }
+
+
+def execute_schedule(schedule, now=None, chunk_size=None):
+    """
+    Send one schedule's notifications; call inside the claiming transaction.
+
+    Returns:
+        int: notifications created
+    """
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    chunk_size = chunk_size or getattr(settings, 'NOTIFICATION_SCHEDULE_CHUNK_SIZE', 5000)
+
+    recipients = audience_queryset(schedule, today).order_by('pk').values_list(*AUDIENCE_FIELDS)
+    created = 0
+    chunk = []
+    for row in recipients.iterator(chunk_size=chunk_size):
+        chunk.append((row[0], recipient_context(row, today)))
+        if len(chunk) >= chunk_size:
+            created += len(Notification.objects.bulk_create(build_notifications(schedule.template, chunk)))
+            chunk = []
+    if chunk:
+        created += len(Notification.objects.bulk_create(build_notifications(schedule.template, chunk)))
+
+    if created:
+        # One dispatch for the whole run rather than one per chunk
+        transaction.on_commit(schedule_dispatch)
+    return created
+
+
+def run_due_schedules(now=None, limit=None):
+    """
+    Execute every due schedule, one transaction each.
+
+    A run that cannot render (no active template, or a template variable
+    error) leaves the schedule untouched, so it runs on the first beat after
+    the template is fixed instead of being used up.
+
+    Returns:
+        tuple: (schedules run, notifications created)
+    """
+    now = now or timezone.now()
+    limit = limit or getattr(settings, 'NOTIFICATION_SCHEDULES_PER_RUN', 20)
+
+    runs = created = 0
+    failed = []
+    while runs < limit:
+        with transaction.atomic():
+            schedule = NotificationSchedule.objects.select_for_update(skip_locked=True, of=('self',)).filter(
+                is_active=True,
+                next_run_at__lte=now
+            ).exclude(pk__in=failed).select_related('template').order_by('next_run_at').first()
+            if schedule is None:
+                break
+
+            if schedule.template is None or not schedule.template.is_active:
+                logger.warning(f'Schedule {schedule.name} has no active template; will retry next run')
+                failed.append(schedule.pk)
+                continue
+            try:
+                with transaction.atomic():
+                    count = execute_schedule(schedule, now=now)
+            except TemplateVariableError as e:
+                logger.error(f'Schedule {schedule.name} not sent: {e}; will retry next run')
+                failed.append(schedule.pk)
+                continue
+
+            next_run_at = next_occurrence(schedule, now)
+            NotificationSchedule.objects.filter(pk=schedule.pk).update(
+                last_run_at=now,
+                next_run_at=next_run_at,
+                is_active=next_run_at is not None,
+                updated_at=timezone.now()
+            )
+
+        runs += 1
+        created += count
+        logger.info(f'Schedule {schedule.name} sent {count} notifications; next run {next_run_at}')
+    return runs, created
@@ -0,0 +1,87 @@
+"""
+Celery tasks for Notifications app.
+"""
+import logging
+from celery import shared_task
+
+from apps.core import queues
+from apps.core.metrics import report_rows
+from apps.core.task_guards import exclusive_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, queue=queues.NOTIFICATIONS_BULK)
+def dispatch_notifications(self, notification_ids=None, channels=None):
+    """
+    Deliver pending notifications in batches.
+    Safe to run on many workers at once; rows are claimed with SKIP LOCKED.
+    """
+    from .dispatcher import dispatch_pending
+    
+    sent, failed = dispatch_pending(channels=channels, notification_ids=notification_ids)
+    
+    report_rows(sent + failed)
+    logger.info(f'Notification dispatch: {sent} sent, {failed} failed')
+    return f'{sent} sent, {failed} failed'
+
+
+@shared_task(bind=True, queue=queues.NOTIFICATIONS_BULK)
+def run_notification_schedules(self):
+    """
+    Execute due NotificationSchedule rules.
+    Safe to run on many workers at once; schedules are claimed with SKIP LOCKED.
+    """
+    from .scheduler import run_due_schedules
+    
+    runs, created = run_due_schedules()
+    
+    report_rows(created)
+    logger.info(f'Notification schedules: {runs} run, {created} notifications queued')
+    return f'{runs} schedules run, {created} notifications queued'
+
+
+@shared_task(bind=True, queue=queues.NOTIFICATIONS_BULK)
+def flush_notification_digests(self):
+    """
+    Send buffered reminder items as one notification per user, channel and category.
+    """
+    from .digest import flush_digests, purge_flushed_items
+    
+    sent, coalesced = flush_digests()
+    purged = purge_flushed_items()
+    
+    report_rows(coalesced)
+    logger.info(f'Digests: {coalesced} items sent as {sent} notifications; {purged} old items purged')
+    return f'{coalesced} items sent as {sent} notifications'
+
+
+@shared_task(bind=True, queue=queues.MAINTENANCE)
+@exclusive_task(period='hourly')
+def reconcile_unread_counters(self):
+    """
+    Recount denormalized unread counters and fix any drift.
+    """
+    from .counters import reconcile_unread_counters as reconcile
+    
+    checked, corrected = reconcile()
+    
+    report_rows(checked)
+    logger.info(f'Unread counters reconciled: {checked} checked, {corrected} corrected')
+    return f'{corrected} of {checked} counters corrected'
+
+
+@shared_task(bind=True, queue=queues.MAINTENANCE)
+@exclusive_task(period='daily')
+def maintain_notification_partitions(self):
+    """
+    Create upcoming monthly partitions and archive those past retention.
+    """
+    from .partitions import archive_old_partitions, ensure_partitions
+    
+    ensure_partitions()
+    archived = archive_old_partitions()
+    
+    report_rows(len(archived))
+    logger.info(f'Notification partitions maintained; {len(archived)} archived')
+    return f'{len(archived)} partitions archived'
@@ -0,0 +1,201 @@
+"""
+Compiled notification template rendering for GSTONGO.
+
+``NotificationTemplate`` rows are compiled once per process and cached by
+template id plus ``updated_at``, so an admin edit is picked up on the next
+render while unchanged templates are never parsed again. Contexts are
+checked against the template's declared ``variables`` and can be rendered
+thousands at a time with ``render_many``.
+"""
+import threading
+from collections import OrderedDict
+
+from django.template import Context, Engine, TemplateSyntaxError
+from django.template.base import VariableNode
+from django.template.defaulttags import ForNode, WithNode
+
+# Notifications are plain text: nothing is HTML-escaped
+_engine = Engine(autoescape=False)
+
+# Compiled templates kept per process
+CACHE_SIZE = 256
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class TemplateVariableError(ValueError):
+    """Template or context does not match the declared variables."""
+
+
+def _referenced_variables(template):
+    """
+    Root names of the context variables a compiled template uses.
+
+    Covers ``{{ variable }}`` nodes, ``{% for %}`` sequences and ``{% with %}``
+    values. Names bound by ``{% for %}`` (and ``forloop``) or ``{% with %}``
+    are not context variables inside their block and are left out.
+    """
+    names = set()
+
+    def add(filter_expression, bound):
+        lookups = getattr(filter_expression.var, 'lookups', None)
+        if lookups and lookups[0] not in bound:
+            names.add(lookups[0])
+
+    def visit(nodelist, bound):
+        for node in nodelist:
+            if isinstance(node, VariableNode):
+                add(node.filter_expression, bound)
+            elif isinstance(node, ForNode):
+                add(node.sequence, bound)
+                visit(node.nodelist_loop, bound | {*node.loopvars, 'forloop'})
+                visit(node.nodelist_empty, bound)
+            elif isinstance(node, WithNode):
+                for value in node.extra_context.values():
+                    add(value, bound)
+                visit(node.nodelist, bound | set(node.extra_context))
+            else:
+                for attr in node.child_nodelists:
+                    visit(getattr(node, attr, None) or (), bound)
+
+    visit(template.nodelist, frozenset())
+    return names
+
+
+class CompiledTemplate:
+    """Parsed subject and body of one ``NotificationTemplate`` version."""
+
+    def __init__(self, template):
+        self.template_id = template.id
+        self.updated_at = template.updated_at
+        self.name = template.name
+        self.variables = frozenset(template.variables or [])
+
+        try:
+            self.subject = _engine.from_string(template.subject) if template.subject else None
+            self.body = _engine.from_string(template.body)
+        except TemplateSyntaxError as e:
+            raise TemplateVariableError(f'Template "{template.name}" is invalid: {e}') from e
+
+        referenced = _referenced_variables(self.body)
+        if self.subject is not None:
+            referenced |= _referenced_variables(self.subject)
+        undeclared = referenced - self.variables
+        if undeclared:
+            raise TemplateVariableError(
+                f'Template "{template.name}" uses undeclared variables: {", ".join(sorted(undeclared))}'
+            )
+
+    def validate(self, context):
+        """Raise ``TemplateVariableError`` if a declared variable is missing."""
+        missing = self.variables.difference(context)
+        if missing:
+            raise TemplateVariableError(
+                f'Missing variables for template "{self.name}": {", ".join(sorted(missing))}'
+            )
+
+    def render(self, context):
+        """
+        Render one context.
+
+        Returns:
+            tuple: (subject or None, body)
+        """
+        self.validate(context)
+        ctx = Context(context, autoescape=False)
+        subject = self.subject.render(ctx) if self.subject is not None else None
+        return subject, self.body.render(ctx)
+
+    def render_many(self, contexts):
+        """
+        Render many contexts with the compiled template.
+
+        Returns:
+            list: one (subject or None, body) tuple per context, in order
+        """
+        variables = self.variables
+        subject = self.subject
+        body = self.body
+        rendered = []
+        for index, context in enumerate(contexts):
+            if not variables.issubset(context):
+                missing = ', '.join(sorted(variables.difference(context)))
+                raise TemplateVariableError(
+                    f'Missing variables for template "{self.name}" in context {index}: {missing}'
+                )
+            ctx = Context(context, autoescape=False)
+            rendered.append((subject.render(ctx) if subject is not None else None, body.render(ctx)))
+        return rendered
+
+
+def get_compiled(template):
+    """
+    Return the compiled version of a ``NotificationTemplate``.
+
+    The cache holds one version per template; a newer ``updated_at``
+    replaces it.
+    """
+    key = (template.id, template.updated_at)
+    with _cache_lock:
+        compiled = _cache.get(template.id)
+        if compiled is not None and (compiled.template_id, compiled.updated_at) == key:
+            _cache.move_to_end(template.id)
+            return compiled
+
+    compiled = CompiledTemplate(template)
+    with _cache_lock:
+        _cache[template.id] = compiled
+        _cache.move_to_end(template.id)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
+
+
+def clear_cache():
+    """Drop every compiled template held by this process."""
+    with _cache_lock:
+        _cache.clear()
+
+
+def get_active_template(category, template_type):
+    """Most recently edited active template for a category and channel, or None."""
+    from .models import NotificationTemplate
+
+    return NotificationTemplate.objects.filter(
+        category=category,
+        template_type=template_type,
+        is_active=True
+    ).order_by('-updated_at').first()
+
+
+def build_notifications(template, recipients, **fields):
+    """
+    Render a template for many recipients as unsaved notifications.
+
+    Args:
+        template: ``NotificationTemplate`` to render
+        recipients: iterable of (user id, context) pairs
+        fields: extra ``Notification`` fields, e.g. ``reference_type``
+
+    Returns:
+        list: unsaved ``Notification`` instances, ready for ``enqueue``
+    """
+    from .models import Notification
+
+    recipients = list(recipients)
+    compiled = get_compiled(template)
+    rendered = compiled.render_many([context for _, context in recipients])
+
+    return [
+        Notification(
+            user_id=user_id,
+            channel=template.template_type,
+            category=template.category,
+            title=(subject or template.name)[:255],
+            message=body,
+            template=template,
+            **fields
+        )
+        for (user_id, _), (subject, body) in zip(recipients, rendered)
+    ]
@@ -0,0 +1,1040 @@
+"""
+Unit tests for Notifications app.
+"""
+import asyncio
+import gzip
+import json
+import os
+import socketserver
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import skipUnless
+from unittest.mock import MagicMock, patch
+
+from dateutil.relativedelta import relativedelta
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from firebase_admin import exceptions, messaging
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.notifications import mailer
+from apps.notifications.digest import coalesce, flush_digests
+from apps.notifications.dispatcher import claim_batch, dispatch_batch, enqueue, retry_delay
+from apps.notifications.counters import get_unread_count, reconcile_unread_counters
+from apps.notifications.mailer import EmailRateLimiter, SendGridTransport, SMTPTransport, deliver, get_smtp_pool
+from apps.notifications.partitions import (
+    archive_old_partitions, create_partition, ensure_partitions, list_partitions, month_start, partition_name,
+)
+from apps.notifications.models import (
+    FCMToken, Notification, NotificationDigestItem, NotificationSchedule,
+    NotificationTemplate, UnreadNotificationCounter,
+)
+from apps.notifications.providers import DeliveryFailure
+from apps.notifications.push import send_push_notifications
+from apps.notifications.realtime import broker
+from apps.notifications.scheduler import run_due_schedules
+from apps.notifications.templating import (
+    TemplateVariableError, build_notifications, clear_cache, get_compiled,
+)
+from apps.notifications.whatsapp import TokenBucket, WhatsAppService
+from apps.users.models import User
+
+
+class FakeProvider:
+    """Provider returning preset results and recording each batch."""
+
+    def __init__(self, results):
+        self.results = results
+        self.batches = []
+
+    def send_batch(self, notifications):
+        self.batches.append([n.id for n in notifications])
+        return {n.id: self.results.get(n.title) for n in notifications}
+
+
+@override_settings(NOTIFICATION_MAX_RETRIES=3, NOTIFICATION_RETRY_BASE_SECONDS=60)
+class DispatcherTests(TestCase):
+    """Test cases for the bulk notification dispatcher."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='dispatch@example.com', password='testpass123')
+
+    def notification(self, title, channel='email', **fields):
+        return Notification.objects.create(
+            user=self.user, channel=channel, category='general', title=title, message='Body', **fields
+        )
+
+    def test_enqueue_schedules_dispatch_after_commit(self):
+        """Test enqueued rows are dispatched once the transaction commits."""
+        with patch('apps.notifications.dispatcher.schedule_dispatch') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                enqueue([Notification(user=self.user, channel='email', category='general', title='A', message='B')])
+                schedule.assert_not_called()
+            schedule.assert_called_once_with(None)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                created = enqueue([Notification(user=self.user, channel='sms', category='otp', title='C', message='D')],
+                                  realtime=True)
+            schedule.assert_called_with([str(created[0].id)])
+
+    def test_otps_are_sent_without_a_notification_row(self):
+        """Test login codes go straight to the provider and are never stored."""
+        from apps.users.views import send_email_otp
+
+        provider = FakeProvider({})
+        with patch('apps.notifications.providers.get_provider', return_value=provider) as get_provider:
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                self.assertTrue(send_email_otp(self.user, '123456'))
+
+        get_provider.assert_called_once_with('email')
+        self.assertEqual(len(provider.batches), 1)
+        self.assertEqual(callbacks, [])
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(get_unread_count(self.user.id), 0)
+
+        provider.results = {'Your GSTONGO Verification Code': DeliveryFailure('SMTP down')}
+        with patch('apps.notifications.providers.get_provider', return_value=provider):
+            self.assertFalse(send_email_otp(self.user, '654321'))
+
+    def test_claim_batch_leases_due_rows(self):
+        """Test claims take due pending rows oldest first and lease them."""
+        first = self.notification('first')
+        second = self.notification('second')
+        third = self.notification('third')
+        self.notification('sent', status='sent')
+        self.notification('later', next_attempt_at=timezone.now() + timedelta(hours=1))
+
+        self.assertEqual([n.id for n in claim_batch(2)], [first.id, second.id])
+        first.refresh_from_db()
+        self.assertGreater(first.next_attempt_at, timezone.now())
+
+        # Leased rows are not claimed again until the lease expires
+        self.assertEqual([n.id for n in claim_batch(10)], [third.id])
+        self.assertEqual(claim_batch(10), [])
+        Notification.objects.filter(id=first.id).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual([n.id for n in claim_batch(10)], [first.id])
+
+        self.assertEqual(claim_batch(10, channels=['sms']), [])
+
+    @skipUnlessDBFeature('has_select_for_update_skip_locked')
+    def test_claim_batch_skips_locked_rows(self):
+        """Test claims skip rows another dispatcher has locked."""
+        self.notification('first')
+        with CaptureQueriesContext(connection) as queries:
+            claim_batch(10)
+        self.assertTrue(any('SKIP LOCKED' in query['sql'] for query in queries.captured_queries))
+
+    def test_retry_delay_backs_off_exponentially(self):
+        """Test retry delays double from the base up to six hours."""
+        self.assertEqual([retry_delay(n).total_seconds() for n in (1, 2, 3)], [60, 120, 240])
+        self.assertEqual(retry_delay(20), timedelta(hours=6))
+
+    def test_dispatch_records_outcomes(self):
+        """Test sends, retries, deferrals and permanent failures are stored in bulk."""
+        retry_at = timezone.now() + timedelta(minutes=10)
+        provider = FakeProvider({
+            'retry': DeliveryFailure('Timeout'),
+            'exhausted': DeliveryFailure('Timeout'),
+            'rejected': DeliveryFailure('Bad address', retryable=False),
+            'deferred': DeliveryFailure('Rate limited', retry_at=retry_at),
+        })
+        self.notification('sent')
+        self.notification('retry')
+        self.notification('exhausted', retry_count=2)
+        self.notification('rejected')
+        self.notification('deferred', retry_count=1)
+
+        with patch('apps.notifications.dispatcher.get_provider', return_value=provider):
+            self.assertEqual(dispatch_batch(claim_batch(10)), (1, 3))
+
+        rows = {n.title: n for n in Notification.objects.all()}
+        self.assertEqual(rows['sent'].status, 'sent')
+        self.assertIsNotNone(rows['sent'].sent_at)
+        self.assertIsNone(rows['sent'].next_attempt_at)
+
+        self.assertEqual((rows['retry'].status, rows['retry'].retry_count), ('pending', 1))
+        self.assertAlmostEqual(
+            (rows['retry'].next_attempt_at - timezone.now()).total_seconds(), 60, delta=5
+        )
+        self.assertEqual((rows['exhausted'].status, rows['exhausted'].retry_count), ('failed', 3))
+        self.assertEqual((rows['rejected'].status, rows['rejected'].error_message), ('failed', 'Bad address'))
+
+        # A deferral keeps the row pending without using up a retry
+        self.assertEqual((rows['deferred'].status, rows['deferred'].retry_count), ('pending', 1))
+        self.assertEqual(rows['deferred'].next_attempt_at, retry_at)
+
+        # Only the retry is due once its backoff has passed
+        Notification.objects.filter(id=rows['retry'].id).update(next_attempt_at=timezone.now())
+        self.assertEqual([n.title for n in claim_batch(10)], ['retry'])
+
+    def test_dispatch_keeps_rows_read_during_the_send(self):
+        """Test outcomes never turn a notification the user has read back to unread."""
+        provider = FakeProvider({'rejected': DeliveryFailure('Bad address', retryable=False)})
+        self.notification('sent')
+        self.notification('rejected')
+        claimed = claim_batch(10)
+        Notification.objects.update(status='read')
+
+        with patch('apps.notifications.dispatcher.get_provider', return_value=provider):
+            self.assertEqual(dispatch_batch(claimed), (1, 1))
+
+        rows = {n.title: n for n in Notification.objects.all()}
+        self.assertEqual((rows['sent'].status, rows['rejected'].status), ('read', 'read'))
+        self.assertEqual(rows['rejected'].error_message, 'Bad address')
+        self.assertEqual(get_unread_count(self.user.id), 0)
+
+    def test_provider_errors_fail_the_whole_group(self):
+        """Test a provider exception counts as a retryable failure for its batch."""
+        self.notification('a')
+        self.notification('b')
+        provider = MagicMock()
+        provider.send_batch.side_effect = RuntimeError('SMTP down')
+
+        with patch('apps.notifications.dispatcher.get_provider', return_value=provider):
+            self.assertEqual(dispatch_batch(claim_batch(10)), (0, 2))
+        self.assertEqual(set(Notification.objects.values_list('status', 'retry_count')), {('pending', 1)})
+
+
+class StubGraphAPI:
+    """Local stand-in for the WhatsApp Cloud API messages endpoint."""
+
+    def __init__(self):
+        self.requests = []
+        self.failures = {}  # phone number -> list of status codes to return first
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.delay = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    stub.requests.append((self.headers.get('Authorization'), body))
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    queued = stub.failures.get(body['to'])
+                    status = queued.pop(0) if queued else 200
+                time.sleep(stub.delay)
+                with stub.lock:
+                    stub.in_flight -= 1
+
+                if status == 200:
+                    payload = {'messages': [{'id': f"wamid.{body['to']}"}]}
+                else:
+                    payload = {'error': {'message': f'stub error {status}'}}
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                if status == 429:
+                    self.send_header('Retry-After', '0')
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class WhatsAppServiceTests(SimpleTestCase):
+    """Test cases for WhatsApp bulk sending against a local stub server."""
+
+    def setUp(self):
+        self.stub = StubGraphAPI().__enter__()
+        self.addCleanup(self.stub.__exit__)
+        settings_override = override_settings(
+            WHATSAPP_API_BASE_URL=self.stub.url,
+            WHATSAPP_PHONE_NUMBER_ID='12345',
+            WHATSAPP_ACCESS_TOKEN='test-token',
+            WHATSAPP_MAX_CONCURRENCY=4,
+            WHATSAPP_MESSAGES_PER_SECOND=0,
+            WHATSAPP_MAX_RETRIES=2,
+            WHATSAPP_RETRY_BACKOFF=0.01,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.service = WhatsAppService()
+
+    def payloads(self, count):
+        return [
+            self.service.build_text_payload(f'+91900000{i:04d}', f'Message {i}')
+            for i in range(count)
+        ]
+
+    def test_send_bulk_returns_results_in_order(self):
+        """Test bulk send returns one result per payload, in order."""
+        results = self.service.send_bulk(self.payloads(10))
+
+        self.assertEqual(len(results), 10)
+        self.assertTrue(all(r['success'] for r in results))
+        self.assertEqual(results[3]['message_id'], 'wamid.+919000000003')
+        self.assertEqual(len(self.stub.requests), 10)
+        self.assertEqual(self.stub.requests[0][0], 'Bearer test-token')
+
+    def test_send_bulk_respects_concurrency_cap(self):
+        """Test no more than WHATSAPP_MAX_CONCURRENCY requests are in flight."""
+        self.stub.delay = 0.05
+        results = self.service.send_bulk(self.payloads(12))
+
+        self.assertTrue(all(r['success'] for r in results))
+        self.assertLessEqual(self.stub.max_in_flight, 4)
+        self.assertGreater(self.stub.max_in_flight, 1)
+
+    def test_send_bulk_retries_throttling_and_server_errors(self):
+        """Test 429 and 5xx responses are retried until success."""
+        self.stub.failures['+919000000001'] = [429, 503]
+        results = self.service.send_bulk(self.payloads(3))
+
+        self.assertTrue(results[1]['success'])
+        self.assertEqual(len(self.stub.requests), 5)
+
+    def test_send_bulk_gives_up_after_max_retries(self):
+        """Test persistent server errors are reported after max retries."""
+        self.stub.failures['+919000000000'] = [500, 500, 500]
+        results = self.service.send_bulk(self.payloads(1))
+
+        self.assertFalse(results[0]['success'])
+        self.assertEqual(results[0]['status_code'], 500)
+        self.assertEqual(len(self.stub.requests), 3)
+
+    def test_client_errors_are_not_retried(self):
+        """Test 4xx responses other than 429 fail immediately."""
+        self.stub.failures['+919000000000'] = [400]
+        result = self.service.send_message('+919000000000', 'Hello')
+
+        self.assertFalse(result['success'])
+        self.assertEqual(result['error'], 'stub error 400')
+        self.assertEqual(len(self.stub.requests), 1)
+
+
+class TokenBucketTests(SimpleTestCase):
+    """Test cases for the token bucket limiter."""
+
+    def test_bucket_limits_rate(self):
+        """Test acquiring beyond capacity waits for refill."""
+        bucket = TokenBucket(rate=50, capacity=5)
+
+        async def take(count):
+            for _ in range(count):
+                await bucket.acquire()
+
+        started = time.monotonic()
+        asyncio.run(take(15))
+
+        # 5 immediately, 10 more at 50/s
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+
+class StubSMTPServer:
+    """Local SMTP server accepting plain-text sessions without TLS or auth."""
+
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+        self.drops = []  # per new connection: messages to accept before hanging up
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write(f'{line}\r\n'.encode())
+
+            def handle(self):
+                with stub.lock:
+                    stub.connections += 1
+                    drop_after = stub.drops.pop(0) if stub.drops else None
+                accepted = 0
+                recipients = []
+                self.reply('220 stub ESMTP')
+                while line := self.rfile.readline():
+                    command = line.decode().strip()
+                    verb = command[:4].upper()
+                    if verb in ('EHLO', 'HELO'):
+                        self.reply('250 stub')
+                    elif verb == 'MAIL':
+                        if drop_after is not None and accepted >= drop_after:
+                            return
+                        recipients = []
+                        self.reply('250 OK')
+                    elif verb == 'RCPT':
+                        if 'refused' in command:
+                            self.reply('550 No such user')
+                        else:
+                            recipients.append(command.split(':', 1)[1].strip(' <>'))
+                            self.reply('250 OK')
+                    elif verb == 'DATA':
+                        self.reply('354 End data with <CR><LF>.<CR><LF>')
+                        while self.rfile.readline() not in (b'.\r\n', b''):
+                            pass
+                        accepted += 1
+                        with stub.lock:
+                            stub.messages.append((stub.connections, recipients))
+                        self.reply('250 Queued')
+                    elif verb in ('NOOP', 'RSET'):
+                        self.reply('250 OK')
+                    elif verb == 'QUIT':
+                        self.reply('221 Bye')
+                        return
+                    else:
+                        self.reply('502 Not implemented')
+
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def email(key, to=None, subject='Filing due', body='Your GSTR-3B is due.'):
+    return key, EmailMessage(subject, body, 'noreply@example.com', [to or f'user{key}@example.com'])
+
+
+class SMTPTransportTests(SimpleTestCase):
+    """Test cases for pooled SMTP delivery and rate limiting against a stub server."""
+
+    def setUp(self):
+        cache.clear()
+        self.stub = StubSMTPServer().__enter__()
+        self.addCleanup(self.stub.__exit__)
+        settings_override = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=self.stub.port,
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER='',
+            EMAIL_HOST_PASSWORD='',
+            EMAIL_DELIVERY_TRANSPORT='smtp',
+            EMAIL_POOL_MAX_MESSAGES=500,
+            EMAIL_RATE_LIMIT_PER_MINUTE=0,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(mailer._pools.clear)
+        self.addCleanup(lambda: get_smtp_pool().close_all())
+        mailer._pools.clear()
+
+    def test_connection_is_reused_across_batches(self):
+        """Test consecutive batches share one pooled connection."""
+        first = SMTPTransport().send([email(1), email(2)])
+        second = SMTPTransport().send([email(3)])
+
+        self.assertEqual(first, {1: None, 2: None})
+        self.assertEqual(second, {3: None})
+        self.assertEqual(self.stub.connections, 1)
+        self.assertEqual([to for _, to in self.stub.messages], [['user1@example.com'], ['user2@example.com'], ['user3@example.com']])
+
+    @override_settings(EMAIL_POOL_MAX_MESSAGES=2)
+    def test_connection_is_recycled_after_max_messages(self):
+        """Test a connection that reached its message cap is replaced."""
+        SMTPTransport().send([email(1), email(2)])
+        SMTPTransport().send([email(3)])
+
+        self.assertEqual(self.stub.connections, 2)
+        self.assertEqual([connection for connection, _ in self.stub.messages], [1, 1, 2])
+
+    def test_dropped_connection_is_reopened_once_per_batch(self):
+        """Test a disconnect mid-batch resends the rest over a new connection."""
+        self.stub.drops = [1]
+        results = SMTPTransport().send([email(1), email(2), email(3)])
+
+        self.assertEqual(results, {1: None, 2: None, 3: None})
+        self.assertEqual([connection for connection, _ in self.stub.messages], [1, 2, 2])
+
+        # A second disconnect in the same batch fails what is left, retryably
+        self.stub.drops = [0, 0]
+        mailer._pools.clear()
+        results = SMTPTransport().send([email(4), email(5)])
+        self.assertEqual(set(results), {4, 5})
+        self.assertTrue(all(failure.retryable for failure in results.values()))
+
+    def test_refused_recipient_fails_permanently(self):
+        """Test a refused recipient fails alone and is not retried."""
+        results = SMTPTransport().send([email(1), email(2, to='refused@example.com'), email(3)])
+
+        self.assertIsNone(results[1])
+        self.assertIsNone(results[3])
+        self.assertFalse(results[2].retryable)
+        self.assertIn('550', results[2].error)
+        self.assertEqual(len(self.stub.messages), 2)
+
+    @override_settings(EMAIL_RATE_LIMIT_PER_MINUTE=2)
+    def test_messages_over_the_rate_limit_are_deferred(self):
+        """Test sends past the per-minute budget are deferred to the next window."""
+        window_start = datetime(2026, 1, 1, 10, 0, tzinfo=dt_timezone.utc).timestamp()
+        next_window = datetime(2026, 1, 1, 10, 1, tzinfo=dt_timezone.utc)
+
+        with patch('apps.notifications.mailer.time.time', return_value=window_start + 5):
+            results = deliver([email(1), email(2), email(3)])
+            self.assertEqual((results[1], results[2]), (None, None))
+            self.assertEqual(results[3].retry_at, next_window)
+            self.assertTrue(results[3].retryable)
+
+            # The budget is shared by every limiter using the cache
+            self.assertEqual(EmailRateLimiter(2).reserve(1), (0, next_window))
+            results = deliver([email(4)])
+            self.assertEqual(results[4].retry_at, next_window)
+
+        with patch('apps.notifications.mailer.time.time', return_value=next_window.timestamp() + 1):
+            self.assertEqual(deliver([email(3), email(4), email(5)])[5].error, 'Deferred by email rate limit')
+        self.assertEqual(len(self.stub.messages), 4)
+
+
+class StubSendGridAPI:
+    """Local stand-in for the SendGrid v3 mail send endpoint."""
+
+    def __init__(self):
+        self.requests = []
+        self.responses = []  # (status, body) to return before accepting
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    stub.requests.append((self.path, self.headers.get('Authorization'), body))
+                    status, payload = stub.responses.pop(0) if stub.responses else (202, None)
+                data = json.dumps(payload).encode() if payload else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.send_header('X-Message-Id', f'msg-{len(stub.requests)}')
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SendGridTransportTests(SimpleTestCase):
+    """Test cases for batched SendGrid delivery against a local stub API."""
+
+    def setUp(self):
+        self.stub = StubSendGridAPI().__enter__()
+        self.addCleanup(self.stub.__exit__)
+        settings_override = override_settings(
+            SENDGRID_API_KEY='test-key',
+            SENDGRID_HOST_URL=self.stub.url,
+            SENDGRID_SANDBOX_MODE_IN_DEBUG=False,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def recipients(self, body):
+        return [
+            (personalization['to'][0]['email'], personalization['custom_args']['notification_id'])
+            for personalization in body['personalizations']
+        ]
+
+    def test_identical_messages_share_a_request(self):
+        """Test each group of identical messages is sent as personalizations of one request."""
+        with patch('apps.notifications.mailer.SENDGRID_MAX_RECIPIENTS', 2):
+            results = SendGridTransport().send([
+                email(1), email(2), email(3), email(4, subject='Payment received'),
+            ])
+
+        self.assertEqual(results, {1: None, 2: None, 3: None, 4: None})
+        self.assertEqual(len(self.stub.requests), 3)
+        path, authorization, body = self.stub.requests[0]
+        self.assertEqual((path, authorization), ('/v3/mail/send', 'Bearer test-key'))
+        self.assertEqual(body['subject'], 'Filing due')
+        self.assertEqual(self.recipients(body), [('user1@example.com', '1'), ('user2@example.com', '2')])
+        self.assertEqual(self.recipients(self.stub.requests[1][2]), [('user3@example.com', '3')])
+        self.assertEqual(self.stub.requests[2][2]['subject'], 'Payment received')
+
+    def test_rejected_recipient_fails_alone(self):
+        """Test a rejected personalization fails permanently and the rest stay retryable."""
+        self.stub.responses = [(400, {'errors': [
+            {'field': 'personalizations.2.to', 'message': 'Invalid email'},
+        ]})]
+        results = SendGridTransport().send([email(1), email(2), email(3, to='bad@example')])
+
+        self.assertFalse(results[3].retryable)
+        self.assertIn('Invalid email', results[3].error)
+        self.assertTrue(results[1].retryable and results[2].retryable)
+        self.assertIn('another recipient', results[1].error)
+
+    def test_server_errors_are_retryable(self):
+        """Test throttling and server errors fail the batch retryably; other errors do not."""
+        self.stub.responses = [
+            (429, {'errors': [{'message': 'Too many requests'}]}),
+            (401, {'errors': [{'message': 'Bad key'}]}),
+        ]
+        throttled = SendGridTransport().send([email(1)])
+        unauthorized = SendGridTransport().send([email(2)])
+
+        self.assertTrue(throttled[1].retryable)
+        self.assertEqual(throttled[1].error, 'SendGrid error 429: Too many requests')
+        self.assertFalse(unauthorized[2].retryable)
+
+
+class PushFanoutTests(TestCase):
+    """Test cases for FCM multicast fan-out."""
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(email=f'user{i}@example.com', password='testpass123')
+            for i in range(300)
+        ]
+        FCMToken.objects.bulk_create([
+            FCMToken(user=user, token=f'token-{user.id}-{device}')
+            for user in self.users
+            for device in range(2)
+        ])
+        self.notifications = Notification.objects.bulk_create([
+            Notification(user=user, channel='push', category='general', title='Title', message='Body')
+            for user in self.users
+        ])
+
+    def fake_multicast(self, message):
+        responses = []
+        for token in message.tokens:
+            if token.endswith('-1'):
+                exception = messaging.UnregisteredError('Token unregistered')
+            elif token == f'token-{self.users[0].id}-0':
+                exception = exceptions.InvalidArgumentError('Invalid token')
+            elif token == f'token-{self.users[1].id}-0':
+                exception = exceptions.UnavailableError('Try later')
+            else:
+                exception = None
+            responses.append(MagicMock(success=exception is None, exception=exception))
+        return MagicMock(responses=responses)
+
+    def test_tokens_are_packed_across_users(self):
+        """Test 600 tokens for 300 users go out in two multicast calls."""
+        with patch.object(messaging, 'send_each_for_multicast', side_effect=self.fake_multicast) as send:
+            results = send_push_notifications(self.notifications)
+
+        self.assertEqual([len(c.args[0].tokens) for c in send.call_args_list], [500, 100])
+        self.assertIsNone(results[self.notifications[5].id])
+
+    def test_dead_tokens_are_deactivated(self):
+        """Test UNREGISTERED and INVALID_ARGUMENT tokens are deactivated."""
+        with patch.object(messaging, 'send_each_for_multicast', side_effect=self.fake_multicast):
+            results = send_push_notifications(self.notifications)
+
+        self.assertEqual(FCMToken.objects.filter(is_active=False).count(), 301)
+        # Only dead devices left: in-app only
+        self.assertIsNone(results[self.notifications[0].id])
+        # A transient error on the only live device is retried
+        self.assertTrue(results[self.notifications[1].id].retryable)
+
+
+class TemplateRenderingTests(SimpleTestCase):
+    """Test cases for compiled notification templates."""
+
+    def setUp(self):
+        clear_cache()
+        self.template = NotificationTemplate(
+            name='Payment due',
+            template_type='email',
+            category='payment_reminder',
+            subject='Invoice {{ invoice_number }} is due',
+            body='Hi {{ name }}, pay Rs. {{ amount }} & avoid penalties.',
+            variables=['name', 'amount', 'invoice_number'],
+            updated_at=timezone.now(),
+        )
+
+    def test_render_many(self):
+        """Test bulk rendering keeps order and does not HTML-escape."""
+        contexts = [
+            {'name': f'User {i}', 'amount': i * 100, 'invoice_number': f'INV-{i}'}
+            for i in range(1000)
+        ]
+        rendered = get_compiled(self.template).render_many(contexts)
+
+        self.assertEqual(len(rendered), 1000)
+        self.assertEqual(rendered[7], ('Invoice INV-7 is due', 'Hi User 7, pay Rs. 700 & avoid penalties.'))
+
+    def test_compiled_once_per_version(self):
+        """Test the cache is keyed by template id and updated_at."""
+        compiled = get_compiled(self.template)
+        self.assertIs(get_compiled(self.template), compiled)
+
+        self.template.updated_at += timedelta(seconds=1)
+        self.template.body = 'Hello {{ name }}'
+        self.assertIsNot(get_compiled(self.template), compiled)
+        self.assertEqual(
+            get_compiled(self.template).render({'name': 'A', 'amount': 1, 'invoice_number': 'X'})[1],
+            'Hello A'
+        )
+
+    def test_missing_variables_are_rejected(self):
+        """Test contexts must supply every declared variable."""
+        with self.assertRaisesMessage(TemplateVariableError, 'context 1: amount'):
+            get_compiled(self.template).render_many([
+                {'name': 'A', 'amount': 1, 'invoice_number': 'X'},
+                {'name': 'B', 'invoice_number': 'Y'},
+            ])
+
+    def test_undeclared_variables_are_rejected(self):
+        """Test templates may only use declared variables."""
+        self.template.body = 'Hi {{ user.first_name }}'
+        with self.assertRaisesMessage(TemplateVariableError, 'undeclared variables: user'):
+            get_compiled(self.template)
+
+    def test_names_bound_by_for_and_with_are_not_undeclared(self):
+        """Test loop variables and with aliases are scoped to their block."""
+        self.template.variables = ['name', 'invoices', 'invoice_number', 'amount']
+        self.template.body = (
+            '{% for invoice in invoices %}{{ forloop.counter }}. {{ invoice.number }}'
+            '{% empty %}None{% endfor %}'
+            '{% with total=amount %}{% if total %}Total {{ total }}{% endif %}{% endwith %}'
+            '{% with name as customer %}, {{ customer }}{% endwith %}'
+        )
+        compiled = get_compiled(self.template)
+        context = {'name': 'A', 'amount': 5, 'invoice_number': 'X', 'invoices': [{'number': 'INV-1'}]}
+        self.assertEqual(compiled.render(context)[1], '1. INV-1Total 5, A')
+
+        # The sequence and with values are still checked, and bound names do not leak
+        clear_cache()
+        self.template.body = '{% for invoice in items %}{{ invoice }}{% endfor %}{{ invoice }}'
+        with self.assertRaisesMessage(TemplateVariableError, 'undeclared variables: invoice, items'):
+            get_compiled(self.template)
+
+    def test_build_notifications(self):
+        """Test rendered notifications carry the template channel and category."""
+        notifications = build_notifications(
+            self.template,
+            [(None, {'name': 'A', 'amount': 5, 'invoice_number': 'INV-1'})],
+        )
+
+        self.assertEqual(notifications[0].channel, 'email')
+        self.assertEqual(notifications[0].category, 'payment_reminder')
+        self.assertEqual(notifications[0].title, 'Invoice INV-1 is due')
+
+
+class UnreadCounterTests(APITestCase):
+    """Test cases for the denormalized unread counter."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='reader@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.notify(2)
+
+    def notify(self, count):
+        return Notification.objects.bulk_create([
+            Notification(user=self.user, channel='push', category='general', title='T', message='M')
+            for _ in range(count)
+        ])
+
+    def test_counter_tracks_creates_and_reads(self):
+        """Test create, mark_as_read and mark_all_as_read keep the counter exact."""
+        self.assertEqual(get_unread_count(self.user.id), 2)
+
+        notifications = self.notify(3)
+        Notification.objects.create(user=self.user, channel='push', category='general', title='T', message='M')
+        self.assertEqual(get_unread_count(self.user.id), 6)
+
+        url = reverse('notifications-mark-as-read', args=[notifications[0].id])
+        self.client.post(url)
+        self.client.post(url)
+        response = self.client.get(reverse('notifications-unread-count'))
+        self.assertEqual(response.data['unread_count'], 5)
+
+        self.client.post(reverse('notifications-mark-all-as-read'))
+        with self.assertNumQueries(1):
+            self.assertEqual(get_unread_count(self.user.id), 0)
+
+    def test_reconcile_fixes_drift(self):
+        """Test reconciliation recounts drifted counters."""
+        get_unread_count(self.user.id)
+        UnreadNotificationCounter.objects.filter(user=self.user).update(count=42)
+
+        self.assertEqual(reconcile_unread_counters(), (1, 1))
+        self.assertEqual(get_unread_count(self.user.id), 2)
+
+
+@override_settings(
+    NOTIFICATION_STREAM_ENABLED=False,
+    NOTIFICATION_STREAM_HEARTBEAT_SECONDS=0.05,
+    NOTIFICATION_STREAM_MAX_AGE_SECONDS=0.5,
+)
+class NotificationStreamTests(TestCase):
+    """Test cases for the server-sent events stream."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='stream@example.com', password='testpass123')
+        Notification.objects.create(user=self.user, channel='push', category='general', title='T', message='M')
+        self.url = f"{reverse('notification-stream')}?token={AccessToken.for_user(self.user)}"
+
+    async def test_stream_requires_token(self):
+        """Test anonymous stream requests are rejected."""
+        response = await self.async_client.get(reverse('notification-stream'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_refuses_wsgi_requests(self):
+        """Test the stream is refused rather than buffered when served over WSGI."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 503)
+
+    async def test_stream_pushes_notifications_and_counts(self):
+        """Test the stream sends badge counts, new notifications and heartbeats."""
+        response = await self.async_client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        self.assertIn(b'"unread_count": 1', await anext(stream))
+        self.assertEqual(await anext(stream), b': keep-alive\n\n')
+
+        broker.dispatch(json.dumps({
+            'type': 'notification',
+            'user_id': str(self.user.id),
+            'notification': {'title': 'Filed'},
+        }))
+        self.assertEqual(await anext(stream), b'event: notification\ndata: {"title": "Filed"}\n\n')
+        self.assertIn(b'event: unread_count', await anext(stream))
+
+        # Streams end at max age and unregister
+        async for _ in stream:
+            pass
+        self.assertNotIn(str(self.user.id), broker.listeners)
+
+
+@override_settings(NOTIFICATION_SCHEDULE_CHUNK_SIZE=7)
+class ScheduleExecutorTests(TestCase):
+    """Test cases for the NotificationSchedule executor."""
+
+    def setUp(self):
+        User.objects.bulk_create([
+            User(email=f'member{i}@example.com', phone_number=f'+9180000{i:05d}', first_name=f'Member{i}')
+            for i in range(20)
+        ])
+        User.objects.filter(email='member0@example.com').update(is_active=False)
+        self.template = NotificationTemplate.objects.create(
+            name='Monthly nudge',
+            template_type='push',
+            category='general',
+            subject='Hello {{ first_name }}',
+            body='Your {{ month }} summary is ready.',
+            variables=['first_name', 'month'],
+        )
+        self.schedule = NotificationSchedule.objects.create(
+            name='Monthly nudge',
+            schedule_type='recurring',
+            recurrence='monthly',
+            trigger_type='date_based',
+            template=self.template,
+            next_run_at=timezone.now() - timedelta(days=40),
+        )
+
+    def test_schedule_runs_once_and_advances(self):
+        """Test a due schedule reaches every active user and moves to its next run."""
+        now = timezone.now()
+        self.assertEqual(run_due_schedules(now=now), (1, 19))
+        self.assertEqual(run_due_schedules(now=now), (0, 0))
+
+        self.schedule.refresh_from_db()
+        self.assertGreater(self.schedule.next_run_at, now)
+        self.assertLessEqual(self.schedule.next_run_at, now + timedelta(days=31))
+        self.assertEqual(self.schedule.last_run_at, now)
+        notification = Notification.objects.get(user__email='member3@example.com')
+        self.assertEqual(notification.title, 'Hello Member3')
+        self.assertEqual(notification.template, self.template)
+
+    def test_one_time_schedule_is_deactivated(self):
+        """Test one-time schedules only run once."""
+        self.schedule.schedule_type = 'one_time'
+        self.schedule.target_all_users = False
+        self.schedule.target_payment_overdue = True
+        self.schedule.save()
+
+        self.assertEqual(run_due_schedules(), (1, 0))
+        self.schedule.refresh_from_db()
+        self.assertFalse(self.schedule.is_active)
+        self.assertIsNone(self.schedule.next_run_at)
+
+    def test_failed_runs_leave_the_schedule_due(self):
+        """Test a schedule that cannot render is not used up and runs once its template is fixed."""
+        due_at = self.schedule.next_run_at
+        self.schedule.schedule_type = 'one_time'
+        self.schedule.save()
+
+        NotificationTemplate.objects.filter(pk=self.template.pk).update(is_active=False)
+        self.assertEqual(run_due_schedules(), (0, 0))
+
+        NotificationTemplate.objects.filter(pk=self.template.pk).update(
+            is_active=True, body='Hi {{ user.first_name }}', updated_at=timezone.now()
+        )
+        self.assertEqual(run_due_schedules(), (0, 0))
+        self.schedule.refresh_from_db()
+        self.assertEqual((self.schedule.is_active, self.schedule.next_run_at), (True, due_at))
+        self.assertIsNone(self.schedule.last_run_at)
+        self.assertFalse(Notification.objects.exists())
+
+        NotificationTemplate.objects.filter(pk=self.template.pk).update(
+            body='Your {{ month }} summary is ready.', updated_at=timezone.now()
+        )
+        self.assertEqual(run_due_schedules(), (1, 19))
+        self.schedule.refresh_from_db()
+        self.assertFalse(self.schedule.is_active)
+
+
+@override_settings(NOTIFICATION_DIGEST_WINDOW_MINUTES=60)
+class DigestTests(TestCase):
+    """Test cases for notification coalescing."""
+
+    def setUp(self):
+        self.heavy = User.objects.create_user(email='heavy@example.com', password='testpass123', first_name='Heavy')
+        self.light = User.objects.create_user(
+            email='light@example.com', password='testpass123', phone_number='+919999900002'
+        )
+
+    def reminder(self, user, channel, number):
+        return Notification(
+            user=user,
+            channel=channel,
+            category='payment_reminder',
+            title=f'Payment Reminder - Invoice #{number}',
+            message=f'Invoice #{number} is due.',
+        )
+
+    def test_items_are_coalesced_per_user_and_channel(self):
+        """Test many reminders become one digest per user and channel."""
+        notifications = [self.reminder(self.heavy, channel, n) for n in range(12) for channel in ('push', 'email')]
+        notifications.append(self.reminder(self.light, 'push', 99))
+        self.assertEqual(coalesce(notifications), 25)
+        self.assertFalse(Notification.objects.exists())
+
+        # Nothing is due before the window has passed
+        self.assertEqual(flush_digests(), (0, 0))
+
+        sent, coalesced = flush_digests(now=timezone.now() + timedelta(minutes=61))
+        self.assertEqual((sent, coalesced), (3, 25))
+
+        push = Notification.objects.get(user=self.heavy, channel='push')
+        self.assertEqual(push.title, 'Payment Reminders (12)')
+        self.assertIn('...and 2 more', push.message)
+        self.assertEqual(NotificationDigestItem.objects.filter(digest_id=push.id).count(), 12)
+        email = Notification.objects.get(user=self.heavy, channel='email')
+        self.assertTrue(email.message.startswith('Dear Heavy,'))
+
+        # A lone item goes out unchanged
+        single = Notification.objects.get(user=self.light)
+        self.assertEqual(single.title, 'Payment Reminder - Invoice #99')
+
+        self.assertEqual(flush_digests(now=timezone.now() + timedelta(minutes=61)), (0, 0))
+
+    @override_settings(NOTIFICATION_DIGEST_WINDOW_MINUTES=0)
+    def test_zero_window_sends_directly(self):
+        """Test digests can be switched off."""
+        coalesce([self.reminder(self.heavy, 'push', 1)])
+        self.assertEqual(Notification.objects.count(), 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'notifications is only partitioned on PostgreSQL')
+class NotificationPartitionTests(TestCase):
+    """Test cases for monthly notification partitions and their archive."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='partitions@example.com', password='testpass123')
+
+    def notification(self, created_at):
+        notification = Notification.objects.create(
+            user=self.user, channel='in_app', category='system', title='Old', message='Archived'
+        )
+        Notification.objects.filter(pk=notification.pk).update(created_at=created_at)
+        return notification
+
+    def test_upcoming_partitions_exist(self):
+        """Test the migration and ensure_partitions cover the current month and those ahead."""
+        self.assertEqual(ensure_partitions(months_ahead=4), 5)
+        current = month_start(timezone.now())
+        months = [month for month, _ in list_partitions()]
+        self.assertIn(current, months)
+        self.assertEqual(months[-1], current + relativedelta(months=4))
+
+    def test_old_partitions_are_archived_to_csv(self):
+        """Test partitions past retention are exported with COPY and dropped."""
+        old_month = month_start(timezone.now() - timedelta(days=500))
+        with connection.cursor() as cursor:
+            create_partition(cursor, old_month)
+        old = self.notification(timezone.now() - timedelta(days=500))
+        recent = self.notification(timezone.now())
+        with connection.cursor() as cursor:
+            # Run the deferred FK checks of the rows above, as their commit would
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        with tempfile.TemporaryDirectory() as archive_dir:
+            paths = archive_old_partitions(retention_months=12, archive_dir=archive_dir)
+            self.assertEqual(paths, [os.path.join(archive_dir, f'{partition_name(old_month)}.csv.gz')])
+            with gzip.open(paths[0], 'rt') as archive:
+                header, *rows = archive.read().splitlines()
+
+        self.assertTrue(header.startswith('id,'))
+        self.assertEqual([row.split(',')[0] for row in rows], [str(old.id)])
+        self.assertNotIn(old_month, [month for month, _ in list_partitions()])
+        self.assertEqual(list(Notification.objects.values_list('id', flat=True)), [recent.id])
+
+    def test_failed_export_attaches_the_partition_again(self):
+        """Test a partition whose export fails is left attached with its rows."""
+        old_month = month_start(timezone.now() - timedelta(days=500))
+        with connection.cursor() as cursor:
+            create_partition(cursor, old_month)
+        old = self.notification(timezone.now() - timedelta(days=500))
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+        with tempfile.TemporaryDirectory() as archive_dir, \
+                patch('apps.notifications.partitions.gzip.open', side_effect=OSError('Disk full')):
+            with self.assertRaises(OSError):
+                archive_old_partitions(retention_months=12, archive_dir=archive_dir)
+            self.assertEqual(os.listdir(archive_dir), [])
+
+        self.assertIn(old_month, [month for month, _ in list_partitions()])
+        self.assertTrue(Notification.objects.filter(pk=old.pk).exists())
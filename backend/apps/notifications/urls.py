@@ -5,7 +5,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     NotificationTemplateViewSet, NotificationViewSet,
-    NotificationSendViewSet, NotificationScheduleViewSet, FCMTokenViewSet
+    NotificationSendViewSet, NotificationScheduleViewSet, FCMTokenViewSet,
+    notification_stream
 )
 
 router = DefaultRouter()
@@ -16,5 +17,6 @@ router.register(r'schedules', NotificationScheduleViewSet, basename='notificatio
 router.register(r'fcm', FCMTokenViewSet, basename='fcm-tokens')
 
 urlpatterns = [
+    path('stream/', notification_stream, name='notification-stream'),
     path('', include(router.urls)),
 ]
@@ -1,18 +1,26 @@
 """
 Views for Notifications.
 """
+import asyncio
+import json
 import re
+import time
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.core.mail import send_mail
-from django.template import Template, Context
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from twilio.rest import Client
-import firebase_admin
-from firebase_admin import messaging
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from django.http import JsonResponse, StreamingHttpResponse
 from django.utils import timezone
 
+from .counters import decrement_unread, get_unread_count, reset_unread
+from .dispatcher import enqueue
+from .realtime import broker
 from .models import NotificationTemplate, Notification, NotificationSchedule, FCMToken
 from .serializers import (
     NotificationTemplateSerializer, NotificationSerializer,
@@ -69,7 +77,10 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def list(self, request, *args, **kwargs):
         """List notifications with unread count."""
         queryset = self.get_queryset()
-        unread_count = queryset.exclude(status='read').count()
+        if 'category' in request.query_params or 'read' in request.query_params:
+            unread_count = queryset.exclude(status='read').count()
+        else:
+            unread_count = get_unread_count(request.user.id)
         
         serializer = self.get_serializer(queryset, many=True)
         return Response({
@@ -81,9 +92,19 @@ class NotificationViewSet(viewsets.ModelViewSet):
     def mark_as_read(self, request, pk=None):
         """Mark notification as read."""
         notification = self.get_object()
-        notification.status = 'read'
-        notification.read_at = timezone.now()
-        notification.save()
+        now = timezone.now()
+        with transaction.atomic():
+            # Conditional so repeated taps only decrement once
+            updated = Notification.objects.filter(
+                pk=notification.pk
+            ).exclude(status='read').update(
+                status='read',
+                read_at=now,
+                updated_at=now
+            )
+            if updated:
+                decrement_unread(request.user.id)
+        notification.refresh_from_db()
         
         return Response({
             'message': 'Notification marked as read.',
@@ -93,23 +114,27 @@ class NotificationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def mark_all_as_read(self, request):
         """Mark all notifications as read."""
-        Notification.objects.filter(
-            user=request.user
-        ).exclude(status='read').update(
-            status='read',
-            read_at=timezone.now()
-        )
+        with transaction.atomic():
+            Notification.objects.filter(
+                user=request.user
+            ).exclude(status='read').update(
+                status='read',
+                read_at=timezone.now()
+            )
+            reset_unread(request.user.id)
         
         return Response({'message': 'All notifications marked as read.'})
     
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
         """Get unread notification count."""
-        count = Notification.objects.filter(
-            user=request.user
-        ).exclude(status='read').count()
-        
-        return Response({'unread_count': count})
+        return Response({'unread_count': get_unread_count(request.user.id)})
+    
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+            if instance.status != 'read':
+                decrement_unread(instance.user_id)
 
 
 class NotificationSendViewSet(viewsets.ViewSet):
@@ -144,39 +169,18 @@ class NotificationSendViewSet(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Create notification record
-        notification = Notification.objects.create(
+        notification = enqueue([Notification(
             user=user,
             channel='email',
             category='general',
             title=subject,
             message=message
-        )
+        )], realtime=True)[0]
         
-        try:
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                [user.email],
-                fail_silently=False,
-            )
-            notification.status = 'sent'
-            notification.sent_at = timezone.now()
-            notification.save()
-            
-            return Response({
-                'message': 'Email sent successfully.',
-                'notification_id': notification.id
-            })
-        except Exception as e:
-            notification.status = 'failed'
-            notification.error_message = str(e)
-            notification.save()
-            return Response(
-                {'error': f'Failed to send email: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        return Response({
+            'message': 'Email queued for delivery.',
+            'notification_id': notification.id
+        }, status=status.HTTP_202_ACCEPTED)
     
     @action(detail=False, methods=['post'])
     def send_sms(self, request):
@@ -205,44 +209,18 @@ class NotificationSendViewSet(viewsets.ViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create notification record
-        notification = Notification.objects.create(
+        notification = enqueue([Notification(
             user=user,
             channel='sms',
             category='general',
             title='SMS',
             message=message
-        )
+        )], realtime=True)[0]
         
-        try:
-            if settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN:
-                client = Client(
-                    settings.TWILIO_ACCOUNT_SID,
-                    settings.TWILIO_AUTH_TOKEN
-                )
-                client.messages.create(
-                    body=message,
-                    from_=settings.TWILIO_PHONE_NUMBER,
-                    to=user.phone_number
-                )
-                notification.status = 'sent'
-                notification.sent_at = timezone.now()
-                notification.save()
-                
-                return Response({
-                    'message': 'SMS sent successfully.',
-                    'notification_id': notification.id
-                })
-            else:
-                raise Exception('Twilio not configured')
-        except Exception as e:
-            notification.status = 'failed'
-            notification.error_message = str(e)
-            notification.save()
-            return Response(
-                {'error': f'Failed to send SMS: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        return Response({
+            'message': 'SMS queued for delivery.',
+            'notification_id': notification.id
+        }, status=status.HTTP_202_ACCEPTED)
     
     @action(detail=False, methods=['post'])
     def send_push(self, request):
@@ -266,53 +244,24 @@ class NotificationSendViewSet(viewsets.ViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Get user's FCM tokens
-        tokens = FCMToken.objects.filter(user=user, is_active=True)
-        if not tokens:
+        if not FCMToken.objects.filter(user=user, is_active=True).exists():
             return Response(
                 {'error': 'User has no active push notification tokens.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create notification record
-        notification = Notification.objects.create(
+        notification = enqueue([Notification(
             user=user,
             channel='push',
             category='general',
             title=title,
             message=message
-        )
+        )], realtime=True)[0]
         
-        try:
-            # Send to all user's devices
-            registration_tokens = [t.token for t in tokens]
-            message_obj = messaging.MulticastMessage(
-                notification=messaging.Notification(
-                    title=title,
-                    body=message,
-                ),
-                tokens=registration_tokens,
-            )
-            response = messaging.send_each_for_multicast(message_obj)
-            
-            notification.status = 'sent' if response.success_count > 0 else 'failed'
-            notification.sent_at = timezone.now()
-            notification.save()
-            
-            return Response({
-                'message': 'Push notifications sent.',
-                'success_count': response.success_count,
-                'failure_count': response.failure_count,
-                'notification_id': notification.id
-            })
-        except Exception as e:
-            notification.status = 'failed'
-            notification.error_message = str(e)
-            notification.save()
-            return Response(
-                {'error': f'Failed to send push notification: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        return Response({
+            'message': 'Push notification queued for delivery.',
+            'notification_id': notification.id
+        }, status=status.HTTP_202_ACCEPTED)
 
 
 class NotificationScheduleViewSet(viewsets.ModelViewSet):
@@ -388,3 +337,77 @@ class FCMTokenViewSet(viewsets.ModelViewSet):
         FCMToken.objects.filter(token=token).update(is_active=False)
         
         return Response({'message': 'Token unregistered.'})
+
+
+def _authenticate_stream(request):
+    """
+    Resolve the JWT user of a stream request.
+    
+    Browsers' EventSource cannot set headers, so the access token may also
+    be passed as ``?token=``.
+    """
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = authentication.get_raw_token(header) if header else request.GET.get('token')
+    if not raw_token:
+        return None
+    try:
+        return authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def notification_stream(request):
+    """
+    Server-sent events stream of new notifications and badge counts.
+    
+    Sends ``unread_count`` on connect and after every change, and
+    ``notification`` for each new notification. Must be served by the
+    ASGI application; streams close after NOTIFICATION_STREAM_MAX_AGE_SECONDS
+    and EventSource reconnects on its own.
+    """
+    if not isinstance(request, ASGIRequest):
+        # Under WSGI the response would be buffered and hold a worker for the whole stream
+        return JsonResponse({'detail': 'Notification stream requires the ASGI server.'}, status=503)
+    
+    user = await sync_to_async(_authenticate_stream)(request)
+    if user is None or not user.is_active:
+        return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+    
+    heartbeat = getattr(settings, 'NOTIFICATION_STREAM_HEARTBEAT_SECONDS', 20)
+    max_age = getattr(settings, 'NOTIFICATION_STREAM_MAX_AGE_SECONDS', 300)
+    unread = sync_to_async(get_unread_count)
+    queue = broker.subscribe(user.id)
+    
+    async def events():
+        try:
+            yield 'retry: 3000\n\n'
+            yield _sse('unread_count', {'unread_count': await unread(user.id)})
+            
+            deadline = time.monotonic() + max_age
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=min(heartbeat, remaining))
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                
+                # Drain whatever else arrived so a burst costs one recount
+                messages = [message]
+                while not queue.empty():
+                    messages.append(queue.get_nowait())
+                for message in messages:
+                    if message['type'] == 'notification':
+                        yield _sse('notification', message['notification'])
+                yield _sse('unread_count', {'unread_count': await unread(user.id)})
+        finally:
+            broker.unsubscribe(user.id, queue)
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
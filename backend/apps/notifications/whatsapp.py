@@ -1,26 +1,245 @@
 """
 WhatsApp Notification Service for GSTONGO
 """
+import asyncio
 import logging
+import random
+import threading
+import time
+
+import httpx
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
 
+# Status codes worth retrying: throttling and server-side failures
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Async token bucket limiting request rate.
+    
+    Tokens refill continuously at ``rate`` per second up to ``capacity``;
+    each request takes one token and waits when the bucket is empty.
+    """
+    
+    def __init__(self, rate: float, capacity: float = None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+        self._lock = None
+    
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        if not self.rate:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+_sync_clients = {}
+_sync_clients_lock = threading.Lock()
+
+
+def _get_sync_client(timeout):
+    """Process-wide keep-alive client for single sends."""
+    with _sync_clients_lock:
+        client = _sync_clients.get(timeout)
+        if client is None or client.is_closed:
+            client = httpx.Client(timeout=timeout)
+            _sync_clients[timeout] = client
+        return client
+
+
 class WhatsAppService:
     """
     WhatsApp Business API integration for sending notifications.
+    
+    Single sends reuse a process-wide keep-alive connection pool. Campaigns
+    go through ``send_bulk``, which sends concurrently over one async pool
+    within ``WHATSAPP_MAX_CONCURRENCY`` in-flight requests and
+    ``WHATSAPP_MESSAGES_PER_SECOND``, retrying 429 and 5xx responses.
     """
     
     def __init__(self):
-        self.base_url = "https://graph.facebook.com/v17.0"
+        self.base_url = getattr(settings, 'WHATSAPP_API_BASE_URL', "https://graph.facebook.com/v17.0")
         self.phone_number_id = getattr(settings, 'WHATSAPP_PHONE_NUMBER_ID', None)
         self.access_token = getattr(settings, 'WHATSAPP_ACCESS_TOKEN', None)
+        self.timeout = getattr(settings, 'WHATSAPP_TIMEOUT', 10)
+        self.max_concurrency = getattr(settings, 'WHATSAPP_MAX_CONCURRENCY', 20)
+        self.messages_per_second = getattr(settings, 'WHATSAPP_MESSAGES_PER_SECOND', 80)
+        self.max_retries = getattr(settings, 'WHATSAPP_MAX_RETRIES', 3)
+        self.retry_backoff = getattr(settings, 'WHATSAPP_RETRY_BACKOFF', 1.0)
     
     def is_configured(self):
         """Check if WhatsApp is configured."""
         return bool(self.phone_number_id and self.access_token)
     
+    @property
+    def messages_url(self):
+        return f"{self.base_url}/{self.phone_number_id}/messages"
+    
+    @property
+    def headers(self):
+        return {
+            'Authorization': f'Bearer {self.access_token}',
+            'Content-Type': 'application/json',
+        }
+    
+    def _not_configured(self):
+        logger.warning("WhatsApp is not configured")
+        return {
+            'success': False,
+            'error': 'WhatsApp is not configured'
+        }
+    
+    # =========================
+    # PAYLOADS
+    # =========================
+    
+    @staticmethod
+    def build_text_payload(phone_number: str, message: str, template_name: str = None):
+        """Request body for a text (or single-parameter template) message."""
+        payload = {
+            'messaging_product': 'whatsapp',
+            'to': phone_number,
+            'type': 'text',
+            'text': {'body': message},
+        }
+        
+        if template_name:
+            payload['type'] = 'template'
+            payload['template'] = {
+                'name': template_name,
+                'language': {'code': 'en'},
+                'components': [
+                    {
+                        'type': 'body',
+                        'parameters': [
+                            {'type': 'text', 'text': message}
+                        ]
+                    }
+                ]
+            }
+        return payload
+    
+    @staticmethod
+    def build_template_payload(phone_number: str, template_name: str, parameters: dict):
+        """Request body for an approved template message."""
+        components = []
+        
+        # Header component
+        if 'header' in parameters:
+            components.append({
+                'type': 'header',
+                'parameters': [
+                    {'type': 'text', 'text': parameters['header']}
+                ]
+            })
+        
+        # Body component
+        if 'body' in parameters:
+            body_params = []
+            for param in parameters['body']:
+                body_params.append({'type': 'text', 'text': str(param)})
+            components.append({
+                'type': 'body',
+                'parameters': body_params
+            })
+        
+        # Button component (for OTP)
+        if 'button_text' in parameters:
+            components.append({
+                'type': 'button',
+                'sub_type': 'url',
+                'index': 0,
+                'parameters': [
+                    {'type': 'text', 'text': parameters['button_text']}
+                ]
+            })
+        
+        return {
+            'messaging_product': 'whatsapp',
+            'to': phone_number,
+            'type': 'template',
+            'template': {
+                'name': template_name,
+                'language': {'code': parameters.get('language', 'en')},
+                'components': components
+            }
+        }
+    
+    @staticmethod
+    def _parse_response(response, phone_number):
+        try:
+            response_data = response.json()
+        except ValueError:
+            response_data = {}
+        
+        if response.status_code in [200, 201]:
+            return {
+                'success': True,
+                'message_id': response_data.get('messages', [{}])[0].get('id'),
+                'phone_number': phone_number
+            }
+        logger.error(f"WhatsApp API error ({response.status_code}): {response_data}")
+        return {
+            'success': False,
+            'status_code': response.status_code,
+            'error': response_data.get('error', {}).get('message', f'HTTP {response.status_code}'),
+            'phone_number': phone_number
+        }
+    
+    def _retry_delay(self, attempt, response=None):
+        """Honour Retry-After, else exponential backoff with jitter."""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        return self.retry_backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+    
+    # =========================
+    # SINGLE SENDS
+    # =========================
+    
+    def _post(self, payload):
+        phone_number = payload['to']
+        client = _get_sync_client(self.timeout)
+        
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = client.post(self.messages_url, headers=self.headers, json=payload)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    logger.error(f"WhatsApp send error: {str(e)}")
+                    return {'success': False, 'error': str(e), 'phone_number': phone_number}
+                time.sleep(self._retry_delay(attempt))
+                continue
+            
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                time.sleep(self._retry_delay(attempt, response))
+                continue
+            return self._parse_response(response, phone_number)
+    
     def send_message(self, phone_number: str, message: str, template_name: str = None):
         """
         Send a WhatsApp message to a user.
@@ -29,75 +248,13 @@ class WhatsAppService:
             phone_number: Recipient's phone number with country code
             message: Message text to send
             template_name: Optional template name for templated messages
-            
+        
         Returns:
             dict: Response with message ID or error
         """
         if not self.is_configured():
-            logger.warning("WhatsApp is not configured")
-            return {
-                'success': False,
-                'error': 'WhatsApp is not configured'
-            }
-        
-        try:
-            import requests
-            
-            headers = {
-                'Authorization': f'Bearer {self.access_token}',
-                'Content-Type': 'application/json',
-            }
-            
-            payload = {
-                'messaging_product': 'whatsapp',
-                'to': phone_number,
-                'type': 'text',
-                'text': {'body': message},
-            }
-            
-            if template_name:
-                payload['type'] = 'template'
-                payload['template'] = {
-                    'name': template_name,
-                    'language': {'code': 'en'},
-                    'components': [
-                        {
-                            'type': 'body',
-                            'parameters': [
-                                {'type': 'text', 'text': message}
-                            ]
-                        }
-                    ]
-                }
-            
-            response = requests.post(
-                f"{self.base_url}/{self.phone_number_id}/messages",
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
-            
-            response_data = response.json()
-            
-            if response.status_code in [200, 201]:
-                return {
-                    'success': True,
-                    'message_id': response_data.get('messages', [{}])[0].get('id'),
-                    'phone_number': phone_number
-                }
-            else:
-                logger.error(f"WhatsApp API error: {response_data}")
-                return {
-                    'success': False,
-                    'error': response_data.get('error', {}).get('message', 'Unknown error')
-                }
-                
-        except Exception as e:
-            logger.error(f"WhatsApp send error: {str(e)}")
-            return {
-                'success': False,
-                'error': str(e)
-            }
+            return self._not_configured()
+        return self._post(self.build_text_payload(phone_number, message, template_name))
     
     def send_template_message(self, phone_number: str, template_name: str, parameters: dict):
         """
@@ -107,97 +264,75 @@ class WhatsAppService:
             phone_number: Recipient's phone number
             template_name: Name of the approved template
             parameters: Dictionary of template parameters
-            
+        
         Returns:
             dict: Response with message ID or error
         """
         if not self.is_configured():
-            logger.warning("WhatsApp is not configured")
-            return {
-                'success': False,
-                'error': 'WhatsApp is not configured'
-            }
+            return self._not_configured()
+        return self._post(self.build_template_payload(phone_number, template_name, parameters))
+    
+    # =========================
+    # BULK SENDS
+    # =========================
+    
+    async def _post_async(self, client, semaphore, bucket, payload):
+        phone_number = payload['to']
         
-        try:
-            import requests
-            
-            headers = {
-                'Authorization': f'Bearer {self.access_token}',
-                'Content-Type': 'application/json',
-            }
-            
-            # Build template components
-            components = []
-            
-            # Header component
-            if 'header' in parameters:
-                components.append({
-                    'type': 'header',
-                    'parameters': [
-                        {'type': 'text', 'text': parameters['header']}
-                    ]
-                })
-            
-            # Body component
-            if 'body' in parameters:
-                body_params = []
-                for param in parameters['body']:
-                    body_params.append({'type': 'text', 'text': str(param)})
-                components.append({
-                    'type': 'body',
-                    'parameters': body_params
-                })
-            
-            # Button component (for OTP)
-            if 'button_text' in parameters:
-                components.append({
-                    'type': 'button',
-                    'sub_type': 'url',
-                    'index': 0,
-                    'parameters': [
-                        {'type': 'text', 'text': parameters['button_text']}
-                    ]
-                })
-            
-            payload = {
-                'messaging_product': 'whatsapp',
-                'to': phone_number,
-                'type': 'template',
-                'template': {
-                    'name': template_name,
-                    'language': {'code': parameters.get('language', 'en')},
-                    'components': components
-                }
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/{self.phone_number_id}/messages",
-                headers=headers,
-                json=payload,
-                timeout=30
-            )
-            
-            response_data = response.json()
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            try:
+                async with semaphore:
+                    response = await client.post(self.messages_url, json=payload)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    logger.error(f"WhatsApp send error: {str(e)}")
+                    return {'success': False, 'error': str(e), 'phone_number': phone_number}
+                await asyncio.sleep(self._retry_delay(attempt))
+                continue
             
-            if response.status_code in [200, 201]:
-                return {
-                    'success': True,
-                    'message_id': response_data.get('messages', [{}])[0].get('id'),
-                    'phone_number': phone_number
-                }
-            else:
-                logger.error(f"WhatsApp template error: {response_data}")
-                return {
-                    'success': False,
-                    'error': response_data.get('error', {}).get('message', 'Unknown error')
-                }
-                
-        except Exception as e:
-            logger.error(f"WhatsApp template send error: {str(e)}")
-            return {
-                'success': False,
-                'error': str(e)
-            }
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                await asyncio.sleep(self._retry_delay(attempt, response))
+                continue
+            return self._parse_response(response, phone_number)
+    
+    async def send_bulk_async(self, payloads):
+        """
+        Send request bodies concurrently over one pooled async client.
+        
+        Returns:
+            list: one result dict per payload, in order
+        """
+        if not self.is_configured():
+            return [self._not_configured() for _ in payloads]
+        
+        limits = httpx.Limits(
+            max_connections=self.max_concurrency,
+            max_keepalive_connections=self.max_concurrency,
+        )
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        bucket = TokenBucket(self.messages_per_second)
+        
+        async with httpx.AsyncClient(headers=self.headers, timeout=self.timeout, limits=limits) as client:
+            return await asyncio.gather(*[
+                self._post_async(client, semaphore, bucket, payload)
+                for payload in payloads
+            ])
+    
+    def send_bulk(self, payloads):
+        """
+        Send many messages concurrently.
+        
+        Args:
+            payloads: request bodies from ``build_text_payload`` /
+                ``build_template_payload``
+        
+        Returns:
+            list: one result dict per payload, in order
+        """
+        if not payloads:
+            return []
+        return asyncio.run(self.send_bulk_async(payloads))
     
     def send_otp(self, phone_number: str, otp: str):
         """
@@ -206,7 +341,7 @@ class WhatsAppService:
         Args:
             phone_number: Recipient's phone number
             otp: One-time password
-            
+        
         Returns:
             dict: Response with message ID or error
         """
@@ -228,7 +363,7 @@ class WhatsAppService:
             phone_number: Recipient's phone number
             filing_type: Type of filing (GSTR-1, GSTR-3B, etc.)
             due_date: Due date for filing
-            
+        
         Returns:
             dict: Response with message ID or error
         """
@@ -243,7 +378,7 @@ class WhatsAppService:
             phone_number: Recipient's phone number
             amount: Payment amount
             invoice_number: Invoice number
-            
+        
         Returns:
             dict: Response with message ID or error
         """
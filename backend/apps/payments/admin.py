@@ -1,6 +1,6 @@
 from django.contrib import admin
 from unfold.admin import ModelAdmin
-from .models import PaymentTransaction
+from .models import DailyCollection, PaymentTransaction, SettlementDiscrepancy, SettlementRun, WebhookEvent
 
 @admin.register(PaymentTransaction)
 class PaymentTransactionAdmin(ModelAdmin):
@@ -8,3 +8,36 @@ class PaymentTransactionAdmin(ModelAdmin):
     list_filter = ('gateway', 'status')
     search_fields = ('user__email', 'gateway_order_id', 'gateway_payment_id')
     date_hierarchy = 'created_at'
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(ModelAdmin):
+    list_display = ('event_id', 'gateway', 'event_type', 'order_id', 'status', 'attempts', 'received_at')
+    list_filter = ('gateway', 'status', 'event_type')
+    search_fields = ('event_id', 'order_id')
+    readonly_fields = ('payload', 'last_error')
+
+@admin.register(SettlementRun)
+class SettlementRunAdmin(ModelAdmin):
+    list_display = ('gateway', 'source', 'status', 'rows_read', 'matched_count', 'discrepancy_count', 'started_at')
+    list_filter = ('gateway', 'status')
+    readonly_fields = ('error_message',)
+
+@admin.register(SettlementDiscrepancy)
+class SettlementDiscrepancyAdmin(ModelAdmin):
+    list_display = (
+        'kind', 'gateway_order_id', 'gateway_payment_id', 'expected_amount', 'reported_amount',
+        'expected_status', 'reported_status', 'resolved'
+    )
+    list_filter = ('kind', 'resolved', 'run__gateway')
+    search_fields = ('gateway_order_id', 'gateway_payment_id')
+    raw_id_fields = ('run', 'transaction')
+
+@admin.register(DailyCollection)
+class DailyCollectionAdmin(ModelAdmin):
+    list_display = ('day', 'kind', 'gateway', 'status', 'count', 'amount', 'updated_at')
+    list_filter = ('kind', 'gateway', 'status')
+    date_hierarchy = 'day'
+    readonly_fields = ('day', 'kind', 'gateway', 'status', 'count', 'amount', 'updated_at')
+
+    def has_add_permission(self, request):
+        return False
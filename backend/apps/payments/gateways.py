@@ -0,0 +1,354 @@
+"""
+Process-wide payment gateway registry for GSTONGO.
+
+Gateway API calls share one keep-alive ``requests`` session per gateway with
+bounded pools, connect/read timeouts and connect-only retries, so a request
+never reopens TLS and a slow gateway cannot hold a worker longer than the
+timeout. ``GatewayRegistry`` wraps every configured gateway in a circuit
+breaker and tracks a moving average of its latency: new orders go to the
+fastest available gateway and fail over to the next one, while calls about
+an existing order go to the gateway that created it.
+"""
+import logging
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+import razorpay
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .services import GatewayUnavailable, PaymentError, PaymentGatewayService, RazorpayService
+
+logger = logging.getLogger(__name__)
+
+
+class GatewaySession(requests.Session):
+    """Keep-alive session applying a default timeout to every request."""
+
+    def __init__(self, timeout, pool_size, retries):
+        super().__init__()
+        self.timeout = timeout
+        # Connection errors happen before the request is sent, so retrying
+        # them is safe even for POST; reads and statuses are never retried
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=retries, connect=retries, read=0, status=0, other=0, backoff_factor=0.1),
+        )
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, *args, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super().request(*args, **kwargs)
+
+
+def build_session():
+    return GatewaySession(
+        timeout=(
+            getattr(settings, 'PAYMENT_GATEWAY_CONNECT_TIMEOUT', 3),
+            getattr(settings, 'PAYMENT_GATEWAY_READ_TIMEOUT', 10),
+        ),
+        pool_size=getattr(settings, 'PAYMENT_GATEWAY_POOL_SIZE', 20),
+        retries=getattr(settings, 'PAYMENT_GATEWAY_CONNECT_RETRIES', 2),
+    )
+
+
+_razorpay_client = None
+_lock = threading.RLock()
+
+
+def get_razorpay_client():
+    """Process-wide Razorpay client on a pooled session."""
+    global _razorpay_client
+    with _lock:
+        if _razorpay_client is None:
+            _razorpay_client = razorpay.Client(
+                session=build_session(),
+                auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET),
+                base_url=getattr(settings, 'RAZORPAY_API_BASE_URL', 'https://api.razorpay.com'),
+            )
+        return _razorpay_client
+
+
+class CashfreeService(PaymentGatewayService):
+    """
+    Cashfree Payment Gateway integration (PG API, orders flow).
+
+    Cashfree addresses payments by our order id, so ``payment_id`` arguments
+    are order ids here.
+    """
+
+    name = 'cashfree'
+
+    def __init__(self, session=None):
+        self.base_url = getattr(settings, 'CASHFREE_API_BASE_URL', 'https://api.cashfree.com/pg')
+        self.app_id = getattr(settings, 'CASHFREE_APP_ID', '')
+        self.secret_key = getattr(settings, 'CASHFREE_SECRET_KEY', '')
+        self.api_version = getattr(settings, 'CASHFREE_API_VERSION', '2023-08-01')
+        self.session = session or build_session()
+
+    def is_configured(self):
+        return bool(self.app_id and self.secret_key)
+
+    @property
+    def headers(self):
+        return {
+            'x-client-id': self.app_id,
+            'x-client-secret': self.secret_key,
+            'x-api-version': self.api_version,
+            'Content-Type': 'application/json',
+        }
+
+    def _request(self, method, path, **kwargs):
+        try:
+            response = self.session.request(method, f'{self.base_url}{path}', headers=self.headers, **kwargs)
+        except requests.RequestException as e:
+            raise GatewayUnavailable(f'Cashfree is unavailable: {e}')
+        if response.status_code >= 500:
+            raise GatewayUnavailable(f'Cashfree is unavailable: HTTP {response.status_code}')
+        try:
+            data = response.json()
+        except ValueError:
+            data = {}
+        if response.status_code >= 400:
+            raise PaymentError(f"Cashfree request failed: {data.get('message', response.status_code)}")
+        return data
+
+    def create_order(self, amount: Decimal, currency: str = 'INR', **kwargs) -> dict:
+        """Create a Cashfree order; the client pays it with ``payment_session_id``."""
+        order = self._request('POST', '/orders', json={
+            'order_id': kwargs.get('order_id') or f'order_{uuid.uuid4().hex[:20]}',
+            'order_amount': float(amount),
+            'order_currency': currency,
+            'customer_details': {
+                'customer_id': str(kwargs.get('user_id', 'guest')),
+                'customer_email': kwargs.get('customer_email'),
+                'customer_phone': kwargs.get('customer_phone') or '',
+                'customer_name': kwargs.get('customer_name'),
+            },
+            'order_tags': {
+                'invoice_id': str(kwargs.get('invoice_id', '')),
+                'service_type': kwargs.get('service_type', 'GST Filing'),
+            },
+        })
+        logger.info(f"Cashfree order created: {order.get('order_id')} for amount ₹{amount}")
+        return {
+            'order_id': order.get('order_id'),
+            'amount': amount,
+            'amount_paise': int(amount * 100),
+            'currency': currency,
+            'payment_session_id': order.get('payment_session_id'),
+            'status': 'created',
+        }
+
+    def verify_payment(self, payment_id: str, order_id: str, signature: str = None) -> dict:
+        """Confirm payment by fetching the order's successful payments."""
+        payments = self._request('GET', f'/orders/{order_id}/payments')
+        paid = next((p for p in payments if p.get('payment_status') == 'SUCCESS'), None)
+        if paid is None:
+            return {'verified': False, 'error': 'No successful payment for order'}
+        return {
+            'verified': True,
+            'payment_id': str(paid.get('cf_payment_id')),
+            'order_id': order_id,
+            'status': 'captured',
+            'amount': Decimal(str(paid.get('payment_amount', 0))),
+            'method': paid.get('payment_group'),
+        }
+
+    def refund_payment(self, payment_id: str, amount: Decimal = None) -> dict:
+        """Refund an order, in full unless ``amount`` is given."""
+        if amount is None:
+            amount = Decimal(str(self._request('GET', f'/orders/{payment_id}').get('order_amount', 0)))
+        refund = self._request('POST', f'/orders/{payment_id}/refunds', json={
+            'refund_amount': float(amount),
+            'refund_id': f'refund_{uuid.uuid4().hex[:20]}',
+        })
+        return {
+            'refund_id': refund.get('refund_id'),
+            'payment_id': payment_id,
+            'amount': Decimal(str(refund.get('refund_amount', amount))),
+            'status': refund.get('refund_status'),
+            'created_at': refund.get('created_at'),
+        }
+
+    def get_payment_status(self, payment_id: str) -> dict:
+        order = self._request('GET', f'/orders/{payment_id}')
+        return {
+            'id': order.get('cf_order_id'),
+            'order_id': order.get('order_id'),
+            'status': order.get('order_status'),
+            'amount': Decimal(str(order.get('order_amount', 0))),
+            'currency': order.get('order_currency'),
+            'created_at': order.get('created_at'),
+        }
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Opens after ``threshold`` failures in a row; after ``reset_seconds`` one
+    trial call is let through (half-open) and its outcome closes or reopens
+    the circuit.
+    """
+
+    def __init__(self, threshold, reset_seconds, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.clock() - self.opened_at >= self.reset_seconds:
+            return 'half-open'
+        return 'open'
+
+    def allow(self):
+        """Whether a call may go through now."""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial_in_flight or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+            self.trial_in_flight = False
+
+
+class GatewayRegistry(PaymentGatewayService):
+    """
+    Routes gateway calls through circuit breakers and latency tracking.
+
+    Args:
+        services: gateway services in preference order (ties go to the first)
+    """
+
+    # Weight of the newest sample in the latency moving average
+    LATENCY_ALPHA = 0.2
+
+    def __init__(self, services, threshold=None, reset_seconds=None, clock=time.monotonic):
+        self.services = {service.name: service for service in services}
+        self.order = [service.name for service in services]
+        threshold = threshold or getattr(settings, 'PAYMENT_GATEWAY_FAILURE_THRESHOLD', 5)
+        reset_seconds = reset_seconds or getattr(settings, 'PAYMENT_GATEWAY_RESET_SECONDS', 30)
+        self.breakers = {name: CircuitBreaker(threshold, reset_seconds, clock) for name in self.order}
+        self.latency = {}
+        self.clock = clock
+
+    def _record_latency(self, name, seconds):
+        previous = self.latency.get(name)
+        self.latency[name] = seconds if previous is None else (
+            self.LATENCY_ALPHA * seconds + (1 - self.LATENCY_ALPHA) * previous
+        )
+
+    def call(self, name, method, *args, **kwargs):
+        """Call ``method`` on gateway ``name`` through its circuit breaker."""
+        service = self.services.get(name)
+        if service is None:
+            raise PaymentError(f'Payment gateway {name} is not available')
+        if not self.breakers[name].allow():
+            raise GatewayUnavailable(f'{name} circuit is open')
+
+        started = self.clock()
+        try:
+            result = getattr(service, method)(*args, **kwargs)
+        except GatewayUnavailable:
+            self.breakers[name].record_failure()
+            raise
+        except Exception:
+            # The gateway answered; a rejected request says nothing about its health
+            self.breakers[name].record_success()
+            raise
+        self.breakers[name].record_success()
+        self._record_latency(name, self.clock() - started)
+        return result
+
+    def route(self, preferred=None):
+        """
+        Gateways to try for a new order, best first.
+
+        A gateway without samples yet sorts first so it gets measured; open
+        circuits sort last.
+        """
+        def key(name):
+            return (
+                self.breakers[name].state == 'open',
+                name != preferred,
+                self.latency.get(name, 0),
+                self.order.index(name),
+            )
+        return sorted(self.order, key=key)
+
+    def create_order(self, amount: Decimal, currency: str = 'INR', preferred=None, **kwargs) -> dict:
+        """Create an order on the best gateway, failing over when one is down."""
+        error = None
+        for name in self.route(preferred):
+            try:
+                order = self.call(name, 'create_order', amount, currency, **kwargs)
+            except GatewayUnavailable as e:
+                logger.warning(f'Payment gateway {name} unavailable, trying next: {e.message}')
+                error = e
+                continue
+            order['gateway'] = name
+            return order
+        raise error or GatewayUnavailable('No payment gateway is configured')
+
+    def verify_payment(self, payment_id: str, order_id: str, signature: str, gateway='razorpay') -> dict:
+        return self.call(gateway, 'verify_payment', payment_id, order_id, signature)
+
+    def refund_payment(self, payment_id: str, amount: Decimal = None, gateway='razorpay') -> dict:
+        return self.call(gateway, 'refund_payment', payment_id, amount)
+
+    def get_payment_status(self, payment_id: str, gateway='razorpay') -> dict:
+        return self.call(gateway, 'get_payment_status', payment_id)
+
+
+GATEWAY_CLASSES = {
+    'razorpay': RazorpayService,
+    'cashfree': CashfreeService,
+}
+
+_registry = None
+
+
+def get_gateway_registry():
+    """Process-wide registry of the configured gateways in ``PAYMENT_GATEWAYS``."""
+    global _registry
+    with _lock:
+        if _registry is None:
+            services = [GATEWAY_CLASSES[name]() for name in getattr(settings, 'PAYMENT_GATEWAYS', ['razorpay'])]
+            _registry = GatewayRegistry([service for service in services if service.is_configured()])
+        return _registry
+
+
+def reset_gateways():
+    """Drop the shared clients and registry, e.g. after settings change in tests."""
+    global _razorpay_client, _registry
+    with _lock:
+        _razorpay_client = None
+        _registry = None
@@ -0,0 +1,47 @@
+"""
+Management command to reconcile a gateway settlement report.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.payments.models import PaymentTransaction
+
+
+class Command(BaseCommand):
+    help = 'Reconcile a gateway settlement report (CSV, JSON/JSON Lines file or report API URL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='Report file path or report API URL')
+        parser.add_argument(
+            '--gateway',
+            default='razorpay',
+            choices=[code for code, _ in PaymentTransaction.GATEWAY_CHOICES],
+            help='Gateway the report belongs to (default: razorpay)'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            help='Report rows matched per query (default: PAYMENT_SETTLEMENT_CHUNK_SIZE)'
+        )
+
+    def handle(self, *args, **options):
+        from apps.payments.reconciliation import (
+            ReconciliationError, discrepancy_summary, open_report, reconcile_settlements
+        )
+
+        try:
+            run = reconcile_settlements(
+                open_report(options['source'], options['gateway']),
+                options['gateway'],
+                source=options['source'],
+                chunk_size=options['chunk_size']
+            )
+        except (OSError, ReconciliationError, ValueError) as e:
+            raise CommandError(f'Could not reconcile {options["source"]}: {e}')
+
+        for kind, count in discrepancy_summary(run).items():
+            self.stdout.write(f'  {kind}: {count}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Reconciled {run.rows_read} rows: {run.matched_count} matched, '
+            f'{run.discrepancy_count} discrepancies (run {run.id}).'
+        ))
@@ -0,0 +1,90 @@
+# Generated by Django 4.2.27 on 2026-10-19 03:05
+
+from django.db import migrations, models
+
+
+def merge_payment_records(apps, schema_editor):
+    """Copy invoices.PaymentRecord rows into the transaction ledger."""
+    PaymentRecord = apps.get_model('invoices', 'PaymentRecord')
+    PaymentTransaction = apps.get_model('payments', 'PaymentTransaction')
+
+    # Keep the original timestamps
+    for name in ('created_at', 'updated_at'):
+        field = PaymentTransaction._meta.get_field(name)
+        field.auto_now = field.auto_now_add = False
+
+    existing_ids = set(PaymentTransaction.objects.values_list('id', flat=True))
+    existing_orders = set(
+        PaymentTransaction.objects.exclude(gateway_order_id=None).values_list('gateway_order_id', flat=True)
+    )
+
+    batch = []
+    for record in PaymentRecord.objects.order_by('created_at').iterator():
+        # Gateway records stored the order id in gateway_payment_id
+        if record.gateway == 'manual':
+            order_id, payment_id = None, record.gateway_payment_id
+        else:
+            order_id, payment_id = record.gateway_payment_id, None
+        if record.id in existing_ids or (order_id and order_id in existing_orders):
+            continue
+        if order_id:
+            existing_orders.add(order_id)
+
+        batch.append(PaymentTransaction(
+            id=record.id,
+            user_id=record.user_id,
+            invoice_id=record.invoice_id,
+            proforma_id=record.proforma_id,
+            gateway=record.gateway,
+            gateway_order_id=order_id,
+            gateway_payment_id=payment_id,
+            amount=record.amount,
+            currency=record.currency,
+            status=record.status,
+            payment_method=record.payment_method,
+            error_message=record.error_message,
+            webhook_data=record.webhook_data,
+            created_at=record.created_at,
+            updated_at=record.updated_at,
+            completed_at=record.updated_at if record.status == 'success' else None,
+        ))
+        if len(batch) >= 1000:
+            PaymentTransaction.objects.bulk_create(batch)
+            batch = []
+    PaymentTransaction.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_add_user_field'),
+        ('invoices', '0003_receivables_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='payment_method',
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddField(
+            model_name='paymenttransaction',
+            name='webhook_data',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='paymenttransaction',
+            name='gateway_order_id',
+            field=models.CharField(blank=True, max_length=100, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='paymenttransaction',
+            name='gateway_payment_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='paymenttransaction',
+            index=models.Index(fields=['status', 'created_at'], name='payment_txn_status_created'),
+        ),
+        migrations.RunPython(merge_payment_records, migrations.RunPython.noop),
+    ]
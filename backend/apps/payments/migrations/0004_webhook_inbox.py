@@ -0,0 +1,42 @@
+# Generated by Django 4.2.27 on 2026-10-19 03:07
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0003_payment_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gateway', models.CharField(choices=[('razorpay', 'Razorpay'), ('cashfree', 'Cashfree'), ('stripe', 'Stripe'), ('manual', 'Manual')], max_length=20)),
+                ('event_id', models.CharField(max_length=100)),
+                ('event_type', models.CharField(max_length=50)),
+                ('order_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('payload', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processed', 'Processed'), ('ignored', 'Ignored'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True, null=True)),
+                ('received_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Webhook Event',
+                'verbose_name_plural': 'Webhook Events',
+                'db_table': 'payment_webhook_events',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'available_at', 'id'], name='webhook_events_pending'), models.Index(fields=['order_id', 'id'], name='webhook_events_order')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='webhookevent',
+            constraint=models.UniqueConstraint(fields=('gateway', 'event_id'), name='unique_webhook_event'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.27 on 2026-10-19 03:16
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0004_webhook_inbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SettlementRun',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('gateway', models.CharField(choices=[('razorpay', 'Razorpay'), ('cashfree', 'Cashfree'), ('stripe', 'Stripe'), ('manual', 'Manual')], max_length=20)),
+                ('source', models.CharField(max_length=500)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('rows_read', models.PositiveIntegerField(default=0)),
+                ('matched_count', models.PositiveIntegerField(default=0)),
+                ('discrepancy_count', models.PositiveIntegerField(default=0)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Settlement Run',
+                'verbose_name_plural': 'Settlement Runs',
+                'db_table': 'payment_settlement_runs',
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SettlementDiscrepancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('amount_mismatch', 'Amount Mismatch'), ('status_mismatch', 'Status Mismatch'), ('missing_transaction', 'Missing Transaction'), ('stuck_pending', 'Stuck Pending')], max_length=30)),
+                ('gateway_order_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('gateway_payment_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('expected_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('reported_amount', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('expected_status', models.CharField(blank=True, max_length=20, null=True)),
+                ('reported_status', models.CharField(blank=True, max_length=50, null=True)),
+                ('resolved', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discrepancies', to='payments.settlementrun')),
+                ('transaction', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='settlement_discrepancies', to='payments.paymenttransaction')),
+            ],
+            options={
+                'verbose_name': 'Settlement Discrepancy',
+                'verbose_name_plural': 'Settlement Discrepancies',
+                'db_table': 'payment_settlement_discrepancies',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['run', 'kind'], name='settlement_disc_run_kind')],
+            },
+        ),
+    ]
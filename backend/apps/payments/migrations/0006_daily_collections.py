@@ -0,0 +1,67 @@
+# Generated by Django 4.2.27 on 2026-10-19 03:29
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+import uuid
+
+
+def backfill_collections(apps, schema_editor):
+    Invoice = apps.get_model('invoices', 'Invoice')
+    PaymentTransaction = apps.get_model('payments', 'PaymentTransaction')
+    DailyCollection = apps.get_model('payments', 'DailyCollection')
+
+    payments = PaymentTransaction.objects.annotate(day=TruncDate('created_at')).values(
+        'day', 'gateway', 'status'
+    ).annotate(count=Count('id'), total=Sum('amount')).order_by()
+    invoices = Invoice.objects.annotate(day=TruncDate('created_at')).values(
+        'day', 'status'
+    ).annotate(count=Count('id'), total=Sum('total_amount')).order_by()
+
+    rows = [
+        DailyCollection(day=row['day'], kind='payment', gateway=row['gateway'], status=row['status'],
+                        count=row['count'], amount=row['total'])
+        for row in payments.iterator()
+    ]
+    rows += [
+        DailyCollection(day=row['day'], kind='invoice', status=row['status'],
+                        count=row['count'], amount=row['total'])
+        for row in invoices.iterator()
+    ]
+    DailyCollection.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0008_service_suspensions'),
+        ('payments', '0005_settlement_reconciliation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCollection',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('kind', models.CharField(choices=[('payment', 'Payment'), ('invoice', 'Invoice')], max_length=20)),
+                ('gateway', models.CharField(blank=True, default='', max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=Decimal('0'), max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Daily Collection',
+                'verbose_name_plural': 'Daily Collections',
+                'db_table': 'payment_daily_collections',
+                'ordering': ['-day', 'kind', 'gateway', 'status'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailycollection',
+            constraint=models.UniqueConstraint(fields=('day', 'kind', 'gateway', 'status'), name='daily_collection_bucket'),
+        ),
+        migrations.RunPython(backfill_collections, migrations.RunPython.noop),
+    ]
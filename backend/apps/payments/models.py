@@ -1,14 +1,20 @@
 """
 Payment Transaction Model
+
+``PaymentTransaction`` is the single payment ledger: gateway and manual
+payments for invoices and proformas are all recorded here.
+``invoices.models.PaymentRecord`` is a proxy kept for the invoices APIs, and
+the ``payment_records`` database view keeps the old table shape readable.
 """
 import uuid
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
+from django.utils import timezone
 from decimal import Decimal
 
 
 class PaymentTransaction(models.Model):
-    """Model for tracking payment transactions."""
+    """Model for tracking payment transactions (gateway and manual)."""
     
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -51,8 +57,9 @@ class PaymentTransaction(models.Model):
     
     # Payment gateway details
     gateway = models.CharField(max_length=20, choices=GATEWAY_CHOICES)
-    gateway_order_id = models.CharField(max_length=100, unique=True)
-    gateway_payment_id = models.CharField(max_length=100, null=True, blank=True)
+    # Manual payments have no gateway order
+    gateway_order_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
+    gateway_payment_id = models.CharField(max_length=100, null=True, blank=True, db_index=True)
     gateway_refund_id = models.CharField(max_length=100, null=True, blank=True)
     
     # Amount
@@ -63,6 +70,10 @@ class PaymentTransaction(models.Model):
     # Status
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     
+    # Metadata
+    payment_method = models.CharField(max_length=50, null=True, blank=True)
+    webhook_data = models.JSONField(null=True, blank=True)
+    
     # Error tracking
     error_code = models.CharField(max_length=100, null=True, blank=True)
     error_message = models.TextField(null=True, blank=True)
@@ -80,10 +91,35 @@ class PaymentTransaction(models.Model):
         verbose_name = 'Payment Transaction'
         verbose_name_plural = 'Payment Transactions'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='payment_txn_status_created'),
+        ]
     
     def __str__(self):
         return f"Transaction {self.id} - ₹{self.amount} ({self.status})"
     
+    def save(self, *args, **kwargs):
+        from .rollup import record_payment
+        
+        # The daily collections rollup moves with the transaction; the stored
+        # state is read under a row lock so concurrent updates move it once
+        with transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = PaymentTransaction.objects.select_for_update().filter(
+                    pk=self.pk
+                ).values_list('gateway', 'status', 'amount').first()
+            super().save(*args, **kwargs)
+            record_payment(self.created_at, previous, (self.gateway, self.status, self.amount))
+    
+    def delete(self, *args, **kwargs):
+        from .rollup import record_payment
+        
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            record_payment(self.created_at, (self.gateway, self.status, self.amount), None)
+        return result
+    
     def mark_as_success(self, payment_id: str = None):
         """Mark transaction as successful."""
         from django.utils import timezone
@@ -93,6 +129,19 @@ class PaymentTransaction(models.Model):
             self.gateway_payment_id = payment_id
         self.save()
     
+    def event_payload(self):
+        """Payload for outbox events about this transaction."""
+        return {
+            'transaction_id': str(self.id),
+            'gateway': self.gateway,
+            'gateway_order_id': self.gateway_order_id,
+            'gateway_payment_id': self.gateway_payment_id,
+            'amount': str(self.amount),
+            'currency': self.currency,
+            'invoice_id': str(self.invoice_id) if self.invoice_id else None,
+            'proforma_id': str(self.proforma_id) if self.proforma_id else None,
+        }
+    
     def mark_as_failed(self, error_message: str):
         """Mark transaction as failed."""
         self.status = 'failed'
@@ -106,3 +155,177 @@ class PaymentTransaction(models.Model):
         self.gateway_refund_id = refund_id
         self.refund_amount = amount
         self.save()
+
+
+class WebhookEvent(models.Model):
+    """
+    Inbox of received payment gateway webhook events.
+    
+    Rows are keyed by the gateway's event id so redelivered events are
+    stored once. A worker processes pending events in id order, never
+    ahead of an earlier unprocessed event for the same order.
+    """
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('ignored', 'Ignored'),
+        ('failed', 'Failed'),
+    ]
+    
+    gateway = models.CharField(max_length=20, choices=PaymentTransaction.GATEWAY_CHOICES)
+    event_id = models.CharField(max_length=100)
+    event_type = models.CharField(max_length=50)
+    
+    # Gateway order the event belongs to; events are processed in order per order
+    order_id = models.CharField(max_length=100, null=True, blank=True)
+    payload = models.JSONField(default=dict)
+    
+    # Processing tracking
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(null=True, blank=True)
+    
+    received_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'payment_webhook_events'
+        verbose_name = 'Webhook Event'
+        verbose_name_plural = 'Webhook Events'
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['gateway', 'event_id'],
+                name='unique_webhook_event'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'available_at', 'id'], name='webhook_events_pending'),
+            models.Index(fields=['order_id', 'id'], name='webhook_events_order'),
+        ]
+    
+    def __str__(self):
+        return f"{self.gateway} {self.event_type} {self.event_id} - {self.status}"
+
+
+class SettlementRun(models.Model):
+    """A reconciliation of one gateway settlement report against our payments."""
+    
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    gateway = models.CharField(max_length=20, choices=PaymentTransaction.GATEWAY_CHOICES)
+    # Report file path or API URL
+    source = models.CharField(max_length=500)
+    
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running')
+    rows_read = models.PositiveIntegerField(default=0)
+    matched_count = models.PositiveIntegerField(default=0)
+    discrepancy_count = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(null=True, blank=True)
+    
+    started_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'payment_settlement_runs'
+        verbose_name = 'Settlement Run'
+        verbose_name_plural = 'Settlement Runs'
+        ordering = ['-started_at']
+    
+    def __str__(self):
+        return f"{self.gateway} settlement {self.started_at:%Y-%m-%d} - {self.status}"
+
+
+class SettlementDiscrepancy(models.Model):
+    """A report row or transaction that did not reconcile in a settlement run."""
+    
+    KIND_CHOICES = [
+        ('amount_mismatch', 'Amount Mismatch'),
+        ('status_mismatch', 'Status Mismatch'),
+        ('missing_transaction', 'Missing Transaction'),
+        ('stuck_pending', 'Stuck Pending'),
+    ]
+    
+    run = models.ForeignKey(
+        SettlementRun,
+        on_delete=models.CASCADE,
+        related_name='discrepancies'
+    )
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    transaction = models.ForeignKey(
+        PaymentTransaction,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='settlement_discrepancies'
+    )
+    gateway_order_id = models.CharField(max_length=100, null=True, blank=True)
+    gateway_payment_id = models.CharField(max_length=100, null=True, blank=True)
+    
+    # Our side and the gateway's side of the mismatch
+    expected_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    reported_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    expected_status = models.CharField(max_length=20, null=True, blank=True)
+    reported_status = models.CharField(max_length=50, null=True, blank=True)
+    
+    resolved = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'payment_settlement_discrepancies'
+        verbose_name = 'Settlement Discrepancy'
+        verbose_name_plural = 'Settlement Discrepancies'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['run', 'kind'], name='settlement_disc_run_kind'),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} {self.gateway_order_id or self.gateway_payment_id}"
+
+
+class DailyCollection(models.Model):
+    """
+    Daily collections rollup: count and amount of the payments or invoices
+    of one day in one status (see ``rollup``).
+    """
+    
+    KIND_CHOICES = [
+        ('payment', 'Payment'),
+        ('invoice', 'Invoice'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Local date the payment was created or the invoice issued
+    day = models.DateField()
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Blank for invoices
+    gateway = models.CharField(max_length=20, blank=True, default='')
+    status = models.CharField(max_length=20)
+    
+    count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0'))
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'payment_daily_collections'
+        verbose_name = 'Daily Collection'
+        verbose_name_plural = 'Daily Collections'
+        ordering = ['-day', 'kind', 'gateway', 'status']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'kind', 'gateway', 'status'],
+                name='daily_collection_bucket'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.day} {self.kind} {self.gateway or '-'} {self.status}: {self.count} / ₹{self.amount}"
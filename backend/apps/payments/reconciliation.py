@@ -0,0 +1,325 @@
+"""
+Settlement reconciliation for GSTONGO.
+
+A gateway settlement or payment report is streamed from a CSV, JSON Lines
+or JSON array file, or from a paginated report API, and matched in chunks
+against ``PaymentTransaction`` (which also holds the invoices app's
+``PaymentRecord`` rows): each chunk costs one indexed lookup by gateway
+order id, plus one by payment id for rows the first did not match, and is
+then matched through in-memory hash maps. Only rows that do not reconcile
+are stored, as ``SettlementDiscrepancy`` rows of the ``SettlementRun``:
+amount and status mismatches, report rows we have no transaction for, and
+transactions of the gateway still pending past ``PAYMENT_STUCK_PENDING_MINUTES``.
+"""
+import csv
+import json
+import logging
+import re
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class ReconciliationError(Exception):
+    """Raised for unreadable settlement reports."""
+    pass
+
+
+# Report columns accepted for each field, first present wins
+COLUMN_ALIASES = {
+    'order_id': ('order_id', 'gateway_order_id'),
+    'payment_id': ('payment_id', 'entity_id', 'cf_payment_id', 'gateway_payment_id'),
+    'amount': ('amount', 'payment_amount', 'order_amount'),
+    'status': ('status', 'payment_status', 'order_status'),
+    'type': ('type', 'entity_type'),
+}
+
+# Report amounts per rupee; Razorpay reports in paise
+REPORT_AMOUNT_UNITS = {
+    'razorpay': 100,
+}
+
+# Gateway report statuses mapped to ours
+REPORT_STATUSES = {
+    'captured': 'success',
+    'settled': 'success',
+    'success': 'success',
+    'paid': 'success',
+    'refunded': 'refunded',
+    'refund': 'refunded',
+    'processed': 'refunded',
+    'failed': 'failed',
+    'failure': 'failed',
+    'user_dropped': 'failed',
+    'cancelled': 'failed',
+    'created': 'pending',
+    'authorized': 'pending',
+    'active': 'pending',
+    'pending': 'pending',
+}
+
+# Our statuses that agree with a reported status; a captured payment may
+# since have been refunded
+COMPATIBLE_STATUSES = {
+    'success': {'success', 'refunded'},
+    'refunded': {'refunded'},
+    'failed': {'failed', 'cancelled'},
+    'pending': {'pending', 'processing'},
+}
+
+ReportRow = namedtuple('ReportRow', 'order_id payment_id amount status reported_status')
+
+_SEPARATOR = re.compile(r'[\s,]*')
+
+
+def _field(row, name):
+    for column in COLUMN_ALIASES[name]:
+        value = row.get(column)
+        if value not in (None, ''):
+            return str(value).strip()
+    return None
+
+
+def normalise_row(row, gateway):
+    """Reduce a raw report row to the fields reconciliation compares."""
+    reported_status = (_field(row, 'status') or '').lower()
+    if (_field(row, 'type') or '').lower() == 'refund':
+        reported_status = 'refund'
+
+    amount = _field(row, 'amount')
+    try:
+        amount = Decimal(amount) / REPORT_AMOUNT_UNITS.get(gateway, 1) if amount else None
+    except InvalidOperation:
+        amount = None
+
+    return ReportRow(
+        order_id=_field(row, 'order_id'),
+        payment_id=_field(row, 'payment_id'),
+        amount=amount,
+        status=REPORT_STATUSES.get(reported_status, reported_status),
+        reported_status=reported_status[:50] or None,
+    )
+
+
+def _json_array_items(fh, chunk_size=1 << 16):
+    """Stream the items of a top-level JSON array without loading the file."""
+    decoder = json.JSONDecoder()
+    buffer = fh.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ReconciliationError('JSON report must be an array of rows')
+    pos = 1
+    while True:
+        pos = _SEPARATOR.match(buffer, pos).end()
+        if buffer.startswith(']', pos):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            chunk = fh.read(chunk_size)
+            if not chunk:
+                raise ReconciliationError('Truncated JSON report')
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+        pos = end
+
+
+def read_report(path):
+    """Stream rows from a CSV, JSON Lines (.jsonl/.ndjson) or JSON array file."""
+    with open(path, newline='', encoding='utf-8-sig') as fh:
+        if path.endswith('.csv'):
+            yield from csv.DictReader(fh)
+        elif path.endswith(('.jsonl', '.ndjson')):
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from _json_array_items(fh)
+
+
+def fetch_report(url, params=None, auth=None, page_size=1000, session=None):
+    """Stream rows from a report API paginated with ``count``/``skip`` into ``items``."""
+    from .gateways import build_session
+
+    session = session or build_session()
+    skip = 0
+    while True:
+        response = session.get(url, params={**(params or {}), 'count': page_size, 'skip': skip}, auth=auth)
+        response.raise_for_status()
+        items = response.json().get('items', [])
+        yield from items
+        if len(items) < page_size:
+            return
+        skip += page_size
+
+
+def open_report(source, gateway):
+    """Rows of ``source``: an http(s) report API URL or a file path."""
+    if source.startswith(('http://', 'https://')):
+        auth = None
+        if gateway == 'razorpay':
+            auth = (settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
+        return fetch_report(source, auth=auth)
+    return read_report(source)
+
+
+def _transactions(**lookup):
+    from .models import PaymentTransaction
+
+    return PaymentTransaction.objects.filter(**lookup).values_list(
+        'id', 'gateway_order_id', 'gateway_payment_id', 'amount', 'refund_amount', 'status', named=True
+    )
+
+
+def _discrepancy(run, kind, row, txn, **fields):
+    from .models import SettlementDiscrepancy
+
+    return SettlementDiscrepancy(
+        run=run,
+        kind=kind,
+        transaction_id=txn.id if txn else None,
+        gateway_order_id=row.order_id or (txn.gateway_order_id if txn else None),
+        gateway_payment_id=row.payment_id or (txn.gateway_payment_id if txn else None),
+        reported_amount=row.amount,
+        reported_status=row.reported_status,
+        **fields
+    )
+
+
+def match_chunk(run, rows):
+    """
+    Match a chunk of report rows to transactions.
+
+    Returns:
+        tuple: (matched row count, unsaved SettlementDiscrepancy list)
+    """
+    rows = [normalise_row(row, run.gateway) for row in rows]
+
+    by_order = {txn.gateway_order_id: txn for txn in _transactions(
+        gateway_order_id__in={row.order_id for row in rows if row.order_id}
+    )}
+    unmatched_payments = {row.payment_id for row in rows if row.payment_id and row.order_id not in by_order}
+    by_payment = {}
+    if unmatched_payments:
+        by_payment = {txn.gateway_payment_id: txn for txn in _transactions(
+            gateway_payment_id__in=unmatched_payments
+        )}
+
+    matched = 0
+    discrepancies = []
+    for row in rows:
+        txn = by_order.get(row.order_id) or by_payment.get(row.payment_id)
+        if txn is None:
+            discrepancies.append(_discrepancy(run, 'missing_transaction', row, txn))
+            continue
+
+        ok = True
+        if txn.status not in COMPATIBLE_STATUSES.get(row.status, ()):
+            discrepancies.append(_discrepancy(run, 'status_mismatch', row, txn, expected_status=txn.status))
+            ok = False
+
+        expected = txn.refund_amount if row.status == 'refunded' else txn.amount
+        if row.amount is not None and row.amount != expected:
+            discrepancies.append(_discrepancy(
+                run, 'amount_mismatch', row, txn, expected_amount=expected, expected_status=txn.status
+            ))
+            ok = False
+
+        matched += ok
+    return matched, discrepancies
+
+
+def flag_stuck_pending(run, chunk_size):
+    """Record the gateway's transactions pending past the cutoff not already flagged."""
+    from .models import PaymentTransaction, SettlementDiscrepancy
+
+    minutes = getattr(settings, 'PAYMENT_STUCK_PENDING_MINUTES', 60)
+    flagged = SettlementDiscrepancy.objects.filter(run=run, transaction__isnull=False).values('transaction_id')
+    stuck = PaymentTransaction.objects.filter(
+        gateway=run.gateway,
+        status__in=('pending', 'processing'),
+        created_at__lt=timezone.now() - timedelta(minutes=minutes)
+    ).exclude(id__in=flagged).values_list(
+        'id', 'gateway_order_id', 'gateway_payment_id', 'amount', 'status'
+    ).iterator(chunk_size=chunk_size)
+
+    count = 0
+    while True:
+        batch = [
+            SettlementDiscrepancy(
+                run=run,
+                kind='stuck_pending',
+                transaction_id=txn_id,
+                gateway_order_id=order_id,
+                gateway_payment_id=payment_id,
+                expected_amount=amount,
+                expected_status=status,
+            )
+            for txn_id, order_id, payment_id, amount, status in islice(stuck, chunk_size)
+        ]
+        if not batch:
+            return count
+        SettlementDiscrepancy.objects.bulk_create(batch)
+        count += len(batch)
+
+
+def reconcile_settlements(rows, gateway, source='', chunk_size=None):
+    """
+    Reconcile report ``rows`` of ``gateway`` against our transactions.
+
+    Args:
+        rows: iterable of raw report rows (dicts), e.g. from ``open_report``
+        gateway: gateway the report belongs to
+        source: file path or URL, recorded on the run
+        chunk_size: report rows matched per query
+
+    Returns:
+        SettlementRun: the finished run
+    """
+    from .models import SettlementDiscrepancy, SettlementRun
+
+    chunk_size = chunk_size or getattr(settings, 'PAYMENT_SETTLEMENT_CHUNK_SIZE', 5000)
+    run = SettlementRun.objects.create(gateway=gateway, source=source[:500])
+    rows = iter(rows)
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            matched, discrepancies = match_chunk(run, chunk)
+            SettlementDiscrepancy.objects.bulk_create(discrepancies)
+            run.rows_read += len(chunk)
+            run.matched_count += matched
+            run.discrepancy_count += len(discrepancies)
+            run.save(update_fields=['rows_read', 'matched_count', 'discrepancy_count'])
+
+        run.discrepancy_count += flag_stuck_pending(run, chunk_size)
+    except Exception as e:
+        run.status = 'failed'
+        run.error_message = str(e)
+        run.completed_at = timezone.now()
+        run.save()
+        logger.error(f'Settlement reconciliation {run.id} failed: {e}')
+        raise
+
+    run.status = 'completed'
+    run.completed_at = timezone.now()
+    run.save()
+    logger.info(
+        f'Reconciled {run.rows_read} {gateway} settlement rows: '
+        f'{run.matched_count} matched, {run.discrepancy_count} discrepancies'
+    )
+    return run
+
+
+def discrepancy_summary(run):
+    """Discrepancy counts of a run by kind."""
+    return dict(run.discrepancies.values_list('kind').annotate(count=Count('id')).order_by('kind'))
@@ -0,0 +1,276 @@
+"""
+Daily collections rollup for GSTONGO.
+
+``DailyCollection`` keeps one row per day and status with the count and
+amount of the documents in it:
+
+- ``payment`` rows group payment transactions by the local day they were
+  created, their gateway and their current status;
+- ``invoice`` rows group invoices by the local day they were issued and
+  their current status (issued, paid, overdue or cancelled).
+
+Saving a transaction or an invoice moves it between rows in the saving
+transaction, and the bulk paths (billing runs, the overdue sweep) apply one
+change per row, so collection dashboards sum a few small rows per day
+instead of scanning the payments and invoices tables. ``rebuild_collections``
+recomputes the rows of a range of days from the source tables, for the
+initial backfill and the nightly check of recent days.
+"""
+import logging
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.invoices.ledger import BILLED_STATUSES, OPEN_STATUSES
+
+logger = logging.getLogger(__name__)
+
+PAYMENT = 'payment'
+INVOICE = 'invoice'
+
+
+def _amount(value):
+    # Views may pass request strings straight into a model
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def add_change(changes, key, count, amount):
+    """Accumulate ``count`` and ``amount`` for bucket ``key`` into ``changes``."""
+    bucket = changes.setdefault(key, [0, Decimal('0')])
+    bucket[0] += count
+    bucket[1] += _amount(amount)
+
+
+def transition_changes(kind, day, previous, current):
+    """
+    Bucket changes for one document moving between states.
+
+    Args:
+        kind: 'payment' or 'invoice'
+        day: local day the document belongs to
+        previous: (gateway, status, amount) before, or None for a new document
+        current: (gateway, status, amount) after, or None for a deleted one
+
+    Returns:
+        dict: ``{(day, kind, gateway, status): [count, amount]}``
+    """
+    changes = {}
+    if previous:
+        gateway, status, amount = previous
+        add_change(changes, (day, kind, gateway, status), -1, -_amount(amount))
+    if current:
+        gateway, status, amount = current
+        add_change(changes, (day, kind, gateway, status), 1, amount)
+    return changes
+
+
+def apply_changes(changes):
+    """Add bucket ``changes`` to the rollup; missing rows are created."""
+    from .models import DailyCollection
+
+    now = timezone.now()
+    # A fixed order keeps concurrent writers from deadlocking
+    for (day, kind, gateway, status), (count, amount) in sorted(changes.items()):
+        if not count and not amount:
+            continue
+        rows = DailyCollection.objects.filter(day=day, kind=kind, gateway=gateway, status=status)
+        updates = {'count': F('count') + count, 'amount': F('amount') + amount, 'updated_at': now}
+        if rows.update(**updates):
+            continue
+        _, created = DailyCollection.objects.get_or_create(
+            day=day, kind=kind, gateway=gateway, status=status,
+            defaults={'count': count, 'amount': amount}
+        )
+        if not created:
+            rows.update(**updates)
+
+
+def record_payment(created_at, previous, current):
+    """
+    Apply one transaction's state change to the rollup.
+
+    ``previous`` and ``current`` are (gateway, status, amount) or None.
+    """
+    apply_changes(transition_changes(PAYMENT, timezone.localdate(created_at), previous, current))
+
+
+def _invoice_state(state):
+    return ('', *state) if state else None
+
+
+def record_invoice(created_at, previous, current):
+    """
+    Apply one invoice's state change to the rollup.
+
+    ``previous`` and ``current`` are (status, total_amount) or None.
+    """
+    apply_changes(transition_changes(
+        INVOICE, timezone.localdate(created_at), _invoice_state(previous), _invoice_state(current)
+    ))
+
+
+def record_invoices(invoices):
+    """Add newly created invoices to the rollup with one change per row."""
+    changes = {}
+    for invoice in invoices:
+        key = (timezone.localdate(invoice.created_at), INVOICE, '', invoice.status)
+        add_change(changes, key, 1, invoice.total_amount)
+    apply_changes(changes)
+
+
+def source_rows(start, end):
+    """
+    Rollup rows for the days ``start`` to ``end`` (inclusive) computed from
+    the payments and invoices tables, one grouped aggregate each.
+    """
+    from apps.invoices.models import Invoice
+    from .models import DailyCollection, PaymentTransaction
+
+    window = {'created_at__gte': _local_midnight(start), 'created_at__lt': _local_midnight(end + timedelta(days=1))}
+    payments = PaymentTransaction.objects.filter(**window).annotate(
+        day=TruncDate('created_at')
+    ).values('day', 'gateway', 'status').annotate(
+        count=Count('id'), total=Sum('amount')
+    ).order_by()
+    invoices = Invoice.objects.filter(**window).annotate(
+        day=TruncDate('created_at')
+    ).values('day', 'status').annotate(
+        count=Count('id'), total=Sum('total_amount')
+    ).order_by()
+
+    rows = [
+        DailyCollection(day=row['day'], kind=PAYMENT, gateway=row['gateway'], status=row['status'],
+                        count=row['count'], amount=row['total'])
+        for row in payments
+    ]
+    rows += [
+        DailyCollection(day=row['day'], kind=INVOICE, status=row['status'],
+                        count=row['count'], amount=row['total'])
+        for row in invoices
+    ]
+    return rows
+
+
+def _bucket(row):
+    return (row.day, row.kind, row.gateway, row.status)
+
+
+def rebuild_collections(start=None, end=None):
+    """
+    Recompute the rollup for the days ``start`` to ``end`` (inclusive).
+
+    Defaults cover everything from the first payment or invoice to today.
+    Rows are corrected in place in one transaction: buckets the source
+    tables have are created first, then every row of the range is locked
+    before the sources are totalled again. A save in flight holds the row it
+    changed until it commits, so the totals include it; one that starts
+    later waits for the rebuild and applies its change on top.
+
+    Returns:
+        tuple: (rows written, rows that differed from the stored rollup)
+    """
+    from apps.invoices.models import Invoice
+    from .models import DailyCollection, PaymentTransaction
+
+    end = end or timezone.localdate()
+    if start is None:
+        firsts = [
+            model.objects.order_by('created_at').values_list('created_at', flat=True).first()
+            for model in (PaymentTransaction, Invoice)
+        ]
+        firsts = [timezone.localdate(first) for first in firsts if first]
+        start = min(firsts, default=end)
+
+    with transaction.atomic():
+        # With every source bucket present, saves update rows the lock below covers
+        DailyCollection.objects.bulk_create(
+            [DailyCollection(day=day, kind=kind, gateway=gateway, status=status, count=0, amount=0)
+             for day, kind, gateway, status in sorted(_bucket(row) for row in source_rows(start, end))],
+            ignore_conflicts=True
+        )
+        stored = {
+            _bucket(row): row
+            for row in DailyCollection.objects.select_for_update().filter(
+                day__gte=start, day__lte=end
+            ).order_by('day', 'kind', 'gateway', 'status')
+        }
+        rows = {_bucket(row): row for row in source_rows(start, end)}
+
+        now = timezone.now()
+        stale = []
+        # A bucket missing here was first created by a save that committed
+        # after the lock, and that save's row already holds its change
+        for key, row in stored.items():
+            actual = rows.get(key)
+            totals = (actual.count, actual.amount) if actual else (0, Decimal('0'))
+            if (row.count, row.amount) != totals:
+                row.count, row.amount = totals
+                row.updated_at = now
+                stale.append(row)
+        DailyCollection.objects.bulk_update(stale, ['count', 'amount', 'updated_at'])
+        drifted = len(stale)
+
+    if drifted:
+        logger.info(f'Daily collections {start} - {end}: {drifted} of {len(rows)} rows corrected')
+    return len(rows), drifted
+
+
+def collection_totals(start=None, end=None):
+    """
+    Collection figures for dashboards, summed from the rollup.
+
+    Payments count by the day they were created and invoices by the day they
+    were issued; ``start`` and ``end`` (inclusive) are optional bounds.
+    """
+    from .models import DailyCollection
+
+    rows = DailyCollection.objects.all()
+    if start:
+        rows = rows.filter(day__gte=start)
+    if end:
+        rows = rows.filter(day__lte=end)
+
+    payment = Q(kind=PAYMENT)
+    invoice = Q(kind=INVOICE)
+    totals = rows.aggregate(
+        collected_amount=Sum('amount', filter=payment & Q(status='success')),
+        collected_count=Sum('count', filter=payment & Q(status='success')),
+        refunded_amount=Sum('amount', filter=payment & Q(status='refunded')),
+        invoiced_amount=Sum('amount', filter=invoice & Q(status__in=BILLED_STATUSES)),
+        invoiced_count=Sum('count', filter=invoice & Q(status__in=BILLED_STATUSES)),
+        paid_amount=Sum('amount', filter=invoice & Q(status='paid')),
+        paid_count=Sum('count', filter=invoice & Q(status='paid')),
+        outstanding_amount=Sum('amount', filter=invoice & Q(status__in=OPEN_STATUSES)),
+        outstanding_count=Sum('count', filter=invoice & Q(status__in=OPEN_STATUSES)),
+        overdue_amount=Sum('amount', filter=invoice & Q(status='overdue')),
+        overdue_count=Sum('count', filter=invoice & Q(status='overdue')),
+    )
+    totals = {field: value or 0 for field, value in totals.items()}
+    totals['pending_amount'] = totals['outstanding_amount'] - totals['overdue_amount']
+    totals['pending_count'] = totals['outstanding_count'] - totals['overdue_count']
+    return totals
+
+
+def collections_by_gateway(start=None, end=None):
+    """Successful payment count and amount per gateway, from the rollup."""
+    from .models import DailyCollection
+
+    rows = DailyCollection.objects.filter(kind=PAYMENT, status='success')
+    if start:
+        rows = rows.filter(day__gte=start)
+    if end:
+        rows = rows.filter(day__lte=end)
+    return {
+        gateway: {'count': count or 0, 'amount': amount or 0}
+        for gateway, count, amount in rows.values('gateway').annotate(
+            total_count=Sum('count'), total_amount=Sum('amount')
+        ).values_list('gateway', 'total_count', 'total_amount').order_by('gateway')
+    }
@@ -9,9 +9,10 @@ class PaymentInitSerializer(serializers.Serializer):
     
     invoice_id = serializers.UUIDField(required=False)
     proforma_id = serializers.UUIDField(required=False)
+    # Optional; without it the payment is routed to the fastest gateway
     gateway = serializers.ChoiceField(
         choices=['razorpay', 'cashfree', 'stripe'],
-        default='razorpay'
+        required=False
     )
     
     def validate(self, attrs):
@@ -24,12 +25,24 @@ class PaymentInitSerializer(serializers.Serializer):
 
 
 class PaymentVerifySerializer(serializers.Serializer):
-    """Serializer for payment verification."""
+    """
+    Serializer for payment verification.
     
-    razorpay_payment_id = serializers.CharField(required=True)
-    razorpay_order_id = serializers.CharField(required=True)
-    razorpay_signature = serializers.CharField(required=True)
-    transaction_id = serializers.IntegerField(required=False)
+    Razorpay checkouts send the ``razorpay_*`` fields; Cashfree checkouts
+    only need the ``order_id``.
+    """
+    
+    order_id = serializers.CharField(required=False)
+    razorpay_payment_id = serializers.CharField(required=False)
+    razorpay_order_id = serializers.CharField(required=False)
+    razorpay_signature = serializers.CharField(required=False)
+    transaction_id = serializers.UUIDField(required=False)
+    
+    def validate(self, attrs):
+        attrs['order_id'] = attrs.get('order_id') or attrs.get('razorpay_order_id')
+        if not attrs['order_id']:
+            raise serializers.ValidationError('order_id or razorpay_order_id is required.')
+        return attrs
 
 
 class PaymentWebhookSerializer(serializers.Serializer):
@@ -2,9 +2,11 @@
 Payment Gateway Service for Razorpay Integration
 """
 import razorpay
+import requests
 from django.conf import settings
 from decimal import Decimal
 import logging
+import base64
 import hashlib
 import hmac
 
@@ -31,16 +33,33 @@ class PaymentGatewayService:
         raise NotImplementedError
 
 
+# Errors meaning the gateway is slow or down rather than rejecting the request
+UNAVAILABLE_ERRORS = (
+    requests.RequestException,
+    razorpay.errors.ServerError,
+    razorpay.errors.GatewayError,
+)
+
+
 class RazorpayService(PaymentGatewayService):
-    """Razorpay payment gateway integration."""
+    """
+    Razorpay payment gateway integration.
     
-    def __init__(self):
-        self.client = razorpay.Client(
-            auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
-        )
+    Uses the process-wide pooled client from ``gateways`` unless one is given.
+    """
+    
+    name = 'razorpay'
+    
+    def __init__(self, client=None):
+        from .gateways import get_razorpay_client
+        
+        self.client = client or get_razorpay_client()
         self.key_id = settings.RAZORPAY_KEY_ID
         self.key_secret = settings.RAZORPAY_KEY_SECRET
     
+    def is_configured(self):
+        return bool(self.key_id and self.key_secret)
+    
     def create_order(self, amount: Decimal, currency: str = 'INR', **kwargs) -> dict:
         """
         Create a Razorpay order for payment.
@@ -93,6 +112,9 @@ class RazorpayService(PaymentGatewayService):
         except razorpay.errors.BadRequestError as e:
             logger.error(f"Razorpay order creation failed: {str(e)}")
             raise PaymentError(f"Failed to create payment order: {str(e)}")
+        except UNAVAILABLE_ERRORS as e:
+            logger.error(f"Razorpay unavailable creating order: {str(e)}")
+            raise GatewayUnavailable(f"Razorpay is unavailable: {str(e)}")
         except Exception as e:
             logger.error(f"Unexpected error creating Razorpay order: {str(e)}")
             raise PaymentError("An error occurred while creating the payment order")
@@ -183,6 +205,9 @@ class RazorpayService(PaymentGatewayService):
         except razorpay.errors.BadRequestError as e:
             logger.error(f"Refund failed: {str(e)}")
             raise PaymentError(f"Refund failed: {str(e)}")
+        except UNAVAILABLE_ERRORS as e:
+            logger.error(f"Razorpay unavailable during refund: {str(e)}")
+            raise GatewayUnavailable(f"Razorpay is unavailable: {str(e)}")
         except Exception as e:
             logger.error(f"Unexpected error during refund: {str(e)}")
             raise PaymentError("An error occurred while processing the refund")
@@ -216,6 +241,9 @@ class RazorpayService(PaymentGatewayService):
                 'created_at': payment.get('created_at'),
             }
             
+        except UNAVAILABLE_ERRORS as e:
+            logger.error(f"Razorpay unavailable fetching payment status: {str(e)}")
+            raise GatewayUnavailable(f"Razorpay is unavailable: {str(e)}")
         except Exception as e:
             logger.error(f"Error fetching payment status: {str(e)}")
             raise PaymentError("Failed to fetch payment status")
@@ -294,6 +322,10 @@ class PaymentError(Exception):
         super().__init__(message)
 
 
+class GatewayUnavailable(PaymentError):
+    """Gateway timed out, refused the connection or failed server-side."""
+
+
 def generate_razorpay_signature(order_id: str, payment_id: str, razorpay_secret: str) -> str:
     """
     Generate HMAC signature for Razorpay webhook verification.
@@ -338,3 +370,31 @@ def verify_razorpay_webhook_signature(
     ).hexdigest()
     
     return hmac.compare_digest(webhook_signature, expected_signature)
+
+
+
+def verify_cashfree_webhook_signature(
+    webhook_signature: str,
+    timestamp: str,
+    secret_key: str,
+    body: str
+) -> bool:
+    """
+    Verify Cashfree webhook signature.
+    
+    Args:
+        webhook_signature: Base64 signature from the ``x-webhook-signature`` header
+        timestamp: Value of the ``x-webhook-timestamp`` header
+        secret_key: Cashfree client secret
+        body: Raw request body
+    
+    Returns:
+        bool: True if signature is valid
+    """
+    expected_signature = base64.b64encode(hmac.new(
+        secret_key.encode(),
+        f"{timestamp}{body}".encode(),
+        hashlib.sha256
+    ).digest()).decode()
+    
+    return hmac.compare_digest(webhook_signature, expected_signature)
@@ -0,0 +1,103 @@
+"""
+Celery tasks for Payments app.
+"""
+import logging
+from datetime import timedelta
+from celery import shared_task
+from django.conf import settings
+from django.utils import timezone
+
+from apps.core import queues
+from apps.core.metrics import report_rows
+from apps.core.task_guards import exclusive_task
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, queue=queues.REALTIME)
+def notify_payment_success(self, transaction_id):
+    """
+    Queue in-app and email confirmation for a successful payment.
+    """
+    from apps.notifications.dispatcher import enqueue
+    from apps.notifications.models import Notification
+    from .models import PaymentTransaction
+    
+    transaction = PaymentTransaction.objects.select_related('user').get(id=transaction_id)
+    user = transaction.user
+    
+    enqueue([
+        # In-app notification
+        Notification(
+            user=user,
+            channel='push',
+            category='payment_received',
+            title='Payment Successful',
+            message=f'Your payment of ₹{transaction.amount} has been received. Transaction ID: {transaction.gateway_payment_id}',
+            reference_type='transaction',
+            reference_id=transaction.id
+        ),
+        # Email notification
+        Notification(
+            user=user,
+            channel='email',
+            category='payment_received',
+            title='Payment Received - GSTONGO',
+            message=f'Dear {user.first_name},\n\nYour payment of ₹{transaction.amount} has been received successfully.\n\nTransaction Details:\n- Amount: ₹{transaction.amount}\n- Transaction ID: {transaction.gateway_payment_id}\n- Date: {transaction.completed_at}\n\nThank you for your payment.\n\nBest regards,\nGSTONGO Team',
+            reference_type='transaction',
+            reference_id=transaction.id
+        ),
+    ], realtime=True)
+
+
+@shared_task(bind=True, queue=queues.REALTIME)
+def process_payment_webhooks(self):
+    """
+    Apply pending payment webhook events from the inbox.
+    Only one worker runs at a time so events stay ordered per order.
+    """
+    from apps.core.task_guards import TaskLock
+    from .webhooks import process_pending_events
+    
+    lock = TaskLock('payment-webhooks', timeout=settings.PAYMENT_WEBHOOK_LOCK_TIMEOUT)
+    if not lock.acquire():
+        return 'Skipped: webhook processing already running'
+    
+    try:
+        processed = process_pending_events()
+    finally:
+        lock.release()
+    
+    report_rows(processed)
+    logger.info(f'Processed {processed} payment webhook events')
+    return f'Processed {processed} payment webhook events'
+
+
+@shared_task(bind=True, queue=queues.REPORTS)
+def reconcile_settlement_report(self, source, gateway='razorpay'):
+    """
+    Reconcile a gateway settlement report (file path or report API URL).
+    """
+    from .reconciliation import open_report, reconcile_settlements
+    
+    run = reconcile_settlements(open_report(source, gateway), gateway, source=source)
+    
+    report_rows(run.rows_read)
+    return f'Reconciled {run.rows_read} rows: {run.discrepancy_count} discrepancies'
+
+
+@shared_task(bind=True, queue=queues.MAINTENANCE)
+@exclusive_task(period='daily')
+def rebuild_recent_collections(self):
+    """
+    Recompute the daily collections rollup for recent days, repairing drift.
+    """
+    from .rollup import rebuild_collections
+    
+    today = timezone.localdate()
+    days = getattr(settings, 'COLLECTIONS_REBUILD_DAYS', 7)
+    written, corrected = rebuild_collections(start=today - timedelta(days=days), end=today)
+    
+    report_rows(written)
+    logger.info(f'Daily collections rebuilt for {days} days: {written} rows, {corrected} corrected')
+    return f'{corrected} of {written} daily collection rows corrected'
@@ -0,0 +1,584 @@
+"""
+Unit tests for Payments app.
+"""
+import base64
+import csv
+import hashlib
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from apps.invoices.ledger import mark_overdue
+from apps.core.models import OutboxEvent
+from apps.invoices.models import Invoice
+from apps.payments.gateways import CashfreeService, get_gateway_registry, reset_gateways
+from apps.payments.models import DailyCollection, PaymentTransaction, SettlementDiscrepancy, WebhookEvent
+from apps.payments.reconciliation import (
+    _json_array_items, discrepancy_summary, read_report, reconcile_settlements
+)
+from apps.payments.rollup import collection_totals, rebuild_collections
+from apps.payments.services import GatewayUnavailable
+from apps.payments.webhooks import process_pending_events
+from apps.users.models import AdminProfile, User
+
+
+@override_settings(RAZORPAY_WEBHOOK_SECRET='')
+class WebhookInboxTests(APITestCase):
+    """Test cases for webhook ingestion and inbox processing."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='payer@example.com', password='testpass123')
+        self.invoice = Invoice.objects.create(
+            user=self.user,
+            amount=Decimal('100.00'),
+            total_amount=Decimal('118.00'),
+            due_date=timezone.now().date() + timedelta(days=30)
+        )
+        self.transaction = PaymentTransaction.objects.create(
+            user=self.user,
+            invoice=self.invoice,
+            gateway='razorpay',
+            gateway_order_id='order_1',
+            amount=Decimal('118.00')
+        )
+
+    def deliver(self, event_id, event, payload):
+        return self.client.post(
+            reverse('payment-webhook'),
+            data=json.dumps({'event': event, 'payload': payload}),
+            content_type='application/json',
+            HTTP_X_RAZORPAY_EVENT_ID=event_id
+        )
+
+    def captured(self, event_id='evt_1'):
+        return self.deliver(event_id, 'payment.captured', {
+            'payment': {'entity': {'id': 'pay_1', 'order_id': 'order_1', 'method': 'upi'}},
+        })
+
+    def refunded(self, event_id='evt_2'):
+        return self.deliver(event_id, 'refund.created', {
+            'refund': {'entity': {'id': 'rfnd_1', 'payment_id': 'pay_1', 'amount': 11800}},
+            'payment': {'entity': {'id': 'pay_1', 'order_id': 'order_1'}},
+        })
+
+    def test_ingest_is_idempotent_and_deferred(self):
+        """Test redelivered events are stored once and applied by the worker."""
+        self.assertEqual(self.captured().data['status'], 'received')
+        self.assertEqual(self.captured().data['status'], 'duplicate')
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'pending')
+
+        self.assertEqual(process_pending_events(), 1)
+        self.transaction.refresh_from_db()
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'success')
+        self.assertEqual(self.transaction.payment_method, 'upi')
+        self.assertEqual(self.invoice.status, 'paid')
+
+        # The same capture under a new event id changes nothing
+        self.captured(event_id='evt_3')
+        self.assertEqual(process_pending_events(), 1)
+        self.assertEqual(WebhookEvent.objects.filter(status='processed').count(), 2)
+
+    def test_failed_event_blocks_later_events_of_order(self):
+        """Test a refund waits while the capture before it is retried."""
+        self.captured()
+        self.refunded()
+
+        with patch('apps.payments.webhooks.HANDLERS', {
+            'payment.captured': lambda payload, gateway: 1 / 0,
+            'refund.created': lambda payload, gateway: None,
+        }):
+            self.assertEqual(process_pending_events(), 0)
+
+        capture, refund = WebhookEvent.objects.order_by('id')
+        self.assertEqual((capture.status, capture.attempts), ('pending', 1))
+        self.assertEqual(refund.status, 'pending')
+        self.assertEqual(refund.available_at, capture.available_at)
+
+        WebhookEvent.objects.update(available_at=timezone.now())
+        self.assertEqual(process_pending_events(), 2)
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'refunded')
+        self.assertEqual(self.transaction.refund_amount, Decimal('118.00'))
+
+
+class StubGateway:
+    """Local stand-in for the Razorpay or Cashfree order endpoint."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.requests = 0
+        self.connections = set()
+        self.delay = 0
+        self.status = 200
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    stub.requests += 1
+                    stub.connections.add(self.client_address)
+                    number = stub.requests
+                time.sleep(stub.delay)
+
+                if stub.status != 200:
+                    payload = {'error': {'code': 'SERVER_ERROR', 'description': 'stub error'}, 'message': 'stub error'}
+                elif stub.kind == 'razorpay':
+                    payload = {'id': f'order_rzp_{number}', 'amount': body['amount'], 'currency': 'INR'}
+                else:
+                    payload = {'order_id': body['order_id'], 'payment_session_id': f'session_{number}'}
+                data = json.dumps(payload).encode()
+                try:
+                    self.send_response(stub.status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except OSError:
+                    pass  # client gave up (timeout)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class GatewayRegistryTests(SimpleTestCase):
+    """Test cases for gateway routing against local stub gateways."""
+
+    def setUp(self):
+        self.razorpay = StubGateway('razorpay')
+        self.cashfree = StubGateway('cashfree')
+        self.addCleanup(self.razorpay.close)
+        self.addCleanup(self.cashfree.close)
+        settings_override = override_settings(
+            RAZORPAY_KEY_ID='rzp_test',
+            RAZORPAY_KEY_SECRET='secret',
+            RAZORPAY_API_BASE_URL=self.razorpay.url,
+            CASHFREE_APP_ID='cf_test',
+            CASHFREE_SECRET_KEY='secret',
+            CASHFREE_API_BASE_URL=self.cashfree.url,
+            PAYMENT_GATEWAYS=['razorpay', 'cashfree'],
+            PAYMENT_GATEWAY_READ_TIMEOUT=0.3,
+            PAYMENT_GATEWAY_FAILURE_THRESHOLD=2,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        reset_gateways()
+        self.addCleanup(reset_gateways)
+        self.registry = get_gateway_registry()
+
+    def create(self, count=1, **kwargs):
+        return [self.registry.create_order(Decimal('118.00'), invoice_id='inv-1', **kwargs) for _ in range(count)]
+
+    def test_routes_to_faster_gateway_over_pooled_connections(self):
+        """Test orders move to the lower-latency gateway and reuse connections."""
+        self.razorpay.delay = 0.05
+        orders = self.create(6)
+
+        self.assertEqual([o['gateway'] for o in orders[:2]], ['razorpay', 'cashfree'])
+        self.assertTrue(all(o['gateway'] == 'cashfree' for o in orders[2:]))
+        self.assertEqual(orders[0]['order_id'], 'order_rzp_1')
+        self.assertEqual(orders[0]['amount_paise'], 11800)
+        self.assertEqual(len(self.cashfree.connections), 1)
+
+        # An explicit preference wins while that gateway is healthy
+        self.assertEqual(self.create(preferred='razorpay')[0]['gateway'], 'razorpay')
+
+    def test_fails_over_and_opens_circuit(self):
+        """Test server errors and timeouts fail over and stop calls to the gateway."""
+        self.razorpay.status = 500
+        self.assertEqual(self.create(preferred='razorpay')[0]['gateway'], 'cashfree')
+
+        self.razorpay.status = 200
+        self.razorpay.delay = 0.5
+        self.assertEqual(self.create(preferred='razorpay')[0]['gateway'], 'cashfree')
+        self.assertEqual(self.registry.breakers['razorpay'].state, 'open')
+
+        calls = self.razorpay.requests
+        self.create(3, preferred='razorpay')
+        self.assertEqual(self.razorpay.requests, calls)
+
+    def test_raises_when_every_gateway_is_down(self):
+        """Test the last gateway error surfaces when nothing is available."""
+        self.razorpay.status = 500
+        self.cashfree.status = 503
+        with self.assertRaises(GatewayUnavailable):
+            self.create()
+
+
+@override_settings(
+    RAZORPAY_KEY_ID='rzp_test',
+    RAZORPAY_KEY_SECRET='secret',
+    CASHFREE_APP_ID='cf_test',
+    CASHFREE_SECRET_KEY='cf_secret',
+    PAYMENT_GATEWAYS=['razorpay', 'cashfree'],
+)
+class CashfreeConfirmationTests(APITestCase):
+    """Test cases for confirming payments of orders routed to Cashfree."""
+
+    def setUp(self):
+        reset_gateways()
+        self.addCleanup(reset_gateways)
+        self.user = User.objects.create_user(email='cfpayer@example.com', password='testpass123')
+        self.invoice = Invoice.objects.create(
+            user=self.user,
+            amount=Decimal('100.00'),
+            total_amount=Decimal('118.00'),
+            due_date=timezone.now().date() + timedelta(days=30)
+        )
+        self.transaction = PaymentTransaction.objects.create(
+            user=self.user,
+            invoice=self.invoice,
+            gateway='cashfree',
+            gateway_order_id='order_cf_1',
+            amount=Decimal('118.00')
+        )
+
+    def deliver(self, body, secret='cf_secret'):
+        raw = json.dumps(body)
+        timestamp = '1700000000'
+        signature = base64.b64encode(
+            hmac.new(secret.encode(), f'{timestamp}{raw}'.encode(), hashlib.sha256).digest()
+        ).decode()
+        return self.client.post(
+            reverse('payment-webhook-cashfree'),
+            data=raw,
+            content_type='application/json',
+            HTTP_X_WEBHOOK_SIGNATURE=signature,
+            HTTP_X_WEBHOOK_TIMESTAMP=timestamp
+        )
+
+    def test_webhooks_capture_and_refund_the_order(self):
+        """Test signed Cashfree webhooks are stored once and applied to the order."""
+        success = {
+            'type': 'PAYMENT_SUCCESS_WEBHOOK',
+            'event_time': '2026-10-19T10:00:00+05:30',
+            'data': {
+                'order': {'order_id': 'order_cf_1', 'order_amount': 118.0},
+                'payment': {'cf_payment_id': 5114910, 'payment_status': 'SUCCESS', 'payment_group': 'upi'},
+            },
+        }
+        self.assertEqual(self.deliver(success, secret='wrong').status_code, 401)
+        self.assertEqual(self.deliver(success).data['status'], 'received')
+        self.assertEqual(self.deliver(success).data['status'], 'duplicate')
+        self.deliver({
+            'type': 'REFUND_STATUS_WEBHOOK',
+            'data': {'refund': {
+                'cf_refund_id': 42, 'refund_id': 'refund_1', 'order_id': 'order_cf_1',
+                'refund_amount': 118.0, 'refund_status': 'SUCCESS',
+            }},
+        })
+
+        self.assertEqual(WebhookEvent.objects.filter(gateway='cashfree', order_id='order_cf_1').count(), 2)
+        self.assertEqual(process_pending_events(), 2)
+        self.transaction.refresh_from_db()
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.transaction.gateway_payment_id, '5114910')
+        self.assertEqual(self.transaction.payment_method, 'upi')
+        self.assertEqual(self.invoice.status, 'paid')
+        self.assertEqual(self.transaction.status, 'refunded')
+        self.assertEqual(self.transaction.refund_amount, Decimal('118.00'))
+
+    def test_verify_confirms_with_the_order_gateway(self):
+        """Test verify asks Cashfree about a Cashfree order and applies it once."""
+        self.client.force_authenticate(self.user)
+        url = reverse('payment-verify')
+
+        with patch.object(CashfreeService, '_request', return_value=[]) as request:
+            response = self.client.post(url, {'order_id': 'order_cf_1'})
+        self.assertEqual(response.status_code, 400)
+        request.assert_called_once_with('GET', '/orders/order_cf_1/payments')
+        self.transaction.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'pending')
+
+        paid = [{'cf_payment_id': 777, 'payment_status': 'SUCCESS', 'payment_amount': 118.0, 'payment_group': 'card'}]
+        with patch.object(CashfreeService, '_request', return_value=paid):
+            response = self.client.post(url, {'order_id': 'order_cf_1', 'transaction_id': str(self.transaction.id)})
+            self.assertEqual(self.client.post(url, {'order_id': 'order_cf_1'}).status_code, 200)
+
+        self.assertEqual(response.data['payment_id'], '777')
+        self.transaction.refresh_from_db()
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.transaction.status, 'success')
+        self.assertEqual(self.invoice.status, 'paid')
+        self.assertEqual(OutboxEvent.objects.filter(event_type='payment.received').count(), 1)
+
+    def test_forged_events_do_not_touch_other_gateways(self):
+        """Test unsigned events are refused and Cashfree events never capture a Razorpay order."""
+        razorpay = PaymentTransaction.objects.create(
+            user=self.user, invoice=self.invoice, gateway='razorpay',
+            gateway_order_id='order_RZP1', amount=Decimal('118.00')
+        )
+        forged = {'type': 'PAYMENT_SUCCESS_WEBHOOK', 'data': {'order': {'order_id': 'order_RZP1'}}}
+        unsigned = self.client.post(
+            reverse('payment-webhook-cashfree'), data=json.dumps(forged), content_type='application/json'
+        )
+        self.assertEqual(unsigned.status_code, 401)
+
+        # Without Cashfree configured the endpoint does not exist
+        reset_gateways()
+        with override_settings(CASHFREE_APP_ID='', CASHFREE_SECRET_KEY=''):
+            self.assertEqual(self.deliver(forged, secret='').status_code, 404)
+        reset_gateways()
+        self.assertFalse(WebhookEvent.objects.exists())
+
+        # Even a correctly signed event only looks at Cashfree transactions
+        self.assertEqual(self.deliver(forged).data['status'], 'received')
+        self.assertEqual(process_pending_events(), 1)
+        razorpay.refresh_from_db()
+        self.invoice.refresh_from_db()
+        self.assertEqual(razorpay.status, 'pending')
+        self.assertEqual(self.invoice.status, 'issued')
+        self.assertFalse(OutboxEvent.objects.filter(event_type='payment.received').exists())
+
+    def test_razorpay_orders_still_need_a_signature(self):
+        """Test verifying a Razorpay order without its checkout fields is rejected."""
+        self.transaction.gateway = 'razorpay'
+        self.transaction.save()
+        self.client.force_authenticate(self.user)
+
+        response = self.client.post(reverse('payment-verify'), {'razorpay_order_id': 'order_cf_1'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SettlementReconciliationTests(TestCase):
+    """Test cases for reconciling gateway settlement reports."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='finance@example.com', password='testpass123')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def transaction(self, order_id, amount, status='success', gateway='razorpay', **kwargs):
+        return PaymentTransaction.objects.create(
+            user=self.user,
+            gateway=gateway,
+            gateway_order_id=order_id,
+            amount=Decimal(amount),
+            status=status,
+            **kwargs
+        )
+
+    def report(self, name, rows):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', newline='') as fh:
+            if name.endswith('.csv'):
+                writer = csv.DictWriter(fh, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+            else:
+                json.dump(rows, fh, indent=1)
+        return path
+
+    def test_csv_report_flags_discrepancies(self):
+        """Test amount, status, missing and stuck-pending discrepancies from a CSV report."""
+        self.transaction('order_ok', '118.00', gateway_payment_id='pay_ok')
+        self.transaction('order_short', '200.00')
+        late = self.transaction('order_late', '50.00', status='pending')
+        stuck = self.transaction('order_stuck', '75.00', status='pending')
+        PaymentTransaction.objects.filter(pk__in=[late.pk, stuck.pk]).update(
+            created_at=timezone.now() - timedelta(hours=3)
+        )
+        self.transaction('order_new', '10.00', status='pending')
+
+        path = self.report('settlement.csv', [
+            # Matched by payment id when the order id is missing
+            {'type': 'payment', 'entity_id': 'pay_ok', 'order_id': '', 'amount': '11800', 'status': 'captured'},
+            {'type': 'payment', 'entity_id': 'pay_2', 'order_id': 'order_short', 'amount': '15000', 'status': 'captured'},
+            {'type': 'payment', 'entity_id': 'pay_3', 'order_id': 'order_late', 'amount': '5000', 'status': 'captured'},
+            {'type': 'payment', 'entity_id': 'pay_4', 'order_id': 'order_unknown', 'amount': '900', 'status': 'captured'},
+        ])
+
+        call_command('reconcile_settlements', path, '--chunk-size', '2', stdout=open(os.devnull, 'w'))
+
+        discrepancies = {d.kind: d for d in SettlementDiscrepancy.objects.select_related('run')}
+        run = discrepancies['stuck_pending'].run
+        self.assertEqual((run.status, run.rows_read, run.matched_count, run.discrepancy_count), ('completed', 4, 1, 4))
+        self.assertEqual(discrepancy_summary(run), {
+            'amount_mismatch': 1, 'missing_transaction': 1, 'status_mismatch': 1, 'stuck_pending': 1,
+        })
+        self.assertEqual(
+            (discrepancies['amount_mismatch'].expected_amount, discrepancies['amount_mismatch'].reported_amount),
+            (Decimal('200.00'), Decimal('150.00'))
+        )
+        # The late capture is reported as a status mismatch, not again as stuck
+        self.assertEqual(discrepancies['status_mismatch'].transaction_id, late.pk)
+        self.assertEqual(discrepancies['stuck_pending'].transaction_id, stuck.pk)
+        self.assertEqual(discrepancies['missing_transaction'].gateway_order_id, 'order_unknown')
+
+    def test_json_report_streams_refunds(self):
+        """Test a JSON array report is streamed and refunds compare against the refund amount."""
+        self.transaction('cf_1', '100.00', gateway='cashfree', status='refunded', refund_amount=Decimal('40.00'))
+        self.transaction('cf_2', '250.00', gateway='cashfree')
+        rows = [
+            {'order_id': 'cf_1', 'cf_payment_id': 11, 'payment_amount': 100, 'payment_status': 'SUCCESS'},
+            {'order_id': 'cf_1', 'type': 'refund', 'amount': '40.00', 'status': 'SUCCESS'},
+            {'order_id': 'cf_2', 'cf_payment_id': 12, 'payment_amount': 250, 'payment_status': 'SUCCESS'},
+        ]
+        path = self.report('settlement.json', rows)
+
+        # Read in chunks smaller than a row
+        with open(path) as fh:
+            self.assertEqual(list(_json_array_items(fh, chunk_size=16)), rows)
+
+        run = reconcile_settlements(read_report(path), 'cashfree', source=path)
+        self.assertEqual((run.rows_read, run.matched_count, run.discrepancy_count), (3, 3, 0))
+
+
+class DailyCollectionTests(APITestCase):
+    """Test cases for the daily collections rollup."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='collections@example.com', password='testpass123')
+        self.admin = User.objects.create_user(email='collections.admin@example.com', password='testpass123')
+        AdminProfile.objects.create(user=self.admin, employee_id='EMP-2', can_manage_payments=True)
+
+    def invoice(self, total, due_days=30):
+        return Invoice.objects.create(
+            user=self.user,
+            amount=Decimal(total) / Decimal('1.18'),
+            total_amount=Decimal(total),
+            due_date=timezone.localdate() + timedelta(days=due_days)
+        )
+
+    def payment(self, invoice, gateway='razorpay', order_id=None):
+        return PaymentTransaction.objects.create(
+            user=self.user,
+            invoice=invoice,
+            gateway=gateway,
+            gateway_order_id=order_id,
+            amount=invoice.total_amount
+        )
+
+    def test_rollup_follows_payment_and_invoice_changes(self):
+        """Test incremental updates match a rebuild from the source tables."""
+        paid = self.invoice('118.00')
+        refunded = self.invoice('236.00')
+        self.invoice('59.00', due_days=-2)
+        self.invoice('354.00').mark_as_paid('cash', 'CASH-1')
+
+        self.payment(paid, order_id='order_paid').mark_as_success('pay_1')
+        paid.mark_as_paid('razorpay', 'pay_1')
+        refund = self.payment(refunded, gateway='cashfree', order_id='order_refund')
+        refund.mark_as_success('pay_2')
+        refund.mark_as_refunded('rfnd_1', refund.amount)
+        self.payment(refunded, order_id='order_failed').mark_as_failed('Declined')
+        self.assertEqual(mark_overdue(), 1)
+
+        with self.assertNumQueries(1):
+            totals = collection_totals(start=timezone.localdate().replace(day=1))
+        self.assertEqual(totals['collected_amount'], Decimal('118.00'))
+        self.assertEqual(totals['refunded_amount'], Decimal('236.00'))
+        self.assertEqual(totals['invoiced_amount'], Decimal('767.00'))
+        self.assertEqual(totals['paid_count'], 2)
+        self.assertEqual(totals['overdue_amount'], Decimal('59.00'))
+        self.assertEqual(totals['pending_amount'], Decimal('236.00'))
+
+        # The incremental rows are exactly what the source tables give
+        stored = set(DailyCollection.objects.exclude(count=0).values_list('kind', 'gateway', 'status', 'count', 'amount'))
+        self.assertEqual(rebuild_collections(), (len(stored), 0))
+        self.assertEqual(
+            set(DailyCollection.objects.exclude(count=0).values_list('kind', 'gateway', 'status', 'count', 'amount')),
+            stored
+        )
+
+        # A drifted row is repaired by the backfill command
+        DailyCollection.objects.filter(kind='payment', status='success').update(count=5)
+        call_command('backfill_collections', stdout=open(os.devnull, 'w'))
+        self.assertEqual(collection_totals()['collected_count'], 1)
+
+    def test_dashboards_read_rollup(self):
+        """Test the collection dashboards report the rollup figures."""
+        invoice = self.invoice('118.00')
+        self.invoice('236.00', due_days=-1)
+        mark_overdue()
+        self.payment(invoice, gateway='manual').mark_as_success()
+        invoice.mark_as_paid('cash', 'CASH-2')
+
+        self.client.force_authenticate(self.admin)
+        summary = self.client.get(reverse('admin-payments-collection-summary')).data
+        self.assertEqual(summary['this_month_collection'], Decimal('118.00'))
+        self.assertEqual(summary['this_month_by_gateway']['manual']['count'], 1)
+        self.assertEqual(summary['overdue_invoices_count'], 1)
+        self.assertEqual(summary['pending_invoices_count'], 0)
+
+        today = timezone.localdate()
+        report = self.client.get(
+            reverse('dashboard-payment-report'), {'year': today.year, 'month': today.month}
+        ).data
+        self.assertEqual(report['total_invoiced'], Decimal('354.00'))
+        self.assertEqual(report['total_collected'], Decimal('118.00'))
+        self.assertEqual(report['overdue_amount'], Decimal('236.00'))
+        self.assertEqual(report['collection_rate'], Decimal('33.33'))
+
+        last_year = self.client.get(reverse('dashboard-payment-report'), {'year': today.year - 1}).data
+        self.assertEqual(last_year['total_collected'], 0)
+        self.assertEqual(
+            self.client.get(reverse('dashboard-payment-report'), {'month': 13}).status_code, 400
+        )
+
+        dashboard = self.client.get(reverse('dashboard-list')).data
+        self.assertEqual(dashboard['total_collected'], Decimal('118.00'))
+        self.assertEqual(dashboard['overdue_count'], 1)
+
+    def test_rebuild_locks_rows_before_totalling(self):
+        """Test a rebuild corrects rows in place after locking them."""
+        invoice = self.invoice('118.00')
+        self.payment(invoice, order_id='order_lock').mark_as_success('pay_lock')
+        DailyCollection.objects.filter(kind='invoice').delete()
+        DailyCollection.objects.filter(kind='payment', status='success').update(amount=Decimal('1.00'))
+        untouched = DailyCollection.objects.get(kind='payment', status='pending')
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(rebuild_collections(), (2, 2))
+
+        statements = [query['sql'] for query in queries.captured_queries]
+        totals = [i for i, sql in enumerate(statements) if 'SUM(' in sql]
+        locked = next(
+            i for i, sql in enumerate(statements)
+            if sql.startswith('SELECT') and 'FROM "payment_daily_collections"' in sql
+        )
+        self.assertLess(totals[1], locked)
+        self.assertLess(locked, totals[2])
+        self.assertFalse(any(sql.startswith('DELETE') for sql in statements))
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', statements[locked])
+
+        # Rows are corrected in place rather than replaced
+        self.assertTrue(DailyCollection.objects.filter(pk=untouched.pk, count=0).exists())
+        totals = collection_totals()
+        self.assertEqual(totals['collected_amount'], Decimal('118.00'))
+        self.assertEqual(totals['invoiced_amount'], Decimal('118.00'))
@@ -6,6 +6,7 @@ from .views import (
     PaymentInitView,
     PaymentVerifyView,
     PaymentWebhookView,
+    CashfreeWebhookView,
     payment_history,
     payment_detail,
 )
@@ -17,6 +18,7 @@ urlpatterns = [
     
     # Webhook handler
     path('webhook/', PaymentWebhookView.as_view(), name='payment-webhook'),
+    path('webhook/cashfree/', CashfreeWebhookView.as_view(), name='payment-webhook-cashfree'),
     
     # Payment history and details
     path('history/', payment_history, name='payment-history'),
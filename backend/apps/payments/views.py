@@ -1,9 +1,10 @@
 """
-Payment Views for Razorpay Integration
+Payment Views for Razorpay and Cashfree Integration
 """
 import json
 import logging
 from django.conf import settings
+from django.db import transaction as db_transaction
 from django.utils import timezone
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, action
@@ -11,9 +12,12 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.generics import RetrieveAPIView
 
-from .services import RazorpayService, PaymentError, verify_razorpay_webhook_signature
+from .gateways import GATEWAY_CLASSES, get_gateway_registry
+from .services import PaymentError, verify_cashfree_webhook_signature, verify_razorpay_webhook_signature
+from .webhooks import ingest_event
 from .models import PaymentTransaction
 from .serializers import PaymentInitSerializer, PaymentVerifySerializer, PaymentWebhookSerializer
+from apps.core.outbox import emit_event
 
 logger = logging.getLogger(__name__)
 
@@ -33,11 +37,12 @@ class PaymentInitView(APIView):
         
         invoice_id = serializer.validated_data.get('invoice_id')
         proforma_id = serializer.validated_data.get('proforma_id')
-        gateway = serializer.validated_data.get('gateway', 'razorpay')
+        # Without a requested gateway the registry picks the fastest available one
+        gateway = serializer.validated_data.get('gateway')
         
-        if gateway != 'razorpay':
+        if gateway and gateway not in GATEWAY_CLASSES:
             return Response(
-                {'error': 'Only Razorpay is currently supported'},
+                {'error': 'Payment gateway not supported'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
@@ -57,13 +62,11 @@ class PaymentInitView(APIView):
                 proforma = ProformaInvoice.objects.get(id=proforma_id, user=user)
                 amount = proforma.total_amount
             
-            # Initialize Razorpay service
-            razorpay_service = RazorpayService()
-            
             # Create order
-            order = razorpay_service.create_order(
+            order = get_gateway_registry().create_order(
                 amount=amount,
                 currency='INR',
+                preferred=gateway,
                 invoice_id=str(invoice.id if invoice else proforma.id),
                 user_id=str(user.id),
                 service_type=invoice.service_type if invoice else proforma.service_type,
@@ -77,7 +80,7 @@ class PaymentInitView(APIView):
                 user=user,
                 invoice=invoice,
                 proforma=proforma,
-                gateway='razorpay',
+                gateway=order['gateway'],
                 gateway_order_id=order['order_id'],
                 amount=amount,
                 currency='INR',
@@ -85,10 +88,12 @@ class PaymentInitView(APIView):
             )
             
             return Response({
+                'gateway': order['gateway'],
                 'order_id': order['order_id'],
                 'amount': order['amount'],
                 'currency': order['currency'],
-                'key_id': order['key_id'],
+                'key_id': order.get('key_id'),
+                'payment_session_id': order.get('payment_session_id'),
                 'transaction_id': transaction.id,
                 'invoice_id': invoice_id,
                 'proforma_id': proforma_id,
@@ -126,64 +131,77 @@ class PaymentVerifyView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request):
-        """Verify payment signature and update status."""
+        """Verify payment with the transaction's gateway and update status."""
         serializer = PaymentVerifySerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        razorpay_payment_id = serializer.validated_data['razorpay_payment_id']
-        razorpay_order_id = serializer.validated_data['razorpay_order_id']
-        razorpay_signature = serializer.validated_data['razorpay_signature']
+        order_id = serializer.validated_data['order_id']
+        razorpay_payment_id = serializer.validated_data.get('razorpay_payment_id')
+        razorpay_signature = serializer.validated_data.get('razorpay_signature')
         
         transaction_id = serializer.validated_data.get('transaction_id')
         
         try:
             # Get transaction
-            transaction = PaymentTransaction.objects.get(
-                id=transaction_id,
-                user=request.user,
-                gateway_order_id=razorpay_order_id,
-            )
+            lookup = {'user': request.user, 'gateway_order_id': order_id}
+            if transaction_id:
+                lookup['id'] = transaction_id
+            transaction = PaymentTransaction.objects.get(**lookup)
+            
+            if transaction.gateway == 'razorpay' and not (razorpay_payment_id and razorpay_signature):
+                return Response(
+                    {'error': 'razorpay_payment_id and razorpay_signature are required.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             
-            # Verify payment
-            razorpay_service = RazorpayService()
-            result = razorpay_service.verify_payment(
+            # Verify payment with the gateway that created the order
+            result = get_gateway_registry().verify_payment(
                 payment_id=razorpay_payment_id,
-                order_id=razorpay_order_id,
+                order_id=order_id,
                 signature=razorpay_signature,
+                gateway=transaction.gateway,
             )
             
             if result['verified']:
-                # Update transaction
-                transaction.razorpay_payment_id = razorpay_payment_id
-                transaction.razorpay_signature = razorpay_signature
-                transaction.status = 'success'
-                transaction.completed_at = timezone.now()
-                transaction.save()
-                
-                # Update invoice/proforma status
-                if transaction.invoice:
-                    transaction.invoice.mark_as_paid(
-                        method=result.get('method', 'online'),
-                        reference=razorpay_payment_id
-                    )
-                if transaction.proforma:
-                    transaction.proforma.status = 'paid'
-                    transaction.proforma.save()
+                payment_id = result.get('payment_id') or razorpay_payment_id
                 
-                # Send notification
-                self.send_payment_success_notification(request.user, transaction)
+                # Update transaction, unless a webhook already confirmed it
+                with db_transaction.atomic():
+                    transaction = PaymentTransaction.objects.select_for_update().get(pk=transaction.pk)
+                    if transaction.status != 'success':
+                        transaction.gateway_payment_id = payment_id
+                        transaction.razorpay_signature = razorpay_signature
+                        transaction.payment_method = result.get('method') or transaction.payment_method
+                        transaction.status = 'success'
+                        transaction.completed_at = timezone.now()
+                        transaction.save()
+                        
+                        # Update invoice/proforma status
+                        if transaction.invoice:
+                            transaction.invoice.mark_as_paid(
+                                method=result.get('method', 'online'),
+                                reference=payment_id
+                            )
+                        if transaction.proforma:
+                            transaction.proforma.status = 'paid'
+                            transaction.proforma.save()
+                        
+                        # Notifications, webhooks and analytics are fed from the outbox
+                        emit_event('payment.received', transaction, transaction.event_payload(), user=transaction.user)
                 
                 return Response({
                     'success': True,
                     'message': 'Payment verified successfully',
                     'transaction_id': transaction.id,
-                    'payment_id': razorpay_payment_id,
+                    'payment_id': payment_id,
                 })
             else:
-                # Mark transaction as failed
-                transaction.status = 'failed'
-                transaction.error_message = result.get('error', 'Verification failed')
-                transaction.save()
+                # A bad Razorpay signature fails the attempt; a Cashfree order
+                # without a successful payment yet stays pending for its webhook
+                if transaction.gateway == 'razorpay':
+                    transaction.status = 'failed'
+                    transaction.error_message = result.get('error', 'Verification failed')
+                    transaction.save()
                 
                 return Response({
                     'success': False,
@@ -201,46 +219,21 @@ class PaymentVerifyView(APIView):
                 {'error': 'Failed to verify payment'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-    
-    def send_payment_success_notification(self, user, transaction):
-        """Send payment success notification."""
-        from apps.notifications.models import Notification
-        from django.core.mail import send_mail
-        
-        # In-app notification
-        Notification.objects.create(
-            user=user,
-            channel='push',
-            category='payment_received',
-            title='Payment Successful',
-            message=f'Your payment of ₹{transaction.amount} has been received. Transaction ID: {transaction.razorpay_payment_id}',
-            reference_type='transaction',
-            reference_id=transaction.id
-        )
-        
-        # Email notification
-        try:
-            send_mail(
-                'Payment Received - GSTONGO',
-                f'Dear {user.first_name},\n\nYour payment of ₹{transaction.amount} has been received successfully.\n\nTransaction Details:\n- Amount: ₹{transaction.amount}\n- Transaction ID: {transaction.razorpay_payment_id}\n- Date: {transaction.completed_at}\n\nThank you for your payment.\n\nBest regards,\nGSTONGO Team',
-                settings.DEFAULT_FROM_EMAIL,
-                [user.email],
-                fail_silently=True,
-            )
-        except Exception as e:
-            logger.error(f'Failed to send payment email: {str(e)}')
 
 
 class PaymentWebhookView(APIView):
     """
-    Handle Razorpay webhooks.
+    Receive Razorpay webhooks into the payment webhook inbox.
     
     POST /api/v1/payments/webhook/
+    
+    Events are stored and acknowledged immediately; a worker applies them
+    (see ``webhooks``).
     """
     permission_classes = [permissions.AllowAny]  # Webhooks don't have auth
     
     def post(self, request):
-        """Handle Razorpay webhook events."""
+        """Verify and store a Razorpay webhook event."""
         # Get webhook signature from header
         webhook_signature = request.META.get('HTTP_X_RAZORPAY_SIGNATURE', '')
         webhook_secret = settings.RAZORPAY_WEBHOOK_SECRET
@@ -256,83 +249,69 @@ class PaymentWebhookView(APIView):
                 )
         
         # Parse event
-        event_data = json.loads(request.body)
-        event_type = event_data.get('event')
-        
-        logger.info(f"Received Razorpay webhook: {event_type}")
-        
         try:
-            if event_type == 'payment.captured':
-                self.handle_payment_captured(event_data.get('payload', {}))
-            elif event_type == 'payment.failed':
-                self.handle_payment_failed(event_data.get('payload', {}))
-            elif event_type == 'refund.created':
-                self.handle_refund_created(event_data.get('payload', {}))
-            else:
-                logger.info(f"Unhandled event type: {event_type}")
-            
-            return Response({'status': 'received'})
-            
-        except Exception as e:
-            logger.error(f"Webhook processing error: {str(e)}")
+            event_data = json.loads(request.body)
+        except ValueError:
             return Response(
-                {'error': 'Webhook processing failed'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': 'Invalid payload'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-    
-    def handle_payment_captured(self, payload):
-        """Handle payment captured event."""
-        payment = payload.get('payment', {})
-        order_id = payment.get('order_id')
-        payment_id = payment.get('id')
         
-        transaction = PaymentTransaction.objects.filter(
-            gateway_order_id=order_id
-        ).first()
+        # Razorpay sends the same event id on every retry of a delivery
+        created = ingest_event(
+            'razorpay',
+            request.body,
+            event_data,
+            event_id=request.META.get('HTTP_X_RAZORPAY_EVENT_ID')
+        )
         
-        if transaction:
-            transaction.razorpay_payment_id = payment_id
-            transaction.status = 'success'
-            transaction.completed_at = timezone.now()
-            transaction.save()
-            
-            # Update invoice/proforma
-            if transaction.invoice:
-                transaction.invoice.mark_as_paid('razorpay', payment_id)
-            if transaction.proforma:
-                transaction.proforma.status = 'paid'
-                transaction.proforma.save()
+        logger.info(f"Received Razorpay webhook: {event_data.get('event')}{'' if created else ' (duplicate)'}")
+        return Response({'status': 'received' if created else 'duplicate'})
+
+
+class CashfreeWebhookView(APIView):
+    """
+    Receive Cashfree webhooks into the payment webhook inbox.
     
-    def handle_payment_failed(self, payload):
-        """Handle payment failed event."""
-        payment = payload.get('payment', {})
-        order_id = payment.get('order_id')
-        error_code = payment.get('error', {}).get('code')
-        error_description = payment.get('error', {}).get('description')
+    POST /api/v1/payments/webhook/cashfree/
+    """
+    permission_classes = [permissions.AllowAny]  # Webhooks don't have auth
+    
+    def post(self, request):
+        """Verify and store a Cashfree webhook event."""
+        # Deployments without Cashfree do not take its webhooks at all
+        if 'cashfree' not in get_gateway_registry().services:
+            return Response(
+                {'error': 'Not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
         
-        transaction = PaymentTransaction.objects.filter(
-            gateway_order_id=order_id
-        ).first()
+        # Cashfree signs the timestamp header and raw body with the client secret
+        if not verify_cashfree_webhook_signature(
+            request.META.get('HTTP_X_WEBHOOK_SIGNATURE', ''),
+            request.META.get('HTTP_X_WEBHOOK_TIMESTAMP', ''),
+            settings.CASHFREE_SECRET_KEY,
+            request.body.decode('utf-8')
+        ):
+            logger.warning("Invalid Cashfree webhook signature")
+            return Response(
+                {'error': 'Invalid signature'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
         
-        if transaction:
-            transaction.status = 'failed'
-            transaction.error_message = f"{error_code}: {error_description}"
-            transaction.save()
-    
-    def handle_refund_created(self, payload):
-        """Handle refund created event."""
-        refund = payload.get('refund', {})
-        payment_id = refund.get('payment_id')
+        try:
+            event_data = json.loads(request.body)
+        except ValueError:
+            return Response(
+                {'error': 'Invalid payload'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        transaction = PaymentTransaction.objects.filter(
-            razorpay_payment_id=payment_id
-        ).first()
+        # Without an event id header a redelivery is recognised by its body
+        created = ingest_event('cashfree', request.body, event_data)
         
-        if transaction:
-            transaction.status = 'refunded'
-            transaction.refund_id = refund.get('id')
-            transaction.refund_amount = Decimal(refund.get('amount', 0)) / 100
-            transaction.save()
+        logger.info(f"Received Cashfree webhook: {event_data.get('type')}{'' if created else ' (duplicate)'}")
+        return Response({'status': 'received' if created else 'duplicate'})
 
 
 @api_view(['GET'])
@@ -355,7 +334,7 @@ def payment_history(request):
             'amount': str(t.amount),
             'status': t.status,
             'gateway': t.gateway,
-            'transaction_id': t.razorpay_payment_id,
+            'transaction_id': t.gateway_payment_id,
             'created_at': t.created_at.isoformat(),
             'completed_at': t.completed_at.isoformat() if t.completed_at else None,
         }
@@ -387,7 +366,7 @@ def payment_detail(request, transaction_id):
             'status': transaction.status,
             'gateway': transaction.gateway,
             'gateway_order_id': transaction.gateway_order_id,
-            'gateway_payment_id': transaction.razorpay_payment_id,
+            'gateway_payment_id': transaction.gateway_payment_id,
             'error_message': transaction.error_message,
             'created_at': transaction.created_at.isoformat(),
             'completed_at': transaction.completed_at.isoformat() if transaction.completed_at else None,
@@ -0,0 +1,332 @@
+"""
+Payment webhook inbox for GSTONGO.
+
+``PaymentWebhookView`` only verifies the signature and stores the raw event
+with ``ingest_event``; the insert is keyed by the gateway's event id, so
+gateway retries of a slow or repeated delivery are stored once. After
+commit a worker drains pending events in id order (``process_pending_events``),
+one transaction per event. An event that fails is retried with backoff, and
+later events for the same order wait behind it so a refund is never applied
+before its capture. Handlers are idempotent, so the same capture delivered
+under two event ids is applied once. Razorpay and Cashfree events are
+stored alike; each gateway has its own event parser and handlers, and a
+handler only touches transactions of the gateway its event came from.
+"""
+import hashlib
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import F, Min
+from django.utils import timezone
+
+from apps.core.outbox import emit_event
+
+logger = logging.getLogger(__name__)
+
+
+def _entity(payload, name):
+    """Entity of ``name`` in a Razorpay event payload."""
+    wrapper = payload.get(name) or {}
+    return wrapper.get('entity', wrapper)
+
+
+def event_order_id(payload):
+    """Gateway order id a Razorpay event belongs to, when it has one."""
+    return _entity(payload, 'payment').get('order_id') or _entity(payload, 'order').get('id')
+
+
+def parse_event(gateway, event):
+    """
+    Split a webhook body into its event type, payload and order id.
+
+    Razorpay sends ``{"event", "payload"}``; Cashfree sends ``{"type", "data"}``
+    with the order (or refund) carrying our order id.
+    """
+    if gateway == 'cashfree':
+        data = event.get('data') or {}
+        order_id = (data.get('order') or data.get('refund') or {}).get('order_id')
+        return event.get('type') or '', data, order_id
+    payload = event.get('payload') or {}
+    return event.get('event') or '', payload, event_order_id(payload)
+
+
+def ingest_event(gateway, raw_body, event, event_id=None):
+    """
+    Store a verified webhook event in the inbox.
+
+    Args:
+        gateway: gateway name
+        raw_body: request body, used as the key when no event id was sent
+        event: parsed event body
+        event_id: the gateway's event id header
+
+    Returns:
+        bool: True if the event is new, False for a duplicate delivery
+    """
+    from .models import WebhookEvent
+
+    event_id = event_id or hashlib.sha256(raw_body).hexdigest()
+    event_type, payload, order_id = parse_event(gateway, event)
+    _, created = WebhookEvent.objects.get_or_create(
+        gateway=gateway,
+        event_id=event_id,
+        defaults={
+            'event_type': event_type,
+            'order_id': order_id,
+            'payload': payload,
+        }
+    )
+    if created:
+        db_transaction.on_commit(schedule_processing)
+    return created
+
+
+def schedule_processing():
+    """Ask a worker to process the inbox now rather than on the next beat."""
+    from .tasks import process_payment_webhooks
+    try:
+        process_payment_webhooks.delay()
+    except Exception as e:
+        # The periodic run picks the event up regardless.
+        logger.warning(f'Could not schedule webhook processing: {e}')
+
+
+def capture_order(gateway, order_id, payment_id, method=None):
+    """Mark the order's transaction and its invoice or proforma paid."""
+    from .models import PaymentTransaction
+
+    transaction = PaymentTransaction.objects.select_for_update().filter(
+        gateway=gateway,
+        gateway_order_id=order_id
+    ).first()
+
+    # Already confirmed via the verify endpoint or an earlier event
+    if not transaction or transaction.status == 'success':
+        return
+
+    transaction.gateway_payment_id = payment_id
+    transaction.payment_method = method or transaction.payment_method
+    transaction.status = 'success'
+    transaction.completed_at = timezone.now()
+    transaction.save()
+
+    if transaction.invoice:
+        transaction.invoice.mark_as_paid(transaction.gateway, payment_id)
+    if transaction.proforma:
+        transaction.proforma.status = 'paid'
+        transaction.proforma.save()
+
+    emit_event('payment.received', transaction, transaction.event_payload(), user=transaction.user)
+
+
+def fail_order(gateway, order_id, error_code, error_description):
+    """Record a failed attempt unless the order was already paid."""
+    from .models import PaymentTransaction
+
+    transaction = PaymentTransaction.objects.select_for_update().filter(
+        gateway=gateway,
+        gateway_order_id=order_id
+    ).first()
+
+    # A later successful attempt on the same order wins
+    if transaction and transaction.status not in ('success', 'refunded'):
+        transaction.status = 'failed'
+        transaction.error_code = error_code
+        transaction.error_message = f"{error_code}: {error_description}"
+        transaction.save()
+
+
+def handle_payment_captured(payload, gateway):
+    payment = _entity(payload, 'payment')
+    capture_order(gateway, payment.get('order_id'), payment.get('id'), payment.get('method'))
+
+
+def handle_payment_failed(payload, gateway):
+    payment = _entity(payload, 'payment')
+    error_code = payment.get('error_code') or (payment.get('error') or {}).get('code')
+    error_description = payment.get('error_description') or (payment.get('error') or {}).get('description')
+    fail_order(gateway, payment.get('order_id'), error_code, error_description)
+
+
+def handle_refund_created(payload, gateway):
+    """Record a refund against the captured payment."""
+    from .models import PaymentTransaction
+
+    refund = _entity(payload, 'refund')
+
+    transaction = PaymentTransaction.objects.select_for_update().filter(
+        gateway=gateway,
+        gateway_payment_id=refund.get('payment_id')
+    ).first()
+
+    if transaction and transaction.gateway_refund_id != refund.get('id'):
+        transaction.mark_as_refunded(refund.get('id'), Decimal(refund.get('amount', 0)) / 100)
+
+
+def handle_cashfree_payment_success(data, gateway):
+    payment = data.get('payment') or {}
+    capture_order(
+        gateway,
+        (data.get('order') or {}).get('order_id'),
+        str(payment.get('cf_payment_id')),
+        payment.get('payment_group')
+    )
+
+
+def handle_cashfree_payment_failed(data, gateway):
+    payment = data.get('payment') or {}
+    error = payment.get('error_details') or {}
+    fail_order(
+        gateway,
+        (data.get('order') or {}).get('order_id'),
+        error.get('error_code') or payment.get('payment_status'),
+        error.get('error_description') or payment.get('payment_message')
+    )
+
+
+def handle_cashfree_refund(data, gateway):
+    """Record a processed refund; Cashfree refunds are addressed by order id."""
+    from .models import PaymentTransaction
+
+    refund = data.get('refund') or {}
+    if refund.get('refund_status') != 'SUCCESS':
+        return
+
+    transaction = PaymentTransaction.objects.select_for_update().filter(
+        gateway=gateway,
+        gateway_order_id=refund.get('order_id')
+    ).first()
+
+    refund_id = refund.get('refund_id') or str(refund.get('cf_refund_id'))
+    if transaction and transaction.gateway_refund_id != refund_id:
+        transaction.mark_as_refunded(refund_id, Decimal(str(refund.get('refund_amount', 0))))
+
+
+HANDLERS = {
+    'payment.captured': handle_payment_captured,
+    'payment.failed': handle_payment_failed,
+    'refund.created': handle_refund_created,
+}
+
+CASHFREE_HANDLERS = {
+    'PAYMENT_SUCCESS_WEBHOOK': handle_cashfree_payment_success,
+    'PAYMENT_FAILED_WEBHOOK': handle_cashfree_payment_failed,
+    'PAYMENT_USER_DROPPED_WEBHOOK': handle_cashfree_payment_failed,
+    'REFUND_STATUS_WEBHOOK': handle_cashfree_refund,
+}
+
+
+def _handlers(gateway):
+    return CASHFREE_HANDLERS if gateway == 'cashfree' else HANDLERS
+
+
+def _retry_delay(attempts):
+    base = getattr(settings, 'PAYMENT_WEBHOOK_RETRY_BASE_SECONDS', 30)
+    return timedelta(seconds=min(base * (2 ** max(attempts - 1, 0)), 60 * 60))
+
+
+def _mark_failed(event, error):
+    """Schedule a retry for ``event`` or dead-letter it after max attempts."""
+    max_attempts = getattr(settings, 'PAYMENT_WEBHOOK_MAX_ATTEMPTS', 10)
+    event.attempts += 1
+    event.last_error = str(error)
+    if event.attempts >= max_attempts:
+        event.status = 'failed'
+        logger.error(f'Webhook event {event.event_id} dead-lettered after {event.attempts} attempts: {error}')
+    else:
+        event.available_at = timezone.now() + _retry_delay(event.attempts)
+    event.save(update_fields=['attempts', 'last_error', 'status', 'available_at'])
+
+
+def _blocked_orders(events):
+    """Earliest waiting (backing-off) event per order of this batch."""
+    from .models import WebhookEvent
+
+    order_ids = {event.order_id for event in events if event.order_id}
+    if not order_ids:
+        return {}
+    waiting = WebhookEvent.objects.filter(
+        status='pending',
+        order_id__in=order_ids,
+        available_at__gt=timezone.now()
+    ).values('order_id').annotate(first_id=Min('id'), until=Min('available_at'))
+    return {row['order_id']: (row['first_id'], row['until']) for row in waiting}
+
+
+def process_batch(events):
+    """
+    Apply an id-ordered batch of inbox events, one transaction each.
+
+    Returns:
+        int: events processed or ignored
+    """
+    from .models import WebhookEvent
+
+    blocked = _blocked_orders(events)
+    done = []
+    ignored = []
+    for event in events:
+        blocker = blocked.get(event.order_id)
+        if blocker and blocker[0] < event.id:
+            # Wait behind the earlier event for this order
+            WebhookEvent.objects.filter(pk=event.pk).update(available_at=blocker[1])
+            continue
+
+        handler = _handlers(event.gateway).get(event.event_type)
+        if handler is None:
+            ignored.append(event.pk)
+            continue
+
+        try:
+            with db_transaction.atomic():
+                handler(event.payload, event.gateway)
+        except Exception as e:
+            _mark_failed(event, e)
+            if event.order_id and event.status == 'pending':
+                blocked[event.order_id] = (event.id, event.available_at)
+        else:
+            done.append(event.pk)
+
+    now = timezone.now()
+    WebhookEvent.objects.filter(pk__in=done).update(
+        status='processed', processed_at=now, attempts=F('attempts') + 1, last_error=None
+    )
+    WebhookEvent.objects.filter(pk__in=ignored).update(status='ignored', processed_at=now)
+    return len(done) + len(ignored)
+
+
+def process_pending_events(batch_size=None, max_batches=None):
+    """
+    Process available inbox events in id order.
+
+    Must run in a single worker at a time (see ``process_payment_webhooks``)
+    to keep per-order ordering.
+
+    Returns:
+        int: events processed or ignored
+    """
+    from .models import WebhookEvent
+
+    batch_size = batch_size or getattr(settings, 'PAYMENT_WEBHOOK_BATCH_SIZE', 200)
+    max_batches = max_batches or getattr(settings, 'PAYMENT_WEBHOOK_MAX_BATCHES_PER_RUN', 50)
+
+    total = 0
+    last_id = 0
+    for _ in range(max_batches):
+        events = list(
+            WebhookEvent.objects.filter(
+                status='pending',
+                available_at__lte=timezone.now(),
+                id__gt=last_id
+            ).order_by('id')[:batch_size]
+        )
+        if not events:
+            break
+        total += process_batch(events)
+        last_id = events[-1].id
+        if len(events) < batch_size:
+            break
+    return total
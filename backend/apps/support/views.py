@@ -4,7 +4,10 @@ Views for Support & Ticketing.
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db import transaction
 from django.utils import timezone
+
+from apps.core.outbox import emit_event
 from .models import Enquiry, SupportTicket, TicketComment, JobTicket, JobTask, KnowledgeBase
 from .serializers import (
     EnquirySerializer, EnquiryCreateSerializer,
@@ -61,7 +64,14 @@ class SupportTicketViewSet(viewsets.ModelViewSet):
         ticket.status = 'resolved'
         ticket.resolved_at = timezone.now()
         ticket.resolution_notes = request.data.get('notes', '')
-        ticket.save()
+        with transaction.atomic():
+            ticket.save()
+            emit_event('ticket.resolved', ticket, {
+                'ticket_id': str(ticket.id),
+                'ticket_number': ticket.ticket_number,
+                'subject': ticket.subject,
+                'resolved_at': ticket.resolved_at.isoformat(),
+            }, user=ticket.customer)
         return Response({'status': 'Ticket resolved'})
     
     @action(detail=True, methods=['post'])
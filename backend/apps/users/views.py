@@ -1,10 +1,10 @@
 """
 Views for User authentication and profile management.
 """
+import logging
 import random
 import pyotp
 from django.utils import timezone
-from django.core.mail import send_mail
 from django.conf import settings
 from django.db.models import Q
 from rest_framework import status, viewsets, permissions
@@ -12,7 +12,6 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
-from twilio.rest import Client
 import firebase_admin
 from firebase_admin import messaging
 
@@ -25,36 +24,42 @@ from .serializers import (
     PasswordResetConfirmSerializer
 )
 
+logger = logging.getLogger(__name__)
+
 
 def generate_otp():
     """Generate a 6-digit OTP."""
     return str(random.randint(100000, 999999))
 
 
+def send_otp(user, channel, title, message):
+    """
+    Send an OTP straight through the channel's provider.
+
+    The notification is never saved, so codes stay out of the in-app list,
+    the unread badge, the notification stream and partition archives.
+    """
+    from apps.notifications.models import Notification
+    from apps.notifications.providers import get_provider
+    notification = Notification(user=user, channel=channel, category='otp', title=title, message=message)
+    failure = get_provider(channel).send_batch([notification]).get(notification.id)
+    if failure is not None:
+        logger.warning(f'Could not send {channel} OTP to user {user.id}: {failure.error}')
+    return failure is None
+
+
 def send_email_otp(user, otp):
     """Send OTP via email."""
-    subject = 'Your GSTONGO Verification Code'
-    message = f'Your verification code is: {otp}\n\nThis code will expire in 5 minutes.'
-    send_mail(
-        subject,
-        message,
-        settings.DEFAULT_FROM_EMAIL,
-        [user.email],
-        fail_silently=False,
+    return send_otp(
+        user, 'email',
+        'Your GSTONGO Verification Code',
+        f'Your verification code is: {otp}\n\nThis code will expire in 5 minutes.',
     )
 
 
 def send_sms_otp(user, otp):
-    """Send OTP via SMS using Twilio."""
-    if settings.TWILIO_ACCOUNT_SID and settings.TWILIO_AUTH_TOKEN:
-        client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
-        message = client.messages.create(
-            body=f'Your GSTONGO verification code is: {otp}',
-            from_=settings.TWILIO_PHONE_NUMBER,
-            to=user.phone_number
-        )
-        return message.sid
-    return None
+    """Send OTP via SMS."""
+    return send_otp(user, 'sms', 'Verification Code', f'Your GSTONGO verification code is: {otp}')
 
 
 def send_push_notification(user, title, body):
@@ -1,5 +1,14 @@
 """
 ASGI config for GSTONGO project.
+
+This is the application the deployments serve (Dockerfile, railway.json), with
+uvicorn workers::
+
+    gunicorn gstongo.asgi:application -k uvicorn.workers.UvicornWorker
+
+The notification event stream (/api/v1/notifications/stream/) holds
+long-lived connections and only streams under ASGI; the rest of the API runs
+unchanged in Django's thread pool.
 """
 import os
 from django.core.asgi import get_asgi_application
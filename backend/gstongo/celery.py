@@ -47,15 +47,67 @@ app.conf.beat_schedule = {
         'task': 'apps.core.tasks.update_overdue_invoices',
         'schedule': crontab(hour=0, minute=0),
     },
+    # Receivables ledgers - nightly check against invoices at 1 AM
+    'reconcile-receivables-ledgers': {
+        'task': 'apps.core.tasks.reconcile_receivables_ledgers',
+        'schedule': crontab(hour=1, minute=0),
+    },
+    # Daily collections rollup - nightly rebuild of recent days at 1:30 AM
+    'rebuild-recent-collections': {
+        'task': 'apps.payments.tasks.rebuild_recent_collections',
+        'schedule': crontab(hour=1, minute=30),
+    },
     # Monthly report generation - 1st of each month at 6 AM
     'monthly-report': {
         'task': 'apps.core.tasks.generate_monthly_report',
         'schedule': crontab(day_of_month='1', hour=6, minute=0),
     },
+    # Outbox relay safety net - every minute (commits also trigger a relay)
+    'relay-outbox-events': {
+        'task': 'apps.core.tasks.relay_outbox_events',
+        'schedule': 60.0,
+    },
+    # Payment webhook inbox safety net - every minute (ingestion also triggers a run)
+    'process-payment-webhooks': {
+        'task': 'apps.payments.tasks.process_payment_webhooks',
+        'schedule': 60.0,
+    },
+    # Notification dispatcher - drains pending sends and due retries
+    'dispatch-notifications': {
+        'task': 'apps.notifications.tasks.dispatch_notifications',
+        'schedule': 30.0,
+    },
+    # Notification schedules - every minute
+    'run-notification-schedules': {
+        'task': 'apps.notifications.tasks.run_notification_schedules',
+        'schedule': 60.0,
+    },
+    # Notification digests - flushes buffered reminders every 5 minutes
+    'flush-notification-digests': {
+        'task': 'apps.notifications.tasks.flush_notification_digests',
+        'schedule': 5 * 60.0,
+    },
+    # Unread notification counters - hourly drift repair
+    'reconcile-unread-counters': {
+        'task': 'apps.notifications.tasks.reconcile_unread_counters',
+        'schedule': crontab(minute=15),
+    },
+    # Notification partitions - daily at 2:30 AM
+    'maintain-notification-partitions': {
+        'task': 'apps.notifications.tasks.maintain_notification_partitions',
+        'schedule': crontab(hour=2, minute=30),
+    },
 }
 
 app.conf.timezone = 'Asia/Kolkata'
 
+# Queue topology; individual tasks pick their queue where they are defined.
+from apps.core import queues  # noqa: E402
+
+app.conf.task_queues = queues.TASK_QUEUES
+app.conf.task_default_queue = queues.DEFAULT_QUEUE
+app.conf.task_default_routing_key = queues.DEFAULT_QUEUE
+
 
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
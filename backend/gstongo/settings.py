@@ -219,6 +219,148 @@ EMAIL_HOST_USER = 'viviztechnologies@gmail.com'
 EMAIL_HOST_PASSWORD = 'YOUR_GMAIL_APP_PASSWORD'
 DEFAULT_FROM_EMAIL = 'GSTONGO <viviztechnologies@gmail.com>'
 
+# Notification email transport: 'smtp' (pooled EMAIL_BACKEND connections)
+# or 'sendgrid' (batched SendGrid API requests)
+EMAIL_DELIVERY_TRANSPORT = os.environ.get('EMAIL_DELIVERY_TRANSPORT', 'smtp')
+SENDGRID_API_KEY = os.environ.get('SENDGRID_API_KEY')
+SENDGRID_SANDBOX_MODE_IN_DEBUG = False
+
+# Connections kept open per worker process and when to recycle them
+EMAIL_POOL_SIZE = 4
+EMAIL_POOL_MAX_MESSAGES = 500
+EMAIL_POOL_MAX_AGE = 300
+
+# Sends per minute across all workers (0 = unlimited)
+EMAIL_RATE_LIMIT_PER_MINUTE = int(os.environ.get('EMAIL_RATE_LIMIT_PER_MINUTE', 0))
+
+# =========================
+# CACHE / REDIS
+# =========================
+
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': REDIS_URL,
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        },
+    }
+}
+
+# =========================
+# CELERY
+# =========================
+
+# Seconds before a periodic task's distributed lock expires
+TASK_LOCK_TIMEOUT = 60 * 60
+
+# Shared secret for the Prometheus task metrics exporter
+METRICS_EXPORTER_TOKEN = os.environ.get('METRICS_EXPORTER_TOKEN')
+
+# =========================
+# OUTBOX
+# =========================
+
+# Consumers the outbox relay delivers domain events to, in order
+OUTBOX_CONSUMERS = [
+    'apps.notifications.consumers.notify_on_events',
+    'apps.analytics.consumers.deliver_webhooks',
+    'apps.analytics.consumers.record_audit_events',
+]
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_BATCHES_PER_RUN = 50
+OUTBOX_MAX_ATTEMPTS = 10
+OUTBOX_RETRY_BASE_SECONDS = 30
+OUTBOX_RELAY_LOCK_TIMEOUT = 5 * 60
+
+# =========================
+# NOTIFICATION DISPATCH
+# =========================
+
+NOTIFICATION_BATCH_SIZE = 200
+NOTIFICATION_MAX_BATCHES_PER_RUN = 50
+NOTIFICATION_MAX_RETRIES = 5
+NOTIFICATION_RETRY_BASE_SECONDS = 60
+# Schedule executor: recipients rendered and inserted per chunk
+NOTIFICATION_SCHEDULE_CHUNK_SIZE = 5000
+NOTIFICATION_SCHEDULES_PER_RUN = 20
+# Reminders per user/channel/category are coalesced over this window (0 = off)
+NOTIFICATION_DIGEST_WINDOW_MINUTES = int(os.environ.get('NOTIFICATION_DIGEST_WINDOW_MINUTES', 60))
+NOTIFICATION_DIGEST_RETENTION_DAYS = 30
+# Retention: monthly partitions older than this are archived to gzip CSV
+NOTIFICATION_RETENTION_MONTHS = int(os.environ.get('NOTIFICATION_RETENTION_MONTHS', 12))
+NOTIFICATION_PARTITIONS_AHEAD = 3
+NOTIFICATION_ARCHIVE_DIR = os.environ.get('NOTIFICATION_ARCHIVE_DIR', os.path.join(BASE_DIR, 'archives', 'notifications'))
+
+# Realtime stream (SSE) fed by Redis pub/sub; served by the ASGI app
+NOTIFICATION_STREAM_ENABLED = True
+NOTIFICATION_STREAM_HEARTBEAT_SECONDS = 20
+# Streams end after this long and the client reconnects
+NOTIFICATION_STREAM_MAX_AGE_SECONDS = 5 * 60
+NOTIFICATION_STREAM_QUEUE_SIZE = 100
+
+# =========================
+# PAYMENTS
+# =========================
+
+RAZORPAY_KEY_ID = os.environ.get('RAZORPAY_KEY_ID', '')
+RAZORPAY_KEY_SECRET = os.environ.get('RAZORPAY_KEY_SECRET', '')
+RAZORPAY_WEBHOOK_SECRET = os.environ.get('RAZORPAY_WEBHOOK_SECRET', '')
+CASHFREE_APP_ID = os.environ.get('CASHFREE_APP_ID', '')
+CASHFREE_SECRET_KEY = os.environ.get('CASHFREE_SECRET_KEY', '')
+CASHFREE_API_BASE_URL = os.environ.get('CASHFREE_API_BASE_URL', 'https://api.cashfree.com/pg')
+# Gateways new orders are routed between, in tie-break order (unconfigured ones are skipped)
+PAYMENT_GATEWAYS = ['razorpay', 'cashfree']
+PAYMENT_GATEWAY_CONNECT_TIMEOUT = 3
+PAYMENT_GATEWAY_READ_TIMEOUT = 10
+PAYMENT_GATEWAY_POOL_SIZE = 20
+PAYMENT_GATEWAY_CONNECT_RETRIES = 2
+# Circuit breaker: consecutive failures to open, seconds before a trial call
+PAYMENT_GATEWAY_FAILURE_THRESHOLD = 5
+PAYMENT_GATEWAY_RESET_SECONDS = 30
+# Webhook inbox processing
+PAYMENT_WEBHOOK_BATCH_SIZE = 200
+PAYMENT_WEBHOOK_MAX_BATCHES_PER_RUN = 50
+PAYMENT_WEBHOOK_MAX_ATTEMPTS = 10
+PAYMENT_WEBHOOK_RETRY_BASE_SECONDS = 30
+PAYMENT_WEBHOOK_LOCK_TIMEOUT = 5 * 60
+# Settlement reconciliation: report rows matched per query, and minutes after
+# which a gateway transaction still pending is reported as stuck
+PAYMENT_SETTLEMENT_CHUNK_SIZE = 5000
+PAYMENT_STUCK_PENDING_MINUTES = 60
+# Daily collections rollup: days recomputed from source by the nightly check
+COLLECTIONS_REBUILD_DAYS = 7
+
+# =========================
+# INVOICES
+# =========================
+
+# Seller details printed on invoice PDFs
+INVOICE_SELLER_NAME = os.environ.get('INVOICE_SELLER_NAME', 'GSTONGO')
+INVOICE_SELLER_GSTIN = os.environ.get('INVOICE_SELLER_GSTIN', '')
+INVOICE_SELLER_ADDRESS = os.environ.get('INVOICE_SELLER_ADDRESS', '')
+# Bulk PDF rendering: documents per batch and render processes (None = all cores)
+INVOICE_PDF_BATCH_SIZE = 500
+INVOICE_PDF_WORKERS = None
+# Proformas converted per transaction in a billing run
+BILLING_RUN_BATCH_SIZE = 1000
+# Days past due after which an open invoice suspends filing for its user
+SERVICE_SUSPENSION_GRACE_DAYS = 7
+
+# =========================
+# WHATSAPP
+# =========================
+
+WHATSAPP_PHONE_NUMBER_ID = os.environ.get('WHATSAPP_PHONE_NUMBER_ID')
+WHATSAPP_ACCESS_TOKEN = os.environ.get('WHATSAPP_ACCESS_TOKEN')
+WHATSAPP_TIMEOUT = 10
+# Bulk sends: in-flight requests and Graph API throughput tier
+WHATSAPP_MAX_CONCURRENCY = 20
+WHATSAPP_MESSAGES_PER_SECOND = int(os.environ.get('WHATSAPP_MESSAGES_PER_SECOND', 80))
+WHATSAPP_MAX_RETRIES = 3
+
 # =========================
 # LOGGING
 # =========================
@@ -15,3 +15,10 @@ PASSWORD_HASHERS = [
 
 # Disable Celery for tests (or run synchronously)
 CELERY_TASK_ALWAYS_EAGER = True
+
+# Use an in-process cache instead of Redis
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}